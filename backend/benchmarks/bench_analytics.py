@@ -0,0 +1,132 @@
+"""Ingest and query time of the columnar order analytics on synthetic orders.
+
+Writes `--orders` random orders as a JSONL segment log, ingests them, then
+times each report query against the columnar copy and against a plain loop
+over the decoded orders, which is what reading the orders directory costs
+without it.
+
+Run from the backend directory:
+
+    uv run python benchmarks/bench_analytics.py --orders 1000000
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from analytics import OrderAnalytics
+from menu import get_catalog
+
+SEGMENT_ORDERS = 200_000
+
+
+def synthetic_orders(count: int, seed: int = 7):
+    catalog = get_catalog()
+    drinks, sizes, milks, extras = (
+        catalog.names(c) for c in ("drinks", "sizes", "milks", "extras")
+    )
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 1, 1, 6)
+    for order_id in range(1, count + 1):
+        placed_at = start + datetime.timedelta(minutes=order_id * 0.5 + rng.random())
+        items = [
+            {
+                "drinkType": rng.choice(drinks),
+                "size": rng.choice(sizes),
+                "milk": rng.choice(milks),
+                "extras": rng.sample(extras, rng.choice((0, 0, 1, 2))),
+                "quantity": rng.choice((1, 1, 1, 2, 3)),
+            }
+            for _ in range(rng.choice((1, 1, 2, 3)))
+        ]
+        yield {
+            "order_id": order_id,
+            "name": f"customer-{order_id}",
+            "items": items,
+            "placed_at": placed_at.isoformat(timespec="seconds"),
+        }
+
+
+def naive_report(orders: list[dict]) -> dict:
+    by_hour: dict[int, collections.Counter] = collections.defaultdict(
+        collections.Counter
+    )
+    oat = milk_given = extras = 0
+    for order in orders:
+        hour = datetime.datetime.fromisoformat(order["placed_at"]).hour
+        for item in order["items"]:
+            by_hour[hour][item["drinkType"]] += item["quantity"]
+            milk_given += item["quantity"]
+            oat += item["quantity"] if item["milk"] == "oat milk" else 0
+            extras += len(item["extras"]) * item["quantity"]
+    return {
+        "popular": {hour: counts.most_common(1)[0] for hour, counts in by_hour.items()},
+        "oat": oat / milk_given,
+        "extras": extras / len(orders),
+    }
+
+
+def timed(label: str, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    print(f"  {label:<34} {time.perf_counter() - start:8.3f} s")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "orders"
+        source.mkdir()
+        orders = []
+        start = time.perf_counter()
+        for order in synthetic_orders(args.orders):
+            orders.append(order)
+        for segment, offset in enumerate(range(0, len(orders), SEGMENT_ORDERS)):
+            with open(source / f"orders-{segment:06d}.jsonl", "w") as f:
+                f.writelines(
+                    json.dumps(o, separators=(",", ":")) + "\n"
+                    for o in orders[offset : offset + SEGMENT_ORDERS]
+                )
+        print(f"{args.orders} orders generated in {time.perf_counter() - start:.1f} s")
+
+        analytics = OrderAnalytics(Path(tmp) / "analytics")
+        print("ingest")
+        timed("first ingest (all orders)", analytics.ingest, "jsonl", source)
+        timed("incremental ingest (nothing new)", analytics.ingest, "jsonl", source)
+        columns = timed("load columns", analytics.load)
+        size = sum(
+            (analytics.directory / name).stat().st_size
+            for name in analytics.manifest["chunks"]
+        )
+        print(
+            f"  columnar copy: {size / 2**20:.1f} MiB for {columns.orders} orders, {len(columns.item_order)} line items"
+        )
+
+        print("queries, columnar")
+        popular = timed("popular drink by hour", columns.popular_drink_by_hour)
+        oat = timed("oat milk share", columns.share, "milk", "oat milk")
+        extras = timed("average extras per order", columns.average_extras_per_order)
+        timed("drinks by size and milk", columns.count_by, "size", "milk")
+        print("queries, loop over decoded orders")
+        naive = timed("all three", naive_report, orders)
+
+        assert {hour: count for hour, (_, count) in popular.items()} == {
+            hour: count for hour, (_, count) in naive["popular"].items()
+        }
+        assert abs(oat - naive["oat"]) < 1e-9 and abs(extras - naive["extras"]) < 1e-9
+
+
+if __name__ == "__main__":
+    main()
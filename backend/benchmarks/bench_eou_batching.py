@@ -0,0 +1,141 @@
+"""Turn detector latency and throughput with and without cross-session batching.
+
+Runs 1, 8 and 32 concurrent sessions against an EOUBatcher, each asking for
+an end-of-turn prediction, waiting `--think-time` seconds and asking again,
+for `--duration` seconds. "unbatched" runs one conversation per model call,
+in order, the way the worker's shared inference process handles requests;
+"batched" runs everything that queued up during the previous call as one,
+waiting up to `--window-ms` for more when the model is idle. Uses the
+synthetic model from fakes.py unless `--model onnx` is given and the turn
+detector's files have been downloaded.
+
+Run from the backend directory:
+
+    uv run python benchmarks/bench_eou_batching.py --duration 5 --think-time 0.05
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fakes import FakeEOUModel
+
+from eou_batching import EOUBatcher, OnnxEOUModel
+
+CONVERSATIONS = [
+    [
+        {
+            "role": "assistant",
+            "content": "Hi there, what can I get started for you today?",
+        }
+    ],
+    [
+        {
+            "role": "assistant",
+            "content": "Hi there, what can I get started for you today?",
+        },
+        {"role": "user", "content": "Can I get a large oat milk latte"},
+    ],
+    [
+        {"role": "assistant", "content": "Sure thing. Anything else with that?"},
+        {
+            "role": "user",
+            "content": "Yeah, and a medium mocha with an extra shot and, um",
+        },
+    ],
+    [
+        {"role": "user", "content": "A medium cappuccino with whole milk."},
+        {
+            "role": "assistant",
+            "content": "A medium cappuccino with whole milk. What name should I put on the order?",
+        },
+        {"role": "user", "content": "It's Sam."},
+    ],
+    [
+        {"role": "user", "content": "What milks do you have?"},
+        {
+            "role": "assistant",
+            "content": "We have whole, skim, oat, almond and soy milk.",
+        },
+        {"role": "user", "content": "Okay then I'll have the"},
+    ],
+]
+
+
+async def session(batcher: EOUBatcher, until: float, think_time: float) -> None:
+    while time.perf_counter() < until:
+        await batcher.predict(random.choice(CONVERSATIONS))
+        await asyncio.sleep(random.uniform(0, 2 * think_time))
+
+
+async def measure(
+    model, sessions: int, *, batched: bool, args: argparse.Namespace
+) -> dict:
+    window = args.window_ms / 1000 if batched else 0.0
+    batcher = EOUBatcher(
+        model, window=window, max_batch=args.max_batch if batched else 1
+    )
+    collector = asyncio.create_task(batcher.run())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            session(batcher, start + args.duration, args.think_time)
+            for _ in range(sessions)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    collector.cancel()
+    await asyncio.gather(collector, return_exceptions=True)
+    return {**batcher.summary(), "throughput": batcher.requests / elapsed}
+
+
+async def run(args: argparse.Namespace) -> None:
+    model = (
+        OnnxEOUModel()
+        if args.model == "onnx"
+        else FakeEOUModel(call_overhead=args.call_overhead_ms / 1000)
+    )
+    print(
+        f"{args.model} model, {args.think_time * 1000:.0f} ms mean think time between requests,"
+        f" {args.window_ms:g} ms batching window, batches of at most {args.max_batch}\n"
+    )
+    print(
+        f"{'sessions':>8} {'mode':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'wait p95':>9} {'batch':>6}"
+    )
+    for sessions in args.sessions:
+        for batched in (False, True):
+            result = await measure(model, sessions, batched=batched, args=args)
+            print(
+                f"{sessions:>8} {'batched' if batched else 'unbatched':>9} {result['throughput']:>8.0f}"
+                f" {result['latency_p50'] * 1000:>8.1f} {result['latency_p95'] * 1000:>8.1f}"
+                f" {result['queue_wait_p95'] * 1000:>9.1f} {result['mean_batch_size']:>6.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--think-time", type=float, default=0.05)
+    parser.add_argument("--window-ms", type=float, default=0.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--model", choices=("fake", "onnx"), default="fake")
+    parser.add_argument(
+        "--call-overhead-ms",
+        type=float,
+        default=2.0,
+        help="fixed cost of each fake model call",
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Event-loop stall from logging, with and without the log pipeline.
+
+Sets up logging the way a job process has it (every record pickled and sent
+to the worker over a socket, with the job's room and session fields added to
+each one), then runs a 10 ms audio ticker on the event loop next to bursts of
+the agent's tool log lines and metrics events, as `--sessions` sessions in
+one process would produce them. Reports how long the loop spent inside
+logging calls and how late the ticker ran:
+
+- direct: f-strings, every metrics event logged, records sent from the loop
+- pipeline: lazy %-formatting, sampled metrics, records queued to the listener thread
+- pipeline+json: the same, also writing JSON lines for each record
+
+Run from the backend directory:
+
+    uv run python benchmarks/bench_logging.py --sessions 8 --duration 5
+"""
+
+import argparse
+import asyncio
+import logging
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from livekit.agents import metrics
+from livekit.agents.ipc.log_queue import LogQueueHandler
+from livekit.agents.metrics.base import Metadata
+from livekit.agents.utils.aio import duplex_unix
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from log_pipeline import LogPipeline, MetricsLogSampler
+
+TICK = 0.01
+BURST_INTERVAL = 0.02
+CONTEXT_FIELDS = {"room": "coffee-shop-1234", "session_id": "AJ_abcdefgh1234"}
+
+logger = logging.getLogger("agent")
+
+
+def _job_process_logging() -> tuple[LogQueueHandler, socket.socket]:
+    """Root handler of a job process, with the worker's end of the socket drained by a thread."""
+    job_end, worker_end = socket.socketpair()
+    handler = LogQueueHandler(duplex_unix._Duplex.open(job_end))
+    root = logging.getLogger()
+    root.setLevel(logging.NOTSET)
+    root.addHandler(handler)
+
+    def drain() -> None:
+        duplex = duplex_unix._Duplex.open(worker_end)
+        while True:
+            try:
+                duplex.recv_bytes()
+            except duplex_unix.DuplexClosed:
+                break
+
+    threading.Thread(target=drain, name="worker-log-reader", daemon=True).start()
+
+    # What JobContext installs so every record carries log_context_fields
+    factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs) -> logging.LogRecord:
+        record = factory(*args, **kwargs)
+        for key, value in CONTEXT_FIELDS.items():
+            setattr(record, key, value)
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+    return handler, worker_end
+
+
+def _tts_metrics() -> metrics.TTSMetrics:
+    return metrics.TTSMetrics(
+        label="tts",
+        request_id="fake_tts_1",
+        timestamp=time.time(),
+        ttfb=0.21,
+        duration=0.8,
+        audio_duration=2.4,
+        cancelled=False,
+        characters_count=42,
+        streamed=False,
+        metadata=Metadata(model_name="FALCON", model_provider="murf"),
+    )
+
+
+def _stt_metrics() -> metrics.STTMetrics:
+    return metrics.STTMetrics(
+        label="stt",
+        request_id="fake_stt_1",
+        timestamp=time.time(),
+        duration=0.0,
+        audio_duration=5.0,
+        streamed=True,
+        metadata=Metadata(model_name="nova-3", model_provider="deepgram"),
+    )
+
+
+def burst(lazy: bool, sampler: MetricsLogSampler) -> None:
+    """One session's log lines for a turn: tool calls, then the metrics events around them."""
+    value, name, order_id = "oat milk", "Sam", 1042
+    if lazy:
+        logger.info("Set milk to: %s", value)
+        logger.info("Set customer name to: %s", name)
+        logger.info(
+            "Order %s saved to %s",
+            order_id,
+            "orders/1042.json",
+            extra={"order_id": order_id},
+        )
+    else:
+        logger.info(f"Set milk to: {value}")
+        logger.info(f"Set customer name to: {name}")
+        logger.info(f"Order {order_id} saved to orders/1042.json")
+    for ev_metrics in (_stt_metrics(), _tts_metrics(), _tts_metrics(), _tts_metrics()):
+        if sampler.should_log(ev_metrics):
+            metrics.log_metrics(ev_metrics)
+
+
+async def measure(mode: str, args: argparse.Namespace) -> dict:
+    pipeline = LogPipeline()
+    json_dir = tempfile.TemporaryDirectory() if mode == "pipeline+json" else None
+    if mode != "direct":
+        pipeline.start(Path(json_dir.name) / "job.jsonl" if json_dir else None)
+    lazy = mode != "direct"
+    samplers = [
+        MetricsLogSampler(every=args.metrics_every if lazy else 1)
+        for _ in range(args.sessions)
+    ]
+    lateness: list[float] = []
+    in_logging: list[float] = []
+    until = time.perf_counter() + args.duration
+
+    async def ticker() -> None:
+        expected = time.perf_counter() + TICK
+        while time.perf_counter() < until:
+            await asyncio.sleep(max(0.0, expected - time.perf_counter()))
+            lateness.append(max(0.0, time.perf_counter() - expected))
+            expected += TICK
+
+    async def sessions() -> None:
+        while time.perf_counter() < until:
+            start = time.perf_counter()
+            for sampler in samplers:
+                burst(lazy, sampler)
+            in_logging.append(time.perf_counter() - start)
+            await asyncio.sleep(BURST_INTERVAL)
+
+    await asyncio.gather(ticker(), sessions())
+    pipeline.stop()
+    if json_dir:
+        json_dir.cleanup()
+    lateness.sort()
+    return {
+        "logging_ms_per_burst": statistics.mean(in_logging) * 1000,
+        "late_p50": lateness[len(lateness) // 2] * 1000,
+        "late_p99": lateness[int(len(lateness) * 0.99)] * 1000,
+        "late_max": lateness[-1] * 1000,
+        "dropped": pipeline.dropped,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(
+        f"{args.sessions} sessions logging a turn every {BURST_INTERVAL * 1000:.0f} ms,"
+        f" {TICK * 1000:.0f} ms audio ticks, for {args.duration:g} s per mode\n"
+    )
+    print(
+        f"{'mode':>14} {'on loop/burst':>14} {'late p50':>9} {'late p99':>9} {'late max':>9} {'dropped':>8}"
+    )
+    for mode in ("direct", "pipeline", "pipeline+json"):
+        result = await measure(mode, args)
+        print(
+            f"{mode:>14} {result['logging_ms_per_burst']:>11.2f} ms {result['late_p50']:>6.2f} ms"
+            f" {result['late_p99']:>6.2f} ms {result['late_max']:>6.2f} ms {result['dropped']:>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--metrics-every", type=int, default=10)
+    args = parser.parse_args()
+    handler, _ = _job_process_logging()
+    try:
+        asyncio.run(run(args))
+    finally:
+        handler.close()
+
+
+if __name__ == "__main__":
+    main()
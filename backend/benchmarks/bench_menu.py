@@ -0,0 +1,72 @@
+"""Accuracy and latency of menu canonicalization over noisy, misheard input.
+
+Run from the backend directory:
+
+    uv run python benchmarks/bench_menu.py
+"""
+
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from menu import CATEGORIES, get_catalog
+
+SAMPLES_PER_FORM = 200
+
+
+def corrupt(text: str, rng: random.Random) -> str:
+    """Apply one STT-style error: drop, swap, substitute or duplicate a letter."""
+    chars = list(text)
+    i = rng.randrange(len(chars))
+    op = rng.choice(("drop", "swap", "substitute", "duplicate"))
+    if op == "drop" and len(chars) > 3:
+        del chars[i]
+    elif op == "swap" and i < len(chars) - 1:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    elif op == "substitute":
+        chars[i] = rng.choice(string.ascii_lowercase)
+    else:
+        chars.insert(i, chars[i])
+    return "".join(chars)
+
+
+def main() -> None:
+    catalog = get_catalog()
+    rng = random.Random(7)
+    cases = [
+        (category, corrupt(form, rng), name)
+        for category in CATEGORIES
+        for name, forms in catalog.aliases(category).items()
+        for form in forms
+        for _ in range(SAMPLES_PER_FORM)
+    ]
+
+    correct = wrong = unmatched = 0
+    methods: dict[str, int] = {}
+    start = time.perf_counter()
+    for category, heard, expected in cases:
+        match = catalog.match(category, heard)
+        if match is None:
+            unmatched += 1
+            continue
+        methods[match.method] = methods.get(match.method, 0) + 1
+        if match.value == expected:
+            correct += 1
+        else:
+            wrong += 1
+    elapsed = time.perf_counter() - start
+
+    n = len(cases)
+    print(f"{n} noisy inputs, {elapsed / n * 1e6:.1f} us/match")
+    print(
+        f"correct {correct / n:.1%}  wrong {wrong / n:.1%}  unmatched {unmatched / n:.1%}"
+    )
+    print("by method:", {k: f"{v / n:.1%}" for k, v in sorted(methods.items())})
+
+
+if __name__ == "__main__":
+    main()
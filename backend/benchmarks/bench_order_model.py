@@ -0,0 +1,195 @@
+"""Allocation, memory and serialization cost of the order model.
+
+Compares the slotted CoffeeOrder with the plain class it replaced (kept
+below as LegacyCoffeeOrder), then times encoding and decoding saved orders
+with the stdlib `json.dumps(indent=2)` the JSON store used to write and with
+every installed codec. Every order is checked to round-trip through every
+codec first.
+
+Run from the backend directory:
+
+    uv run python benchmarks/bench_order_model.py --orders 200000
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bench_analytics import synthetic_orders
+
+from cart import CoffeeOrder
+from order_codec import ORDER_CODECS, SCHEMA_VERSION, check_round_trip, create_codec
+
+
+class LegacyCoffeeOrder:
+    """CoffeeOrder before it was slotted: a per-instance __dict__ and extras in a list."""
+
+    def __init__(
+        self,
+        drink_type: Optional[str] = None,
+        size: Optional[str] = None,
+        milk: Optional[str] = None,
+        extras: Optional[list[str]] = None,
+        quantity: int = 1,
+    ):
+        self.drink_type = drink_type
+        self.size = size
+        self.milk = milk
+        self.extras: list[str] = list(extras or [])
+        self.quantity = quantity
+
+    def add_extra(self, extra: str) -> bool:
+        if extra in self.extras:
+            return False
+        self.extras.append(extra)
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            "drinkType": self.drink_type,
+            "size": self.size,
+            "milk": self.milk,
+            "extras": list(self.extras),
+            "quantity": self.quantity,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LegacyCoffeeOrder":
+        return cls(
+            drink_type=data.get("drinkType"),
+            size=data.get("size"),
+            milk=data.get("milk"),
+            extras=data.get("extras"),
+            quantity=data.get("quantity", 1),
+        )
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_model(cls, items: list[dict]) -> dict:
+    tracemalloc.start()
+    objects = [cls.from_dict(item) for item in items]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+
+    build = timed(lambda: [cls.from_dict(item) for item in items])
+    objects = [cls.from_dict(item) for item in items]
+    to_dict = timed(lambda: [obj.to_dict() for obj in objects])
+    # A repeated extra: the check the add_extra tool runs on every call
+    add_extra = timed(lambda: [obj.add_extra("extra shot") for obj in objects])
+    per_item = 1e9 / len(items)
+    return {
+        "from_dict_ns": round(build * per_item),
+        "to_dict_ns": round(to_dict * per_item),
+        "add_extra_ns": round(add_extra * per_item),
+        "bytes_per_item": round(memory / len(items)),
+    }
+
+
+def bench_snapshots(items: list[dict]) -> dict:
+    """Frozen copies, e.g. what a turn transaction keeps to roll back to, against the to_dict copies they replace."""
+    objects = [CoffeeOrder.from_dict(item) for item in items]
+    results = {}
+    for name, copy in (
+        ("to_dict", CoffeeOrder.to_dict),
+        ("snapshot", CoffeeOrder.snapshot),
+    ):
+        tracemalloc.start()
+        copies = [copy(obj) for obj in objects]
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del copies
+        elapsed = timed(lambda copy=copy: [copy(obj) for obj in objects])
+        results[name] = {
+            "ns": round(elapsed * 1e9 / len(items)),
+            "bytes_per_item": round(memory / len(items)),
+        }
+    return results
+
+
+def bench_codecs(orders: list[dict]) -> dict:
+    results = {}
+    legacy_blobs = [json.dumps(order, indent=2) for order in orders]
+    results["json.dumps(indent=2)"] = {
+        "dumps_us": round(
+            timed(lambda: [json.dumps(order, indent=2) for order in orders])
+            * 1e6
+            / len(orders),
+            2,
+        ),
+        "loads_us": round(
+            timed(lambda: [json.loads(blob) for blob in legacy_blobs])
+            * 1e6
+            / len(orders),
+            2,
+        ),
+    }
+    for kind in ORDER_CODECS:
+        try:
+            codec = create_codec(kind)
+        except RuntimeError:
+            print(f"{kind}: not installed, skipped")
+            continue
+        for pretty in (False, True):
+            blobs = [check_round_trip(order, codec, pretty=pretty) for order in orders]
+            results[f"{kind}{' pretty' if pretty else ''}"] = {
+                "dumps_us": round(
+                    timed(
+                        lambda codec=codec, pretty=pretty: [
+                            codec.dumps(o, pretty=pretty) for o in orders
+                        ]
+                    )
+                    * 1e6
+                    / len(orders),
+                    2,
+                ),
+                "loads_us": round(
+                    timed(
+                        lambda codec=codec, blobs=blobs: [
+                            codec.loads(blob) for blob in blobs
+                        ]
+                    )
+                    * 1e6
+                    / len(orders),
+                    2,
+                ),
+                "bytes": round(sum(len(blob) for blob in blobs) / len(orders)),
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--orders", type=int, default=200_000)
+    args = parser.parse_args()
+
+    orders = [
+        {"schema": SCHEMA_VERSION, **order} for order in synthetic_orders(args.orders)
+    ]
+    items = [item for order in orders for item in order["items"]]
+    print(f"{len(orders)} orders, {len(items)} line items\n")
+
+    for name, cls in (("legacy", LegacyCoffeeOrder), ("slotted", CoffeeOrder)):
+        print(f"{name:>8}: {bench_model(cls, items)}")
+    for name, result in bench_snapshots(items).items():
+        print(f"{name:>8}: {result}")
+    print()
+    for name, result in bench_codecs(orders).items():
+        print(f"{name:>22}: {result}")
+
+
+if __name__ == "__main__":
+    main()
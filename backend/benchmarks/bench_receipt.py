@@ -0,0 +1,68 @@
+"""Bytes and microseconds per receipt render.
+
+Run from the backend directory:
+
+    uv run python benchmarks/bench_receipt.py
+"""
+
+import datetime
+import itertools
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from menu import get_catalog
+from receipt_renderer import (
+    _cup_fragment,
+    _details_fragment,
+    build_receipt_payload,
+)
+
+EXTRAS = [[], ["extra shot"], ["whipped cream", "vanilla syrup", "caramel drizzle"]]
+
+
+def _orders():
+    catalog = get_catalog()
+    combos = itertools.product(
+        catalog.names("drinks"), catalog.names("sizes"), catalog.names("milks"), EXTRAS
+    )
+    return [
+        {
+            "name": "Alex",
+            "items": [
+                {"drinkType": d, "size": s, "milk": m, "extras": e, "quantity": 1}
+            ],
+        }
+        for d, s, m, e in combos
+    ]
+
+
+def bench(mode: str, orders: list, rounds: int, cold: bool) -> None:
+    placed_at = datetime.datetime.now()
+    sizes = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for order in orders:
+            if cold:
+                _cup_fragment.cache_clear()
+                _details_fragment.cache_clear()
+            _, data = build_receipt_payload(
+                order, order_number="123456", placed_at=placed_at, mode=mode
+            )
+            sizes.append(len(data))
+    elapsed = time.perf_counter() - start
+    renders = rounds * len(orders)
+    label = f"{mode} ({'cold' if cold else 'warm'} cache)"
+    print(
+        f"{label:<24} {elapsed / renders * 1e6:8.1f} us/render"
+        f"  {sum(sizes) / len(sizes):8.0f} bytes avg  {max(sizes):6d} bytes max"
+    )
+
+
+if __name__ == "__main__":
+    orders = _orders()
+    for mode in ("html", "compact"):
+        bench(mode, orders, rounds=1, cold=True)
+        bench(mode, orders, rounds=50, cold=False)
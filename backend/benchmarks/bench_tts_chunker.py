@@ -0,0 +1,118 @@
+"""Time to first audio for a streamed reply, by sentence tokenizer.
+
+Streams barista replies word by word at LLM speed into a StreamAdapter over
+the fake TTS, the way the agent feeds Murf, and reports how long after the
+first word the first audio frame arrives and how many TTS requests each
+reply took. Compares the basic sentence tokenizer the agent used before with
+the adaptive one, across a few first-chunk settings.
+
+Run from the backend directory:
+
+    uv run python benchmarks/bench_tts_chunker.py --tokens-per-second 40 --tts-ttfb 0.2
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions, tokenize, tts
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fakes import FakeTTS
+
+from tts_chunker import AdaptiveSentenceTokenizer
+
+REPLIES = [
+    "Sure thing, one large oat milk latte coming right up. Would you like anything else with that?",
+    "Got it, I've added an extra shot of espresso and vanilla syrup to your mocha. What name should I put on the order?",
+    "Hi there, welcome to the coffee shop! What can I get started for you today?",
+    "Your order is placed and the kitchen is already on it. It should be ready in about five minutes.",
+    "A medium cappuccino with whole milk. Anything else?",
+    "Thanks, Sam!",
+]
+
+
+class CountingTTS(FakeTTS):
+    def __init__(self, *, ttfb: float) -> None:
+        super().__init__(ttfb=ttfb)
+        self.requests = 0
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ):
+        self.requests += 1
+        return super().synthesize(text, conn_options=conn_options)
+
+
+async def first_audio(
+    tokenizer: tokenize.SentenceTokenizer,
+    reply: str,
+    tokens_per_second: float,
+    ttfb: float,
+):
+    fake = CountingTTS(ttfb=ttfb)
+    adapter = tts.StreamAdapter(tts=fake, sentence_tokenizer=tokenizer)
+    stream = adapter.stream()
+    start = time.perf_counter()
+
+    async def feed() -> None:
+        for i, word in enumerate(reply.split(" ")):
+            if i:
+                await asyncio.sleep(1 / tokens_per_second)
+            stream.push_text(word if i == 0 else f" {word}")
+        stream.end_input()
+
+    feeder = asyncio.create_task(feed())
+    first = None
+    async for _ in stream:
+        if first is None:
+            first = time.perf_counter() - start
+    await feeder
+    await stream.aclose()
+    await adapter.aclose()
+    return first, fake.requests
+
+
+async def run(args: argparse.Namespace) -> None:
+    tokenizers = {
+        "basic": tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+        "adaptive 2-6": AdaptiveSentenceTokenizer(min_words=2, max_words=6),
+        "adaptive 3-8": AdaptiveSentenceTokenizer(min_words=3, max_words=8),
+        "adaptive 2-4": AdaptiveSentenceTokenizer(min_words=2, max_words=4),
+    }
+    print(
+        f"{args.tokens_per_second:g} words/s from the LLM, {args.tts_ttfb * 1000:.0f} ms TTS time to first byte\n"
+    )
+    for name, tokenizer in tokenizers.items():
+        results = [
+            await first_audio(tokenizer, reply, args.tokens_per_second, args.tts_ttfb)
+            for reply in REPLIES
+            for _ in range(args.rounds)
+        ]
+        latencies = sorted(first * 1000 for first, _ in results)
+        print(
+            f"{name:>14}: first audio p50 {statistics.median(latencies):6.0f} ms"
+            f"  max {latencies[-1]:6.0f} ms"
+            f"  {statistics.mean(count for _, count in results):.1f} TTS requests/reply"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--tts-ttfb", type=float, default=0.2)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
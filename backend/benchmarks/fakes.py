@@ -0,0 +1,403 @@
+"""Offline stand-ins for the STT, LLM and TTS plugins, with configurable latency.
+
+They implement the plugin interfaces that AgentSession drives, so benchmarks
+exercise the real Assistant, tools and session machinery without any network.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from typing import Optional
+
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    APIConnectionError,
+    APIConnectOptions,
+    llm,
+    stt,
+    tts,
+    utils,
+)
+from livekit.agents.voice.io import AudioOutput, AudioOutputCapabilities
+
+SAMPLE_RATE = 24000
+# Synthesized audio per character of text, roughly conversational speaking rate
+AUDIO_SECONDS_PER_CHAR = 0.06
+# How much longer than usual the requests picked by `slow_rate` take to answer
+SLOW_FACTOR = 10
+
+
+async def _inject_faults(fake, latency: float) -> None:
+    """Wait out a request's latency, failing it or stretching it as the fake's error and slow rates say."""
+    if random.random() < fake.slow_rate:
+        latency *= SLOW_FACTOR
+    await asyncio.sleep(latency)
+    if random.random() < fake.error_rate:
+        raise APIConnectionError(f"Injected {fake.model} failure", retryable=False)
+
+
+class Turn:
+    """One scripted exchange: what the customer says and what the LLM does about it."""
+
+    def __init__(
+        self, user: str, reply: str, tools: Optional[list[tuple[str, dict]]] = None
+    ) -> None:
+        self.user = user
+        self.reply = reply
+        self.tools = tools or []
+
+
+# Tool arguments are complete, as in strict function calling where optional
+# parameters are sent as null. A full order, mixing utterances the slot filler
+# handles with ones only the LLM can handle, such as corrections and questions
+ORDER_DIALOGUE = [
+    Turn("Hi there", "Hi! Welcome to Murf Coffee. What can I get started for you?"),
+    Turn(
+        "Two large lattes with oat milk please",
+        "Two large oat milk lattes, lovely. Any extras?",
+        [
+            (
+                "set_items",
+                {
+                    "items": [
+                        {
+                            "drink_type": "latte",
+                            "size": "large",
+                            "milk": "oat",
+                            "quantity": 2,
+                        }
+                    ],
+                    "customer_name": None,
+                },
+            )
+        ],
+    ),
+    Turn(
+        "And a small mocha",
+        "And a small mocha. What milk would you like in that?",
+        [
+            (
+                "set_items",
+                {
+                    "items": [{"drink_type": "mocha", "size": "small"}],
+                    "customer_name": None,
+                },
+            )
+        ],
+    ),
+    Turn(
+        "Actually make the mocha a cappuccino instead",
+        "No problem, the mocha is a cappuccino now. What milk would you like?",
+        [("set_drink_type", {"drink_type": "cappuccino", "item_number": 2})],
+    ),
+    Turn(
+        "Whole milk",
+        "Whole milk it is.",
+        [("set_milk", {"milk_type": "whole", "item_number": 2})],
+    ),
+    Turn(
+        "What extras do you have?",
+        "We have an extra shot, vanilla syrup, caramel drizzle, whipped cream and chocolate chips.",
+    ),
+    Turn(
+        "Add vanilla syrup",
+        "Vanilla syrup added.",
+        [("add_extra", {"extra": "vanilla syrup", "item_number": None})],
+    ),
+    Turn("My name is Sam", "Thanks Sam!", [("set_customer_name", {"name": "Sam"})]),
+    Turn("That's everything", "Your order is in, enjoy!", [("save_order", {})]),
+]
+
+
+class FakeLLM(llm.LLM):
+    """Answers from a script keyed on the latest user message.
+
+    The first request of a turn returns the scripted tool calls; once their
+    outputs are in the context it returns the scripted reply. Turns the slot
+    filler already handled get the reply straight away, like the real prompt asks.
+    """
+
+    def __init__(
+        self,
+        dialogue: list[Turn],
+        *,
+        ttft: float = 0.3,
+        tokens_per_second: float = 60.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        model: str = "fake-llm",
+    ) -> None:
+        super().__init__()
+        self._turns = {turn.user: turn for turn in dialogue}
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self._model = model
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: Optional[list] = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs,
+    ) -> "FakeLLMStream":
+        return FakeLLMStream(
+            self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options
+        )
+
+
+class FakeLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        fake: FakeLLM = self._llm  # type: ignore[assignment]
+        items = self._chat_ctx.items
+        last_user = next(
+            (
+                i
+                for i in range(len(items) - 1, -1, -1)
+                if getattr(items[i], "role", None) == "user"
+            ),
+            None,
+        )
+        turn = (
+            fake._turns.get(items[last_user].text_content)
+            if last_user is not None
+            else None
+        )
+        request_id = utils.shortuuid("fake_llm_")
+
+        await _inject_faults(fake, fake.ttft)
+        if turn is None:
+            await self._emit_text(request_id, "Sorry, could you say that again?")
+            return
+
+        answered = any(
+            item.type == "function_call_output" for item in items[last_user:]
+        )
+        previous = items[last_user - 1] if last_user else None
+        prefilled = (
+            previous is not None
+            and previous.type == "message"
+            and "already updated" in previous.text_content
+        )
+        if turn.tools and not answered and not prefilled:
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    id=request_id,
+                    delta=llm.ChoiceDelta(
+                        role="assistant",
+                        tool_calls=[
+                            llm.FunctionToolCall(
+                                name=name,
+                                arguments=json.dumps(args),
+                                call_id=utils.shortuuid("call_"),
+                            )
+                            for name, args in turn.tools
+                        ],
+                    ),
+                )
+            )
+            return
+        await self._emit_text(request_id, turn.reply)
+
+    async def _emit_text(self, request_id: str, text: str) -> None:
+        fake: FakeLLM = self._llm  # type: ignore[assignment]
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / fake.tokens_per_second)
+            chunk = word if i == 0 else f" {word}"
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    id=request_id,
+                    delta=llm.ChoiceDelta(role="assistant", content=chunk),
+                )
+            )
+        prompt = sum(
+            len(item.text_content or "")
+            for item in self._chat_ctx.items
+            if item.type == "message"
+        )
+        usage = llm.CompletionUsage(
+            completion_tokens=len(words),
+            prompt_tokens=prompt // 4,
+            total_tokens=prompt // 4 + len(words),
+        )
+        self._event_ch.send_nowait(llm.ChatChunk(id=request_id, usage=usage))
+
+
+class FakeSTT(stt.STT):
+    """Returns queued transcripts after `latency` seconds, whatever audio it is given."""
+
+    def __init__(self, *, latency: float = 0.2) -> None:
+        super().__init__(
+            capabilities=stt.STTCapabilities(streaming=False, interim_results=False)
+        )
+        self.latency = latency
+        self._transcripts: deque[str] = deque()
+
+    def queue(self, transcript: str) -> None:
+        self._transcripts.append(transcript)
+
+    async def _recognize_impl(
+        self, buffer, *, language=None, conn_options: APIConnectOptions
+    ) -> stt.SpeechEvent:
+        await asyncio.sleep(self.latency)
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            request_id=utils.shortuuid("fake_stt_"),
+            alternatives=[
+                stt.SpeechData(
+                    language="en", text=self._transcripts.popleft(), confidence=1.0
+                )
+            ],
+        )
+
+
+class FakeTTS(tts.TTS):
+    """Synthesizes silence sized to the text, after `ttfb` seconds."""
+
+    def __init__(
+        self,
+        *,
+        ttfb: float = 0.25,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        model: str = "fake-tts",
+    ) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+        )
+        self.ttfb = ttfb
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self._model = model
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "FakeChunkedStream":
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        await _inject_faults(self._tts, self._tts.ttfb)  # type: ignore[attr-defined]
+        output_emitter.initialize(
+            request_id=utils.shortuuid("fake_tts_"),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        samples = int(len(self._input_text) * AUDIO_SECONDS_PER_CHAR * SAMPLE_RATE)
+        output_emitter.push(bytes(samples * 2))
+        output_emitter.flush()
+
+
+class NullAudioOutput(AudioOutput):
+    """Discards audio and reports each segment as played out as soon as it is flushed."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            label="NullAudioOutput",
+            capabilities=AudioOutputCapabilities(pause=False),
+            sample_rate=SAMPLE_RATE,
+        )
+        self._pushed: Optional[float] = None
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        self._pushed = (self._pushed or 0.0) + frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        self._finish(interrupted=False)
+
+    def clear_buffer(self) -> None:
+        self._finish(interrupted=True)
+
+    def _finish(self, interrupted: bool) -> None:
+        if self._pushed is not None:
+            pushed, self._pushed = self._pushed, None
+            self.on_playback_finished(playback_position=pushed, interrupted=interrupted)
+
+
+class FakeEOUModel:
+    """A small causal transformer in numpy with the turn detector's batched interface.
+
+    Costs grow with batch size and padded length the way the real model's do,
+    plus `call_overhead` seconds per call for what every model invocation pays
+    whatever its size (the inference process round trip, session setup), so
+    batching is measured without the ONNX model's files. Conversations whose
+    last message ends a sentence come out as likely turn ends.
+    """
+
+    def __init__(
+        self,
+        *,
+        layers: int = 4,
+        dim: int = 256,
+        call_overhead: float = 0.002,
+        seed: int = 0,
+    ) -> None:
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.call_overhead = call_overhead
+        self.weights = [
+            [
+                rng.standard_normal((dim, dim), dtype=np.float32) / dim**0.5
+                for _ in range(4)
+            ]
+            for _ in range(layers)
+        ]
+
+    def predict_batch(self, chat_ctxs: list[list[dict]]) -> list[float]:
+        import numpy as np
+
+        time.sleep(self.call_overhead)
+        # About four characters per token, capped like the turn detector's MAX_HISTORY_TOKENS
+        lengths = [
+            min(128, max(1, sum(len(msg["content"]) for msg in ctx) // 4))
+            for ctx in chat_ctxs
+        ]
+        width = max(lengths)
+        x = np.ones((len(chat_ctxs), width, self.dim), dtype=np.float32)
+        mask = np.triu(np.full((width, width), -np.inf, dtype=np.float32), k=1)
+        for wq, wk, wv, wo in self.weights:
+            q, k, v = x @ wq, x @ wk, x @ wv
+            scores = q @ k.transpose(0, 2, 1) / self.dim**0.5 + mask
+            scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+            x = x + (scores / scores.sum(axis=-1, keepdims=True)) @ v @ wo
+        return [
+            0.9 if ctx[-1]["content"].rstrip().endswith((".", "!", "?")) else 0.1
+            for ctx in chat_ctxs
+        ]
+
+    def threshold(self, language: str) -> Optional[float]:
+        return 0.5 if language.lower().startswith("en") else None
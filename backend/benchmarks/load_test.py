@@ -0,0 +1,258 @@
+"""How many concurrent barista sessions one worker process can carry.
+
+Runs N AgentSessions with the real Assistant against the offline plugins in
+fakes.py, each placing scripted orders, and reports CPU per session (as
+sessions per core), event-loop lag, memory per session and order-save
+throughput. No network access or API keys are needed.
+
+Customer lines go through FakeSTT and then `session.run`, the text-input path,
+which does not call `Assistant.on_user_turn_completed`; every turn therefore
+takes the LLM tool-call route, which is the worst case for CPU.
+
+With --route the LLM and TTS go through the provider routers the agent uses,
+each with a second fake as backup; --error-rate and --slow-rate inject
+failures and slow (10x) requests into the primary fakes to exercise hedging,
+failover and the circuit breakers.
+
+Run from the backend directory:
+
+    uv run python benchmarks/load_test.py --sessions 50 --orders 2
+    uv run python benchmarks/load_test.py --sessions 20 --route --error-rate 0.1 --slow-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fakes import ORDER_DIALOGUE, FakeLLM, FakeSTT, FakeTTS, NullAudioOutput
+from livekit import rtc
+from livekit.agents import AgentSession, tts
+
+from agent import Assistant
+from instrumentation import Histogram, recorder
+from order_ids import create_order_id_sequence
+from order_store import create_order_store
+from profiles import ProfileIndex
+from routing import RoutedLLM, RoutedTTS, health_summary
+from tts_chunker import AdaptiveSentenceTokenizer
+
+LAG_PROBE_INTERVAL = 0.01
+# 10ms of 16kHz mono silence; FakeSTT ignores the audio and returns the scripted line
+_SILENCE = rtc.AudioFrame(
+    bytes(320), sample_rate=16000, num_channels=1, samples_per_channel=160
+)
+
+
+class _FakeParticipant:
+    def __init__(self) -> None:
+        self.published = 0
+
+    async def publish_data(
+        self, payload: bytes, *, reliable: bool = True, topic: str = ""
+    ) -> None:
+        self.published += 1
+
+
+class _FakeRoom:
+    def __init__(self) -> None:
+        self.local_participant = _FakeParticipant()
+
+    def on(self, event: str, callback) -> None:
+        pass
+
+
+async def _probe_loop_lag(lag: Histogram, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        lag.record(max(0.0, time.perf_counter() - start - LAG_PROBE_INTERVAL))
+
+
+async def _run_session(
+    args,
+    order_store,
+    order_ids,
+    profiles,
+    started: asyncio.Queue,
+    go: asyncio.Event,
+    turns: Histogram,
+) -> int:
+    stt = FakeSTT(latency=args.stt_latency)
+    # The session gets text input, so the STT is driven here rather than by the session
+    faults = {"error_rate": args.error_rate, "slow_rate": args.slow_rate}
+    if args.route:
+        session_llm = RoutedLLM(
+            [
+                FakeLLM(
+                    ORDER_DIALOGUE, ttft=args.llm_ttft, model="primary-llm", **faults
+                ),
+                FakeLLM(ORDER_DIALOGUE, ttft=args.llm_ttft, model="backup-llm"),
+            ],
+            budget=args.llm_ttft * 3,
+        )
+        routed_tts = RoutedTTS(
+            [
+                FakeTTS(ttfb=args.tts_ttfb, model="primary-tts", **faults),
+                FakeTTS(ttfb=args.tts_ttfb, model="backup-tts"),
+            ],
+            budget=args.tts_ttfb * 3,
+        )
+        session_tts = tts.StreamAdapter(
+            tts=routed_tts, sentence_tokenizer=AdaptiveSentenceTokenizer()
+        )
+    else:
+        session_llm = FakeLLM(ORDER_DIALOGUE, ttft=args.llm_ttft, **faults)
+        session_tts = FakeTTS(ttfb=args.tts_ttfb, **faults)
+    session = AgentSession(
+        llm=session_llm, tts=session_tts, resume_false_interruption=False
+    )
+    session.output.audio = NullAudioOutput()
+    assistant = Assistant(
+        order_store=order_store, order_ids=order_ids, profiles=profiles
+    )
+    room = _FakeRoom()
+    assistant.set_room(room)
+    await session.start(assistant)
+
+    started.put_nowait(None)
+    await go.wait()
+    try:
+        for _ in range(args.orders):
+            for turn in ORDER_DIALOGUE:
+                await asyncio.sleep(args.think_time)
+                start = time.perf_counter()
+                stt.queue(turn.user)
+                transcript = (await stt.recognize(_SILENCE)).alternatives[0].text
+                await session.run(user_input=transcript)
+                turns.record(time.perf_counter() - start)
+        await asyncio.gather(*assistant.receipts._tasks, return_exceptions=True)
+    finally:
+        await session.aclose()
+        await assistant.receipts.aclose()
+    return assistant.receipts.published
+
+
+def _ms(histogram: Histogram) -> dict:
+    return {
+        "count": histogram.count,
+        **{
+            f"p{round(q * 100)}": round(histogram.percentile(q) * 1000, 1)
+            for q in (0.5, 0.95, 0.99)
+        },
+        "max": round(histogram.max * 1000, 1),
+    }
+
+
+async def run(args) -> dict:
+    process = psutil.Process()
+    lag, turns = Histogram(), Histogram()
+    stop = asyncio.Event()
+    started: asyncio.Queue = asyncio.Queue()
+    go = asyncio.Event()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_kwargs = (
+            {"path": os.path.join(tmp, "orders.db")}
+            if args.store == "sqlite"
+            else {"directory": tmp}
+        )
+        order_store = create_order_store(args.store, **store_kwargs)
+        order_ids = create_order_id_sequence(path=os.path.join(tmp, "order_id.seq"))
+        profiles = ProfileIndex(os.path.join(tmp, "profiles.db"))
+        rss_before = process.memory_info().rss
+
+        sessions = [
+            asyncio.create_task(
+                _run_session(args, order_store, order_ids, profiles, started, go, turns)
+            )
+            for _ in range(args.sessions)
+        ]
+        for _ in range(args.sessions):
+            await started.get()
+        rss_started = (process.memory_info().rss - rss_before) / args.sessions
+
+        prober = asyncio.create_task(_probe_loop_lag(lag, stop))
+        cpu_start = sum(process.cpu_times()[:2])
+        wall_start = time.perf_counter()
+        go.set()
+        receipts = await asyncio.gather(*sessions)
+        wall = time.perf_counter() - wall_start
+        cpu = sum(process.cpu_times()[:2]) - cpu_start
+        rss_finished = (process.memory_info().rss - rss_before) / args.sessions
+        stop.set()
+        await prober
+        await order_store.aclose()
+
+    saves = recorder.stages.get("tool.save_order", Histogram())
+    return {
+        "sessions": args.sessions,
+        "orders_per_session": args.orders,
+        "wall_seconds": round(wall, 2),
+        "cpu_seconds": round(cpu, 2),
+        # Sessions at this conversation pace that one fully busy core could carry
+        "sessions_per_core": round(args.sessions * wall / cpu, 1) if cpu else None,
+        "rss_mb_per_session": round(rss_started / 2**20, 2),
+        "rss_mb_per_session_end": round(rss_finished / 2**20, 2),
+        "loop_lag_ms": _ms(lag),
+        "turn_latency_ms": _ms(turns),
+        "orders_saved": saves.count,
+        "orders_per_second": round(saves.count / wall, 1),
+        "save_order_ms": _ms(saves),
+        "receipts_published": sum(receipts),
+        **({"providers": health_summary()} if args.route else {}),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument(
+        "--orders", type=int, default=2, help="orders placed by each session"
+    )
+    parser.add_argument("--stt-latency", type=float, default=0.2)
+    parser.add_argument("--llm-ttft", type=float, default=0.3)
+    parser.add_argument("--tts-ttfb", type=float, default=0.25)
+    parser.add_argument(
+        "--think-time", type=float, default=0.5, help="customer pause before each line"
+    )
+    parser.add_argument(
+        "--route",
+        action="store_true",
+        help="route the LLM and TTS through primary and backup fakes",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of (primary) requests that fail",
+    )
+    parser.add_argument(
+        "--slow-rate",
+        type=float,
+        default=0.0,
+        help="fraction of (primary) requests that are 10x slower",
+    )
+    parser.add_argument("--store", default="jsonl", help="order store backend")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    for key, value in report.items():
+        print(f"{key:>22}: {value}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,426 +1,100 @@
+import asyncio
+import datetime
 import logging
-import json
+import os
+from collections.abc import Awaitable
 from pathlib import Path
-from typing import Optional
-import datetime
-import asyncio
+from typing import Callable, Optional
 
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
     AgentSession,
+    ChatContext,
+    ChatMessage,
+    ConversationItemAddedEvent,
+    FunctionToolsExecutedEvent,
     JobContext,
     JobProcess,
     MetricsCollectedEvent,
+    ModelSettings,
     RoomInputOptions,
+    RunContext,
     WorkerOptions,
     cli,
-    metrics,
-    tokenize,
     function_tool,
-    RunContext
+    llm,
+    metrics,
+    tts,
+    utils,
 )
-from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
+from livekit.plugins import deepgram, google, murf
+from pydantic import BaseModel, Field
+
+from cart import Cart, CartSnapshot, CoffeeOrder
+from context_manager import ContextCompactor, compact_prompt
+from eou_batching import serve_eou, unregister_local_runner
+from instrumentation import dump_periodically, serve_metrics, timed_tools
+from instrumentation import recorder as latency
+from kitchen import KitchenClient, serve_kitchen
+from load_control import WorkerLoad, job_load, read_degradation
+from log_pipeline import MetricsLogSampler, log_pipeline
+from menu import MenuCatalog, MenuMatch, get_catalog
+from order_codec import SCHEMA_VERSION
+from order_ids import OrderIdSequence, format_order_number, get_order_id_sequence
+from order_store import OrderStore, create_order_store
+from profiles import ProfileIndex, UsualOrderStats, get_profile_index
+from receipt_renderer import build_receipt_payload
+from receipt_scheduler import ReceiptScheduler
+from recorder import SessionRecorder
+from room_messaging import MAX_MESSAGE_BYTES, RESYNC_TOPIC, RoomMessenger
+from routing import RoutedLLM, RoutedSTT, RoutedTTS, health_summary
+from shared_models import SharedModels
+from slot_filler import SlotFiller
+from tts_cache import cached_stream_tts, warm_up_cache
+from turn_transaction import TurnTransactions
 
 logger = logging.getLogger("agent")
 
 load_dotenv(".env.local")
 
 
-class CoffeeOrder:
-    """Represents a coffee order with all its details."""
-    def __init__(self):
-        self.drink_type: Optional[str] = None
-        self.size: Optional[str] = None
-        self.milk: Optional[str] = None
-        self.extras: list[str] = []
-        self.name: Optional[str] = None
-    
-    def is_complete(self) -> bool:
-        """Check if all required fields are filled."""
-        return all([
-            self.drink_type,
-            self.size,
-            self.milk,
-            self.name
-        ])
-    
-    def to_dict(self) -> dict:
-        """Convert order to dictionary format."""
-        return {
-            "drinkType": self.drink_type,
-            "size": self.size,
-            "milk": self.milk,
-            "extras": self.extras,
-            "name": self.name
-        }
-    
-    def generate_beverage_html(self) -> str:
-        """Generate HTML visualization of the beverage."""
-        # Cup sizes - more realistic proportions
-        cup_heights = {"small": "180px", "medium": "220px", "large": "260px"}
-        cup_widths = {"small": "110px", "medium": "130px", "large": "150px"}
-        
-        height = cup_heights.get(self.size or "medium", "220px")
-        width = cup_widths.get(self.size or "medium", "130px")
-        
-        # Check for whipped cream in extras
-        has_whipped_cream = any("whipped" in extra or "cream" in extra for extra in self.extras)
-        
-        # Drink colors - more realistic coffee colors
-        drink_colors = {
-            "latte": "#c49a6c",
-            "cappuccino": "#b88a5e", 
-            "espresso": "#3e2723",
-            "americano": "#5d4037",
-            "mocha": "#6d4c41",
-            "flat white": "#d4a574",
-        }
-        
-        drink_color = drink_colors.get(self.drink_type or "latte", "#c49a6c")
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                @keyframes slideIn {{
-                    from {{ opacity: 0; transform: translateY(20px); }}
-                    to {{ opacity: 1; transform: translateY(0); }}
-                }}
-                .coffee-container {{
-                    animation: slideIn 0.6s ease-out;
-                }}
-            </style>
-        </head>
-        <body style="margin: 0; padding: 0;">
-        <div class="coffee-container" style="display: flex; flex-direction: column; align-items: center; padding: 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 20px; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;">
-            <h2 style="color: white; margin-bottom: 25px; text-shadow: 2px 2px 8px rgba(0,0,0,0.4); font-size: 28px; letter-spacing: 1px;">☕ Your Perfect Coffee</h2>
-            
-            <!-- Beverage Visualization -->
-            <div style="position: relative; margin-bottom: 35px; transform-style: preserve-3d;">
-                
-                <!-- Coffee Cup - Modern Minimalist Style -->
-                <div style="position: relative; width: {width}; height: {height}; 
-                    background: linear-gradient(165deg, {drink_color} 0%, {drink_color}dd 100%);
-                    border-radius: 8px 8px 35px 35px; 
-                    box-shadow: 
-                        0 25px 50px rgba(0,0,0,0.35),
-                        inset -8px 0 15px rgba(0,0,0,0.2),
-                        inset 8px 0 15px rgba(255,255,255,0.1);
-                    border: 3px solid rgba(139,111,71,0.8);
-                    overflow: visible;">
-                    
-                    <!-- Foam/Milk Layer - Realistic -->
-                    <div style="position: absolute; top: 0; left: 0; right: 0; height: 22%; 
-                        background: linear-gradient(180deg, 
-                            rgba(255,248,240,0.95) 0%, 
-                            rgba(245,235,220,0.85) 40%,
-                            rgba(240,230,215,0.6) 70%,
-                            transparent 100%);
-                        border-radius: 8px 8px 50% 50% / 8px 8px 35% 35%;
-                        box-shadow: inset 0 -3px 8px rgba(0,0,0,0.08);"></div>
-                    
-                    <!-- Coffee Shine/Highlight -->
-                    <div style="position: absolute; top: 20%; left: 12%; width: 25%; height: 35%; 
-                        background: linear-gradient(135deg, rgba(255,255,255,0.25) 0%, transparent 60%); 
-                        border-radius: 40% 60% 50% 70%;
-                        filter: blur(8px);"></div>
-                    
-                    <!-- Whipped Cream - Simple and Clean -->
-                    {f'''<div style="position: absolute; top: -22px; left: 50%; transform: translateX(-50%); 
-                        width: calc({cup_widths.get(self.size or 'medium', '130px')} - 10px); 
-                        height: 35px; 
-                        background: linear-gradient(180deg, #ffffff 0%, #fffbf5 50%, #f5f0e8 100%); 
-                        border-radius: 50%; 
-                        box-shadow: 
-                            0 -2px 8px rgba(255,255,255,0.8),
-                            0 4px 12px rgba(0,0,0,0.2),
-                            inset 0 -2px 5px rgba(0,0,0,0.05);
-                        z-index: 5;
-                    "></div>''' if has_whipped_cream else ''}
-                    
-                    <!-- Cup Handle - Clean Design -->
-                    <div style="position: absolute; right: -38px; top: 30%; 
-                        width: 45px; height: 42%; 
-                        border: 4px solid rgba(139,111,71,0.9); 
-                        border-left: none; 
-                        border-radius: 0 45% 45% 0;
-                        box-shadow: 
-                            inset -2px 0 6px rgba(0,0,0,0.25),
-                            2px 3px 10px rgba(0,0,0,0.3);"></div>
-                </div>
-                
-                <!-- Saucer - Simple and Elegant -->
-                <div style="width: calc({width} + 50px); height: 16px; 
-                    background: linear-gradient(180deg, #9d826d 0%, #8b6f47 100%); 
-                    border-radius: 50%; 
-                    margin-top: 6px;
-                    box-shadow: 
-                        0 8px 20px rgba(0,0,0,0.35),
-                        inset 0 2px 6px rgba(255,255,255,0.15);
-                    border: 2px solid #6d5638;"></div>
-            </div>
-            
-            <!-- Order Details -->
-            <div style="background: white; padding: 25px; border-radius: 18px; width: 100%; max-width: 450px; box-shadow: 0 10px 40px rgba(0,0,0,0.3); animation: slideIn 0.8s ease-out 0.2s both;">
-                <h3 style="margin-top: 0; color: #4a2c2a; border-bottom: 3px solid #667eea; padding-bottom: 12px; font-size: 24px; display: flex; align-items: center; gap: 10px;">
-                    <span style="font-size: 28px;">📋</span> Order Summary
-                </h3>
-                
-                <div style="margin: 20px 0;">
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f8f9ff 0%, #f0f2ff 100%); border-radius: 10px; border-left: 4px solid #667eea;">
-                        <strong style="color: #555; font-size: 16px;">👤 Customer:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{self.name or "N/A"}</span>
-                    </div>
-                    
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #fff8f0 0%, #fff0e6 100%); border-radius: 10px; border-left: 4px solid #d4a574;">
-                        <strong style="color: #555; font-size: 16px;">☕ Drink:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{(self.drink_type or "N/A").title()}</span>
-                    </div>
-                    
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f0fff4 0%, #e6f9f0 100%); border-radius: 10px; border-left: 4px solid #52c41a;">
-                        <strong style="color: #555; font-size: 16px;">📏 Size:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{(self.size or "N/A").title()}</span>
-                    </div>
-                    
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #fffbf0 0%, #fff5e6 100%); border-radius: 10px; border-left: 4px solid #faad14;">
-                        <strong style="color: #555; font-size: 16px;">🥛 Milk:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{(self.milk or "N/A").title()}</span>
-                    </div>
-                    
-                    {f'''<div style="margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #fff0f6 0%, #ffe6f0 100%); border-radius: 10px; border-left: 4px solid #eb2f96;">
-                        <strong style="color: #555; font-size: 16px; display: block; margin-bottom: 8px;">✨ Extras:</strong>
-                        <ul style="margin: 5px 0; padding-left: 25px; color: #222;">
-                            {"".join(f"<li style='margin: 5px 0; font-weight: 500;'>{extra.title()}</li>" for extra in self.extras)}
-                        </ul>
-                    </div>''' if self.extras else '<div style="margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f5f5f5 0%, #ebebeb 100%); border-radius: 10px; border-left: 4px solid #d9d9d9;"><strong style="color: #555; font-size: 16px;">✨ Extras:</strong> <span style="color: #999; font-style: italic;">None</span></div>'}
-                </div>
-                
-                <div style="margin-top: 25px; padding-top: 20px; border-top: 2px dashed #ddd; text-align: center;">
-                    <p style="color: #667eea; font-weight: bold; font-size: 22px; margin: 8px 0; text-shadow: 1px 1px 2px rgba(0,0,0,0.1);">
-                        Order #{datetime.datetime.now().strftime("%Y%m%d%H%M%S")[-6:]}
-                    </p>
-                    <p style="color: #999; font-size: 14px; margin: 5px 0; font-weight: 500;">
-                        {datetime.datetime.now().strftime("%B %d, %Y at %I:%M %p")}
-                    </p>
-                </div>
-            </div>
-            
-            <p style="color: white; margin-top: 25px; font-size: 16px; text-align: center; text-shadow: 1px 1px 3px rgba(0,0,0,0.3); font-weight: 500;">
-                ✨ Thank you for ordering from Murf Coffee Shop! ✨
-            </p>
-        </div>
-        </body>
-        </html>
-        """
-        
-        return html
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                @keyframes float {{
-                    0%, 100% {{ transform: translateY(0px); }}
-                    50% {{ transform: translateY(-10px); }}
-                }}
-                @keyframes steam {{
-                    0% {{ opacity: 0.7; transform: translateY(0) scale(1); }}
-                    100% {{ opacity: 0; transform: translateY(-40px) scale(1.5); }}
-                }}
-                @keyframes pulse {{
-                    0%, 100% {{ transform: scale(1); }}
-                    50% {{ transform: scale(1.02); }}
-                }}
-                @keyframes slideIn {{
-                    from {{ opacity: 0; transform: translateY(20px); }}
-                    to {{ opacity: 1; transform: translateY(0); }}
-                }}
-                .coffee-container {{
-                    animation: slideIn 0.8s ease-out;
-                }}
-                .cup-wrapper {{
-                    animation: float 3s ease-in-out infinite;
-                }}
-            </style>
-        </head>
-        <body style="margin: 0; padding: 0;">
-        <div class="coffee-container" style="display: flex; flex-direction: column; align-items: center; padding: 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 20px; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; min-height: 500px;">
-            <h2 style="color: white; margin-bottom: 30px; text-shadow: 2px 2px 8px rgba(0,0,0,0.4); font-size: 28px; letter-spacing: 1px;">☕ Your Perfect Coffee</h2>
-            
-            <!-- Beverage Visualization -->
-            <div class="cup-wrapper" style="position: relative; margin-bottom: 40px; filter: drop-shadow(0 20px 40px rgba(0,0,0,0.4));">
-                
-                <!-- Steam Animation -->
-                <div style="position: absolute; top: -60px; left: 50%; transform: translateX(-50%); width: 100%; height: 60px; overflow: hidden; z-index: 15;">
-                    <div style="position: absolute; left: 30%; width: 8px; height: 40px; background: linear-gradient(180deg, rgba(255,255,255,0.6) 0%, transparent 100%); border-radius: 50%; animation: steam 2s ease-in-out infinite; animation-delay: 0s;"></div>
-                    <div style="position: absolute; left: 50%; width: 10px; height: 45px; background: linear-gradient(180deg, rgba(255,255,255,0.5) 0%, transparent 100%); border-radius: 50%; animation: steam 2.5s ease-in-out infinite; animation-delay: 0.5s;"></div>
-                    <div style="position: absolute; left: 65%; width: 7px; height: 35px; background: linear-gradient(180deg, rgba(255,255,255,0.6) 0%, transparent 100%); border-radius: 50%; animation: steam 2.2s ease-in-out infinite; animation-delay: 1s;"></div>
-                </div>
-                
-                <!-- Whipped Cream (if present) -->
-                {f'''<div style="position: absolute; top: -35px; left: 50%; transform: translateX(-50%); 
-                    width: calc({cup_widths.get(self.size or 'medium', '170px')} + 10px); height: 55px; 
-                    background: radial-gradient(ellipse at center, #ffffff 0%, #fff8f0 40%, #f5f5f0 100%); 
-                    border-radius: 60% 60% 50% 50% / 70% 70% 40% 40%; 
-                    box-shadow: 
-                        inset 0 -8px 15px rgba(0,0,0,0.08),
-                        0 8px 20px rgba(0,0,0,0.15),
-                        inset 0 2px 10px rgba(255,255,255,0.9);
-                    z-index: 12;
-                    animation: pulse 2s ease-in-out infinite;
-                "></div>
-                <div style="position: absolute; top: -42px; left: 52%; transform: translateX(-50%); 
-                    width: calc({cup_widths.get(self.size or 'medium', '170px')} * 0.6); height: 30px; 
-                    background: radial-gradient(ellipse at center, #ffffff 0%, #fefdf8 60%, #f8f6f0 100%); 
-                    border-radius: 50%; 
-                    box-shadow: inset 0 -3px 8px rgba(0,0,0,0.06);
-                    z-index: 13;
-                "></div>
-                <div style="position: absolute; top: -48px; left: 48%; transform: translateX(-50%); 
-                    width: calc({cup_widths.get(self.size or 'medium', '170px')} * 0.4); height: 22px; 
-                    background: radial-gradient(ellipse at center, #ffffff 0%, #fffefb 70%); 
-                    border-radius: 50%; 
-                    box-shadow: inset 0 -2px 5px rgba(0,0,0,0.05);
-                    z-index: 14;
-                "></div>''' if has_whipped_cream else ''}
-                
-                <!-- Coffee Cup -->
-                <div style="position: relative; width: {width}; height: {height}; 
-                    background: {drink_color}; 
-                    border-radius: 0 0 40px 40px; 
-                    box-shadow: 
-                        0 20px 60px rgba(0,0,0,0.4),
-                        inset 0 0 50px rgba(0,0,0,0.1),
-                        inset -15px 0 30px rgba(0,0,0,0.15),
-                        inset 15px 0 30px rgba(255,255,255,0.1);
-                    border: 4px solid #8b6f47;
-                    border-top: none;
-                    overflow: hidden;">
-                    
-                    <!-- Coffee Liquid Shine -->
-                    <div style="position: absolute; top: 0; left: 15%; width: 30%; height: 60%; 
-                        background: linear-gradient(135deg, rgba(255,255,255,0.3) 0%, transparent 50%); 
-                        border-radius: 50%;
-                        filter: blur(15px);"></div>
-                    
-                    <!-- Foam/Milk Layer -->
-                    <div style="position: absolute; top: 0; left: 0; right: 0; height: 35%; 
-                        background: 
-                            radial-gradient(ellipse at 30% 20%, rgba(255,255,255,0.6) 0%, transparent 50%),
-                            radial-gradient(ellipse at 70% 30%, rgba(255,255,255,0.5) 0%, transparent 50%),
-                            linear-gradient(180deg, rgba(255,255,255,0.5) 0%, rgba(255,255,255,0.2) 60%, transparent 100%); 
-                        border-radius: 0 0 50% 50% / 0 0 30% 30%;
-                        box-shadow: inset 0 -5px 15px rgba(0,0,0,0.1);"></div>
-                    
-                    <!-- Foam Bubbles -->
-                    <div style="position: absolute; top: 8%; left: 25%; width: 18px; height: 18px; 
-                        background: radial-gradient(circle, rgba(255,255,255,0.8) 0%, rgba(255,255,255,0.3) 100%); 
-                        border-radius: 50%; 
-                        box-shadow: inset 0 2px 4px rgba(255,255,255,0.6);"></div>
-                    <div style="position: absolute; top: 12%; left: 55%; width: 14px; height: 14px; 
-                        background: radial-gradient(circle, rgba(255,255,255,0.7) 0%, rgba(255,255,255,0.3) 100%); 
-                        border-radius: 50%;
-                        box-shadow: inset 0 2px 4px rgba(255,255,255,0.5);"></div>
-                    <div style="position: absolute; top: 6%; left: 70%; width: 12px; height: 12px; 
-                        background: radial-gradient(circle, rgba(255,255,255,0.8) 0%, rgba(255,255,255,0.3) 100%); 
-                        border-radius: 50%;
-                        box-shadow: inset 0 2px 4px rgba(255,255,255,0.6);"></div>
-                    
-                    <!-- Cup Handle -->
-                    <div style="position: absolute; right: -45px; top: 25%; 
-                        width: 55px; height: 50%; 
-                        border: 6px solid #8b6f47; 
-                        border-left: none; 
-                        border-radius: 0 60% 60% 0;
-                        background: linear-gradient(90deg, transparent 0%, rgba(139,111,71,0.1) 50%, transparent 100%);
-                        box-shadow: 
-                            inset -3px 0 8px rgba(0,0,0,0.3),
-                            3px 5px 15px rgba(0,0,0,0.3);"></div>
-                </div>
-                
-                <!-- Saucer -->
-                <div style="width: calc({width} + 60px); height: 20px; 
-                    background: linear-gradient(180deg, #a0826d 0%, #8b6f47 50%, #6d5638 100%); 
-                    border-radius: 50%; 
-                    margin-top: 8px;
-                    box-shadow: 
-                        0 10px 30px rgba(0,0,0,0.4),
-                        inset 0 3px 10px rgba(255,255,255,0.2),
-                        inset 0 -3px 10px rgba(0,0,0,0.3);
-                    border: 3px solid #6d5638;
-                    position: relative;">
-                    <div style="position: absolute; top: 2px; left: 20%; width: 60%; height: 40%; 
-                        background: linear-gradient(90deg, transparent 0%, rgba(255,255,255,0.2) 50%, transparent 100%); 
-                        border-radius: 50%;"></div>
-                </div>
-            </div>
-            
-            <!-- Order Details -->
-            <div style="background: white; padding: 25px; border-radius: 20px; width: 100%; max-width: 450px; box-shadow: 0 10px 40px rgba(0,0,0,0.3); animation: slideIn 0.8s ease-out 0.3s both;">
-                <h3 style="margin-top: 0; color: #4a2c2a; border-bottom: 3px solid #667eea; padding-bottom: 12px; font-size: 24px; display: flex; align-items: center; gap: 10px;">
-                    <span style="font-size: 28px;">📋</span> Order Summary
-                </h3>
-                
-                <div style="margin: 20px 0;">
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f8f9ff 0%, #f0f2ff 100%); border-radius: 10px; border-left: 4px solid #667eea;">
-                        <strong style="color: #555; font-size: 16px;">👤 Customer:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{self.name or "N/A"}</span>
-                    </div>
-                    
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #fff8f0 0%, #fff0e6 100%); border-radius: 10px; border-left: 4px solid #d4a574;">
-                        <strong style="color: #555; font-size: 16px;">☕ Drink:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{(self.drink_type or "N/A").title()}</span>
-                    </div>
-                    
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f0fff4 0%, #e6f9f0 100%); border-radius: 10px; border-left: 4px solid #52c41a;">
-                        <strong style="color: #555; font-size: 16px;">📏 Size:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{(self.size or "N/A").title()}</span>
-                    </div>
-                    
-                    <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #fffbf0 0%, #fff5e6 100%); border-radius: 10px; border-left: 4px solid #faad14;">
-                        <strong style="color: #555; font-size: 16px;">🥛 Milk:</strong>
-                        <span style="color: #222; font-weight: 600; font-size: 16px;">{(self.milk or "N/A").title()}</span>
-                    </div>
-                    
-                    {f'''<div style="margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #fff0f6 0%, #ffe6f0 100%); border-radius: 10px; border-left: 4px solid #eb2f96;">
-                        <strong style="color: #555; font-size: 16px; display: block; margin-bottom: 8px;">✨ Extras:</strong>
-                        <ul style="margin: 5px 0; padding-left: 25px; color: #222;">
-                            {"".join(f"<li style='margin: 5px 0; font-weight: 500;'>{extra.title()}</li>" for extra in self.extras)}
-                        </ul>
-                    </div>''' if self.extras else '<div style="margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f5f5f5 0%, #ebebeb 100%); border-radius: 10px; border-left: 4px solid #d9d9d9;"><strong style="color: #555; font-size: 16px;">✨ Extras:</strong> <span style="color: #999; font-style: italic;">None</span></div>'}
-                </div>
-                
-                <div style="margin-top: 25px; padding-top: 20px; border-top: 2px dashed #ddd; text-align: center;">
-                    <p style="color: #667eea; font-weight: bold; font-size: 22px; margin: 8px 0; text-shadow: 1px 1px 2px rgba(0,0,0,0.1);">
-                        Order #{datetime.datetime.now().strftime("%Y%m%d%H%M%S")[-6:]}
-                    </p>
-                    <p style="color: #999; font-size: 14px; margin: 5px 0; font-weight: 500;">
-                        {datetime.datetime.now().strftime("%B %d, %Y at %I:%M %p")}
-                    </p>
-                </div>
-            </div>
-            
-            <p style="color: white; margin-top: 25px; font-size: 16px; text-align: center; text-shadow: 1px 1px 3px rgba(0,0,0,0.3); font-weight: 500;">
-                ✨ Thank you for ordering from Murf Coffee Shop! ✨
-            </p>
-        </div>
-        </body>
-        </html>
-        """
-        
-        return html
+class DrinkRequest(BaseModel):
+    """One line of a batch order passed to `set_items`."""
 
+    drink_type: str = Field(
+        description="The type of coffee drink, e.g. latte, cappuccino, espresso, americano, mocha, flat white"
+    )
+    size: Optional[str] = Field(
+        default=None, description="small, medium or large, if the customer said it"
+    )
+    milk: Optional[str] = Field(
+        default=None, description="The type of milk, if the customer said it"
+    )
+    extras: list[str] = Field(
+        default_factory=list,
+        description="Extras for this drink, e.g. extra shot, vanilla syrup",
+    )
+    quantity: int = Field(default=1, ge=1, description="How many of this exact drink")
 
+
+@timed_tools
 class Assistant(Agent):
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        order_store: Optional[OrderStore] = None,
+        menu: Optional[MenuCatalog] = None,
+        order_ids: Optional[OrderIdSequence] = None,
+        session_id: Optional[str] = None,
+        kitchen: Optional[KitchenClient] = None,
+        profiles: Optional[ProfileIndex] = None,
+        recorder: Optional[SessionRecorder] = None,
+    ) -> None:
+        menu = menu or get_catalog()
         super().__init__(
-            instructions="""You are a friendly and enthusiastic barista at Murf Coffee Shop, the finest coffee establishment in town. 
+            instructions=compact_prompt(f"""You are a friendly and enthusiastic barista at Murf Coffee Shop, the finest coffee establishment in town.
             The user is interacting with you via voice, even if you perceive the conversation as text.
-            
+
             Your job is to take customer orders in a warm and welcoming manner. You should:
             - Greet customers cheerfully
             - Ask about their drink preferences one at a time
@@ -428,154 +102,545 @@ class Assistant(Agent):
             - Make suggestions when appropriate
             - Keep your responses conversational and brief
             - Never use complex formatting, emojis, asterisks, or other symbols
-            
-            You need to collect the following information for each order:
-            1. Drink type (e.g., latte, cappuccino, espresso, americano, mocha, flat white)
-            2. Size (small, medium, or large)
-            3. Milk type (whole milk, skim milk, oat milk, almond milk, soy milk, or no milk)
-            4. Any extras (e.g., extra shot, vanilla syrup, caramel drizzle, whipped cream, chocolate chips)
-            5. Customer's name
-            
-            Once you have all the information, use the save_order tool to finalize the order and thank the customer warmly.""",
+
+            You need to collect the following information for each drink, only offering what is on the menu:
+            {menu.prompt_section()}
+            And the customer's name once for the whole order.
+
+            A customer may order several drinks. Whenever they mention one or more drinks, use the set_items tool
+            to record all of them, with every detail they gave, in a single call. Use the set_* tools with an
+            item_number only to change or fill in a single detail of an existing drink. When the customer gives
+            several independent details at once, such as a size, a milk and their name, call all of those tools
+            together in the same response.
+
+            If the customer tells you their name before ordering, record it right away: regulars have a usual order,
+            and when a tool reports one, offer it and use order_usual if they accept.
+
+            Once you have all the information, use the save_order tool to finalize the order and thank the customer warmly.
+            After an order is saved, the next thing you hear may be a new customer starting a fresh order."""),
+        )
+        self.menu = menu
+        self.order_store = order_store or create_order_store()
+        self.order_ids = order_ids or get_order_id_sequence()
+        self.session_id = session_id or utils.shortuuid("session_")
+        self.kitchen = kitchen
+        self.profiles = profiles or get_profile_index()
+        self.usual_stats = UsualOrderStats()
+        self.recorder = recorder
+        # The returning customer's usual while it is on offer for the current cart
+        self._usual: Optional[list[dict]] = None
+        # save_order results by turn, so a repeated call in the same turn does not save twice
+        self._saves: dict[str, asyncio.Future] = {}
+        self.messenger = RoomMessenger()
+        self.cart = self._observed(Cart())
+        self.receipts = ReceiptScheduler(self._publish_visualization)
+        self.slot_filler = SlotFiller(menu)
+        self.compactor = ContextCompactor()
+        self.transactions = TurnTransactions(
+            lambda: self.cart.snapshot(), self._restore_cart
         )
-        self.current_order = CoffeeOrder()
         self._room = None
-    
+
+    async def on_enter(self) -> None:
+        self.session.on("function_tools_executed", self._on_tools_executed)
+
+    def llm_node(
+        self,
+        chat_ctx: ChatContext,
+        tools: list[llm.FunctionTool],
+        model_settings: ModelSettings,
+    ):
+        stream = Agent.default.llm_node(self, chat_ctx, tools, model_settings)
+        if self.recorder is None:
+            return stream
+        return self.recorder.record_llm(chat_ctx, tools, stream)
+
+    def _on_tools_executed(self, ev: FunctionToolsExecutedEvent) -> None:
+        # The calls' outputs are now part of the chat history, so their order changes stand
+        self.transactions.commit_calls([call.call_id for call in ev.function_calls])
+
+    def _observed(self, cart: Cart) -> Cart:
+        # Every change to the cart reaches the frontend as a patch
+        cart.on_patch = self.messenger.publish_patch
+        return cart
+
+    def _replace_cart(self, cart: Cart) -> Cart:
+        """Swap in a new cart and send the frontend all of it; returns the old one."""
+        old, self.cart = self.cart, self._observed(cart)
+        old.on_patch = None
+        self.messenger.publish_snapshot(cart.to_dict())
+        return old
+
+    def _restore_cart(self, snapshot: CartSnapshot) -> None:
+        self._replace_cart(Cart.from_snapshot(snapshot))
+
     def set_room(self, room):
         """Store reference to the LiveKit room for data publishing."""
         self._room = room
+        self.messenger.attach(room)
+        self.messenger.on("visualization-closed", self._on_receipt_closed)
+        self.messenger.on(RESYNC_TOPIC, self._on_state_resync)
+
+    async def _publish_visualization(self, topic: str, payload: bytes) -> None:
+        """Send the order visualization to the frontend over the data channel."""
+        if not self._room:
+            raise RuntimeError("Room not available for publishing visualization")
+        with latency.time("receipt_publish"):
+            await self.messenger.publish(topic, payload)
+
+    def _on_receipt_closed(self, payload: bytes, sender: Optional[str]) -> None:
+        self.receipts.closed += 1
+        logger.info(f"Receipt closed by {sender}")
+
+    def _on_state_resync(self, payload: bytes, sender: Optional[str]) -> None:
+        # A frontend that just joined, or missed a patch, gets the whole order again
+        self.messenger.publish_snapshot(self.cart.to_dict())
+
+    async def on_user_turn_completed(
+        self, turn_ctx: ChatContext, new_message: ChatMessage
+    ) -> None:
+        """Compact the chat history, then pre-fill the order from unambiguous utterances."""
+        compacted = self.compactor.compact(turn_ctx)
+        if compacted is not None:
+            # turn_ctx only lives for this reply, so persist the compacted history on the agent too
+            await self.update_chat_ctx(compacted.copy())
+            turn_ctx.items = compacted.items
+
+        transcript = new_message.text_content
+        if not transcript:
+            return
+
+        fill = self.slot_filler.apply(transcript, self.cart)
+        # A confirmation changes nothing; adding a message anyway would discard the preemptive reply
+        if fill is None or not fill.changed:
+            return
+
+        offer = await self._offer_usual(fill.name) if fill.name else ""
+        missing = self.cart.missing_fields()
+        logger.info(
+            "Fast path filled %s fields from: %s", fill.field_count(), transcript
+        )
+        # Tell the LLM what is already recorded so it can answer without tool round-trips
+        turn_ctx.add_message(
+            role="system",
+            content=(
+                f"The order was already updated from the customer's last message. "
+                f"Current order: {self.cart.describe()}, name: {self.cart.name or 'not given'}. "
+                f"{'Still need: ' + ', '.join(missing) + '.' if missing else 'The order is complete, confirm it and call save_order.'} "
+                f"Do not call tools again for details that are already recorded.{offer}"
+            ),
+        )
+
+    @property
+    def current_order(self) -> CoffeeOrder:
+        """The drink currently being discussed."""
+        return self.cart.current
+
+    def _item(self, item_number: Optional[int]) -> CoffeeOrder:
+        return self.cart.item(item_number)
+
+    def _match(self, category: str, text: str) -> Optional[MenuMatch]:
+        """Canonicalize a tool argument against the menu, logging anything that was corrected."""
+        match = self.menu.match(category, text)
+        if match and match.method != "exact":
+            logger.info(
+                "Matched %r to %r (%s, confidence %s)",
+                text,
+                match.value,
+                match.method,
+                match.confidence,
+            )
+        return match
+
+    def _not_on_menu(self, category: str, text: str) -> str:
+        return f"Sorry, {text} is not on our menu. We have {', '.join(self.menu.names(category))}."
+
+    @staticmethod
+    def _heard_as(text: str, match: MenuMatch) -> str:
+        # Low-confidence corrections are read back so the customer can catch a mishearing
+        return (
+            f" (heard {text!r}, please confirm {match.value} with the customer)"
+            if match.confidence < 0.8
+            else ""
+        )
+
+    async def _offer_usual(self, name: str) -> str:
+        """Look up a returning customer and, if nothing is ordered yet, put their usual on offer."""
+        # Until the profiles are built in the background, returning customers just order as usual
+        if any(item.drink_type for item in self.cart.items) or not self.profiles.ready:
+            return ""
+        try:
+            profile = await self.profiles.lookup(name)
+        except Exception as e:
+            logger.warning(f"Customer profile lookup failed: {e}")
+            return ""
+        usual = profile.usual() if profile else None
+        if not usual or not all(
+            self.menu.match(category, item.get(field) or "")
+            for item in usual
+            for category, field in (
+                ("drinks", "drinkType"),
+                ("sizes", "size"),
+                ("milks", "milk"),
+            )
+        ):
+            return ""
+        self._usual = usual
+        self.usual_stats.offered += 1
+        logger.info(f"Offering {name} their usual: {usual}")
+        return (
+            f" {name} is a returning customer whose usual is {Cart.from_dict({'items': usual}).describe()}."
+            f" Offer them the usual; if they want it, call order_usual."
+        )
+
+    @function_tool
+    async def order_usual(self, context: RunContext):
+        """Fill in the returning customer's usual order in one step.
+
+        Only call this after the customer said yes to the usual you offered them.
+        """
+        if self._usual is None:
+            return "There is no usual order on offer for this customer; take the order as normal."
+        self.transactions.begin(context)
+        for item in self._usual:
+            self.cart.add_item(CoffeeOrder.from_dict(item))
+        # Drink, size and milk, plus any extras, would each have been a question
+        self.usual_stats.observe_accepted(
+            sum(3 + len(item.get("extras") or []) for item in self._usual)
+        )
+        self._usual = None
+        missing = self.cart.missing_fields()
+        still_needed = (
+            f" Still need: {', '.join(missing)}."
+            if missing
+            else " The order is complete, confirm it and call save_order."
+        )
+        return f"Added the usual: {self.cart.describe()}.{still_needed}"
 
     @function_tool
     async def save_order(self, context: RunContext):
-        """Use this tool to save the completed coffee order to a JSON file.
-        
+        """Use this tool to save the completed coffee order.
+
         Only call this tool when you have collected ALL required information:
-        - drink type
-        - size
-        - milk type
+        - drink type, size and milk type for every drink
         - customer name
-        
+
         The extras field is optional and can be an empty list.
         """
-        if not self.current_order.is_complete():
-            missing = []
-            if not self.current_order.drink_type:
-                missing.append("drink type")
-            if not self.current_order.size:
-                missing.append("size")
-            if not self.current_order.milk:
-                missing.append("milk type")
-            if not self.current_order.name:
-                missing.append("customer name")
-            return f"Cannot save order yet. Still need: {', '.join(missing)}"
-        
-        # Create orders directory if it doesn't exist
-        orders_dir = Path("orders")
-        orders_dir.mkdir(exist_ok=True)
-        
-        # Generate filename with customer name and timestamp
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{self.current_order.name}_{timestamp}.json"
-        filepath = orders_dir / filename
-        
-        # Save order to JSON file
-        with open(filepath, 'w') as f:
-            json.dump(self.current_order.to_dict(), f, indent=2)
-        
-        logger.info(f"Order saved to {filepath}")
-        
-        # Generate HTML visualization
-        html_content = self.current_order.generate_beverage_html()
-        
-        # Delay publishing visualization to allow agent to finish speaking completely
-        # This ensures the receipt appears AFTER the agent says "thank you" and everything is done
-        async def publish_with_delay():
-            await asyncio.sleep(18)  # Wait 18 seconds for agent to finish completely
-            try:
-                if self._room:
-                    await self._room.local_participant.publish_data(
-                        html_content.encode('utf-8'),
-                        topic="order-visualization"
-                    )
-                    logger.info("Published order visualization to frontend")
-                else:
-                    logger.error("Room not available for publishing visualization")
-            except Exception as e:
-                logger.error(f"Failed to publish visualization: {e}")
-        
-        # Schedule the delayed publication as a background task
-        asyncio.create_task(publish_with_delay())
-        
-        return f"Perfect! Your order has been saved successfully. Order summary: {self.current_order.size} {self.current_order.drink_type} with {self.current_order.milk}, extras: {', '.join(self.current_order.extras) if self.current_order.extras else 'none'}, for {self.current_order.name}. Your delicious coffee will be ready shortly!"
+        # Keyed on the reply, so duplicate or retried calls within one turn share a single save
+        key = (
+            f"{self.session_id}:{context.speech_handle.id}"
+            if context.speech_handle is not None
+            else None
+        )
+        previous = self._saves.get(key) if key else None
+        if previous is not None:
+            logger.info(
+                "save_order repeated in turn %s, returning the first result", key
+            )
+            return await asyncio.shield(previous)
+
+        if not self.cart.is_complete():
+            return f"Cannot save order yet. Still need: {', '.join(self.cart.missing_fields())}"
+
+        if key is None:
+            return await self._save_cart(context)
+        result = self._saves[key] = asyncio.get_running_loop().create_future()
+        try:
+            result.set_result(await self._save_cart(context))
+        except BaseException as e:
+            # Let a later call in this turn try again
+            del self._saves[key]
+            result.set_exception(e)
+            raise
+        return result.result()
+
+    async def _save_cart(self, context: RunContext) -> str:
+        # Saving cannot be undone, so this reply's changes are final from here on
+        self.transactions.commit_now(context)
+        cart = self._replace_cart(Cart())
+        usual, self._usual = self._usual, None
+        details = cart.to_dict()
+        try:
+            order_id = await self.order_ids.allocate()
+            placed_at = datetime.datetime.now()
+            order = {
+                "schema": SCHEMA_VERSION,
+                "order_id": order_id,
+                **details,
+                "placed_at": placed_at.isoformat(timespec="seconds"),
+            }
+            # Hand the order to the store's writer thread so disk I/O never blocks the audio loop
+            location = await self.order_store.save(order)
+        except Exception:
+            # Nothing was saved: give the customer their order back so a retry can save it
+            self._replace_cart(cart)
+            self._usual = usual
+            raise
+
+        logger.info(
+            "Order %s saved to %s", order_id, location, extra={"order_id": order_id}
+        )
+        if self.kitchen is not None:
+            self.kitchen.enqueue(order)
+        try:
+            await self.profiles.record(order)
+        except Exception as e:
+            logger.warning("Could not update the profile of %s: %s", cart.name, e)
+        # The tool calls that built this order are summarized away on the next turn
+        self.compactor.note_order_saved(f"{cart.describe()} for {cart.name}")
+
+        # Render the receipt; the messenger chunks large HTML receipts, so the compact
+        # form is only used above the messenger's own limit
+        topic, payload = build_receipt_payload(
+            details,
+            order_number=format_order_number(order_id),
+            placed_at=placed_at,
+            max_bytes=MAX_MESSAGE_BYTES,
+        )
+
+        # Publish the receipt as soon as the agent's confirmation has finished playing out
+        self.receipts.schedule(topic, payload, context.speech_handle)
+
+        return f"Perfect! Your order has been saved successfully. Order summary: {cart.describe()}, for {cart.name}. Your delicious coffee will be ready shortly! The next order starts fresh."
+
+    @function_tool
+    async def set_items(
+        self,
+        context: RunContext,
+        items: list[DrinkRequest],
+        customer_name: Optional[str] = None,
+    ):
+        """Add one or more drinks to the order in a single step, with every detail the customer gave.
+
+        Use this whenever the customer names drinks, e.g. "three large lattes with oat milk and a mocha"
+        becomes two items: a latte with quantity 3 and a mocha with quantity 1.
+
+        Args:
+            items: The drinks to add to the order
+            customer_name: The customer's name, if they said it
+        """
+        self.transactions.begin(context)
+        added, problems = [], []
+        for request in items:
+            drink = self._match("drinks", request.drink_type)
+            if drink is None:
+                problems.append(self._not_on_menu("drinks", request.drink_type))
+                continue
+            size = self._match("sizes", request.size) if request.size else None
+            if request.size and size is None:
+                problems.append(self._not_on_menu("sizes", request.size))
+            milk = self._match("milks", request.milk) if request.milk else None
+            if request.milk and milk is None:
+                problems.append(self._not_on_menu("milks", request.milk))
+            extras = []
+            for extra in request.extras:
+                match = self._match("extras", extra)
+                if match is None:
+                    problems.append(self._not_on_menu("extras", extra))
+                elif match.value not in extras:
+                    extras.append(match.value)
+            item = self.cart.add_item(
+                CoffeeOrder(
+                    drink_type=drink.value,
+                    size=size.value if size else None,
+                    milk=milk.value if milk else None,
+                    extras=extras,
+                    quantity=request.quantity,
+                )
+            )
+            added.append(item.describe())
+        if customer_name:
+            self.cart.name = customer_name
+
+        logger.info("Added items: %s", added)
+        missing = self.cart.missing_fields()
+        still_needed = (
+            f" Still need: {', '.join(missing)}."
+            if missing
+            else " The order is complete."
+        )
+        return f"Added {'; '.join(added) or 'nothing'}.{still_needed} {' '.join(problems)}".strip()
 
     @function_tool
-    async def set_drink_type(self, context: RunContext, drink_type: str):
+    async def remove_item(self, context: RunContext, item_number: int):
+        """Remove a drink from the order.
+
+        Args:
+            item_number: The 1-based number of the drink to remove
+        """
+        self.transactions.begin(context)
+        try:
+            item = self.cart.remove_item(item_number)
+        except IndexError as e:
+            return str(e)
+        logger.info("Removed item %s: %s", item_number, item.describe())
+        return f"Removed the {item.describe()}."
+
+    @function_tool
+    async def set_drink_type(
+        self, context: RunContext, drink_type: str, item_number: Optional[int] = None
+    ):
         """Set the type of drink the customer wants to order.
-        
+
         Args:
             drink_type: The type of coffee drink (e.g., latte, cappuccino, espresso, americano, mocha, flat white)
+            item_number: Which drink to change when there are several, 1-based. Defaults to the latest drink.
         """
-        self.current_order.drink_type = drink_type.lower()
-        logger.info(f"Set drink type to: {drink_type}")
-        return f"Great choice! A {drink_type} it is."
+        self.transactions.begin(context)
+        match = self._match("drinks", drink_type)
+        if match is None:
+            return self._not_on_menu("drinks", drink_type)
+        try:
+            self._item(item_number).drink_type = match.value
+        except IndexError as e:
+            return str(e)
+        logger.info("Set drink type to: %s", match.value)
+        return (
+            f"Great choice! A {match.value} it is.{self._heard_as(drink_type, match)}"
+        )
 
     @function_tool
-    async def set_size(self, context: RunContext, size: str):
+    async def set_size(
+        self, context: RunContext, size: str, item_number: Optional[int] = None
+    ):
         """Set the size of the drink.
-        
+
         Args:
             size: The size of the drink (small, medium, or large)
+            item_number: Which drink to change when there are several, 1-based. Defaults to the latest drink.
         """
-        size_lower = size.lower()
-        if size_lower not in ["small", "medium", "large"]:
-            return "Sorry, we only have small, medium, or large sizes available."
-        
-        self.current_order.size = size_lower
-        logger.info(f"Set size to: {size}")
-        return f"Got it! {size} size."
+        self.transactions.begin(context)
+        match = self._match("sizes", size)
+        if match is None:
+            return f"Sorry, we only have {', '.join(self.menu.names('sizes'))} sizes available."
+
+        try:
+            self._item(item_number).size = match.value
+        except IndexError as e:
+            return str(e)
+        logger.info("Set size to: %s", match.value)
+        return f"Got it! {match.value} size.{self._heard_as(size, match)}"
 
     @function_tool
-    async def set_milk(self, context: RunContext, milk_type: str):
+    async def set_milk(
+        self, context: RunContext, milk_type: str, item_number: Optional[int] = None
+    ):
         """Set the type of milk for the drink.
-        
+
         Args:
             milk_type: The type of milk (whole milk, skim milk, oat milk, almond milk, soy milk, or no milk)
+            item_number: Which drink to change when there are several, 1-based. Defaults to the latest drink.
         """
-        self.current_order.milk = milk_type.lower()
-        logger.info(f"Set milk to: {milk_type}")
-        return f"Perfect! {milk_type} noted."
+        self.transactions.begin(context)
+        match = self._match("milks", milk_type)
+        if match is None:
+            return self._not_on_menu("milks", milk_type)
+        try:
+            self._item(item_number).milk = match.value
+        except IndexError as e:
+            return str(e)
+        logger.info("Set milk to: %s", match.value)
+        return f"Perfect! {match.value} noted.{self._heard_as(milk_type, match)}"
 
     @function_tool
-    async def add_extra(self, context: RunContext, extra: str):
+    async def add_extra(
+        self, context: RunContext, extra: str, item_number: Optional[int] = None
+    ):
         """Add an extra item to the drink order (e.g., extra shot, syrup, whipped cream).
-        
+
         Args:
             extra: The extra item to add to the drink
+            item_number: Which drink to change when there are several, 1-based. Defaults to the latest drink.
         """
-        extra_lower = extra.lower()
+        self.transactions.begin(context)
+        match = self._match("extras", extra)
+        if match is None:
+            return self._not_on_menu("extras", extra)
+        try:
+            item = self._item(item_number)
+        except IndexError as e:
+            return str(e)
         # Only add if not already in extras to prevent duplicates
-        if extra_lower not in self.current_order.extras:
-            self.current_order.extras.append(extra_lower)
-            logger.info(f"Added extra: {extra}")
-            return f"Added {extra} to your order!"
+        if item.add_extra(match.value):
+            logger.info("Added extra: %s", match.value)
+            return f"Added {match.value} to your order!{self._heard_as(extra, match)}"
         else:
-            logger.info(f"Extra already in order: {extra}")
-            return f"{extra} is already in your order!"
+            logger.info("Extra already in order: %s", match.value)
+            return f"{match.value} is already in your order!"
 
     @function_tool
     async def set_customer_name(self, context: RunContext, name: str):
         """Set the customer's name for the order.
-        
+
         Args:
             name: The customer's name
         """
-        self.current_order.name = name
-        logger.info(f"Set customer name to: {name}")
-        return f"Thanks {name}!"
+        self.transactions.begin(context)
+        self.cart.name = name
+        logger.info("Set customer name to: %s", name)
+        return f"Thanks {name}!{await self._offer_usual(name)}"
+
+
+# Seconds to a first result before a request is hedged, until each provider has a rolling p95 of its own
+STT_HEDGE_BUDGET = 1.0
+LLM_HEDGE_BUDGET = 1.5
+TTS_HEDGE_BUDGET = 0.8
+# The barista's Murf voice, which TTS cache entries are also keyed on
+MURF_VOICE = {"voice": "en-US-matthew", "style": "Conversation"}
+
+
+def _murf_tts(http_session=None, **kwargs) -> murf.TTS:
+    return murf.TTS(**MURF_VOICE, http_session=http_session, **kwargs)
+
+
+def _routed_tts(http_session=None, **murf_options) -> tts.TTS:
+    """Murf behind a router that hedges and fails over to Deepgram, or Murf alone with no TTS_FALLBACK_MODEL."""
+    fallback = os.getenv("TTS_FALLBACK_MODEL", "aura-2-apollo-en")
+    if not fallback:
+        # Hedging Murf with another Murf request only doubles the load when Murf is slow
+        return _murf_tts(http_session, **murf_options)
+    # Deepgram already has a key for the STT, and speaks at Murf's 24 kHz
+    providers = [
+        _murf_tts(http_session, **murf_options),
+        deepgram.TTS(model=fallback, http_session=http_session),
+    ]
+    return RoutedTTS(providers, budget=TTS_HEDGE_BUDGET)
+
+
+def _routed_stt() -> RoutedSTT:
+    fallback = os.getenv("STT_FALLBACK_MODEL", "nova-2")
+    providers = [
+        deepgram.STT(model="nova-3"),
+        *([deepgram.STT(model=fallback)] if fallback else []),
+    ]
+    return RoutedSTT(providers, budget=STT_HEDGE_BUDGET)
+
+
+def _routed_llm() -> RoutedLLM:
+    fallback = os.getenv("LLM_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+    providers = [
+        google.LLM(model="gemini-2.5-flash"),
+        *([google.LLM(model=fallback)] if fallback else []),
+    ]
+    return RoutedLLM(providers, budget=LLM_HEDGE_BUDGET)
 
 
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    # Load the reusable models once per worker process (or on first use with PREWARM_MODE=lazy)
+    models = SharedModels()
+    models.prewarm()
+    if models.eager and models.tts_cache is not None:
+        # Pre-synthesize the phrases the barista repeats on every call
+        warm_up_cache(
+            models.tts_cache,
+            _routed_tts,
+            models.sentence_tokenizer,
+            voice=tuple(MURF_VOICE.values()),
+        )
+    # Customer profiles are built from the saved orders the first time, off the job's event loop
+    get_profile_index().start_build(create_order_store().read_orders)
+    proc.userdata["models"] = models
 
 
 async def entrypoint(ctx: JobContext):
@@ -583,30 +648,77 @@ async def entrypoint(ctx: JobContext):
     # Add any other context you want in all log entries here
     ctx.log_context_fields = {
         "room": ctx.room.name,
+        "session_id": ctx.job.id,
     }
+    # Records are formatted and sent to the worker from a listener thread, off the event loop;
+    # with LOG_JSON_DIR they are also written there as JSON lines, one file per session
+    log_json_dir = os.getenv("LOG_JSON_DIR")
+    log_pipeline.start(
+        Path(log_json_dir) / f"{ctx.job.id}.jsonl" if log_json_dir else None
+    )
+    # The job's shutdown steps run together, then the log queue is drained, so nothing they log is lost
+    shutdown_steps: list[Callable[[], Awaitable[None]]] = []
+
+    async def shutdown():
+        results = await asyncio.gather(
+            *(step() for step in shutdown_steps), return_exceptions=True
+        )
+        for step, result in zip(shutdown_steps, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    "Shutdown step %s failed", step.__qualname__, exc_info=result
+                )
+        # Last, while the handler that sends records to the worker is still open
+        await asyncio.to_thread(log_pipeline.stop)
+
+    ctx.add_shutdown_callback(shutdown)
+
+    models: SharedModels = ctx.proc.userdata["models"]
+
+    # Under load, new sessions leave out noise cancellation and then the turn detector model
+    degradation = read_degradation()
+    if degradation.level:
+        logger.warning(
+            f"Worker under load, starting {degradation.name}: noise cancellation {degradation.noise_cancellation}, "
+            f"turn detector {degradation.turn_detector}"
+        )
+
+    # Murf one sentence at a time, through a router that hedges slow requests and fails over when a
+    # provider keeps failing; with TTS_CACHE_BYTES set, repeated sentences come from the TTS cache
+    tts_provider = _routed_tts(tokenizer=models.sentence_tokenizer, text_pacing=True)
+    if models.tts_cache is not None:
+        tts_engine = cached_stream_tts(
+            tts_provider,
+            models.tts_cache,
+            models.sentence_tokenizer,
+            voice=tuple(MURF_VOICE.values()),
+            text_pacing=True,
+        )
+    elif isinstance(tts_provider, RoutedTTS):
+        tts_engine = tts.StreamAdapter(
+            tts=tts_provider,
+            sentence_tokenizer=models.sentence_tokenizer,
+            text_pacing=True,
+        )
+    else:
+        # Nothing to cache or route: Murf gets the reply over its websocket as it streams in
+        tts_engine = tts_provider
 
     # Set up a voice AI pipeline using OpenAI, Cartesia, AssemblyAI, and the LiveKit turn detector
     session = AgentSession(
         # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
         # See all available models at https://docs.livekit.io/agents/models/stt/
-        stt=deepgram.STT(model="nova-3"),
+        stt=_routed_stt(),
         # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
         # See all available models at https://docs.livekit.io/agents/models/llm/
-        llm=google.LLM(
-                model="gemini-2.5-flash",
-            ),
+        llm=_routed_llm(),
         # Text-to-speech (TTS) is your agent's voice, turning the LLM's text into speech that the user can hear
         # See all available models as well as voice selections at https://docs.livekit.io/agents/models/tts/
-        tts=murf.TTS(
-                voice="en-US-matthew", 
-                style="Conversation",
-                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
-                text_pacing=True
-            ),
+        tts=tts_engine,
         # VAD and turn detection are used to determine when the user is speaking and when the agent should respond
         # See more at https://docs.livekit.io/agents/build/turns
-        turn_detection=MultilingualModel(),
-        vad=ctx.proc.userdata["vad"],
+        turn_detection=models.turn_detector() if degradation.turn_detector else "vad",
+        vad=models.vad,
         # allow the LLM to generate a response while waiting for the end of turn
         # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
         preemptive_generation=True,
@@ -625,17 +737,101 @@ async def entrypoint(ctx: JobContext):
     # Metrics collection, to measure pipeline performance
     # For more information, see https://docs.livekit.io/agents/build/metrics/
     usage_collector = metrics.UsageCollector()
+    # STT and TTS metrics come several times a turn; only some of them are logged
+    metrics_sampler = MetricsLogSampler()
+
+    # Create assistant instance; it gets access to the room below
+    order_store = create_order_store()
+    shutdown_steps.append(order_store.aclose)
+
+    # Saved orders go to the kitchen display, which sends their status back to this room
+    kitchen = None
+    kitchen_url = os.getenv("KITCHEN_URL") or (
+        f"http://127.0.0.1:{os.getenv('KITCHEN_PORT')}"
+        if os.getenv("KITCHEN_PORT")
+        else None
+    )
+    if kitchen_url:
+        kitchen = KitchenClient(
+            kitchen_url,
+            session_id=ctx.job.id,
+            publish=lambda topic, payload: assistant.messenger.publish(topic, payload),
+        )
+        shutdown_steps.append(kitchen.aclose)
+
+    # Everything the call needs to be replayed offline with `python src/recorder.py`
+    recorder = None
+    if os.getenv("SESSION_RECORDING_DIR"):
+        recorder = SessionRecorder(
+            Path(os.getenv("SESSION_RECORDING_DIR")) / f"{ctx.job.id}.jsonl",
+            session_id=ctx.job.id,
+        )
+        recorder.attach(session)
+        shutdown_steps.append(recorder.aclose)
+
+    assistant = Assistant(
+        order_store=order_store,
+        menu=models.menu,
+        session_id=ctx.job.id,
+        kitchen=kitchen,
+        recorder=recorder,
+    )
+
+    @session.on("conversation_item_added")
+    def _on_conversation_item_added(ev: ConversationItemAddedEvent):
+        if getattr(ev.item, "role", None) == "user":
+            assistant.usual_stats.observe_user_turn()
 
     @session.on("metrics_collected")
     def _on_metrics_collected(ev: MetricsCollectedEvent):
-        metrics.log_metrics(ev.metrics)
+        if metrics_sampler.should_log(ev.metrics):
+            metrics.log_metrics(ev.metrics)
         usage_collector.collect(ev.metrics)
+        latency.observe(ev.metrics)
+        job_load.observe(ev.metrics)
+        if isinstance(ev.metrics, metrics.LLMMetrics):
+            assistant.slot_filler.stats.observe_llm_ttft(ev.metrics.ttft)
+            assistant.compactor.record_llm_metrics(ev.metrics)
 
     async def log_usage():
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
+        logger.info(f"Slot filler: {assistant.slot_filler.stats.summary()}")
+        logger.info(f"Chat context: {assistant.compactor.summary()}")
+        logger.info(f"Tool transactions: {assistant.transactions.summary()}")
+        logger.info(f"Order IDs this worker: {assistant.order_ids.summary()}")
+        logger.info(
+            f"Customer profiles: {assistant.profiles.summary()}, usual orders: {assistant.usual_stats.summary()}"
+        )
+        if kitchen is not None:
+            logger.info(f"Kitchen feed: {kitchen.summary()}")
+        if models.tts_cache is not None:
+            logger.info(f"TTS cache: {models.tts_cache.summary()}")
+        logger.info(f"Providers: {health_summary()}")
+        logger.info(
+            f"Logging: {log_pipeline.summary()}, metrics {metrics_sampler.summary()}"
+        )
+
+    shutdown_steps.append(log_usage)
+
+    # Per-stage latency histograms, dumped for the worker's metrics endpoint to aggregate
+    latency_dump = asyncio.create_task(dump_periodically())
+
+    async def close_latency_dump():
+        logger.info(f"Latency (ms): {latency.summary()}")
+        latency_dump.cancel()
+        await asyncio.gather(latency_dump, return_exceptions=True)
+
+    shutdown_steps.append(close_latency_dump)
+
+    # Event-loop lag and inference times, reported to the worker's load function
+    load_report = asyncio.create_task(job_load.run())
 
-    ctx.add_shutdown_callback(log_usage)
+    async def close_load_report():
+        load_report.cancel()
+        await asyncio.gather(load_report, return_exceptions=True)
+
+    shutdown_steps.append(close_load_report)
 
     # # Add a virtual avatar to the session, if desired
     # # For other providers, see https://docs.livekit.io/agents/models/avatar/
@@ -645,17 +841,26 @@ async def entrypoint(ctx: JobContext):
     # # Start the avatar and wait for it to join
     # await avatar.start(session, room=ctx.room)
 
-    # Create assistant instance and give it access to the room
-    assistant = Assistant()
+    # Give the assistant access to the room
     assistant.set_room(ctx.room)
-    
+
+    async def close_receipts():
+        logger.info(f"Receipts: {assistant.receipts.summary()}")
+        await assistant.receipts.aclose()
+        await assistant.messenger.aclose()
+        logger.info(f"Data channel: {assistant.messenger.summary()}")
+
+    shutdown_steps.append(close_receipts)
+
     # Start the session, which initializes the voice pipeline and warms up the models
     await session.start(
         agent=assistant,
         room=ctx.room,
         room_input_options=RoomInputOptions(
             # For telephony applications, use `BVCTelephony` for best results
-            noise_cancellation=noise_cancellation.BVC(),
+            noise_cancellation=models.noise_cancellation
+            if degradation.noise_cancellation
+            else None,
         ),
     )
 
@@ -664,4 +869,33 @@ async def entrypoint(ctx: JobContext):
 
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
+    if os.getenv("LATENCY_METRICS_PORT"):
+        serve_metrics(int(os.getenv("LATENCY_METRICS_PORT")))
+    if os.getenv("KITCHEN_PORT"):
+        # Open orders and their status survive restarts, and saved orders the kitchen missed are queued
+        serve_kitchen(
+            int(os.getenv("KITCHEN_PORT")),
+            journal=os.getenv("KITCHEN_JOURNAL", "orders/kitchen-status.jsonl"),
+            order_store=create_order_store(),
+        )
+    if os.getenv("EOU_BATCH_PORT"):
+        # Every job's turn detector posts to this one batching service instead of the inference process
+        port = int(os.getenv("EOU_BATCH_PORT"))
+        try:
+            serve_eou(port)
+        except Exception as e:
+            logger.error(
+                f"Batched turn detection is unavailable, jobs use the shared inference process: {e}"
+            )
+        else:
+            os.environ["LIVEKIT_REMOTE_EOT_URL"] = f"http://127.0.0.1:{port}"
+            unregister_local_runner()
+    # Load from CPU, event-loop lag, sessions and inference time; new jobs are refused at LOAD_THRESHOLD
+    cli.run_app(
+        WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            load_fnc=WorkerLoad(),
+            load_threshold=float(os.getenv("LOAD_THRESHOLD", "0.8")),
+        )
+    )
@@ -0,0 +1,430 @@
+"""Columnar analytics over saved orders.
+
+`OrderAnalytics` ingests orders from any order store backend into NumPy
+column chunks under one directory, reading only what was saved since the
+last ingest, and answers questions such as the most popular drink per hour
+with vectorized group-bys instead of opening every order again.
+
+Run from the backend directory:
+
+    uv run python src/analytics.py ingest --store json --source orders
+    uv run python src/analytics.py report
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+from cart import Cart
+from order_codec import get_codec, upgrade_order
+
+logger = logging.getLogger("agent.analytics")
+
+FORMAT_VERSION = 1
+DEFAULT_DIRECTORY = "analytics"
+# Dictionary-encoded columns; code 0 is "not given"
+CATEGORIES = ("drink", "size", "milk", "extra")
+
+
+class Columns:
+    """Orders as NumPy columns: one row per order and one per line item.
+
+    Line items point at their order with `item_order`, and extras at their
+    line item with `extra_item`. Category columns hold dictionary codes into
+    `dictionaries`.
+    """
+
+    def __init__(
+        self, arrays: dict[str, np.ndarray], dictionaries: dict[str, list]
+    ) -> None:
+        self.arrays = arrays
+        self.dictionaries = dictionaries
+
+    @property
+    def orders(self) -> int:
+        return len(self.arrays["order_id"])
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        try:
+            return self.arrays[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def _weights(self) -> np.ndarray:
+        return self.item_quantity.astype(np.int64)
+
+    def count_by(self, *columns: str) -> dict[tuple, int]:
+        """Drinks sold (line quantities summed) for every combination of item columns.
+
+        `columns` are "drink", "size", "milk" or "hour" (of the order).
+        """
+        keys, sizes = [], []
+        for column in columns:
+            if column == "hour":
+                # -1 (unknown) is shifted to 0, and so is every hour
+                keys.append(self.order_hour[self.item_order].astype(np.int64) + 1)
+                sizes.append(25)
+            else:
+                keys.append(self.arrays[f"item_{column}"].astype(np.int64))
+                sizes.append(len(self.dictionaries[column]))
+        combined = (
+            np.ravel_multi_index(keys, sizes)
+            if keys
+            else np.zeros(len(self.item_order), np.int64)
+        )
+        totals = np.bincount(
+            combined, weights=self._weights(), minlength=int(np.prod(sizes))
+        )
+        result = {}
+        for flat in np.flatnonzero(totals):
+            codes = np.unravel_index(flat, sizes)
+            result[
+                tuple(
+                    self._decode(column, int(code))
+                    for column, code in zip(columns, codes)
+                )
+            ] = int(totals[flat])
+        return result
+
+    def _decode(self, column: str, code: int):
+        if column == "hour":
+            return code - 1 if code else None
+        return self.dictionaries[column][code]
+
+    def popular_drink_by_hour(self) -> dict[int, tuple[str, int]]:
+        """The most sold drink in each hour of the day that had orders, with its count."""
+        drinks = len(self.dictionaries["drink"])
+        hours = self.order_hour[self.item_order].astype(np.int64)
+        known = (hours >= 0) & (self.item_drink > 0)
+        table = np.bincount(
+            hours[known] * drinks + self.item_drink[known],
+            weights=self._weights()[known],
+            minlength=24 * drinks,
+        ).reshape(24, drinks)
+        best = table.argmax(axis=1)
+        return {
+            hour: (self.dictionaries["drink"][best[hour]], int(table[hour, best[hour]]))
+            for hour in np.flatnonzero(table.sum(axis=1)).tolist()
+        }
+
+    def share(self, column: str, value: str) -> float:
+        """Fraction of drinks sold whose `column` is `value`, among those where it was given."""
+        codes = self.arrays[f"item_{column}"]
+        weights = self._weights()
+        given = weights[codes > 0].sum()
+        if value not in self.dictionaries[column] or not given:
+            return 0.0
+        return float(
+            weights[codes == self.dictionaries[column].index(value)].sum() / given
+        )
+
+    def average_extras_per_order(self) -> float:
+        """Extras per order, counting an extra once for every drink of a line item it is on."""
+        if not self.orders:
+            return 0.0
+        return float(self._weights()[self.extra_item].sum() / self.orders)
+
+    def report(self) -> dict:
+        return {
+            "orders": self.orders,
+            "drinks": int(self._weights().sum()),
+            "popular_drink_by_hour": {
+                f"{hour:02d}:00": {"drink": drink, "count": count}
+                for hour, (drink, count) in self.popular_drink_by_hour().items()
+            },
+            "oat_milk_share": round(self.share("milk", "oat milk"), 4),
+            "average_extras_per_order": round(self.average_extras_per_order(), 4),
+            "drinks_by_size": {
+                str(size): count for (size,), count in self.count_by("size").items()
+            },
+        }
+
+
+class _ChunkBuilder:
+    """Encodes orders into the arrays of one chunk, growing the dictionaries as it goes."""
+
+    def __init__(self, dictionaries: dict[str, list]) -> None:
+        self.dictionaries = dictionaries
+        self._codes = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in dictionaries.items()
+        }
+        self.columns: dict[str, list] = {
+            name: []
+            for name in (
+                "order_id",
+                "order_time",
+                "order_hour",
+                "item_order",
+                "item_drink",
+                "item_size",
+                "item_milk",
+                "item_quantity",
+                "extra_item",
+                "extra_code",
+            )
+        }
+
+    def _code(self, category: str, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        codes = self._codes[category]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.dictionaries[category])
+            self.dictionaries[category].append(value)
+        return code
+
+    def add(
+        self, order: dict, placed_at: Optional[datetime.datetime], row_offset: int
+    ) -> None:
+        c = self.columns
+        order_row = row_offset + len(c["order_id"])
+        c["order_id"].append(order.get("order_id") or -1)
+        c["order_time"].append(int(placed_at.timestamp()) if placed_at else -1)
+        c["order_hour"].append(placed_at.hour if placed_at else -1)
+        for item in Cart.from_dict(order).items:
+            item_row = len(c["item_order"])
+            c["item_order"].append(order_row)
+            c["item_drink"].append(self._code("drink", item.drink_type))
+            c["item_size"].append(self._code("size", item.size))
+            c["item_milk"].append(self._code("milk", item.milk))
+            c["item_quantity"].append(item.quantity or 1)
+            for extra in item.extras:
+                c["extra_item"].append(item_row)
+                c["extra_code"].append(self._code("extra", extra))
+
+    def arrays(self, item_offset: int) -> dict[str, np.ndarray]:
+        c = self.columns
+        return {
+            "order_id": np.array(c["order_id"], dtype=np.int64),
+            "order_time": np.array(c["order_time"], dtype=np.int64),
+            "order_hour": np.array(c["order_hour"], dtype=np.int8),
+            "item_order": np.array(c["item_order"], dtype=np.int64),
+            "item_drink": np.array(c["item_drink"], dtype=np.int16),
+            "item_size": np.array(c["item_size"], dtype=np.int16),
+            "item_milk": np.array(c["item_milk"], dtype=np.int16),
+            "item_quantity": np.array(c["item_quantity"], dtype=np.int32),
+            "extra_item": np.array(c["extra_item"], dtype=np.int64) + item_offset,
+            "extra_code": np.array(c["extra_code"], dtype=np.int16),
+        }
+
+
+def _placed_at(
+    order: dict, fallback: Optional[str] = None
+) -> Optional[datetime.datetime]:
+    value = order.get("placed_at") or fallback
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _scan_json(directory: Path, watermark: dict):
+    """JSON files modified after the watermark; files sharing its mtime are told apart by name."""
+    codec = get_codec()
+    last_mtime, seen = watermark.get("mtime_ns", -1), set(watermark.get("seen", []))
+    files = []
+    for path in directory.glob("*.json"):
+        mtime = path.stat().st_mtime_ns
+        if mtime > last_mtime or (mtime == last_mtime and path.name not in seen):
+            files.append((mtime, path))
+    files.sort()
+    for mtime, path in files:
+        order = upgrade_order(codec.loads(path.read_bytes()))
+        fallback = datetime.datetime.fromtimestamp(mtime / 1e9).isoformat()
+        if mtime > last_mtime:
+            last_mtime, seen = mtime, set()
+        seen.add(path.name)
+        yield order, fallback, {"mtime_ns": last_mtime, "seen": sorted(seen)}
+
+
+def _scan_jsonl(directory: Path, watermark: dict):
+    """Complete lines of the segment log past the watermark's segment and byte offset."""
+    codec = get_codec()
+    start_segment, start_offset = (
+        watermark.get("segment", -1),
+        watermark.get("offset", 0),
+    )
+    segments = sorted(
+        (int(path.stem.rsplit("-", 1)[1]), path)
+        for path in directory.glob("orders-*.jsonl")
+    )
+    for index, path in segments:
+        if index < start_segment:
+            continue
+        offset = start_offset if index == start_segment else 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written
+                offset += len(line)
+                if line.strip():
+                    yield (
+                        upgrade_order(codec.loads(line)),
+                        None,
+                        {"segment": index, "offset": offset},
+                    )
+
+
+def _scan_sqlite(path: Path, watermark: dict):
+    """Rows with an id above the watermark."""
+    codec = get_codec()
+    if not path.exists():
+        return
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT id, saved_at, payload FROM orders WHERE id > ? ORDER BY id",
+            (watermark.get("rowid", 0),),
+        )
+        for rowid, saved_at, payload in rows:
+            yield upgrade_order(codec.loads(payload)), saved_at, {"rowid": rowid}
+    finally:
+        conn.close()
+
+
+SCANNERS = {"json": _scan_json, "jsonl": _scan_jsonl, "sqlite": _scan_sqlite}
+
+
+class OrderAnalytics:
+    """Incrementally built columnar copy of one order store.
+
+    Each `ingest` appends a compressed `.npz` chunk and records in
+    `manifest.json` how far into the store it has read, so the next ingest
+    only reads newer orders. Dictionaries only ever grow, so codes in older
+    chunks stay valid.
+    """
+
+    def __init__(self, directory: Union[str, Path] = DEFAULT_DIRECTORY) -> None:
+        self.directory = Path(directory)
+        self._manifest_path = self.directory / "manifest.json"
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self) -> dict:
+        if not self._manifest_path.exists():
+            return {
+                "version": FORMAT_VERSION,
+                "source": None,
+                "watermark": {},
+                "dictionaries": {name: [None] for name in CATEGORIES},
+                "chunks": [],
+                "orders": 0,
+                "items": 0,
+            }
+        with open(self._manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported analytics format {manifest.get('version')} in {self.directory}"
+            )
+        return manifest
+
+    def _write_manifest(self) -> None:
+        tmp = self._manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self._manifest_path)
+
+    def ingest(self, store: str, source: Union[str, Path]) -> int:
+        """Read orders saved to `source` by the `store` backend since the last ingest; returns how many."""
+        try:
+            scan = SCANNERS[store]
+        except KeyError:
+            raise ValueError(
+                f"Unknown order store {store!r}, expected one of {', '.join(SCANNERS)}"
+            ) from None
+        source_key = {"store": store, "path": str(Path(source).resolve())}
+        if self.manifest["source"] not in (None, source_key):
+            raise ValueError(
+                f"{self.directory} holds orders from {self.manifest['source']}, not {source_key}"
+            )
+
+        builder = _ChunkBuilder(self.manifest["dictionaries"])
+        watermark = self.manifest["watermark"]
+        for order, fallback, position in scan(Path(source), self.manifest["watermark"]):
+            builder.add(order, _placed_at(order, fallback), self.manifest["orders"])
+            watermark = position
+        added = len(builder.columns["order_id"])
+        if not added:
+            return 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        arrays = builder.arrays(item_offset=self.manifest["items"])
+        name = f"chunk-{len(self.manifest['chunks']) + 1:06d}.npz"
+        np.savez_compressed(self.directory / name, **arrays)
+        # The manifest is written last, so a crash before this point only leaves an unused chunk
+        self.manifest.update(
+            source=source_key,
+            watermark=watermark,
+            chunks=[*self.manifest["chunks"], name],
+            orders=self.manifest["orders"] + added,
+            items=self.manifest["items"] + len(arrays["item_order"]),
+        )
+        self._write_manifest()
+        logger.info(f"Ingested {added} orders into {self.directory / name}")
+        return added
+
+    def load(self) -> Columns:
+        """Every chunk concatenated into one set of columns."""
+        parts: dict[str, list[np.ndarray]] = {}
+        for name in self.manifest["chunks"]:
+            with np.load(self.directory / name) as chunk:
+                for column in chunk.files:
+                    parts.setdefault(column, []).append(chunk[column])
+        if not parts:
+            parts = {
+                column: [values]
+                for column, values in _ChunkBuilder(self.manifest["dictionaries"])
+                .arrays(0)
+                .items()
+            }
+        return Columns(
+            {column: np.concatenate(values) for column, values in parts.items()},
+            self.manifest["dictionaries"],
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--directory", default=DEFAULT_DIRECTORY, help="where the columnar copy is kept"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="read newly saved orders")
+    ingest.add_argument(
+        "--store", default=os.getenv("ORDER_STORE", "json"), choices=sorted(SCANNERS)
+    )
+    ingest.add_argument(
+        "--source", default=None, help="orders directory, or the database for sqlite"
+    )
+    commands.add_parser(
+        "report",
+        help="print popular drinks by hour, oat milk share and extras per order",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    analytics = OrderAnalytics(args.directory)
+    if args.command == "ingest":
+        source = args.source or (
+            "orders/orders.db" if args.store == "sqlite" else "orders"
+        )
+        added = analytics.ingest(args.store, source)
+        print(f"{added} new orders, {analytics.manifest['orders']} in total")
+    else:
+        print(json.dumps(analytics.load().report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+from collections.abc import Iterable
+from typing import Callable, NamedTuple, Optional
+
+
+class DrinkSnapshot(NamedTuple):
+    """An immutable copy of a line item, cheap to keep around, compare and hash."""
+
+    drink_type: Optional[str]
+    size: Optional[str]
+    milk: Optional[str]
+    extras: tuple[str, ...]
+    quantity: int
+
+
+class CartSnapshot(NamedTuple):
+    name: Optional[str]
+    items: tuple[DrinkSnapshot, ...]
+
+
+class CoffeeOrder:
+    """A single line item in the cart: one drink, possibly ordered several times.
+
+    Slotted, as replaying or analysing saved orders builds millions of these.
+    Extras are kept as an insertion-ordered set (a dict without values), so
+    checking for a duplicate does not scan a list. The fields are properties
+    so that, once the item is in a cart, every change is reported to it.
+    """
+
+    __slots__ = ("_cart", "_drink_type", "_extras", "_milk", "_quantity", "_size")
+
+    def __init__(
+        self,
+        drink_type: Optional[str] = None,
+        size: Optional[str] = None,
+        milk: Optional[str] = None,
+        extras: Optional[Iterable[str]] = None,
+        quantity: int = 1,
+    ):
+        # The cart this item belongs to, which reports its changes; set by the cart
+        self._cart: Optional[Cart] = None
+        self._drink_type = drink_type
+        self._size = size
+        self._milk = milk
+        # None until the first extra, as most drinks have none
+        self._extras: Optional[dict[str, None]] = (
+            dict.fromkeys(extras) if extras else None
+        )
+        self._quantity = quantity
+
+    def _changed(self, key: str, value) -> None:
+        if self._cart is not None:
+            self._cart._item_changed(self, "replace", key, value)
+
+    @property
+    def drink_type(self) -> Optional[str]:
+        return self._drink_type
+
+    @drink_type.setter
+    def drink_type(self, drink_type: Optional[str]) -> None:
+        self._drink_type = drink_type
+        self._changed("drinkType", drink_type)
+
+    @property
+    def size(self) -> Optional[str]:
+        return self._size
+
+    @size.setter
+    def size(self, size: Optional[str]) -> None:
+        self._size = size
+        self._changed("size", size)
+
+    @property
+    def milk(self) -> Optional[str]:
+        return self._milk
+
+    @milk.setter
+    def milk(self, milk: Optional[str]) -> None:
+        self._milk = milk
+        self._changed("milk", milk)
+
+    @property
+    def quantity(self) -> int:
+        return self._quantity
+
+    @quantity.setter
+    def quantity(self, quantity: int) -> None:
+        self._quantity = quantity
+        self._changed("quantity", quantity)
+
+    @property
+    def extras(self) -> list[str]:
+        """A copy of the extras in the order they were added; change them with `add_extra`."""
+        return list(self._extras or ())
+
+    @extras.setter
+    def extras(self, extras: Iterable[str]) -> None:
+        self._extras = dict.fromkeys(extras) or None
+        self._changed("extras", self.extras)
+
+    def missing_fields(self) -> list[str]:
+        """Names of the required fields that are still empty."""
+        missing = []
+        if not self.drink_type:
+            missing.append("drink type")
+        if not self.size:
+            missing.append("size")
+        if not self.milk:
+            missing.append("milk type")
+        return missing
+
+    def is_complete(self) -> bool:
+        """Check if all required fields are filled."""
+        return not self.missing_fields()
+
+    def is_empty(self) -> bool:
+        """True until something has been set on the item."""
+        return (
+            not (self.drink_type or self.size or self.milk or self._extras)
+            and self.quantity == 1
+        )
+
+    def add_extra(self, extra: str) -> bool:
+        """Add an extra, returning False if it was already on the drink."""
+        if self._extras is None:
+            self._extras = {}
+        elif extra in self._extras:
+            return False
+        self._extras[extra] = None
+        if self._cart is not None:
+            self._cart._item_changed(self, "add", "extras/-", extra)
+        return True
+
+    def describe(self) -> str:
+        """Short spoken description, e.g. "2 large latte with oat milk"."""
+        quantity = f"{self.quantity} " if self.quantity > 1 else ""
+        description = (
+            f"{quantity}{self.size or ''} {self.drink_type or 'drink'}".replace(
+                "  ", " "
+            ).strip()
+        )
+        if self.milk:
+            description += f" with {self.milk}"
+        if self.extras:
+            description += f", extras: {', '.join(self.extras)}"
+        return description
+
+    def to_dict(self) -> dict:
+        """Convert the line item to dictionary format."""
+        return {
+            "drinkType": self._drink_type,
+            "size": self._size,
+            "milk": self._milk,
+            "extras": list(self._extras) if self._extras else [],
+            "quantity": self._quantity,
+        }
+
+    def snapshot(self) -> DrinkSnapshot:
+        return DrinkSnapshot(
+            self._drink_type,
+            self._size,
+            self._milk,
+            tuple(self._extras or ()),
+            self._quantity,
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot: DrinkSnapshot) -> "CoffeeOrder":
+        return cls(*snapshot)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CoffeeOrder":
+        return cls(
+            drink_type=data.get("drinkType"),
+            size=data.get("size"),
+            milk=data.get("milk"),
+            extras=data.get("extras"),
+            quantity=data.get("quantity", 1),
+        )
+
+
+class Cart:
+    """Everything one customer is ordering: the line items and the name for the order.
+
+    Every change is reported to `on_patch`, when set, as a JSON Patch (RFC 6902)
+    operation against `to_dict()`, e.g. `{"op": "replace", "path":
+    "/items/0/size", "value": "large"}`.
+    """
+
+    __slots__ = ("items", "name", "on_patch")
+
+    def __init__(self) -> None:
+        self.on_patch: Optional[Callable[[dict], None]] = None
+        self.items: list[CoffeeOrder] = []
+        self.name: Optional[str] = None
+
+    def __setattr__(self, attr: str, value) -> None:
+        if attr == "items":
+            for item in value:
+                item._cart = self
+        object.__setattr__(self, attr, value)
+        if attr == "name":
+            self._emit("replace", "/name", value)
+        elif attr == "items":
+            self._emit("replace", "/items", [item.to_dict() for item in value])
+
+    def _emit(self, op: str, path: str, value=None) -> None:
+        if getattr(self, "on_patch", None) is not None:
+            self.on_patch(
+                {"op": op, "path": path}
+                if op == "remove"
+                else {"op": op, "path": path, "value": value}
+            )
+
+    def _item_changed(self, item: CoffeeOrder, op: str, key: str, value) -> None:
+        for index, candidate in enumerate(self.items):
+            if candidate is item:
+                self._emit(op, f"/items/{index}/{key}", value)
+                return
+
+    def _append(self, item: CoffeeOrder) -> CoffeeOrder:
+        item._cart = self
+        self.items.append(item)
+        self._emit("add", "/items/-", item.to_dict())
+        return item
+
+    @property
+    def current(self) -> CoffeeOrder:
+        """The line item being discussed, created on first use."""
+        if not self.items:
+            self._append(CoffeeOrder())
+        return self.items[-1]
+
+    def item(self, item_number: Optional[int] = None) -> CoffeeOrder:
+        """Look up a line item by its 1-based number, defaulting to the current one."""
+        if item_number is None:
+            return self.current
+        if not 1 <= item_number <= len(self.items):
+            raise IndexError(f"There is no drink number {item_number} in the order")
+        return self.items[item_number - 1]
+
+    def add_item(self, item: CoffeeOrder) -> CoffeeOrder:
+        """Append a line item, reusing the current one if nothing has been set on it yet."""
+        if self.items and self.items[-1].is_empty():
+            self.items[-1]._cart = None
+            item._cart = self
+            self.items[-1] = item
+            self._emit("replace", f"/items/{len(self.items) - 1}", item.to_dict())
+            return item
+        return self._append(item)
+
+    def remove_item(self, item_number: int) -> CoffeeOrder:
+        item = self.item(item_number)
+        del self.items[item_number - 1]
+        item._cart = None
+        self._emit("remove", f"/items/{item_number - 1}")
+        return item
+
+    @property
+    def total_drinks(self) -> int:
+        return sum(item.quantity for item in self.items)
+
+    def missing_fields(self) -> list[str]:
+        """Everything still needed before the order can be saved."""
+        missing = []
+        if not self.items:
+            missing.append("drink type")
+        for number, item in enumerate(self.items, start=1):
+            suffix = f" for drink {number}" if len(self.items) > 1 else ""
+            missing.extend(f"{field}{suffix}" for field in item.missing_fields())
+        if not self.name:
+            missing.append("customer name")
+        return missing
+
+    def is_complete(self) -> bool:
+        """Check if every line item and the customer name are filled."""
+        return not self.missing_fields()
+
+    def describe(self) -> str:
+        return "; ".join(item.describe() for item in self.items) or "nothing yet"
+
+    def to_dict(self) -> dict:
+        """Convert the cart to the dictionary format that gets saved and rendered."""
+        return {
+            "name": self.name,
+            "items": [item.to_dict() for item in self.items],
+        }
+
+    def snapshot(self) -> CartSnapshot:
+        """An immutable copy of the cart, e.g. to roll back to."""
+        return CartSnapshot(self.name, tuple(item.snapshot() for item in self.items))
+
+    @classmethod
+    def from_snapshot(cls, snapshot: CartSnapshot) -> "Cart":
+        cart = cls()
+        cart.name = snapshot.name
+        cart.items = [CoffeeOrder.from_snapshot(item) for item in snapshot.items]
+        return cart
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Cart":
+        """Load a saved order, including single-drink orders saved before carts existed."""
+        cart = cls()
+        cart.name = data.get("name")
+        if "items" in data:
+            cart.items = [CoffeeOrder.from_dict(item) for item in data["items"]]
+        else:
+            cart.items = [CoffeeOrder.from_dict(data)]
+        return cart
@@ -0,0 +1,146 @@
+import logging
+import os
+from typing import Optional
+
+from livekit.agents import ChatContext, ChatMessage, metrics
+
+logger = logging.getLogger("agent.context")
+
+# Rough chars-per-token ratio for English chat text, good enough for budgeting
+CHARS_PER_TOKEN = 4
+# Per-item overhead for role markers and separators
+ITEM_OVERHEAD_TOKENS = 4
+# Chat item id of the saved-orders summary, replaced in place on every compaction
+SUMMARY_ID = "saved_orders_summary"
+
+
+def compact_prompt(text: str) -> str:
+    """Strip source indentation and blank lines from a prompt written as an indented literal."""
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def estimate_tokens(item) -> int:
+    """Approximate prompt tokens for one chat context item."""
+    if item.type == "message":
+        text = item.text_content or ""
+    elif item.type == "function_call":
+        text = item.name + item.arguments
+    elif item.type == "function_call_output":
+        text = item.name + item.output
+    else:
+        text = ""
+    return len(text) // CHARS_PER_TOKEN + ITEM_OVERHEAD_TOKENS
+
+
+class ContextCompactor:
+    """Keeps the barista's chat context small over long sessions.
+
+    Once an order is saved, its tool calls and their confirmations are replaced
+    by a one-line summary, and whenever the estimated prompt exceeds
+    `token_budget` the oldest turns are dropped. The instructions and the most
+    recent `keep_recent` items are never removed.
+    """
+
+    def __init__(
+        self, token_budget: Optional[int] = None, keep_recent: int = 6
+    ) -> None:
+        self.token_budget = (
+            token_budget
+            if token_budget is not None
+            else int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+        )
+        self.keep_recent = keep_recent
+        self._saved_summaries: list[str] = []
+        self._pending_save = False
+
+        self.compactions = 0
+        self.items_removed = 0
+        self.prompt_tokens: list[int] = []
+
+    def note_order_saved(self, summary: str) -> None:
+        """Record a finished order; its tool-call history is dropped on the next compaction."""
+        self._saved_summaries.append(summary)
+        self._pending_save = True
+
+    def compact(self, chat_ctx: ChatContext) -> Optional[ChatContext]:
+        """Return a compacted copy of `chat_ctx`, or None if nothing needed to change."""
+        items = list(chat_ctx.items)
+        preamble = 0
+        while (
+            preamble < len(items)
+            and items[preamble].type == "message"
+            and items[preamble].role == "system"
+        ):
+            if items[preamble].id == SUMMARY_ID:
+                break
+            preamble += 1
+        head = items[:preamble]
+        body = [item for item in items[preamble:] if item.id != SUMMARY_ID]
+        removed = 0
+        new_save = self._pending_save
+
+        if new_save:
+            kept = [
+                item
+                for item in body
+                if item.type not in ("function_call", "function_call_output")
+            ]
+            removed += len(body) - len(kept)
+            body = kept
+            self._pending_save = False
+
+        summary = []
+        if self._saved_summaries:
+            summary = [
+                ChatMessage(
+                    id=SUMMARY_ID,
+                    role="system",
+                    content=[
+                        "Orders already saved in this session: "
+                        + "; ".join(self._saved_summaries)
+                    ],
+                )
+            ]
+
+        total = sum(estimate_tokens(item) for item in head + summary + body)
+        # Drop the oldest turns, never the instructions, the summary or the recent tail
+        while total > self.token_budget and len(body) > self.keep_recent:
+            dropped = body.pop(0)
+            total -= estimate_tokens(dropped)
+            removed += 1
+            # Never leave a function call without its output, or the reverse
+            call_id = getattr(dropped, "call_id", None)
+            if call_id:
+                for i, item in enumerate(body):
+                    if getattr(item, "call_id", None) == call_id:
+                        total -= estimate_tokens(body.pop(i))
+                        removed += 1
+                        break
+
+        if not removed and not new_save:
+            return None
+
+        self.compactions += 1
+        self.items_removed += removed
+        logger.info(
+            f"Compacted chat context: removed {removed} items, ~{total} tokens remain"
+        )
+        return ChatContext(head + summary + body)
+
+    def record_llm_metrics(self, llm_metrics: metrics.LLMMetrics) -> None:
+        """Track per-turn prompt size as reported by the LLM's usage metrics."""
+        self.prompt_tokens.append(llm_metrics.prompt_tokens)
+        logger.info(
+            f"Prompt tokens this turn: {llm_metrics.prompt_tokens} "
+            f"(cached {llm_metrics.prompt_cached_tokens})"
+        )
+
+    def summary(self) -> dict:
+        tokens = self.prompt_tokens
+        return {
+            "llm_requests": len(tokens),
+            "prompt_tokens_avg": round(sum(tokens) / len(tokens), 1) if tokens else 0.0,
+            "prompt_tokens_max": max(tokens) if tokens else 0,
+            "compactions": self.compactions,
+            "items_removed": self.items_removed,
+        }
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Protocol
+
+from aiohttp import web
+from livekit.plugins.turn_detector.base import (
+    MAX_HISTORY_TOKENS,
+    MAX_HISTORY_TURNS,
+    _download_from_hf_hub,
+)
+from livekit.plugins.turn_detector.models import HG_MODEL, MODEL_REVISIONS
+
+from instrumentation import Histogram
+
+logger = logging.getLogger("agent.eou")
+
+# Path MultilingualModel posts to when LIVEKIT_REMOTE_EOT_URL points at a turn detector service
+EOT_PATH = "/eot/multi"
+
+# Conversations of different lengths, so a batch of them needs padding
+_PADDING_CHECK = [
+    [{"role": "user", "content": "Hi"}],
+    [
+        {
+            "role": "assistant",
+            "content": "Hi there, what can I get started for you today?",
+        },
+        {
+            "role": "user",
+            "content": "Can I get a large oat milk latte with an extra shot",
+        },
+    ],
+    [{"role": "user", "content": "A medium mocha please."}],
+]
+
+
+class EOUModel(Protocol):
+    def predict_batch(self, chat_ctxs: list[list[dict]]) -> list[float]:
+        """End-of-turn probability of each conversation, given as {"role", "content"} messages."""
+        ...
+
+    def threshold(self, language: str) -> Optional[float]: ...
+
+
+class OnnxEOUModel:
+    """The multilingual turn detector's ONNX model, run on a whole batch of conversations at once.
+
+    Uses the plugin's own runner to load the model and format conversations,
+    so its predictions match what the shared inference process returns for
+    one conversation at a time. The model takes no attention mask, so on
+    load it scores a padded batch against the same conversations one by one;
+    if they differ, every conversation is run on its own instead.
+    """
+
+    def __init__(self) -> None:
+        # Imported here: importing the plugin's multilingual module registers its inference runner
+        from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+
+        self._runner = _EUORunnerMultilingual()
+        self._runner.initialize()
+        path = _download_from_hf_hub(
+            HG_MODEL,
+            "languages.json",
+            revision=MODEL_REVISIONS["multilingual"],
+            local_files_only=True,
+        )
+        with open(path) as f:
+            self._languages = json.load(f)
+        self.batched = self._padding_is_safe()
+        if not self.batched:
+            logger.warning(
+                "Padded turn detector batches change its predictions, running conversations one at a time"
+            )
+
+    def _padding_is_safe(self) -> bool:
+        together = self._run(_PADDING_CHECK)
+        alone = [self._run([ctx])[0] for ctx in _PADDING_CHECK]
+        return all(abs(a - b) < 1e-3 for a, b in zip(together, alone))
+
+    def predict_batch(self, chat_ctxs: list[list[dict]]) -> list[float]:
+        if self.batched or len(chat_ctxs) == 1:
+            return self._run(chat_ctxs)
+        return [self._run([ctx])[0] for ctx in chat_ctxs]
+
+    def _run(self, chat_ctxs: list[list[dict]]) -> list[float]:
+        import numpy as np
+
+        # _format_chat_ctx merges adjacent turns in place
+        texts = [
+            self._runner._format_chat_ctx([dict(msg) for msg in ctx])
+            for ctx in chat_ctxs
+        ]
+        tokenizer = self._runner._tokenizer
+        encoded = tokenizer(
+            texts,
+            add_special_tokens=False,
+            max_length=MAX_HISTORY_TOKENS,
+            truncation=True,
+        )
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        width = max(lengths)
+        if not width:
+            return [1.0] * len(texts)
+        # Padded on the right: the model is causal, so a conversation's last token never attends to its padding
+        input_ids = np.full(
+            (len(texts), width), tokenizer.pad_token_id or 0, dtype=np.int64
+        )
+        for row, ids in enumerate(encoded["input_ids"]):
+            input_ids[row, : len(ids)] = ids
+        outputs = self._runner._session.run(None, {"input_ids": input_ids})[0].reshape(
+            len(texts), width
+        )
+        return [
+            float(outputs[row, length - 1]) if length else 1.0
+            for row, length in enumerate(lengths)
+        ]
+
+    def threshold(self, language: str) -> Optional[float]:
+        language = language.lower()
+        data = self._languages.get(language) or self._languages.get(
+            language.split("-")[0]
+        )
+        return data["threshold"] if data else None
+
+
+class EOUBatcher:
+    """Micro-batches end-of-turn predictions from every session in the worker.
+
+    Batches run one at a time on a dedicated thread, off the event loop.
+    Requests that arrive while one runs are taken together as the next, up
+    to `max_batch` conversations, and each request's future gets its own
+    result. With a `window`, the first request into an idle batcher also
+    waits that long for others to join it; by default it does not, since a
+    lone session would pay the wait on every turn for nothing.
+    """
+
+    def __init__(
+        self,
+        model: EOUModel,
+        *,
+        window: Optional[float] = None,
+        max_batch: Optional[int] = None,
+    ) -> None:
+        self.model = model
+        self.window = (
+            window
+            if window is not None
+            else float(os.getenv("EOU_BATCH_WINDOW_MS", "0")) / 1000
+        )
+        self.max_batch = max_batch or int(os.getenv("EOU_MAX_BATCH", "32"))
+        self.requests = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.batch_sizes: dict[int, int] = {}
+        self.queue_wait = Histogram()
+        self.inference = Histogram()
+        self.latency = Histogram()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="eou-inference"
+        )
+
+    async def predict(self, chat_ctx: list[dict]) -> float:
+        if self._queue is None:
+            raise RuntimeError("EOUBatcher.run() has not started")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((chat_ctx, future, time.perf_counter()))
+        self.requests += 1
+        return await future
+
+    async def run(self) -> None:
+        """Collect and run batches until cancelled."""
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = batch[0][2] + self.window
+                while len(batch) < self.max_batch:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(
+                            await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                await self._run_batch(loop, batch)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, batch: list) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self.queue_wait.record(started - enqueued_at)
+        self.batches += 1
+        self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+        try:
+            probabilities = await loop.run_in_executor(
+                self._executor, self.model.predict_batch, [ctx for ctx, _, _ in batch]
+            )
+        except Exception as e:
+            self.failed_batches += 1
+            logger.exception(f"Turn detector batch of {len(batch)} failed")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        self.inference.record(finished - started)
+        for (_, future, enqueued_at), probability in zip(batch, probabilities):
+            self.latency.record(finished - enqueued_at)
+            # A session that timed out has cancelled its future
+            if not future.done():
+                future.set_result(probability)
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "mean_batch_size": round(
+                sum(size * n for size, n in self.batch_sizes.items()) / self.batches, 2
+            )
+            if self.batches
+            else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "queue_wait_p95": round(self.queue_wait.percentile(0.95), 4),
+            "inference_p95": round(self.inference.percentile(0.95), 4),
+            "latency_p50": round(self.latency.percentile(0.5), 4),
+            "latency_p95": round(self.latency.percentile(0.95), 4),
+        }
+
+
+def _messages(request: dict) -> list[dict]:
+    """The {"role", "content"} turns of a serialized ChatContext, as the local turn detector takes them."""
+    messages = []
+    for item in request.get("items", []):
+        if item.get("type") != "message" or item.get("role") not in (
+            "user",
+            "assistant",
+        ):
+            continue
+        content = "\n".join(
+            part for part in item.get("content", []) if isinstance(part, str)
+        )
+        if content:
+            messages.append({"role": item["role"], "content": content})
+    return messages[-MAX_HISTORY_TURNS:]
+
+
+def create_app(batcher: EOUBatcher) -> web.Application:
+    """The remote turn detector API that MultilingualModel speaks: thresholds and predictions on one path."""
+
+    async def end_of_turn(request: web.Request) -> web.Response:
+        body = await request.json()
+        if "language" in body:
+            return web.json_response(
+                {"threshold": batcher.model.threshold(body["language"])}
+            )
+        messages = _messages(body)
+        if not messages:
+            raise web.HTTPBadRequest(text="no user or assistant messages to predict on")
+        return web.json_response(
+            {"probability": float(await batcher.predict(messages))}
+        )
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(batcher.summary())
+
+    app = web.Application()
+    app.router.add_post(EOT_PATH, end_of_turn)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def unregister_local_runner() -> None:
+    """Stop the worker's shared inference process from loading its own copy of the turn detector.
+
+    The plugin registers its runner on import unless LIVEKIT_REMOTE_EOT_URL is
+    already set, which it is not when the worker sets it at startup.
+    """
+    from livekit.agents.inference_runner import _InferenceRunner
+    from livekit.plugins.turn_detector.multilingual import _EUORunnerMultilingual
+
+    _InferenceRunner.registered_runners.pop(
+        _EUORunnerMultilingual.INFERENCE_METHOD, None
+    )
+
+
+def serve_eou(
+    port: int, host: str = "127.0.0.1", model: Optional[EOUModel] = None
+) -> EOUBatcher:
+    """Serve batched turn detection from a daemon thread with its own event loop.
+
+    It runs in the worker process like the kitchen display; job processes
+    reach it through MultilingualModel's remote inference path. Raises
+    RuntimeError when the server is not listening, so the caller only points
+    jobs at it once it is.
+    """
+    batcher = EOUBatcher(model or OnnxEOUModel())
+    started = threading.Event()
+    errors: list[Exception] = []
+
+    async def run() -> None:
+        collector = asyncio.create_task(batcher.run())
+        runner = web.AppRunner(create_app(batcher), access_log=None)
+        try:
+            await runner.setup()
+            await web.TCPSite(runner, host, port).start()
+        except Exception as e:
+            # Port in use, say: the caller raises it, and jobs keep their own turn detector
+            errors.append(e)
+            collector.cancel()
+            await runner.cleanup()
+            return
+        finally:
+            started.set()
+        await collector
+
+    threading.Thread(
+        target=asyncio.run, args=(run(),), name="eou-batching", daemon=True
+    ).start()
+    if not started.wait(timeout=10):
+        raise RuntimeError(
+            f"Batched turn detection did not start on {host}:{port} within 10s"
+        )
+    if errors:
+        raise RuntimeError(
+            f"Could not serve batched turn detection on {host}:{port}: {errors[0]}"
+        ) from errors[0]
+    logger.info(f"Serving batched turn detection on http://{host}:{port}{EOT_PATH}")
+    return batcher
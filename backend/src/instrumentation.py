@@ -0,0 +1,329 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Union
+
+from livekit.agents import metrics
+from livekit.agents.llm.tool_context import get_function_info, is_function_tool
+
+logger = logging.getLogger("agent.instrumentation")
+
+# Each power-of-two range of microseconds is split into 2**SUB_BUCKET_BITS linear
+# buckets, so recorded values are accurate to within 1 / 2**SUB_BUCKET_BITS (~0.8%)
+SUB_BUCKET_BITS = 7
+QUANTILES = (0.5, 0.95, 0.99)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Distinguishes dumps of job processes that happen to reuse a pid
+_PROCESS_STARTED = int(time.time())
+
+
+def _bucket(micros: int) -> int:
+    """Lower bound of the log-linear bucket holding `micros`."""
+    shift = max(0, micros.bit_length() - SUB_BUCKET_BITS)
+    return (micros >> shift) << shift
+
+
+def _bucket_mid(lower: int) -> float:
+    shift = max(0, lower.bit_length() - SUB_BUCKET_BITS)
+    return lower + ((1 << shift) - 1) / 2
+
+
+class Histogram:
+    """HDR-style latency histogram with bounded relative error and mergeable buckets."""
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        if seconds < 0:
+            return
+        lower = _bucket(int(seconds * 1_000_000))
+        self.counts[lower] = self.counts.get(lower, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, quantile: float) -> float:
+        """Value in seconds at `quantile` (0-1), or 0.0 if nothing was recorded."""
+        if not self.count:
+            return 0.0
+        rank = max(1, round(quantile * self.count))
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= rank:
+                return min(_bucket_mid(lower) / 1_000_000, self.max)
+        return self.max
+
+    def merge(self, other: "Histogram") -> None:
+        for lower, count in other.counts.items():
+            self.counts[lower] = self.counts.get(lower, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            **{f"p{round(q * 100)}": self.percentile(q) for q in QUANTILES},
+            "buckets": {
+                str(lower): count for lower, count in sorted(self.counts.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        histogram = cls()
+        histogram.counts = {
+            int(lower): count for lower, count in data.get("buckets", {}).items()
+        }
+        histogram.count = data.get("count", 0)
+        histogram.total = data.get("sum", 0.0)
+        histogram.max = data.get("max", 0.0)
+        return histogram
+
+
+class LatencyRecorder:
+    """Per-stage latency histograms for the whole process, shared by every session it runs."""
+
+    def __init__(self) -> None:
+        self.stages: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def observe(self, ev_metrics) -> None:
+        """Record the pipeline timings carried by a `metrics_collected` event."""
+        if isinstance(ev_metrics, metrics.EOUMetrics):
+            if ev_metrics.end_of_utterance_delay > 0:
+                self.record("end_of_utterance", ev_metrics.end_of_utterance_delay)
+                self.record("stt_transcription", ev_metrics.transcription_delay)
+            self.record(
+                "on_user_turn_completed", ev_metrics.on_user_turn_completed_delay
+            )
+        elif isinstance(ev_metrics, metrics.STTMetrics):
+            # Streaming STT reports a zero duration; its latency shows up in transcription delay
+            if not ev_metrics.streamed and ev_metrics.duration > 0:
+                self.record("stt_request", ev_metrics.duration)
+        elif isinstance(ev_metrics, metrics.LLMMetrics):
+            if ev_metrics.ttft > 0:
+                self.record("llm_ttft", ev_metrics.ttft)
+            if not ev_metrics.cancelled:
+                self.record("llm_duration", ev_metrics.duration)
+        elif isinstance(ev_metrics, metrics.TTSMetrics):
+            if ev_metrics.ttfb > 0:
+                self.record("tts_ttfb", ev_metrics.ttfb)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                stage: histogram.to_dict()
+                for stage, histogram in sorted(self.stages.items())
+            }
+
+    def summary(self) -> dict[str, dict]:
+        """Counts and percentiles in milliseconds, for logging."""
+        return {
+            stage: {
+                "count": data["count"],
+                **{
+                    key: round(data[key] * 1000, 1)
+                    for key in data
+                    if key.startswith("p")
+                },
+            }
+            for stage, data in self.snapshot().items()
+        }
+
+
+recorder = LatencyRecorder()
+
+
+def timed_tool(func):
+    """Record every call of a function tool under the stage `tool.<name>`."""
+    stage = f"tool.{get_function_info(func).name}"
+
+    # functools.wraps keeps the signature, docstring and tool info livekit reads
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with recorder.time(stage):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def timed_tools(cls):
+    """Class decorator that times every `@function_tool` method of an Agent."""
+    for name, attr in list(vars(cls).items()):
+        if is_function_tool(attr):
+            setattr(cls, name, timed_tool(attr))
+    return cls
+
+
+def render_openmetrics(stages: dict[str, dict]) -> str:
+    lines = [
+        "# TYPE agent_stage_latency_seconds summary",
+        "# UNIT agent_stage_latency_seconds seconds",
+        "# HELP agent_stage_latency_seconds Voice pipeline latency per stage.",
+    ]
+    for stage, data in sorted(stages.items()):
+        label = stage.replace("\\", "\\\\").replace('"', '\\"')
+        histogram = Histogram.from_dict(data)
+        for q in QUANTILES:
+            lines.append(
+                f'agent_stage_latency_seconds{{stage="{label}",quantile="{q}"}} {histogram.percentile(q):.6f}'
+            )
+        lines.append(
+            f'agent_stage_latency_seconds_sum{{stage="{label}"}} {histogram.total:.6f}'
+        )
+        lines.append(
+            f'agent_stage_latency_seconds_count{{stage="{label}"}} {histogram.count}'
+        )
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def _dump_dir(directory: Union[str, Path, None]) -> Path:
+    return Path(directory or os.getenv("LATENCY_DUMP_DIR", "metrics"))
+
+
+def dump(
+    directory: Union[str, Path, None] = None, latency: LatencyRecorder = recorder
+) -> Path:
+    """Write this process's histograms to `directory`, replacing its previous dump."""
+    directory = _dump_dir(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"latency-{os.getpid()}-{_PROCESS_STARTED}.json"
+    # A temporary file of its own, since the periodic dump and the final one can overlap
+    with tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=directory,
+        prefix=f"{path.stem}-",
+        suffix=".tmp",
+        delete=False,
+    ) as f:
+        json.dump(
+            {
+                "pid": os.getpid(),
+                "updated_at": time.time(),
+                "stages": latency.snapshot(),
+            },
+            f,
+        )
+    os.replace(f.name, path)
+    return path
+
+
+async def dump_periodically(
+    directory: Union[str, Path, None] = None, interval: Optional[float] = None
+) -> None:
+    """Dump the histograms every `interval` seconds until cancelled, then once more."""
+    if interval is None:
+        interval = float(os.getenv("LATENCY_DUMP_INTERVAL", "30"))
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(dump, directory)
+    finally:
+        # Runs once the task is cancelled; the final dump still stays off the event loop
+        await asyncio.to_thread(dump, directory)
+
+
+def load_dumps(
+    directory: Union[str, Path, None] = None, retention: Optional[float] = None
+) -> dict[str, dict]:
+    """Merge the dumps of every job process into one set of histograms.
+
+    A running job rewrites its dump every LATENCY_DUMP_INTERVAL seconds, so a
+    dump not updated for `retention` seconds (LATENCY_DUMP_RETENTION, an hour
+    by default) is from a process that has exited; it is deleted, and its
+    sessions drop out of the aggregate.
+    """
+    if retention is None:
+        retention = float(os.getenv("LATENCY_DUMP_RETENTION", "3600"))
+    merged: dict[str, Histogram] = {}
+    now = time.time()
+    for path in sorted(_dump_dir(directory).glob("latency-*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                dumped = json.load(f)
+            stages = dumped["stages"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Skipping unreadable latency dump {path}: {e}")
+            continue
+        if now - dumped.get("updated_at", 0) > retention:
+            path.unlink(missing_ok=True)
+            continue
+        for stage, data in stages.items():
+            merged.setdefault(stage, Histogram()).merge(Histogram.from_dict(data))
+    return {stage: histogram.to_dict() for stage, histogram in merged.items()}
+
+
+def serve_metrics(
+    port: int, directory: Union[str, Path, None] = None, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """Serve the merged histograms at /metrics (OpenMetrics) and /latency.json from a daemon thread.
+
+    Sessions run in separate job processes, so the endpoint lives in the worker
+    process and aggregates the dumps they write to `directory`.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            stages = load_dumps(directory)
+            if self.path == "/metrics":
+                body, content_type = (
+                    render_openmetrics(stages).encode(),
+                    OPENMETRICS_CONTENT_TYPE,
+                )
+            elif self.path == "/latency.json":
+                body, content_type = json.dumps(stages).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(
+        target=server.serve_forever, name="latency-metrics", daemon=True
+    ).start()
+    logger.info(
+        f"Serving latency metrics on http://{host}:{server.server_port}/metrics"
+    )
+    return server
@@ -0,0 +1,523 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Awaitable, Iterable
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import aiohttp
+from aiohttp import web
+
+from order_ids import format_order_number
+from order_store import OrderStore
+
+logger = logging.getLogger("agent.kitchen")
+
+STATUSES = ("queued", "making", "ready")
+STATUS_TOPIC = "order-status"
+# Updates that arrive within this window are sent to a display as one batch
+BATCH_WINDOW = 0.05
+HEARTBEAT_INTERVAL = 15.0
+# Saved orders this recent are owed to the kitchen when it restarts
+BACKFILL_WINDOW = 3600.0
+# Rejections worth retrying; any other 4xx means the kitchen will never accept the batch
+_RETRYABLE_STATUSES = (408, 429)
+
+
+class Subscription:
+    """One display's feed of order updates, bounded so a slow display cannot hold up the rest."""
+
+    def __init__(self, session_id: Optional[str], buffer: int) -> None:
+        self.session_id = session_id
+        self.overflowed = False
+        self._updates: asyncio.Queue[dict] = asyncio.Queue(maxsize=buffer)
+
+    def offer(self, entry: dict) -> bool:
+        if self.session_id is not None and entry.get("session_id") != self.session_id:
+            return True
+        try:
+            self._updates.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+        return True
+
+    async def next_batch(self, window: float = BATCH_WINDOW) -> list[dict]:
+        """Wait for an update, collect whatever follows within `window`, keep the latest per order."""
+        batch = {}
+        entry = await self._updates.get()
+        batch[entry["order_id"]] = entry
+        await asyncio.sleep(window)
+        while not self._updates.empty():
+            entry = self._updates.get_nowait()
+            batch[entry["order_id"]] = entry
+        return list(batch.values())
+
+
+class KitchenQueue:
+    """Open orders and their status, as shown on the barista display.
+
+    Orders are submitted after the order store has persisted them, so the store
+    stays the record of what was ordered and this queue only tracks progress.
+    After `restore`, every change is appended to a journal, so a restarted
+    kitchen picks up where it left off. Every subscriber gets at most
+    `subscriber_buffer` pending updates; one that falls further behind is
+    disconnected, and catches up from a snapshot when it reconnects. Ready
+    orders stay listed for `keep_ready` seconds.
+    """
+
+    def __init__(
+        self, *, subscriber_buffer: int = 256, keep_ready: float = 300.0
+    ) -> None:
+        self._subscriber_buffer = subscriber_buffer
+        self._keep_ready = keep_ready
+        self._orders: dict[int, dict] = {}
+        self._subscriptions: set[Subscription] = set()
+        self._journal: Optional[Path] = None
+
+        self.submitted = 0
+        self.transitions = 0
+        self.dropped_subscribers = 0
+
+    def submit(self, order: dict) -> dict:
+        """Queue a saved order; submitting the same order ID again is a no-op."""
+        order_id = order["order_id"]
+        entry = self._orders.get(order_id)
+        if entry is not None:
+            if entry["session_id"] is None and order.get("session_id") is not None:
+                # Backfilled from the order store before its session sent it
+                entry["session_id"] = order["session_id"]
+                self._record(entry)
+            return entry
+        self._prune()
+        entry = self._orders[order_id] = {
+            "order_id": order_id,
+            "order_number": format_order_number(order_id),
+            "session_id": order.get("session_id"),
+            "name": order.get("name"),
+            "items": order.get("items", []),
+            "status": "queued",
+            "updated_at": time.time(),
+        }
+        self.submitted += 1
+        self._record(entry)
+        self._broadcast(entry)
+        return entry
+
+    def set_status(self, order_id: int, status: str) -> dict:
+        """Move an order forward to `status`; raises KeyError or ValueError for invalid moves."""
+        if status not in STATUSES:
+            raise ValueError(
+                f"Unknown status {status!r}, expected one of {', '.join(STATUSES)}"
+            )
+        entry = self._orders[order_id]
+        if STATUSES.index(status) < STATUSES.index(entry["status"]):
+            raise ValueError(f"Order {order_id} is already {entry['status']}")
+        if status != entry["status"]:
+            entry["status"] = status
+            entry["updated_at"] = time.time()
+            self.transitions += 1
+            self._record(entry)
+            self._broadcast(entry)
+        return entry
+
+    def restore(
+        self, journal: Union[str, Path], orders: Iterable[dict] = (), since: float = 0.0
+    ) -> int:
+        """Reload the queue from `journal` and append every later change to it.
+
+        Saved `orders` placed after `since` that the journal has never seen
+        (the kitchen was down, or a job dropped them from its feed) are queued
+        as well; returns how many. The journal is rewritten without orders
+        that were ready before `since`.
+        """
+        path = Path(journal)
+        seen: dict[int, dict] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line torn by a crash mid-write
+                        continue
+                    seen[entry["order_id"]] = entry
+        self._orders = {
+            order_id: entry
+            for order_id, entry in seen.items()
+            if entry["status"] != "ready" or entry["updated_at"] >= since
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in self._orders.values())
+        os.replace(tmp, path)
+        self._journal = path
+
+        missed = [
+            order
+            for order in orders
+            if order.get("order_id") not in seen and _placed_at(order) >= since
+        ]
+        for order in missed:
+            self.submit(order)
+        return len(missed)
+
+    def snapshot(self, session_id: Optional[str] = None) -> list[dict]:
+        self._prune()
+        return [
+            dict(entry)
+            for entry in self._orders.values()
+            if session_id is None or entry["session_id"] == session_id
+        ]
+
+    def subscribe(self, session_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(session_id, self._subscriber_buffer)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def _record(self, entry: dict) -> None:
+        # A few changes per order, so opening the journal for each one costs nothing that matters
+        if self._journal is not None:
+            with open(self._journal, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _broadcast(self, entry: dict) -> None:
+        for subscription in list(self._subscriptions):
+            if not subscription.offer(dict(entry)):
+                logger.warning("Dropping a kitchen display that fell behind")
+                self._subscriptions.discard(subscription)
+                self.dropped_subscribers += 1
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self._keep_ready
+        for order_id in [
+            order_id
+            for order_id, entry in self._orders.items()
+            if entry["status"] == "ready" and entry["updated_at"] < cutoff
+        ]:
+            del self._orders[order_id]
+
+    def summary(self) -> dict:
+        return {
+            "open": sum(entry["status"] != "ready" for entry in self._orders.values()),
+            "submitted": self.submitted,
+            "transitions": self.transitions,
+            "subscribers": len(self._subscriptions),
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+def _placed_at(order: dict) -> float:
+    try:
+        return datetime.datetime.fromisoformat(order["placed_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+DISPLAY_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Murf Coffee - Kitchen</title>
+<style>
+body{font-family:system-ui,sans-serif;background:#2c1810;color:#fff;margin:0;padding:24px}
+#orders{display:grid;grid-template-columns:repeat(auto-fill,minmax(260px,1fr));gap:16px}
+.order{background:#4a2c1f;border-radius:12px;padding:16px}.ready{opacity:.5}
+button{margin-top:12px;padding:8px 16px;border:0;border-radius:8px;background:#d4a574;cursor:pointer}
+</style></head><body><h1>Kitchen queue</h1><div id="orders"></div>
+<script>
+const orders = new Map();
+const next = {queued: "making", making: "ready"};
+const esc = (v) => String(v ?? "").replace(/[&<>"']/g, (c) => `&#${c.charCodeAt(0)};`);
+function render() {
+  const el = document.getElementById("orders");
+  el.innerHTML = "";
+  [...orders.values()].sort((a, b) => a.order_id - b.order_id).forEach((o) => {
+    const card = document.createElement("div");
+    card.className = "order " + o.status;
+    const items = o.items.map((i) => esc(`${i.quantity} x ${i.size} ${i.drinkType} (${i.milk})`)).join("<br>");
+    card.innerHTML = `<h2>#${esc(o.order_number)} ${esc(o.name)}</h2><div>${items}</div><p>${esc(o.status)}</p>`;
+    if (next[o.status]) {
+      const button = document.createElement("button");
+      button.textContent = "Mark " + next[o.status];
+      button.onclick = () => fetch(`/orders/${o.order_id}/status`, {method: "POST", body: JSON.stringify({status: next[o.status]})});
+      card.appendChild(button);
+    }
+    el.appendChild(card);
+  });
+}
+const source = new EventSource("/events");
+source.addEventListener("snapshot", (e) => { orders.clear(); JSON.parse(e.data).forEach((o) => orders.set(o.order_id, o)); render(); });
+source.addEventListener("orders", (e) => { JSON.parse(e.data).forEach((o) => orders.set(o.order_id, o)); render(); });
+</script></body></html>
+"""
+
+
+def create_app(queue: KitchenQueue) -> web.Application:
+    """HTTP API of the kitchen: the display page, an SSE feed, order intake and status changes."""
+
+    async def display(request: web.Request) -> web.Response:
+        return web.Response(text=DISPLAY_HTML, content_type="text/html")
+
+    async def list_orders(request: web.Request) -> web.Response:
+        return web.json_response(queue.snapshot(request.query.get("session")))
+
+    async def submit_orders(request: web.Request) -> web.Response:
+        body = await request.json()
+        orders = body if isinstance(body, list) else [body]
+        if not all(isinstance(order, dict) and "order_id" in order for order in orders):
+            raise web.HTTPBadRequest(text="every order needs an order_id")
+        for order in orders:
+            queue.submit(order)
+        return web.json_response({"accepted": len(orders)})
+
+    async def update_status(request: web.Request) -> web.Response:
+        body = await request.json()
+        try:
+            entry = queue.set_status(
+                int(request.match_info["order_id"]), body.get("status")
+            )
+        except KeyError:
+            raise web.HTTPNotFound(text="unknown order") from None
+        except ValueError as e:
+            raise web.HTTPConflict(text=str(e)) from None
+        return web.json_response(entry)
+
+    async def events(request: web.Request) -> web.StreamResponse:
+        session_id = request.query.get("session")
+        subscription = queue.subscribe(session_id)
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        # Outlives each heartbeat: cancelling next_batch would lose the updates it has taken
+        pending: Optional[asyncio.Task] = None
+        try:
+            await response.write(_sse("snapshot", queue.snapshot(session_id)))
+            while not subscription.overflowed:
+                if pending is None:
+                    pending = asyncio.create_task(subscription.next_batch())
+                done, _ = await asyncio.wait({pending}, timeout=HEARTBEAT_INTERVAL)
+                if not done:
+                    await response.write(b": keep-alive\n\n")
+                    continue
+                batch, pending = pending.result(), None
+                await response.write(_sse("orders", batch))
+        except ConnectionResetError:
+            pass
+        finally:
+            if pending is not None:
+                pending.cancel()
+            queue.unsubscribe(subscription)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/", display)
+    app.router.add_get("/orders", list_orders)
+    app.router.add_post("/orders", submit_orders)
+    app.router.add_post("/orders/{order_id}/status", update_status)
+    app.router.add_get("/events", events)
+    return app
+
+
+def _sse(event: str, data) -> bytes:
+    return (
+        f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+    )
+
+
+def serve_kitchen(
+    port: int,
+    host: str = "127.0.0.1",
+    queue: Optional[KitchenQueue] = None,
+    *,
+    journal: Union[str, Path, None] = None,
+    order_store: Optional[OrderStore] = None,
+) -> KitchenQueue:
+    """Serve the kitchen display and API from a daemon thread with its own event loop.
+
+    Like the metrics endpoint it runs in the worker process, and job processes
+    reach it through `KitchenClient`. With a `journal` the queue survives
+    restarts, and orders from `order_store` placed in the last BACKFILL_WINDOW
+    seconds that never reached the kitchen are queued on startup.
+    """
+    queue = queue or KitchenQueue()
+    started = threading.Event()
+
+    async def run() -> None:
+        if journal is not None:
+            try:
+                orders = order_store.read_orders() if order_store is not None else []
+                missed = queue.restore(
+                    journal, orders, since=time.time() - BACKFILL_WINDOW
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Could not restore the kitchen queue from {journal}: {e}"
+                )
+            else:
+                logger.info(
+                    f"Restored the kitchen queue: {queue.summary()}, {missed} saved orders backfilled"
+                )
+        # Cancel a display's event stream as soon as it disconnects
+        runner = web.AppRunner(
+            create_app(queue), access_log=None, handler_cancellation=True
+        )
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(
+        target=asyncio.run, args=(run(),), name="kitchen-display", daemon=True
+    ).start()
+    started.wait(timeout=10)
+    logger.info(f"Serving the kitchen display on http://{host}:{port}/")
+    return queue
+
+
+class KitchenClient:
+    """Sends a session's saved orders to the kitchen and relays their status to the customer's room.
+
+    `enqueue` never blocks the tool that calls it: orders wait in a queue of at
+    most `max_pending` and are posted in batches by a background task, which
+    retries with backoff while the kitchen is unreachable. Orders that do not
+    fit are dropped from the feed (they are already in the order store). Once
+    the session has an order, a second task follows the kitchen's event stream
+    for this session and publishes every status change on STATUS_TOPIC.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        session_id: str,
+        publish: Callable[[str, bytes], Awaitable[None]],
+        *,
+        max_pending: int = 64,
+        max_backoff: float = 10.0,
+    ) -> None:
+        self.url = url.rstrip("/")
+        self.session_id = session_id
+        self._publish = publish
+        self._pending: asyncio.Queue[dict] = asyncio.Queue(maxsize=max_pending)
+        self._max_backoff = max_backoff
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._tasks: list[asyncio.Task] = []
+        self._statuses: dict[int, str] = {}
+
+        self.sent = 0
+        self.dropped = 0
+        self.published = 0
+        self.reconnects = 0
+
+    def enqueue(self, order: dict) -> None:
+        if not self._tasks:
+            self._http = aiohttp.ClientSession()
+            self._tasks = [
+                asyncio.create_task(self._send_loop(), name="kitchen-send"),
+                asyncio.create_task(self._watch_loop(), name="kitchen-watch"),
+            ]
+        try:
+            self._pending.put_nowait({**order, "session_id": self.session_id})
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(
+                f"Kitchen feed is backed up, order {order.get('order_id')} was not sent"
+            )
+
+    async def _send_loop(self) -> None:
+        while True:
+            batch = [await self._pending.get()]
+            while not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            backoff = 0.5
+            while True:
+                try:
+                    async with self._http.post(
+                        f"{self.url}/orders", json=batch
+                    ) as resp:
+                        resp.raise_for_status()
+                    self.sent += len(batch)
+                    break
+                except aiohttp.ClientResponseError as e:
+                    if 400 <= e.status < 500 and e.status not in _RETRYABLE_STATUSES:
+                        # Sending the same batch again would be rejected again; the orders are in the store
+                        self.dropped += len(batch)
+                        logger.warning(
+                            f"The kitchen rejected {len(batch)} orders ({e.status} {e.message}), not resending them"
+                        )
+                        break
+                    logger.warning(
+                        f"The kitchen at {self.url} failed: {e}; retrying in {backoff}s"
+                    )
+                except Exception as e:
+                    logger.warning(
+                        f"Could not reach the kitchen at {self.url}: {e}; retrying in {backoff}s"
+                    )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+
+    async def _watch_loop(self) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                async with self._http.get(
+                    f"{self.url}/events",
+                    params={"session": self.session_id},
+                    timeout=aiohttp.ClientTimeout(total=None),
+                ) as resp:
+                    resp.raise_for_status()
+                    backoff = 0.5
+                    data = ""
+                    async for raw in resp.content:
+                        line = raw.decode().rstrip("\r\n")
+                        if line.startswith("data:"):
+                            data += line[5:].strip()
+                        elif not line and data:
+                            await self._relay(json.loads(data))
+                            data = ""
+            except Exception as e:
+                logger.debug(f"Kitchen event stream failed: {e}")
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self._max_backoff)
+
+    async def _relay(self, entries: list[dict]) -> None:
+        for entry in entries:
+            if self._statuses.get(entry["order_id"]) == entry["status"]:
+                continue
+            self._statuses[entry["order_id"]] = entry["status"]
+            payload = {
+                "orderId": entry["order_id"],
+                "orderNumber": entry["order_number"],
+                "status": entry["status"],
+            }
+            try:
+                await self._publish(STATUS_TOPIC, json.dumps(payload).encode())
+            except Exception as e:
+                logger.warning(
+                    f"Could not publish the status of order {entry['order_id']}: {e}"
+                )
+                continue
+            self.published += 1
+
+    async def aclose(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._http is not None:
+            await self._http.close()
+
+    def summary(self) -> dict:
+        return {
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "pending": self._pending.qsize(),
+            "statuses_published": self.published,
+            "reconnects": self.reconnects,
+        }
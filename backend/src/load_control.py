@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+import psutil
+from livekit.agents import metrics
+from livekit.agents.utils.hw import get_cpu_monitor
+
+logger = logging.getLogger("agent.load")
+
+# Degradation levels, from least to most degraded
+NORMAL = 0
+# New sessions start without noise cancellation, the heaviest per-session CPU cost
+DEGRADED = 1
+# New sessions also detect turns from VAD silence alone, without the turn detector model
+SHEDDING = 2
+LEVEL_NAMES = ("normal", "degraded", "shedding")
+
+# A level is only left once the load is this far below the threshold that raised it, so it does not flap
+HYSTERESIS = 0.1
+# Reports older than this come from a process that stopped writing them
+STALE_SECONDS = 5.0
+REPORT_INTERVAL = 1.0
+LAG_PROBE_INTERVAL = 0.05
+# Silero VAD runs once per 512-sample window at 16 kHz; past half of that in inference, audio starts queueing
+VAD_WINDOW_SECONDS = 0.032
+
+STATE_FILE = "load-state.json"
+
+
+def _load_dir(directory: Union[str, Path, None]) -> Path:
+    # Next to the latency dumps, which the worker already aggregates across job processes
+    return Path(directory or os.getenv("LATENCY_DUMP_DIR", "metrics"))
+
+
+def _p95(samples) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(1, round(0.95 * len(ordered))) - 1]
+
+
+class JobLoadReporter:
+    """Event-loop lag and model inference times of one job process.
+
+    The worker's load function cannot see inside job processes, so `run`
+    writes a small report to a shared directory every REPORT_INTERVAL
+    seconds for WorkerLoad to read.
+    """
+
+    def __init__(self, window: int = 100) -> None:
+        self._window = window
+        self.loop_lag: deque[float] = deque(maxlen=window)
+        self.inference: dict[str, deque[float]] = {}
+
+    def observe_inference(self, kind: str, seconds: float) -> None:
+        samples = self.inference.get(kind)
+        if samples is None:
+            samples = self.inference[kind] = deque(maxlen=self._window)
+        samples.append(seconds)
+
+    def observe(self, ev_metrics) -> None:
+        """Record the VAD inference time carried by a `metrics_collected` event."""
+        if isinstance(ev_metrics, metrics.VADMetrics) and ev_metrics.inference_count:
+            self.observe_inference(
+                "vad", ev_metrics.inference_duration_total / ev_metrics.inference_count
+            )
+
+    def report(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "updated_at": time.time(),
+            "loop_lag_p95": _p95(self.loop_lag),
+            "inference_p95": {
+                kind: _p95(samples) for kind, samples in self.inference.items()
+            },
+        }
+
+    def write(self, directory: Union[str, Path, None] = None) -> Path:
+        directory = _load_dir(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"jobload-{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f)
+        os.replace(tmp, path)
+        return path
+
+    async def run(self, directory: Union[str, Path, None] = None) -> None:
+        """Probe the event loop's lag and write the report until cancelled, then remove it."""
+        path = _load_dir(directory) / f"jobload-{os.getpid()}.json"
+        next_report = time.perf_counter() + REPORT_INTERVAL
+        try:
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(LAG_PROBE_INTERVAL)
+                now = time.perf_counter()
+                self.loop_lag.append(max(0.0, now - start - LAG_PROBE_INTERVAL))
+                if now >= next_report:
+                    next_report = now + REPORT_INTERVAL
+                    await asyncio.to_thread(self.write, directory)
+        finally:
+            path.unlink(missing_ok=True)
+
+
+# One per job process, fed by the session's metrics and the turn detector
+job_load = JobLoadReporter()
+
+
+@dataclass
+class Degradation:
+    """What a new session leaves out to spare the worker's CPU."""
+
+    level: int = NORMAL
+
+    @property
+    def name(self) -> str:
+        return LEVEL_NAMES[self.level]
+
+    @property
+    def noise_cancellation(self) -> bool:
+        return self.level < DEGRADED
+
+    @property
+    def turn_detector(self) -> bool:
+        return self.level < SHEDDING
+
+
+def read_degradation(directory: Union[str, Path, None] = None) -> Degradation:
+    """The degradation level the worker last decided on; normal if it has not reported lately."""
+    try:
+        with open(_load_dir(directory) / STATE_FILE, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return Degradation()
+    if time.time() - state.get("updated_at", 0) > STALE_SECONDS:
+        return Degradation()
+    return Degradation(int(state.get("level", NORMAL)))
+
+
+class WorkerLoad:
+    """Load function for WorkerOptions, combining CPU, event-loop lag, sessions and inference time.
+
+    Each signal is scaled so that 1.0 means the worker is saturated:
+
+    - cpu: CPU of the worker and all its job and inference processes, over the CPUs available to it
+    - loop_lag: the worst job's p95 event-loop lag over `lag_budget`
+    - inference: the worst job's p95 VAD or turn detector inference time over its budget
+    - sessions: active jobs over `max_sessions`
+
+    The load is the largest of them, averaged over the last `samples` calls
+    (the worker calls it every 0.5 s), and the worker stops taking jobs once
+    it reaches WorkerOptions.load_threshold. Before that, at `degrade_at` and
+    `shed_at`, new sessions start in a cheaper configuration; see Degradation.
+    """
+
+    def __init__(
+        self,
+        *,
+        directory: Union[str, Path, None] = None,
+        max_sessions: Optional[int] = None,
+        lag_budget: Optional[float] = None,
+        inference_budgets: Optional[dict[str, float]] = None,
+        degrade_at: Optional[float] = None,
+        shed_at: Optional[float] = None,
+        samples: int = 5,
+    ) -> None:
+        self.directory = directory
+        self.max_sessions = max_sessions or int(os.getenv("WORKER_MAX_SESSIONS", "25"))
+        self.lag_budget = (
+            lag_budget or float(os.getenv("LOAD_LAG_BUDGET_MS", "100")) / 1000
+        )
+        self.inference_budgets = inference_budgets or {
+            "vad": VAD_WINDOW_SECONDS / 2,
+            "turn_detector": 0.3,
+        }
+        self.degrade_at = degrade_at or float(os.getenv("LOAD_DEGRADE_AT", "0.6"))
+        self.shed_at = shed_at or float(os.getenv("LOAD_SHED_AT", "0.7"))
+        self.level = NORMAL
+        self.load = 0.0
+        self.components: dict[str, float] = {}
+        self._samples: deque[float] = deque(maxlen=samples)
+        self._cpu_count = get_cpu_monitor().cpu_count()
+        self._processes: dict[int, psutil.Process] = {}
+
+    def cpu(self) -> float:
+        root = psutil.Process()
+        total = 0.0
+        seen = {}
+        for process in (root, *root.children(recursive=True)):
+            # cpu_percent measures since the previous call on the same Process object
+            process = self._processes.get(process.pid, process)
+            try:
+                total += process.cpu_percent(None)
+            except psutil.Error:
+                continue
+            seen[process.pid] = process
+        self._processes = seen
+        return total / 100 / self._cpu_count
+
+    def job_reports(self) -> list[dict]:
+        reports = []
+        now = time.time()
+        for path in _load_dir(self.directory).glob("jobload-*.json"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - report.get("updated_at", 0) <= STALE_SECONDS:
+                reports.append(report)
+        return reports
+
+    def measure(self, active_sessions: int) -> dict[str, float]:
+        reports = self.job_reports()
+        lags = [
+            report["loop_lag_p95"]
+            for report in reports
+            if report.get("loop_lag_p95") is not None
+        ]
+        inference = [
+            seconds / self.inference_budgets[kind]
+            for report in reports
+            for kind, seconds in report.get("inference_p95", {}).items()
+            if seconds is not None and kind in self.inference_budgets
+        ]
+        return {
+            "cpu": self.cpu(),
+            "loop_lag": max(lags, default=0.0) / self.lag_budget,
+            "inference": max(inference, default=0.0),
+            "sessions": active_sessions / self.max_sessions,
+        }
+
+    def update(self, active_sessions: int) -> float:
+        self.components = self.measure(active_sessions)
+        self._samples.append(max(self.components.values()))
+        self.load = min(1.0, sum(self._samples) / len(self._samples))
+        self._set_level(self.load)
+        self._write_state()
+        return self.load
+
+    def __call__(self, worker) -> float:
+        return self.update(len(worker.active_jobs))
+
+    def _set_level(self, load: float) -> None:
+        thresholds = (0.0, self.degrade_at, self.shed_at)
+        level = self.level
+        while level < SHEDDING and load >= thresholds[level + 1]:
+            level += 1
+        while level > NORMAL and load < thresholds[level] - HYSTERESIS:
+            level -= 1
+        if level != self.level:
+            log = logger.warning if level > self.level else logger.info
+            log(
+                f"Worker load {load:.2f} {self.components}, new sessions now start {LEVEL_NAMES[level]}"
+            )
+            self.level = level
+
+    def _write_state(self) -> None:
+        directory = _load_dir(self.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / STATE_FILE
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"updated_at": time.time(), "level": self.level, "load": self.load}, f
+            )
+        os.replace(tmp, path)
+
+    def summary(self) -> dict:
+        return {
+            "load": round(self.load, 3),
+            "level": LEVEL_NAMES[self.level],
+            **{name: round(value, 3) for name, value in self.components.items()},
+        }
@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Optional, Union
+
+from livekit.agents import metrics
+
+logger = logging.getLogger("agent.logging")
+
+# Attributes every LogRecord has; anything else came from `extra` or the job's log context fields
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger and message, then the
+    job's log context fields (room, session) and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Queues records as they are, so the listener thread formats them, and
+    drops them instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue, pipeline: "LogPipeline") -> None:
+        super().__init__(log_queue)
+        self._pipeline = pipeline
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler formats here, on the caller's thread; the message's args are
+        # only read later, so log values rather than objects that keep changing
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            self._pipeline.queued += 1
+        except queue.Full:
+            self._pipeline.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room rather than fail when stopping with a full queue
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """Takes log formatting and I/O off the event loop of a job process.
+
+    `start` swaps the root logger's handlers (in a job process, the one that
+    pickles every record over to the worker) for a handler that only puts
+    the record on a bounded queue. A listener thread formats the records and
+    passes them on to those handlers and, given a path, to a JSON-lines file.
+    Records that do not fit in the queue are dropped and counted.
+
+    `stop` drains the queue. The job process closes the handler that sends
+    records to the worker before its atexit handlers run, so the entrypoint
+    stops the pipeline as its last shutdown step instead, once every other
+    shutdown callback has logged what it had to.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None) -> None:
+        self.max_queue = max_queue or int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        self.queued = 0
+        self.dropped = 0
+        self._listener: Optional[_Listener] = None
+        self._queue_handler: Optional[_LazyQueueHandler] = None
+        self._handlers: list[logging.Handler] = []
+        self._json_handler: Optional[logging.Handler] = None
+
+    @property
+    def running(self) -> bool:
+        return self._listener is not None
+
+    def start(self, json_path: Union[str, Path, None] = None) -> None:
+        if self._listener is not None:
+            return
+        root = logging.getLogger()
+        self._handlers = list(root.handlers)
+        handlers = list(self._handlers)
+        if json_path is not None:
+            Path(json_path).parent.mkdir(parents=True, exist_ok=True)
+            self._json_handler = logging.FileHandler(json_path, encoding="utf-8")
+            self._json_handler.setFormatter(JsonFormatter())
+            handlers.append(self._json_handler)
+
+        log_queue: queue.Queue = queue.Queue(self.max_queue)
+        self._queue_handler = _LazyQueueHandler(log_queue, self)
+        for handler in self._handlers:
+            root.removeHandler(handler)
+        root.addHandler(self._queue_handler)
+        self._listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+
+    def stop(self) -> None:
+        """Write out what is still queued and give the root logger its handlers back."""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self._listener = None
+        root = logging.getLogger()
+        root.removeHandler(self._queue_handler)
+        for handler in self._handlers:
+            root.addHandler(handler)
+        if self._json_handler is not None:
+            self._json_handler.close()
+            self._json_handler = None
+        if self.dropped:
+            logger.warning(
+                f"Dropped {self.dropped} log records while the log queue was full"
+            )
+
+    def summary(self) -> dict:
+        return {
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "backlog": self._queue_handler.queue.qsize()
+            if self._listener is not None
+            else 0,
+        }
+
+
+# One per job process; started by the entrypoint and drained when the job shuts down
+log_pipeline = LogPipeline()
+
+
+class MetricsLogSampler:
+    """Decides which `metrics_collected` events get logged.
+
+    STT, TTS and VAD metrics arrive several times a turn in every session,
+    so only the first of each kind and then one in every `every` is logged.
+    LLM and end-of-turn metrics come once a turn and are always logged.
+    All of them are still collected; this only thins out the log lines.
+    """
+
+    HIGH_RATE = (metrics.STTMetrics, metrics.TTSMetrics, metrics.VADMetrics)
+
+    def __init__(self, every: Optional[int] = None) -> None:
+        self.every = every or int(os.getenv("LOG_METRICS_EVERY", "10"))
+        self.seen: dict[str, int] = {}
+        self.skipped = 0
+
+    def should_log(self, ev_metrics) -> bool:
+        if not isinstance(ev_metrics, self.HIGH_RATE):
+            return True
+        kind = type(ev_metrics).__name__
+        count = self.seen.get(kind, 0)
+        self.seen[kind] = count + 1
+        if count % self.every == 0:
+            return True
+        self.skipped += 1
+        return False
+
+    def summary(self) -> dict:
+        return {"seen": dict(self.seen), "skipped": self.skipped}
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import re
+import unicodedata
+from functools import cache
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+logger = logging.getLogger("agent.menu")
+
+DEFAULT_MENU_PATH = Path(__file__).with_name("menu.json")
+
+CATEGORIES = ("drinks", "sizes", "milks", "extras")
+
+# Words that carry no menu meaning ("a large latte please")
+_FILLER = {
+    "a",
+    "an",
+    "the",
+    "please",
+    "with",
+    "some",
+    "of",
+    "just",
+    "like",
+    "i'd",
+    "id",
+}
+
+# Scores given to non-exact matches; trigram matches score their Jaccard similarity
+PHONETIC_CONFIDENCE = 0.9
+MIN_CONFIDENCE = 0.5
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+class MenuMatch(NamedTuple):
+    value: str
+    confidence: float
+    method: str
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation, and drop filler words."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return " ".join(w for w in words if w not in _FILLER)
+
+
+def soundex(word: str) -> str:
+    if not word:
+        return ""
+    first, codes = word[0], []
+    previous = _SOUNDEX_CODES.get(first, "")
+    for char in word[1:]:
+        code = _SOUNDEX_CODES.get(char, "")
+        if code and code != previous:
+            codes.append(code)
+        if char not in "hw":
+            previous = code
+    return (first.upper() + "".join(codes) + "000")[:4]
+
+
+def phonetic_key(text: str) -> str:
+    return " ".join(soundex(word) for word in text.split())
+
+
+def trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class _CategoryIndex:
+    """Precomputed lookup tables for one menu category."""
+
+    def __init__(self, entries: list[dict]) -> None:
+        self.names: list[str] = [entry["name"] for entry in entries]
+        self.exact: dict[str, str] = {}
+        self.phonetic: dict[str, set[str]] = {}
+        self.trigram_postings: dict[str, set[int]] = {}
+        self.forms: list[tuple[str, frozenset]] = []
+
+        for entry in entries:
+            for form in [entry["name"], *entry.get("aliases", [])]:
+                key = normalize(form)
+                self.exact[key] = entry["name"]
+                self.phonetic.setdefault(phonetic_key(key), set()).add(entry["name"])
+                grams = trigrams(key)
+                form_id = len(self.forms)
+                self.forms.append((entry["name"], grams))
+                for gram in grams:
+                    self.trigram_postings.setdefault(gram, set()).add(form_id)
+
+    def match(self, text: str) -> Optional[MenuMatch]:
+        key = normalize(text)
+        if not key:
+            return None
+        value = self.exact.get(key)
+        if value:
+            return MenuMatch(value, 1.0, "exact")
+
+        phonetic = self.phonetic.get(phonetic_key(key))
+        if phonetic and len(phonetic) == 1:
+            return MenuMatch(next(iter(phonetic)), PHONETIC_CONFIDENCE, "phonetic")
+
+        # Only score forms that share at least one trigram with the input
+        grams = trigrams(key)
+        shared: dict[int, int] = {}
+        for gram in grams:
+            for form_id in self.trigram_postings.get(gram, ()):
+                shared[form_id] = shared.get(form_id, 0) + 1
+        best: Optional[MenuMatch] = None
+        for form_id, overlap in shared.items():
+            value, form_grams = self.forms[form_id]
+            score = overlap / (len(grams) + len(form_grams) - overlap)
+            if best is None or score > best.confidence:
+                best = MenuMatch(value, round(score, 3), "trigram")
+        if best and best.confidence >= MIN_CONFIDENCE:
+            return best
+        return None
+
+
+class MenuCatalog:
+    """The shop's menu, indexed once for canonicalizing what the customer said.
+
+    The same catalog drives the agent's prompt, tool argument validation, the
+    fast-path slot filler and receipt rendering, so adding a drink is a change
+    to the menu file only.
+    """
+
+    def __init__(self, data: dict) -> None:
+        self.version = data.get("version", 1)
+        self._entries = {category: data.get(category, []) for category in CATEGORIES}
+        self._indexes = {
+            category: _CategoryIndex(entries)
+            for category, entries in self._entries.items()
+        }
+        self._by_name = {
+            category: {entry["name"]: entry for entry in entries}
+            for category, entries in self._entries.items()
+        }
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "MenuCatalog":
+        path = Path(path)
+        with open(path, encoding="utf-8") as f:
+            if path.suffix in (".yaml", ".yml"):
+                import yaml  # optional, only needed for YAML menus
+
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        return cls(data)
+
+    def names(self, category: str) -> list[str]:
+        return self._indexes[category].names
+
+    def aliases(self, category: str) -> dict[str, list[str]]:
+        """Canonical name to every spoken form, including the name itself."""
+        return {
+            entry["name"]: [entry["name"], *entry.get("aliases", [])]
+            for entry in self._entries[category]
+        }
+
+    def entry(self, category: str, name: Optional[str]) -> dict:
+        return self._by_name[category].get(name, {})
+
+    def match(self, category: str, text: str) -> Optional[MenuMatch]:
+        """Canonicalize `text` against one category, or None if nothing is close enough."""
+        return self._indexes[category].match(text)
+
+    def drink_color(self, drink: Optional[str], default: str = "#c49a6c") -> str:
+        return self.entry("drinks", drink).get("color", default)
+
+    def cup(self, size: Optional[str]) -> dict:
+        return self.entry("sizes", size).get("cup") or self.entry(
+            "sizes", "medium"
+        ).get("cup", {})
+
+    def prompt_section(self) -> str:
+        """The menu as it is described to the LLM."""
+
+        def listing(category: str, conjunction: str = "or") -> str:
+            names = self.names(category)
+            return (
+                ", ".join(names[:-1]) + f", {conjunction} {names[-1]}"
+                if len(names) > 1
+                else "".join(names)
+            )
+
+        return (
+            f"1. Drink type ({listing('drinks')})\n"
+            f"2. Size ({listing('sizes')})\n"
+            f"3. Milk type ({listing('milks')})\n"
+            f"4. Any extras ({listing('extras')})"
+        )
+
+
+@cache
+def _load_catalog(path: str) -> MenuCatalog:
+    catalog = MenuCatalog.load(path)
+    logger.info(f"Loaded menu v{catalog.version} from {path}")
+    return catalog
+
+
+def get_catalog() -> MenuCatalog:
+    """The process-wide catalog, loaded once from MENU_PATH or the bundled menu.json."""
+    return _load_catalog(os.getenv("MENU_PATH", str(DEFAULT_MENU_PATH)))
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from functools import cache
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+logger = logging.getLogger("agent.order_codec")
+
+# Version 1 orders held a single drink at the top level; version 2 has a list of items
+SCHEMA_VERSION = 2
+
+_ITEM_FIELDS = {"drinkType": str, "size": str, "milk": str}
+
+
+class OrderSchemaError(ValueError):
+    pass
+
+
+class OrderCodec(ABC):
+    """Turns saved orders into JSON bytes and back."""
+
+    name: str
+
+    @abstractmethod
+    def dumps(self, obj: Any, *, pretty: bool = False) -> bytes: ...
+
+    @abstractmethod
+    def loads(self, data: Union[bytes, str]) -> Any: ...
+
+
+class StdlibCodec(OrderCodec):
+    name = "json"
+
+    def dumps(self, obj: Any, *, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(obj, indent=2).encode()
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(OrderCodec):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise RuntimeError(
+                "OrjsonCodec needs the orjson package; use ORDER_CODEC=json without it"
+            )
+
+    def dumps(self, obj: Any, *, pretty: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+class MsgspecCodec(OrderCodec):
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        if msgspec is None:
+            raise RuntimeError(
+                "MsgspecCodec needs the msgspec package; use ORDER_CODEC=json without it"
+            )
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any, *, pretty: bool = False) -> bytes:
+        data = self._encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self._decoder.decode(data)
+
+
+ORDER_CODECS = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "json": StdlibCodec,
+}
+
+
+def _default_codec() -> str:
+    if orjson is not None:
+        return "orjson"
+    if msgspec is not None:
+        return "msgspec"
+    return "json"
+
+
+def create_codec(kind: Optional[str] = None) -> OrderCodec:
+    """Build the codec selected by `kind` or the ORDER_CODEC env var, by default the fastest installed."""
+    kind = (kind or os.getenv("ORDER_CODEC") or _default_codec()).lower()
+    try:
+        codec_cls = ORDER_CODECS[kind]
+    except KeyError:
+        raise ValueError(
+            f"Unknown order codec {kind!r}, expected one of {', '.join(ORDER_CODECS)}"
+        ) from None
+    return codec_cls()
+
+
+@cache
+def get_codec() -> OrderCodec:
+    """The process-wide codec used by the order stores and analytics."""
+    codec = create_codec()
+    logger.info(f"Encoding orders with {codec.name}")
+    return codec
+
+
+def upgrade_order(order: dict) -> dict:
+    """Return `order` in the current schema; orders already in it are returned as they are."""
+    version = order.get("schema", 1 if "items" not in order else SCHEMA_VERSION)
+    if version == SCHEMA_VERSION:
+        return order
+    if version != 1:
+        raise OrderSchemaError(f"Unknown order schema version {version!r}")
+    upgraded = {
+        key: value
+        for key, value in order.items()
+        if key not in ("drinkType", "size", "milk", "extras")
+    }
+    upgraded["schema"] = SCHEMA_VERSION
+    upgraded["items"] = [
+        {
+            "drinkType": order.get("drinkType"),
+            "size": order.get("size"),
+            "milk": order.get("milk"),
+            "extras": list(order.get("extras") or []),
+            "quantity": 1,
+        }
+    ]
+    return upgraded
+
+
+def validate_order(order: dict) -> None:
+    """Check that `order` has the shape of a current-schema order, raising OrderSchemaError if not."""
+    if order.get("schema", SCHEMA_VERSION) != SCHEMA_VERSION:
+        raise OrderSchemaError(
+            f"Expected schema {SCHEMA_VERSION}, got {order.get('schema')!r}"
+        )
+    if order.get("name") is not None and not isinstance(order["name"], str):
+        raise OrderSchemaError(f"name must be a string, got {order['name']!r}")
+    items = order.get("items")
+    if not isinstance(items, list):
+        raise OrderSchemaError(f"items must be a list, got {items!r}")
+    for number, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise OrderSchemaError(f"Item {number} must be an object, got {item!r}")
+        for field, kind in _ITEM_FIELDS.items():
+            if item.get(field) is not None and not isinstance(item[field], kind):
+                raise OrderSchemaError(
+                    f"Item {number} {field} must be a string, got {item[field]!r}"
+                )
+        extras = item.get("extras", [])
+        if not isinstance(extras, list) or not all(
+            isinstance(extra, str) for extra in extras
+        ):
+            raise OrderSchemaError(
+                f"Item {number} extras must be a list of strings, got {extras!r}"
+            )
+        quantity = item.get("quantity", 1)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            raise OrderSchemaError(
+                f"Item {number} quantity must be a positive integer, got {quantity!r}"
+            )
+
+
+def check_round_trip(
+    order: dict, codec: Optional[OrderCodec] = None, *, pretty: bool = False
+) -> bytes:
+    """Encode a valid order and make sure it decodes to the same value; returns the encoding."""
+    codec = codec or get_codec()
+    validate_order(order)
+    data = codec.dumps(order, pretty=pretty)
+    decoded = codec.loads(data)
+    if decoded != order:
+        raise OrderSchemaError(
+            f"{codec.name} does not round-trip {order!r}, got {decoded!r}"
+        )
+    return data
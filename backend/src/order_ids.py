@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from functools import cache
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger("agent.order_ids")
+
+
+class OrderIdSequence(ABC):
+    """Hands out order IDs that are unique and increasing across every worker process on a host.
+
+    `next_id` blocks on a lock shared between processes, so coroutines should
+    use `allocate`, which runs it in a thread. Each instance also counts the
+    IDs it handed out, which is the per-worker order counter.
+    """
+
+    def __init__(self) -> None:
+        self.allocated = 0
+        self.last_id: Optional[int] = None
+
+    async def allocate(self) -> int:
+        order_id = await asyncio.to_thread(self.next_id)
+        self.allocated += 1
+        self.last_id = order_id
+        return order_id
+
+    @abstractmethod
+    def next_id(self) -> int:
+        """Reserve and return the next ID."""
+
+    def summary(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "allocated": self.allocated,
+            "last_id": self.last_id,
+        }
+
+
+class FileLockSequence(OrderIdSequence):
+    """The last ID as text in a file, incremented under an exclusive `flock`."""
+
+    def __init__(self, path: Union[str, Path] = "orders/order_id.seq") -> None:
+        super().__init__()
+        if fcntl is None:
+            raise RuntimeError(
+                "FileLockSequence needs fcntl; use ORDER_ID_SEQUENCE=sqlite on this platform"
+            )
+        self.path = Path(path)
+
+    def next_id(self) -> int:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            current = os.read(fd, 32).strip()
+            order_id = int(current) + 1 if current else 1
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(order_id).encode())
+            os.fsync(fd)
+            return order_id
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+
+class SQLiteSequence(OrderIdSequence):
+    """A counter row in a SQLite database, incremented in an immediate transaction."""
+
+    def __init__(
+        self, path: Union[str, Path] = "orders/order_ids.db", *, name: str = "orders"
+    ) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self.name = name
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection per process, so threads of this process take turns on it
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode, so the BEGIN IMMEDIATE below is the only transaction
+        conn = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        return conn
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO sequences (name, value) VALUES (?, 0)",
+                    (self.name,),
+                )
+                conn.execute(
+                    "UPDATE sequences SET value = value + 1 WHERE name = ?",
+                    (self.name,),
+                )
+                (order_id,) = conn.execute(
+                    "SELECT value FROM sequences WHERE name = ?", (self.name,)
+                ).fetchone()
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return order_id
+
+
+ORDER_ID_SEQUENCES = {
+    "file": FileLockSequence,
+    "sqlite": SQLiteSequence,
+}
+
+
+def create_order_id_sequence(kind: Optional[str] = None, **kwargs) -> OrderIdSequence:
+    """Build the sequence selected by `kind` or the ORDER_ID_SEQUENCE env var."""
+    kind = (
+        kind
+        or os.getenv("ORDER_ID_SEQUENCE", "file" if fcntl is not None else "sqlite")
+    ).lower()
+    try:
+        sequence_cls = ORDER_ID_SEQUENCES[kind]
+    except KeyError:
+        raise ValueError(
+            f"Unknown order ID sequence {kind!r}, expected one of {', '.join(ORDER_ID_SEQUENCES)}"
+        ) from None
+    if "path" not in kwargs and os.getenv("ORDER_ID_PATH"):
+        kwargs["path"] = os.getenv("ORDER_ID_PATH")
+    return sequence_cls(**kwargs)
+
+
+@cache
+def get_order_id_sequence() -> OrderIdSequence:
+    """The process-wide sequence, shared by every job this worker runs."""
+    sequence = create_order_id_sequence()
+    logger.info(f"Order IDs from {type(sequence).__name__} at {sequence.path}")
+    return sequence
+
+
+def format_order_number(order_id: int) -> str:
+    """The order number printed on the receipt."""
+    return f"{order_id:06d}"
@@ -0,0 +1,416 @@
+import asyncio
+import datetime
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from order_codec import OrderCodec, get_codec, upgrade_order, validate_order
+
+logger = logging.getLogger("agent.order_store")
+
+
+class OrderStore(ABC):
+    """Persists saved orders off the event loop.
+
+    Every backend owns a single writer thread. Coroutines hand records to it
+    through a queue and await the result, so the voice pipeline never blocks
+    on disk I/O. The writer drains whatever is queued into one batch, which
+    lets the backends amortise fsyncs and transactions across bursts. Each
+    order in a batch succeeds or fails on its own, so a caller only sees an
+    error for an order that is not on disk.
+    """
+
+    def __init__(
+        self, *, max_batch: int = 64, codec: Optional[OrderCodec] = None
+    ) -> None:
+        self._max_batch = max_batch
+        self._codec = codec or get_codec()
+        self._queue: queue.SimpleQueue[Optional[tuple[dict, Future]]] = (
+            queue.SimpleQueue()
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._closed = False
+
+    async def save(self, order: dict) -> str:
+        """Persist one order and return the location it was written to."""
+        if self._closed:
+            raise RuntimeError("order store is closed")
+        # Reject a malformed order here, where the caller can still fix it, not in the writer thread
+        validate_order(order)
+        self._ensure_writer()
+        fut: Future = Future()
+        self._queue.put((order, fut))
+        return await asyncio.wrap_future(fut)
+
+    async def load_orders(self) -> list[dict]:
+        """Return every saved order, oldest first."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.read_orders)
+
+    @abstractmethod
+    def read_orders(self) -> list[dict]:
+        """Blocking read of every saved order, for offline tools and executors.
+
+        Orders saved under an older schema are returned upgraded to the current one.
+        """
+
+    def _decode(self, data: bytes) -> dict:
+        return upgrade_order(self._codec.loads(data))
+
+    async def aclose(self) -> None:
+        """Flush pending writes and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+
+    @abstractmethod
+    def _write_batch(self, orders: list[dict]) -> list[Union[str, Exception]]:
+        """Write a batch of orders from the writer thread.
+
+        Returns, for each order, its location or the exception that kept it off disk.
+        """
+
+    def _close_writer(self) -> None:  # noqa: B027 - optional hook, most backends hold nothing open
+        """Release backend resources from the writer thread."""
+
+    def _ensure_writer(self) -> None:
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._writer_loop,
+                    name=f"{type(self).__name__}-writer",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def _writer_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self._max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            # A save() cancelled before its future is claimed is skipped; once claimed
+            # the future can no longer be cancelled, so the order is written and resolved
+            batch = [
+                (order, fut)
+                for order, fut in batch
+                if fut.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            try:
+                results = self._write_batch([order for order, _ in batch])
+            except Exception as e:
+                logger.exception("Failed to write order batch")
+                results = [e] * len(batch)
+            for (order, fut), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.error(
+                        "Failed to write order for %s",
+                        order.get("name"),
+                        exc_info=result,
+                    )
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+
+        try:
+            self._close_writer()
+        except Exception:
+            logger.exception("Failed to close order store")
+
+
+def _segment_index(path: Path) -> int:
+    return int(path.stem.rsplit("-", 1)[1])
+
+
+def _safe_filename(value: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", value).strip("._") or "order"
+
+
+class JsonFileOrderStore(OrderStore):
+    """One pretty-printed JSON file per order, named `{name}_{order_id}.json`.
+
+    Orders without an `order_id` are named after the time they were saved
+    instead; files are never overwritten, a clash gets a numeric suffix.
+    """
+
+    def __init__(self, directory: Union[str, Path] = "orders", **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._directory = Path(directory)
+
+    def _write_batch(self, orders: list[dict]) -> list[Union[str, Exception]]:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        results: list[Union[str, Exception]] = []
+        for order in orders:
+            try:
+                results.append(self._write_one(order))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _write_one(self, order: dict) -> str:
+        if order.get("order_id") is not None:
+            suffix = str(order["order_id"])
+        else:
+            suffix = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        stem = f"{_safe_filename(str(order.get('name')))}_{suffix}"
+        data = self._codec.dumps(order, pretty=True)
+        filepath = self._directory / f"{stem}.json"
+        attempt = 1
+        while True:
+            try:
+                with open(filepath, "xb") as f:
+                    f.write(data)
+            except FileExistsError:
+                attempt += 1
+                filepath = self._directory / f"{stem}_{attempt}.json"
+                continue
+            return str(filepath)
+
+    def read_orders(self) -> list[dict]:
+        if not self._directory.is_dir():
+            return []
+        files = sorted(self._directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        return [self._decode(path.read_bytes()) for path in files]
+
+
+class JsonlOrderStore(OrderStore):
+    """Append-only JSONL segment log, shared by every worker process writing to `directory`.
+
+    Orders are appended to `orders-<n>.jsonl` segments that roll over once they
+    reach `segment_bytes`. Each batch goes out as one unbuffered append under
+    an exclusive `flock` on `orders.lock`, so batches from different processes
+    never interleave, every returned offset points at its own record and only
+    one process rolls a segment over. Each batch is written with a single
+    fsync. A non-zero `fsync_interval` lets consecutive batches share one fsync
+    under sustained load; anything left unsynced is flushed by the next batch
+    or on close.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = "orders",
+        *,
+        segment_bytes: int = 64 * 1024 * 1024,
+        fsync_interval: float = 0.0,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self._directory = Path(directory)
+        self._segment_bytes = segment_bytes
+        self._fsync_interval = fsync_interval
+        self._fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._segment_index = 0
+        self._last_fsync = 0.0
+        self._unsynced = False
+
+    def _segments(self) -> list[Path]:
+        return sorted(self._directory.glob("orders-*.jsonl"), key=_segment_index)
+
+    def _segment_path(self, index: int) -> Path:
+        return self._directory / f"orders-{index:06d}.jsonl"
+
+    def _open_segment(self) -> None:
+        """Point at the newest segment, rolling over when it is full; called under the lock."""
+        if self._fd is None:
+            segments = self._segments()
+            if segments:
+                self._segment_index = _segment_index(segments[-1])
+        # Another process may have rolled over since this one last wrote
+        while self._segment_path(self._segment_index + 1).exists():
+            self._close_segment()
+            self._segment_index += 1
+        if self._fd is not None and os.fstat(self._fd).st_size >= self._segment_bytes:
+            self._close_segment()
+            self._segment_index += 1
+        if self._fd is None:
+            self._fd = os.open(
+                self._segment_path(self._segment_index),
+                os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                0o644,
+            )
+
+    def _close_segment(self) -> None:
+        if self._fd is not None:
+            if self._unsynced:
+                self._sync()
+            os.close(self._fd)
+            self._fd = None
+
+    def _sync(self) -> None:
+        os.fsync(self._fd)
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+    def _write_batch(self, orders: list[dict]) -> list[Union[str, Exception]]:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        results: list[Union[int, Exception]] = []
+        data = bytearray()
+        for order in orders:
+            try:
+                line = self._codec.dumps(order) + b"\n"
+            except Exception as e:
+                results.append(e)
+                continue
+            results.append(len(data))
+            data += line
+        if not data:
+            return results
+
+        if self._lock_fd is None:
+            self._lock_fd = os.open(
+                self._directory / "orders.lock", os.O_RDWR | os.O_CREAT, 0o644
+            )
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            self._open_segment()
+            offset = os.fstat(self._fd).st_size
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view) :]
+            except OSError:
+                # Leave no partial line for the next append to run into
+                os.ftruncate(self._fd, offset)
+                raise
+            if time.monotonic() - self._last_fsync >= self._fsync_interval:
+                self._sync()
+            else:
+                self._unsynced = True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+        path = self._segment_path(self._segment_index)
+        return [
+            r if isinstance(r, Exception) else f"{path}:{offset + r}" for r in results
+        ]
+
+    def _close_writer(self) -> None:
+        self._close_segment()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def read_orders(self) -> list[dict]:
+        if not self._directory.is_dir():
+            return []
+        orders = []
+        for path in self._segments():
+            with open(path, "rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        orders.append(self._decode(line))
+        return orders
+
+
+class SQLiteOrderStore(OrderStore):
+    """Orders in a single SQLite database running in WAL mode."""
+
+    def __init__(self, path: Union[str, Path] = "orders/orders.db", **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " saved_at TEXT NOT NULL,"
+            " name TEXT,"
+            " payload TEXT NOT NULL)"
+        )
+        return conn
+
+    def _write_batch(self, orders: list[dict]) -> list[Union[str, Exception]]:
+        if self._conn is None:
+            self._conn = self._connect()
+        saved_at = datetime.datetime.now().isoformat(timespec="seconds")
+        results: list[Union[str, Exception]] = []
+        payloads = []
+        for order in orders:
+            try:
+                payload = self._codec.dumps(order).decode()
+            except Exception as e:
+                results.append(e)
+                continue
+            payloads.append((len(results), order.get("name"), payload))
+            results.append("")
+        # One transaction: if it fails it is rolled back, and every order in it fails with it
+        with self._conn:
+            for position, name, payload in payloads:
+                cur = self._conn.execute(
+                    "INSERT INTO orders (saved_at, name, payload) VALUES (?, ?, ?)",
+                    (saved_at, name, payload),
+                )
+                results[position] = f"{self._path}#{cur.lastrowid}"
+        return results
+
+    def _close_writer(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def read_orders(self) -> list[dict]:
+        if not self._path.exists():
+            return []
+        conn = sqlite3.connect(self._path)
+        try:
+            rows = conn.execute("SELECT payload FROM orders ORDER BY id").fetchall()
+        finally:
+            conn.close()
+        return [self._decode(payload) for (payload,) in rows]
+
+
+ORDER_STORE_BACKENDS = {
+    "json": JsonFileOrderStore,
+    "jsonl": JsonlOrderStore,
+    "sqlite": SQLiteOrderStore,
+}
+
+
+def create_order_store(backend: Optional[str] = None, **kwargs) -> OrderStore:
+    """Build the order store selected by `backend` or the ORDER_STORE env var."""
+    backend = (backend or os.getenv("ORDER_STORE", "json")).lower()
+    try:
+        store_cls = ORDER_STORE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown order store {backend!r}, expected one of {', '.join(ORDER_STORE_BACKENDS)}"
+        ) from None
+    return store_cls(**kwargs)
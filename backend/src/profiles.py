@@ -0,0 +1,414 @@
+import asyncio
+import datetime
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from cart import Cart
+from order_codec import upgrade_order
+
+logger = logging.getLogger("agent.profiles")
+
+# Distinct orders remembered per customer; the least favoured is forgotten first
+MAX_ORDERS_PER_PROFILE = 8
+
+
+def normalize_name(name: str) -> str:
+    """Names as the STT writes them vary in case and punctuation ("Sam.", "sam")."""
+    return " ".join(re.sub(r"[^\w\s'-]", " ", name).split()).casefold()
+
+
+def _signature(items: list[dict]) -> str:
+    """Identity of an order's drinks, ignoring the order of line items and extras."""
+    return json.dumps(
+        sorted(
+            [
+                item.get("drinkType"),
+                item.get("size"),
+                item.get("milk"),
+                sorted(item.get("extras") or []),
+                item.get("quantity", 1),
+            ]
+            for item in items
+        )
+    )
+
+
+class CustomerProfile:
+    """What one customer has ordered, each distinct order scored with exponential recency decay.
+
+    Every order adds 1 to its score, and scores halve every `half_life`
+    seconds, so a regular who switched drinks a few weeks ago gets offered the
+    new favourite rather than the one they ordered most often overall.
+    """
+
+    def __init__(self, name: str, half_life: float) -> None:
+        self.name = name
+        self.half_life = half_life
+        self.orders: dict[str, dict] = {}
+        self.order_count = 0
+        self.last_seen = 0.0
+
+    def _score(self, entry: dict, now: float) -> float:
+        return entry["score"] * math.pow(
+            0.5, max(0.0, now - entry["as_of"]) / self.half_life
+        )
+
+    def record(self, items: list[dict], placed_at: float) -> None:
+        key = _signature(items)
+        entry = self.orders.get(key)
+        if entry is None:
+            entry = self.orders[key] = {
+                "items": items,
+                "score": 0.0,
+                "as_of": placed_at,
+            }
+        entry["score"] = self._score(entry, placed_at) + 1.0
+        entry["as_of"] = max(entry["as_of"], placed_at)
+        self.order_count += 1
+        self.last_seen = max(self.last_seen, placed_at)
+        if len(self.orders) > MAX_ORDERS_PER_PROFILE:
+            del self.orders[
+                min(self.orders, key=lambda k: self._score(self.orders[k], placed_at))
+            ]
+
+    def usual(self, now: Optional[float] = None) -> Optional[list[dict]]:
+        """Line items of the favourite order, or None for a first-time customer."""
+        if not self.orders:
+            return None
+        now = time.time() if now is None else now
+        return max(self.orders.values(), key=lambda entry: self._score(entry, now))[
+            "items"
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "orders": self.orders,
+            "order_count": self.order_count,
+            "last_seen": self.last_seen,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, half_life: float) -> "CustomerProfile":
+        profile = cls(data["name"], half_life)
+        profile.orders = data["orders"]
+        profile.order_count = data["order_count"]
+        profile.last_seen = data["last_seen"]
+        return profile
+
+
+def _identity(order: dict) -> str:
+    """Tells a saved order apart from others, to add each one to the profiles once."""
+    return json.dumps(
+        [
+            order.get("order_id"),
+            normalize_name(order.get("name") or ""),
+            order.get("placed_at"),
+            _signature(order["items"]),
+        ]
+    )
+
+
+def _placed_at(order: dict) -> float:
+    try:
+        return datetime.datetime.fromisoformat(order["placed_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class ProfileIndex:
+    """Customer profiles by name: an in-memory LRU in front of a SQLite table shared by all workers.
+
+    The table lives next to the order store (PROFILE_DB, default
+    orders/profiles.db) and is built from the saved orders the first time it is
+    opened, in the background (`start_build`); after that every saved order
+    updates it. Orders recorded while the build scans the store are queued in a
+    `pending` table and added by the build. Lookups that miss the LRU and all
+    writes run in a thread.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path, None] = None,
+        *,
+        capacity: Optional[int] = None,
+        half_life_days: Optional[float] = None,
+    ) -> None:
+        self.path = Path(path or os.getenv("PROFILE_DB", "orders/profiles.db"))
+        self.capacity = (
+            capacity
+            if capacity is not None
+            else int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
+        )
+        self.half_life = 86400 * (
+            half_life_days
+            if half_life_days is not None
+            else float(os.getenv("PROFILE_HALF_LIFE_DAYS", "30"))
+        )
+        self._cache: OrderedDict[str, Optional[CustomerProfile]] = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._ready = threading.Event()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, payload TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, profile: Optional[CustomerProfile]) -> None:
+        self._cache[key] = profile
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    @property
+    def ready(self) -> bool:
+        """True once the table has been built, by this process or another one."""
+        return self._ready.is_set()
+
+    def _is_built(self, conn: sqlite3.Connection) -> bool:
+        if (
+            not self._ready.is_set()
+            and conn.execute("SELECT 1 FROM meta WHERE key = 'built'").fetchone()
+        ):
+            self._ready.set()
+        return self._ready.is_set()
+
+    def _add_orders(
+        self, profiles: dict[str, CustomerProfile], orders: list[dict]
+    ) -> None:
+        for order in orders:
+            if not order.get("name"):
+                continue
+            key = normalize_name(order["name"])
+            profile = profiles.setdefault(
+                key, CustomerProfile(order["name"], self.half_life)
+            )
+            profile.record(Cart.from_dict(order).to_dict()["items"], _placed_at(order))
+
+    def build(self, read_orders: Callable[[], list[dict]]) -> int:
+        """Fill the table from past orders, unless another process already has.
+
+        The store is scanned before the write lock is taken, so other workers
+        keep saving orders meanwhile; the lock is only held to write the result.
+        """
+        with self._build_lock:
+            with self._lock:
+                if self._is_built(self._connect()):
+                    return 0
+            # read_orders may come from anywhere, including stores written before carts existed
+            orders = [upgrade_order(order) for order in read_orders()]
+            scanned = {_identity(order) for order in orders}
+            profiles: dict[str, CustomerProfile] = {}
+            self._add_orders(profiles, orders)
+
+            with self._lock:
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if self._is_built(conn):
+                        conn.execute("COMMIT")
+                        return 0
+                    pending = [
+                        upgrade_order(json.loads(payload))
+                        for (payload,) in conn.execute(
+                            "SELECT payload FROM pending ORDER BY id"
+                        )
+                    ]
+                    self._add_orders(
+                        profiles,
+                        [order for order in pending if _identity(order) not in scanned],
+                    )
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO profiles (name, payload) VALUES (?, ?)",
+                        [
+                            (key, json.dumps(profile.to_dict()))
+                            for key, profile in profiles.items()
+                        ],
+                    )
+                    conn.execute("DELETE FROM pending")
+                    conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('built', ?)",
+                        (str(time.time()),),
+                    )
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+                self._ready.set()
+        logger.info(
+            f"Built {len(profiles)} customer profiles from {len(orders)} saved orders"
+        )
+        return len(profiles)
+
+    def start_build(self, read_orders: Callable[[], list[dict]]) -> None:
+        """Build the table on a background thread; lookups wait for `ready` instead of for the build."""
+
+        def run() -> None:
+            try:
+                self.build(read_orders)
+            except Exception:
+                logger.exception("Could not build the customer profiles")
+
+        threading.Thread(target=run, name="profile-build", daemon=True).start()
+
+    async def ensure_built(self, read_orders: Callable[[], list[dict]]) -> None:
+        if not self.ready:
+            await asyncio.to_thread(self.build, read_orders)
+
+    def _load(self, key: str) -> Optional[CustomerProfile]:
+        with self._lock:
+            row = (
+                self._connect()
+                .execute("SELECT payload FROM profiles WHERE name = ?", (key,))
+                .fetchone()
+            )
+        return (
+            CustomerProfile.from_dict(json.loads(row[0]), self.half_life)
+            if row
+            else None
+        )
+
+    async def lookup(self, name: str) -> Optional[CustomerProfile]:
+        key = normalize_name(name)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        self.misses += 1
+        profile = await asyncio.to_thread(self._load, key)
+        self._remember(key, profile)
+        return profile
+
+    def _record(self, key: str, order: dict) -> Optional[CustomerProfile]:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._is_built(conn):
+                    # The build may have scanned the store before this order was saved; it adds it from here
+                    conn.execute(
+                        "INSERT INTO pending (payload) VALUES (?)",
+                        (json.dumps(order, default=str),),
+                    )
+                    conn.execute("COMMIT")
+                    return None
+                row = conn.execute(
+                    "SELECT payload FROM profiles WHERE name = ?", (key,)
+                ).fetchone()
+                if row:
+                    profile = CustomerProfile.from_dict(
+                        json.loads(row[0]), self.half_life
+                    )
+                else:
+                    profile = CustomerProfile(order["name"], self.half_life)
+                profile.record(order["items"], _placed_at(order))
+                conn.execute(
+                    "INSERT OR REPLACE INTO profiles (name, payload) VALUES (?, ?)",
+                    (key, json.dumps(profile.to_dict())),
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return profile
+
+    async def record(self, order: dict) -> None:
+        """Add a just-saved order to its customer's profile."""
+        if not order.get("name"):
+            return
+        key = normalize_name(order["name"])
+        profile = await asyncio.to_thread(self._record, key, order)
+        if profile is not None:
+            self._remember(key, profile)
+
+    def summary(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+@cache
+def get_profile_index() -> ProfileIndex:
+    """The process-wide profile index, shared by every job this worker runs."""
+    return ProfileIndex()
+
+
+class UsualOrderStats:
+    """How often "the usual" was offered and taken, and the turns and seconds that saved."""
+
+    def __init__(self) -> None:
+        self.offered = 0
+        self.accepted = 0
+        self.slots_filled = 0
+        self.turns_saved = 0
+        self._turn_gaps_total = 0.0
+        self._turn_gaps = 0
+        self._last_user_turn: Optional[float] = None
+
+    def observe_user_turn(self, at: Optional[float] = None) -> None:
+        """Feed the time of every user turn; the gaps between them are the cost of one more question."""
+        at = time.monotonic() if at is None else at
+        if self._last_user_turn is not None:
+            self._turn_gaps_total += at - self._last_user_turn
+            self._turn_gaps += 1
+        self._last_user_turn = at
+
+    def observe_accepted(self, slots: int) -> None:
+        # Every slot would otherwise be one question and answer; taking the usual costs one
+        self.accepted += 1
+        self.slots_filled += slots
+        self.turns_saved += max(0, slots - 1)
+
+    def summary(self) -> dict:
+        seconds_per_turn = (
+            self._turn_gaps_total / self._turn_gaps if self._turn_gaps else 0.0
+        )
+        return {
+            "offered": self.offered,
+            "accepted": self.accepted,
+            "slots_filled": self.slots_filled,
+            "turns_saved": self.turns_saved,
+            "turns_saved_per_order": round(self.turns_saved / self.accepted, 2)
+            if self.accepted
+            else 0.0,
+            "est_seconds_per_turn": round(seconds_per_turn, 2),
+            "est_seconds_saved": round(self.turns_saved * seconds_per_turn, 1),
+            "est_seconds_saved_per_order": (
+                round(self.turns_saved * seconds_per_turn / self.accepted, 1)
+                if self.accepted
+                else 0.0
+            ),
+        }
@@ -0,0 +1,339 @@
+import datetime
+import html
+import json
+import logging
+import os
+import re
+import string
+from functools import lru_cache
+from typing import Optional
+
+from menu import get_catalog
+
+logger = logging.getLogger("agent.receipts")
+
+# Bump whenever the compact payload or the frontend's receipt card changes shape
+TEMPLATE_VERSION = 2
+
+# LiveKit drops reliable data packets above ~15KiB, keep some headroom
+MAX_PAYLOAD_BYTES = 14_000
+
+HTML_TOPIC = "order-visualization"
+COMPACT_TOPIC = "order-receipt"
+
+_SHELL = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        @keyframes slideIn {{
+            from {{ opacity: 0; transform: translateY(20px); }}
+            to {{ opacity: 1; transform: translateY(0); }}
+        }}
+        .coffee-container {{
+            animation: slideIn 0.6s ease-out;
+        }}
+    </style>
+</head>
+<body style="margin: 0; padding: 0;">
+<div class="coffee-container" style="display: flex; flex-direction: column; align-items: center; padding: 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 20px; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;">
+    <h2 style="color: white; margin-bottom: 25px; text-shadow: 2px 2px 8px rgba(0,0,0,0.4); font-size: 28px; letter-spacing: 1px;">☕ Your Perfect Coffee</h2>
+    {cup}
+    <!-- Order Details -->
+    <div style="background: white; padding: 25px; border-radius: 18px; width: 100%; max-width: 450px; box-shadow: 0 10px 40px rgba(0,0,0,0.3); animation: slideIn 0.8s ease-out 0.2s both;">
+        <h3 style="margin-top: 0; color: #4a2c2a; border-bottom: 3px solid #667eea; padding-bottom: 12px; font-size: 24px; display: flex; align-items: center; gap: 10px;">
+            <span style="font-size: 28px;">📋</span> Order Summary
+        </h3>
+        <div style="margin: 20px 0;">
+            <div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f8f9ff 0%, #f0f2ff 100%); border-radius: 10px; border-left: 4px solid #667eea;">
+                <strong style="color: #555; font-size: 16px;">👤 Customer:</strong>
+                <span style="color: #222; font-weight: 600; font-size: 16px;">{name}</span>
+            </div>
+            {items}
+        </div>
+        <div style="margin-top: 25px; padding-top: 20px; border-top: 2px dashed #ddd; text-align: center;">
+            <p style="color: #667eea; font-weight: bold; font-size: 22px; margin: 8px 0; text-shadow: 1px 1px 2px rgba(0,0,0,0.1);">
+                Order #{order_number}
+            </p>
+            <p style="color: #999; font-size: 14px; margin: 5px 0; font-weight: 500;">
+                {placed_at}
+            </p>
+        </div>
+    </div>
+    <p style="color: white; margin-top: 25px; font-size: 16px; text-align: center; text-shadow: 1px 1px 3px rgba(0,0,0,0.3); font-weight: 500;">
+        ✨ Thank you for ordering from Murf Coffee Shop! ✨
+    </p>
+</div>
+</body>
+</html>
+"""
+
+_CUP = """
+<!-- Beverage Visualization -->
+<div style="position: relative; margin-bottom: 35px; transform-style: preserve-3d;">
+    <!-- Coffee Cup - Modern Minimalist Style -->
+    <div style="position: relative; width: {width}; height: {height};
+        background: linear-gradient(165deg, {color} 0%, {color}dd 100%);
+        border-radius: 8px 8px 35px 35px;
+        box-shadow: 0 25px 50px rgba(0,0,0,0.35), inset -8px 0 15px rgba(0,0,0,0.2), inset 8px 0 15px rgba(255,255,255,0.1);
+        border: 3px solid rgba(139,111,71,0.8);
+        overflow: visible;">
+        <!-- Foam/Milk Layer - Realistic -->
+        <div style="position: absolute; top: 0; left: 0; right: 0; height: 22%;
+            background: linear-gradient(180deg, rgba(255,248,240,0.95) 0%, rgba(245,235,220,0.85) 40%, rgba(240,230,215,0.6) 70%, transparent 100%);
+            border-radius: 8px 8px 50% 50% / 8px 8px 35% 35%;
+            box-shadow: inset 0 -3px 8px rgba(0,0,0,0.08);"></div>
+        <!-- Coffee Shine/Highlight -->
+        <div style="position: absolute; top: 20%; left: 12%; width: 25%; height: 35%;
+            background: linear-gradient(135deg, rgba(255,255,255,0.25) 0%, transparent 60%);
+            border-radius: 40% 60% 50% 70%;
+            filter: blur(8px);"></div>
+        {whipped_cream}
+        <!-- Cup Handle - Clean Design -->
+        <div style="position: absolute; right: -38px; top: 30%;
+            width: 45px; height: 42%;
+            border: 4px solid rgba(139,111,71,0.9);
+            border-left: none;
+            border-radius: 0 45% 45% 0;
+            box-shadow: inset -2px 0 6px rgba(0,0,0,0.25), 2px 3px 10px rgba(0,0,0,0.3);"></div>
+    </div>
+    <!-- Saucer - Simple and Elegant -->
+    <div style="width: calc({width} + 50px); height: 16px;
+        background: linear-gradient(180deg, #9d826d 0%, #8b6f47 100%);
+        border-radius: 50%;
+        margin-top: 6px;
+        box-shadow: 0 8px 20px rgba(0,0,0,0.35), inset 0 2px 6px rgba(255,255,255,0.15);
+        border: 2px solid #6d5638;"></div>
+</div>
+"""
+
+_WHIPPED_CREAM = """
+<!-- Whipped Cream - Simple and Clean -->
+<div style="position: absolute; top: -22px; left: 50%; transform: translateX(-50%);
+    width: calc({width} - 10px);
+    height: 35px;
+    background: linear-gradient(180deg, #ffffff 0%, #fffbf5 50%, #f5f0e8 100%);
+    border-radius: 50%;
+    box-shadow: 0 -2px 8px rgba(255,255,255,0.8), 0 4px 12px rgba(0,0,0,0.2), inset 0 -2px 5px rgba(0,0,0,0.05);
+    z-index: 5;"></div>
+"""
+
+_DETAIL_ROW = """
+<div style="display: flex; justify-content: space-between; align-items: center; margin: 15px 0; padding: 12px; background: linear-gradient(135deg, {background}); border-radius: 10px; border-left: 4px solid {accent};">
+    <strong style="color: #555; font-size: 16px;">{label}:</strong>
+    <span style="color: #222; font-weight: 600; font-size: 16px;">{value}</span>
+</div>
+"""
+
+_EXTRAS = """
+<div style="margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #fff0f6 0%, #ffe6f0 100%); border-radius: 10px; border-left: 4px solid #eb2f96;">
+    <strong style="color: #555; font-size: 16px; display: block; margin-bottom: 8px;">✨ Extras:</strong>
+    <ul style="margin: 5px 0; padding-left: 25px; color: #222;">{items}</ul>
+</div>
+"""
+
+_ITEM_HEADER = '<h4 style="margin: 22px 0 0; color: #4a2c2a; font-size: 18px;">Drink {number}{quantity}</h4>'
+
+_EXTRA_ITEM = "<li style='margin: 5px 0; font-weight: 500;'>{extra}</li>"
+
+_NO_EXTRAS = '<div style="margin: 15px 0; padding: 12px; background: linear-gradient(135deg, #f5f5f5 0%, #ebebeb 100%); border-radius: 10px; border-left: 4px solid #d9d9d9;"><strong style="color: #555; font-size: 16px;">✨ Extras:</strong> <span style="color: #999; font-style: italic;">None</span></div>'
+
+
+def _minify(template: str) -> str:
+    template = re.sub(r"<!--.*?-->", "", template, flags=re.S)
+    template = re.sub(r">\s+<", "><", template)
+    return re.sub(r"\s+", " ", template).strip()
+
+
+class _CompiledTemplate:
+    """A format string split once into literal chunks and field names."""
+
+    def __init__(self, template: str) -> None:
+        self._parts: list[tuple[str, Optional[str]]] = [
+            (literal, field)
+            for literal, field, _, _ in string.Formatter().parse(_minify(template))
+        ]
+
+    def render(self, **fields: str) -> str:
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(fields[field])
+        return "".join(out)
+
+
+_SHELL_TEMPLATE = _CompiledTemplate(_SHELL)
+_CUP_TEMPLATE = _CompiledTemplate(_CUP)
+_WHIPPED_CREAM_TEMPLATE = _CompiledTemplate(_WHIPPED_CREAM)
+_DETAIL_ROW_TEMPLATE = _CompiledTemplate(_DETAIL_ROW)
+_EXTRAS_TEMPLATE = _CompiledTemplate(_EXTRAS)
+_NO_EXTRAS_HTML = _minify(_NO_EXTRAS)
+
+
+def _display(value: Optional[str]) -> str:
+    return html.escape((value or "N/A").title())
+
+
+@lru_cache(maxsize=256)
+def _cup_fragment(
+    drink_type: Optional[str], size: Optional[str], whipped_cream: bool
+) -> str:
+    # Cup proportions and drink colors come from the menu catalog
+    catalog = get_catalog()
+    cup = catalog.cup(size)
+    width = cup.get("width", "130px")
+    return _CUP_TEMPLATE.render(
+        width=width,
+        height=cup.get("height", "220px"),
+        color=catalog.drink_color(drink_type or "latte"),
+        whipped_cream=_WHIPPED_CREAM_TEMPLATE.render(width=width)
+        if whipped_cream
+        else "",
+    )
+
+
+@lru_cache(maxsize=1024)
+def _details_fragment(
+    drink_type: Optional[str], size: Optional[str], milk: Optional[str]
+) -> str:
+    return "".join(
+        [
+            _DETAIL_ROW_TEMPLATE.render(
+                background="#fff8f0 0%, #fff0e6 100%",
+                accent="#d4a574",
+                label="☕ Drink",
+                value=_display(drink_type),
+            ),
+            _DETAIL_ROW_TEMPLATE.render(
+                background="#f0fff4 0%, #e6f9f0 100%",
+                accent="#52c41a",
+                label="📏 Size",
+                value=_display(size),
+            ),
+            _DETAIL_ROW_TEMPLATE.render(
+                background="#fffbf0 0%, #fff5e6 100%",
+                accent="#faad14",
+                label="🥛 Milk",
+                value=_display(milk),
+            ),
+        ]
+    )
+
+
+def _has_whipped_cream(extras: list[str]) -> bool:
+    return any("whipped" in extra or "cream" in extra for extra in extras)
+
+
+def _item_html(item: dict, number: int, show_header: bool) -> str:
+    extras = item.get("extras") or []
+    if extras:
+        extras_html = _EXTRAS_TEMPLATE.render(
+            items="".join(
+                _EXTRA_ITEM.format(extra=html.escape(extra.title())) for extra in extras
+            )
+        )
+    else:
+        extras_html = _NO_EXTRAS_HTML
+    quantity = item.get("quantity", 1)
+    header = (
+        _ITEM_HEADER.format(
+            number=number, quantity=f" \u00d7 {quantity}" if quantity > 1 else ""
+        )
+        if show_header
+        else ""
+    )
+    details = _details_fragment(
+        item.get("drinkType"), item.get("size"), item.get("milk")
+    )
+    return header + details + extras_html
+
+
+def render_html(order: dict, *, order_number: str, placed_at: datetime.datetime) -> str:
+    """Render the full HTML receipt for an order in `Cart.to_dict` form."""
+    items = order.get("items") or [{}]
+    first = items[0]
+    show_headers = len(items) > 1 or first.get("quantity", 1) > 1
+    return _SHELL_TEMPLATE.render(
+        cup=_cup_fragment(
+            first.get("drinkType"),
+            first.get("size"),
+            _has_whipped_cream(first.get("extras") or []),
+        ),
+        name=html.escape(order.get("name") or "N/A"),
+        items="".join(
+            _item_html(item, n, show_headers) for n, item in enumerate(items, start=1)
+        ),
+        order_number=html.escape(order_number),
+        placed_at=placed_at.strftime("%B %d, %Y at %I:%M %p"),
+    )
+
+
+def render_compact(
+    order: dict, *, order_number: str, placed_at: datetime.datetime
+) -> dict:
+    """Order fields plus the template version the frontend's receipt card understands."""
+    return {
+        "v": TEMPLATE_VERSION,
+        "orderNumber": order_number,
+        "placedAt": placed_at.isoformat(timespec="seconds"),
+        "order": order,
+    }
+
+
+def _encode(payload: dict) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode(
+        "utf-8"
+    )
+
+
+def build_receipt_payload(
+    order: dict,
+    *,
+    order_number: str,
+    placed_at: Optional[datetime.datetime] = None,
+    mode: Optional[str] = None,
+    max_bytes: int = MAX_PAYLOAD_BYTES,
+) -> tuple[str, bytes]:
+    """Pick a receipt encoding that fits the data channel and return `(topic, payload)`.
+
+    `mode` is `html`, `compact` or `auto` (the default, also read from RECEIPT_MODE):
+    auto sends the full HTML when it fits in `max_bytes` and falls back to the
+    compact payload otherwise. If even that does not fit, trailing extras and
+    then trailing line items are dropped and the payload is flagged as truncated.
+    """
+    placed_at = placed_at or datetime.datetime.now()
+    mode = (mode or os.getenv("RECEIPT_MODE", "auto")).lower()
+
+    if mode in ("html", "auto"):
+        data = render_html(
+            order, order_number=order_number, placed_at=placed_at
+        ).encode("utf-8")
+        if len(data) <= max_bytes:
+            return HTML_TOPIC, data
+        logger.warning(
+            f"HTML receipt is {len(data)} bytes, sending the compact receipt instead"
+        )
+
+    payload = render_compact(order, order_number=order_number, placed_at=placed_at)
+    data = _encode(payload)
+    items = [
+        dict(item, extras=list(item.get("extras") or []))
+        for item in order.get("items") or []
+    ]
+    while len(data) > max_bytes and items:
+        with_extras = [item for item in items if item["extras"]]
+        if with_extras:
+            with_extras[-1]["extras"].pop()
+        elif len(items) > 1:
+            items.pop()
+        else:
+            break
+        payload["order"] = {**order, "items": items}
+        payload["truncated"] = True
+        data = _encode(payload)
+    if len(data) > max_bytes:
+        raise ValueError(
+            f"Receipt payload is {len(data)} bytes, above the {max_bytes} byte limit"
+        )
+    return COMPACT_TOPIC, data
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable
+from typing import Callable, Optional
+
+from livekit.agents.voice import SpeechHandle
+
+logger = logging.getLogger("agent.receipts")
+
+
+class ReceiptScheduler:
+    """Publishes receipts as soon as the agent finishes speaking its confirmation.
+
+    `schedule` waits for the speech handle that owns the save_order call to be
+    played out, then publishes straight away. `timeout` caps the wait so a
+    stuck or very long speech cannot hold the receipt back forever. Pending
+    deliveries are tracked and cancelled by `aclose`.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[str, bytes], Awaitable[None]],
+        *,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self._publish = publish
+        self._timeout = (
+            timeout
+            if timeout is not None
+            else float(os.getenv("RECEIPT_PUBLISH_TIMEOUT", "18"))
+        )
+        self._tasks: set[asyncio.Task] = set()
+
+        self.published = 0
+        self.timed_out = 0
+        self.failed = 0
+        # Receipts the customer dismissed on the frontend
+        self.closed = 0
+        self.latencies: list[float] = []
+
+    def schedule(
+        self, topic: str, payload: bytes, speech_handle: Optional[SpeechHandle] = None
+    ) -> asyncio.Task:
+        """Publish `payload` on `topic` once `speech_handle` has finished playing out."""
+        loop = asyncio.get_running_loop()
+        speech_done = loop.create_future()
+
+        def _on_speech_done(_: SpeechHandle) -> None:
+            if not speech_done.done():
+                speech_done.set_result(time.perf_counter())
+
+        if speech_handle is None or speech_handle.done():
+            speech_done.set_result(time.perf_counter())
+        else:
+            speech_handle.add_done_callback(_on_speech_done)
+
+        task = asyncio.create_task(
+            self._deliver(topic, payload, speech_done), name="receipt-delivery"
+        )
+        self._tasks.add(task)
+
+        def _on_task_done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            if speech_handle is not None:
+                speech_handle.remove_done_callback(_on_speech_done)
+
+        task.add_done_callback(_on_task_done)
+        return task
+
+    async def _deliver(
+        self, topic: str, payload: bytes, speech_done: asyncio.Future
+    ) -> None:
+        try:
+            speech_ended_at = await asyncio.wait_for(
+                asyncio.shield(speech_done), self._timeout
+            )
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            speech_ended_at = time.perf_counter()
+            logger.warning(
+                f"Speech still playing after {self._timeout}s, publishing receipt anyway"
+            )
+
+        try:
+            await self._publish(topic, payload)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Failed to publish receipt: {e}")
+            return
+
+        latency = time.perf_counter() - speech_ended_at
+        self.published += 1
+        self.latencies.append(latency)
+        logger.info(f"Published receipt {latency * 1000:.1f}ms after speech ended")
+
+    async def aclose(self) -> None:
+        """Cancel receipts that have not been delivered yet."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def summary(self) -> dict:
+        """Delivery counters and speech-end-to-publish latency in milliseconds."""
+        latencies = sorted(self.latencies)
+        return {
+            "published": self.published,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+            "closed": self.closed,
+            "pending": len(self._tasks),
+            "latency_ms_p50": round(latencies[len(latencies) // 2] * 1000, 2)
+            if latencies
+            else None,
+            "latency_ms_max": round(latencies[-1] * 1000, 2) if latencies else None,
+        }
@@ -0,0 +1,502 @@
+"""Session recordings: what the STT heard, what the LLM was asked and answered, the
+tools it called and what the agent said, for reproducing a call offline.
+
+Recording is on when SESSION_RECORDING_DIR is set; each job writes
+`<dir>/<job id>.jsonl`. Replay a recording without any network access:
+
+    uv run python src/recorder.py recordings/AJ_abc123.jsonl --profile replay.prof
+"""
+
+import argparse
+import asyncio
+import cProfile
+import datetime
+import json
+import logging
+import pstats
+import queue
+import tempfile
+import threading
+import time
+from collections.abc import AsyncIterable
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    AgentSession,
+    APIConnectOptions,
+    llm,
+    utils,
+)
+
+from order_codec import OrderCodec, get_codec
+
+logger = logging.getLogger("agent.recorder")
+
+# Bumped when the meaning of a record kind changes
+RECORD_VERSION = 1
+
+
+def _item_record(item: Any) -> Optional[dict]:
+    """The parts of a chat item worth keeping, or None for item types nobody replays."""
+    if item.type == "message":
+        return {
+            "role": item.role,
+            "text": item.text_content or "",
+            "interrupted": item.interrupted,
+        }
+    if item.type == "function_call":
+        return {"call": item.name, "arguments": item.arguments, "call_id": item.call_id}
+    if item.type == "function_call_output":
+        return {
+            "output": item.output,
+            "call_id": item.call_id,
+            "is_error": item.is_error,
+        }
+    return None
+
+
+def _last_user_text(chat_ctx: llm.ChatContext) -> Optional[str]:
+    for item in reversed(chat_ctx.items):
+        if item.type == "message" and item.role == "user":
+            return item.text_content
+    return None
+
+
+class SessionRecorder:
+    """Append-only JSONL log of one session, written by its own thread.
+
+    `record` only puts a dict on a queue, so the event loop never waits on the
+    disk or on encoding. The writer drains whatever is queued into one write
+    and flushes it, so a crashed worker loses at most the records of the last
+    batch. Every record has the seconds since the recording started (`t`) and
+    its `kind`:
+
+    - `session`: the header, with the record version and session id
+    - `stt`: a final transcript
+    - `llm_request`: chat items added since the previous request, and the tool
+      names when they change
+    - `llm_response`: the text and tool calls, with time to first token
+    - `tool`: a tool call with its arguments and output
+    - `message`: an item added to the conversation; the agent's are what the
+      TTS spoke, cut short if `interrupted`
+    - `agent_state`, `metrics`, `close`: as the session reports them
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        *,
+        session_id: Optional[str] = None,
+        codec: Optional[OrderCodec] = None,
+        max_batch: int = 256,
+    ) -> None:
+        self.path = Path(path)
+        self._codec = codec or get_codec()
+        self._max_batch = max_batch
+        self._queue: queue.SimpleQueue[Optional[dict]] = queue.SimpleQueue()
+        self._start = time.monotonic()
+        self._closed = False
+        self._llm_requests = 0
+        self._seen_items: set[str] = set()
+        self._tool_names: Optional[list[str]] = None
+
+        self.records = 0
+        self.bytes = 0
+        self.dropped = 0
+        self._thread = threading.Thread(
+            target=self._writer_loop, name=f"recorder-{self.path.stem}", daemon=True
+        )
+        self._thread.start()
+        self.record(
+            "session",
+            version=RECORD_VERSION,
+            session_id=session_id,
+            started_at=datetime.datetime.now().isoformat(timespec="seconds"),
+        )
+
+    def record(self, kind: str, **fields: Any) -> None:
+        if not self._closed:
+            self._queue.put(
+                {"t": round(time.monotonic() - self._start, 4), "kind": kind, **fields}
+            )
+
+    def _writer_loop(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self._max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                lines = []
+                for rec in batch:
+                    if rec is None:
+                        continue
+                    try:
+                        lines.append(self._codec.dumps(rec) + b"\n")
+                    except (TypeError, ValueError) as e:
+                        self.dropped += 1
+                        logger.warning(
+                            f"Dropped an unencodable {rec['kind']} record: {e}"
+                        )
+                data = b"".join(lines)
+                f.write(data)
+                f.flush()
+                self.records += len(lines)
+                self.bytes += len(data)
+                if batch[-1] is None:
+                    return
+
+    def attach(self, session: AgentSession) -> None:
+        """Record the session's transcripts, conversation, tool calls, states and metrics."""
+
+        @session.on("user_input_transcribed")
+        def _on_transcribed(ev) -> None:
+            if ev.is_final:
+                self.record("stt", text=ev.transcript, language=ev.language)
+
+        @session.on("conversation_item_added")
+        def _on_item_added(ev) -> None:
+            item = _item_record(ev.item)
+            if item is not None:
+                self.record("message", **item)
+
+        @session.on("function_tools_executed")
+        def _on_tools_executed(ev) -> None:
+            for call, output in ev.zipped():
+                self.record(
+                    "tool",
+                    name=call.name,
+                    arguments=call.arguments,
+                    call_id=call.call_id,
+                    output=output.output if output is not None else None,
+                    is_error=output.is_error if output is not None else False,
+                )
+
+        @session.on("agent_state_changed")
+        def _on_agent_state(ev) -> None:
+            self.record("agent_state", state=ev.new_state)
+
+        @session.on("metrics_collected")
+        def _on_metrics(ev) -> None:
+            self.record(
+                "metrics", **ev.metrics.model_dump(mode="json", exclude_none=True)
+            )
+
+        @session.on("close")
+        def _on_close(ev) -> None:
+            self.record(
+                "close",
+                reason=str(ev.reason),
+                error=str(ev.error) if ev.error else None,
+            )
+
+    async def record_llm(
+        self,
+        chat_ctx: llm.ChatContext,
+        tools: list,
+        stream: AsyncIterable[Union[llm.ChatChunk, str]],
+    ) -> AsyncIterable[Union[llm.ChatChunk, str]]:
+        """Pass an `llm_node` stream through, recording the request and the response."""
+        self._llm_requests += 1
+        request = self._llm_requests
+        new_items = []
+        for item in chat_ctx.items:
+            if item.id not in self._seen_items:
+                self._seen_items.add(item.id)
+                rec = _item_record(item)
+                if rec is not None:
+                    new_items.append(rec)
+        fields: dict[str, Any] = {
+            "request": request,
+            "user": _last_user_text(chat_ctx),
+            "items": new_items,
+        }
+        tool_names = sorted(llm.ToolContext(tools).function_tools)
+        if tool_names != self._tool_names:
+            self._tool_names = fields["tools"] = tool_names
+        self.record("llm_request", **fields)
+
+        start = time.perf_counter()
+        ttft = None
+        text: list[str] = []
+        tool_calls: list[dict] = []
+        try:
+            async for chunk in stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                if isinstance(chunk, str):
+                    text.append(chunk)
+                elif chunk.delta is not None:
+                    text.append(chunk.delta.content or "")
+                    tool_calls.extend(
+                        {
+                            "name": call.name,
+                            "arguments": call.arguments,
+                            "call_id": call.call_id,
+                        }
+                        for call in chunk.delta.tool_calls
+                    )
+                yield chunk
+        finally:
+            self.record(
+                "llm_response",
+                request=request,
+                text="".join(text),
+                tool_calls=tool_calls,
+                ttft=round(ttft, 4) if ttft is not None else None,
+                duration=round(time.perf_counter() - start, 4),
+            )
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        await asyncio.to_thread(self._thread.join)
+        logger.info(f"Session recording {self.path}: {self.summary()}")
+
+    def summary(self) -> dict:
+        return {"records": self.records, "bytes": self.bytes, "dropped": self.dropped}
+
+
+def read_recording(
+    path: Union[str, Path], codec: Optional[OrderCodec] = None
+) -> list[dict]:
+    codec = codec or get_codec()
+    with open(path, "rb") as f:
+        return [codec.loads(line) for line in f if line.strip()]
+
+
+class ReplayLLM(llm.LLM):
+    """Answers each request with the next recorded response, without any network.
+
+    With `realtime`, responses take as long as they did when recorded. A request
+    whose latest user message differs from the recorded one still gets the next
+    response, but is counted in `mismatches`: the replay has diverged.
+    """
+
+    def __init__(self, records: list[dict], *, realtime: bool = False) -> None:
+        super().__init__()
+        requests = {r["request"]: r for r in records if r["kind"] == "llm_request"}
+        self._exchanges = [
+            (requests.get(r["request"], {}), r)
+            for r in records
+            if r["kind"] == "llm_response"
+        ]
+        self._next = 0
+        self.realtime = realtime
+        self.mismatches = 0
+        self.exhausted = 0
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: Optional[list] = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs: Any,
+    ) -> "ReplayLLMStream":
+        response = None
+        if self._next < len(self._exchanges):
+            request, response = self._exchanges[self._next]
+            self._next += 1
+            if request.get("user") != _last_user_text(chat_ctx):
+                self.mismatches += 1
+                logger.warning(f"Replay diverged at LLM request {response['request']}")
+        else:
+            self.exhausted += 1
+        return ReplayLLMStream(
+            self,
+            response,
+            chat_ctx=chat_ctx,
+            tools=tools or [],
+            conn_options=conn_options,
+        )
+
+
+class ReplayLLMStream(llm.LLMStream):
+    def __init__(
+        self, replay: ReplayLLM, response: Optional[dict], **kwargs: Any
+    ) -> None:
+        super().__init__(replay, **kwargs)
+        self._response = response
+
+    async def _run(self) -> None:
+        replay: ReplayLLM = self._llm  # type: ignore[assignment]
+        response = self._response or {"text": "", "tool_calls": []}
+        request_id = utils.shortuuid("replay_")
+        if replay.realtime:
+            await asyncio.sleep(response.get("ttft") or 0)
+        if response["tool_calls"]:
+            calls = [llm.FunctionToolCall(**call) for call in response["tool_calls"]]
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    id=request_id,
+                    delta=llm.ChoiceDelta(role="assistant", tool_calls=calls),
+                )
+            )
+        if response["text"]:
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    id=request_id,
+                    delta=llm.ChoiceDelta(role="assistant", content=response["text"]),
+                )
+            )
+        if replay.realtime:
+            await asyncio.sleep(
+                max(0.0, (response.get("duration") or 0) - (response.get("ttft") or 0))
+            )
+
+
+class _NullParticipant:
+    async def publish_data(self, payload: bytes, **kwargs: Any) -> None:
+        pass
+
+
+class _NullRoom:
+    """Lets the Assistant publish receipts and order patches during a replay."""
+
+    def __init__(self) -> None:
+        self.local_participant = _NullParticipant()
+
+    def on(self, event: str, callback) -> None:
+        pass
+
+
+async def replay(
+    path: Union[str, Path],
+    *,
+    realtime: bool = False,
+    record_to: Union[str, Path, None] = None,
+) -> dict:
+    """Re-run the Assistant against a recording and report where it diverged.
+
+    Customer turns go in as text through `session.run`, which skips
+    `on_user_turn_completed`, so it is called here first to apply the slot
+    filler as a live turn would. Orders, order ids and profiles go to a
+    scratch directory; with `record_to` the replay is itself recorded.
+    """
+    from agent import Assistant
+    from order_ids import create_order_id_sequence
+    from order_store import create_order_store
+    from profiles import ProfileIndex
+
+    records = read_recording(path)
+    header = next((r for r in records if r["kind"] == "session"), {})
+    if header.get("version", RECORD_VERSION) != RECORD_VERSION:
+        raise ValueError(
+            f"Recording version {header['version']} is not supported, expected {RECORD_VERSION}"
+        )
+    user_turns = [
+        r["text"] for r in records if r["kind"] == "message" and r["role"] == "user"
+    ]
+    recorded_tools = [(r["name"], r["output"]) for r in records if r["kind"] == "tool"]
+
+    replay_llm = ReplayLLM(records, realtime=realtime)
+    replayed_tools: list[tuple[str, Optional[str]]] = []
+    turn_ms: list[float] = []
+    with tempfile.TemporaryDirectory(prefix="replay_") as scratch:
+        order_store = create_order_store("jsonl", directory=Path(scratch) / "orders")
+        assistant = Assistant(
+            order_store=order_store,
+            order_ids=create_order_id_sequence(
+                "sqlite", path=Path(scratch) / "order_ids.db"
+            ),
+            profiles=ProfileIndex(Path(scratch) / "profiles.db"),
+            session_id=header.get("session_id"),
+        )
+        assistant.set_room(_NullRoom())
+        session = AgentSession(llm=replay_llm)
+        session.on(
+            "function_tools_executed",
+            lambda ev: replayed_tools.extend(
+                (call.name, out.output if out else None) for call, out in ev.zipped()
+            ),
+        )
+        if record_to is not None:
+            assistant.recorder = SessionRecorder(
+                record_to, session_id=header.get("session_id")
+            )
+            assistant.recorder.attach(session)
+        await session.start(assistant)
+        try:
+            for text in user_turns:
+                await assistant.on_user_turn_completed(
+                    assistant.chat_ctx.copy(),
+                    llm.ChatMessage(role="user", content=[text]),
+                )
+                start = time.perf_counter()
+                await session.run(user_input=text)
+                turn_ms.append((time.perf_counter() - start) * 1000)
+        finally:
+            await session.aclose()
+            await assistant.receipts.aclose()
+            await assistant.messenger.aclose()
+            await order_store.aclose()
+            if assistant.recorder is not None:
+                await assistant.recorder.aclose()
+        orders = order_store.read_orders()
+
+    diverged = [
+        {"index": i, "recorded": recorded, "replayed": replayed}
+        for i, (recorded, replayed) in enumerate(zip(recorded_tools, replayed_tools))
+        if recorded != replayed
+    ]
+    turn_ms.sort()
+    return {
+        "turns": len(user_turns),
+        "llm_requests": replay_llm._next + replay_llm.exhausted,
+        "llm_mismatches": replay_llm.mismatches,
+        "llm_exhausted": replay_llm.exhausted,
+        "tool_calls": {
+            "recorded": len(recorded_tools),
+            "replayed": len(replayed_tools),
+        },
+        "tool_divergences": diverged,
+        "orders_saved": len(orders),
+        "turn_ms": {
+            "p50": round(turn_ms[len(turn_ms) // 2], 1) if turn_ms else None,
+            "max": round(turn_ms[-1], 1) if turn_ms else None,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a session recording offline.")
+    parser.add_argument("recording", type=Path)
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="wait as long as the recorded LLM responses took",
+    )
+    parser.add_argument(
+        "--profile", type=Path, help="write cProfile stats of the replay to this file"
+    )
+    parser.add_argument(
+        "--record-to",
+        type=Path,
+        help="record the replay itself, e.g. to diff against the original",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    result = asyncio.run(
+        replay(args.recording, realtime=args.realtime, record_to=args.record_to)
+    )
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import zlib
+from typing import Callable, Optional
+
+from livekit import rtc
+
+logger = logging.getLogger("agent.messaging")
+
+# LiveKit drops reliable data packets above ~15KiB, keep some headroom
+MAX_PACKET_BYTES = 14_000
+# Largest payload `publish` accepts, i.e. up to ~19 chunks before compression
+MAX_MESSAGE_BYTES = 256 * 1024
+# Payloads below this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+# Chunked messages travel on their own topic and name the real topic in their header
+CHUNK_TOPIC = "room-chunk"
+ORDER_STATE_TOPIC = "order-state"
+RESYNC_TOPIC = "order-state-resync"
+# Order patches arriving within this window go out as one message
+PATCH_WINDOW = float(os.getenv("ORDER_PATCH_WINDOW_MS", "10")) / 1000
+
+
+def coalesce_patch(ops: list[dict], op: dict) -> None:
+    """Append a JSON Patch operation to `ops`, dropping the ones it makes redundant.
+
+    A root replace supersedes everything before it, and a replace supersedes an
+    earlier replace of the same path unless an add or remove in between may
+    have shifted what that path points at.
+    """
+    if op["op"] == "replace" and op["path"] == "":
+        ops.clear()
+    elif op["op"] == "replace":
+        for index in range(len(ops) - 1, -1, -1):
+            if ops[index]["op"] != "replace":
+                break
+            if ops[index]["path"] == op["path"]:
+                del ops[index]
+                break
+    ops.append(op)
+
+
+def encode_chunks(
+    message_id: str, topic: str, payload: bytes, max_packet: int = MAX_PACKET_BYTES
+) -> list[bytes]:
+    """Split `payload` (compressed with zlib when that helps) into packets of at most `max_packet` bytes.
+
+    Each packet is a one-line JSON header, a newline, then its slice of the
+    (possibly compressed) payload.
+    """
+    encoding = "identity"
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 6)
+        if len(compressed) < len(payload):
+            payload, encoding = compressed, "deflate"
+    # Worst-case header size with 6-digit sequence numbers
+    header_size = (
+        len(
+            json.dumps(
+                {
+                    "id": message_id,
+                    "topic": topic,
+                    "seq": 999999,
+                    "count": 999999,
+                    "enc": encoding,
+                }
+            )
+        )
+        + 1
+    )
+    body = max_packet - header_size
+    count = max(1, -(-len(payload) // body))
+    packets = []
+    for seq in range(count):
+        header = {
+            "id": message_id,
+            "topic": topic,
+            "seq": seq,
+            "count": count,
+            "enc": encoding,
+        }
+        packets.append(
+            json.dumps(header, separators=(",", ":")).encode()
+            + b"\n"
+            + payload[seq * body : (seq + 1) * body]
+        )
+    return packets
+
+
+class ChunkAssembler:
+    """Reassembles chunked messages, like the frontend does; returns `(topic, payload)` once complete."""
+
+    def __init__(self, max_pending: int = 16) -> None:
+        self._max_pending = max_pending
+        self._pending: dict[str, dict] = {}
+
+    def add(self, packet: bytes) -> Optional[tuple[str, bytes]]:
+        header_bytes, _, body = packet.partition(b"\n")
+        header = json.loads(header_bytes)
+        entry = self._pending.setdefault(header["id"], {"header": header, "parts": {}})
+        entry["parts"][header["seq"]] = body
+        while len(self._pending) > self._max_pending:
+            del self._pending[next(iter(self._pending))]
+        if len(entry["parts"]) < header["count"]:
+            return None
+        del self._pending[header["id"]]
+        payload = b"".join(entry["parts"][seq] for seq in range(header["count"]))
+        if header["enc"] == "deflate":
+            payload = zlib.decompress(payload)
+        return header["topic"], payload
+
+
+class RoomMessenger:
+    """The Assistant's data-channel link to the frontend.
+
+    Payloads that fit in one packet are published as they are, on their own
+    topic. Larger ones are compressed and split into numbered chunks on
+    CHUNK_TOPIC. Every packet is retried with exponential backoff, and chunks
+    of one message are never interleaved with another message's. Order
+    changes go out as versioned JSON Patch messages, `{"v": 3, "ops": [...]}`;
+    operations arriving within `patch_window`, or while the previous message
+    is in flight, are coalesced into one. A frontend that sees a version gap
+    asks for a snapshot, which is a root replace. Inbound packets are dispatched to handlers registered with `on`.
+    """
+
+    def __init__(
+        self,
+        room: Optional[rtc.Room] = None,
+        *,
+        max_packet: int = MAX_PACKET_BYTES,
+        max_retries: Optional[int] = None,
+        backoff: float = 0.2,
+        patch_window: float = PATCH_WINDOW,
+    ) -> None:
+        self.max_packet = max_packet
+        self.max_retries = (
+            max_retries
+            if max_retries is not None
+            else int(os.getenv("DATA_PUBLISH_RETRIES", "3"))
+        )
+        self.backoff = backoff
+        self.patch_window = patch_window
+        self._room: Optional[rtc.Room] = None
+        self._handlers: dict[str, list[Callable[[bytes, Optional[str]], None]]] = {}
+        self._send_lock = asyncio.Lock()
+        self._message_ids = itertools.count(1)
+        self._id_prefix = os.urandom(3).hex()
+
+        self._patches: dict[str, list[dict]] = {}
+        self._versions: dict[str, int] = {}
+        self._patch_tasks: dict[str, asyncio.Task] = {}
+
+        self.messages = 0
+        self.packets = 0
+        self.bytes = 0
+        self.chunked = 0
+        self.retries = 0
+        self.failed = 0
+        self.received = 0
+        self.patch_ops = 0
+        self.patch_ops_coalesced = 0
+        if room is not None:
+            self.attach(room)
+
+    def attach(self, room: rtc.Room) -> None:
+        self._room = room
+        room.on("data_received", self._on_data_received)
+
+    def on(self, topic: str, handler: Callable[[bytes, Optional[str]], None]) -> None:
+        """Call `handler(payload, sender_identity)` for every packet received on `topic`."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def _on_data_received(self, packet: rtc.DataPacket) -> None:
+        handlers = self._handlers.get(packet.topic or "")
+        if not handlers:
+            return
+        self.received += 1
+        sender = packet.participant.identity if packet.participant else None
+        for handler in handlers:
+            try:
+                handler(packet.data, sender)
+            except Exception:
+                logger.exception(f"Handler for {packet.topic!r} failed")
+
+    async def _send_packet(self, topic: str, packet: bytes) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._room.local_participant.publish_data(
+                    packet, reliable=True, topic=topic
+                )
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = self.backoff * 2**attempt
+                logger.warning(
+                    f"Publishing on {topic!r} failed ({e}), retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+            else:
+                self.packets += 1
+                self.bytes += len(packet)
+                return
+
+    async def publish(self, topic: str, payload: bytes) -> None:
+        """Deliver `payload` on `topic`, chunked if needed; raises once the retries are used up."""
+        if self._room is None:
+            raise RuntimeError("Room not available for publishing")
+        if len(payload) > MAX_MESSAGE_BYTES:
+            raise ValueError(
+                f"Payload on {topic!r} is {len(payload)} bytes, above the {MAX_MESSAGE_BYTES} byte limit"
+            )
+        if len(payload) <= self.max_packet:
+            packets = [(topic, payload)]
+        else:
+            message_id = f"{self._id_prefix}-{next(self._message_ids)}"
+            packets = [
+                (CHUNK_TOPIC, p)
+                for p in encode_chunks(message_id, topic, payload, self.max_packet)
+            ]
+            self.chunked += 1
+        try:
+            async with self._send_lock:
+                for packet_topic, packet in packets:
+                    await self._send_packet(packet_topic, packet)
+        except Exception:
+            self.failed += 1
+            raise
+        self.messages += 1
+
+    def publish_patch(self, op: dict, topic: str = ORDER_STATE_TOPIC) -> None:
+        """Queue one JSON Patch operation; it is sent with the others from the same window."""
+        if self._room is None:
+            return
+        ops = self._patches.setdefault(topic, [])
+        before = len(ops)
+        coalesce_patch(ops, op)
+        self.patch_ops += 1
+        self.patch_ops_coalesced += before + 1 - len(ops)
+        if topic not in self._patch_tasks:
+            self._patch_tasks[topic] = asyncio.create_task(
+                self._flush_patches(topic), name=f"publish-{topic}"
+            )
+
+    def publish_snapshot(self, state: dict, topic: str = ORDER_STATE_TOPIC) -> None:
+        """Queue the whole state, e.g. for a frontend that just (re)joined or after a rollback."""
+        self.publish_patch({"op": "replace", "path": "", "value": state}, topic)
+
+    async def _flush_patches(self, topic: str) -> None:
+        try:
+            await asyncio.sleep(self.patch_window)
+            while self._patches.get(topic):
+                ops = self._patches.pop(topic)
+                version = self._versions[topic] = self._versions.get(topic, 0) + 1
+                try:
+                    await self.publish(
+                        topic,
+                        json.dumps(
+                            {"v": version, "ops": ops}, separators=(",", ":")
+                        ).encode(),
+                    )
+                except Exception as e:
+                    # The version is spent anyway, so the frontend sees a gap and asks for a snapshot
+                    logger.error(f"Failed to publish order patch v{version}: {e}")
+        finally:
+            del self._patch_tasks[topic]
+
+    async def aclose(self) -> None:
+        tasks = list(self._patch_tasks.values())
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def summary(self) -> dict:
+        return {
+            "messages": self.messages,
+            "packets": self.packets,
+            "bytes": self.bytes,
+            "chunked": self.chunked,
+            "retries": self.retries,
+            "failed": self.failed,
+            "received": self.received,
+            "patch_ops": self.patch_ops,
+            "patch_ops_coalesced": self.patch_ops_coalesced,
+        }
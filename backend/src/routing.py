@@ -0,0 +1,637 @@
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import os
+import time
+from collections import deque
+from collections.abc import AsyncGenerator
+from typing import Callable, Generic, Optional, TypeVar
+
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    NOT_GIVEN,
+    APIConnectionError,
+    APIConnectOptions,
+    NotGivenOr,
+    llm,
+    stt,
+    tts,
+    utils,
+)
+from livekit.agents.utils import AudioBuffer, aio
+
+logger = logging.getLogger("agent.routing")
+
+# A provider's own p95 replaces the configured hedge budget once this many requests have finished
+MIN_SAMPLES = 20
+HEDGE_QUANTILE = 0.95
+# Audio kept for replay into the next STT stream if the current one fails (~5 s of 10 ms frames)
+REPLAY_FRAMES = 500
+
+P = TypeVar("P")
+T = TypeVar("T")
+
+
+class RollingLatency:
+    """Latencies of the last `window` requests, so percentiles follow a provider's current behaviour."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        """Value in seconds at `quantile` (0-1), or None until MIN_SAMPLES requests have been recorded."""
+        if len(self._samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(1, round(quantile * len(ordered))) - 1]
+
+
+class CircuitBreaker:
+    """Stops sending requests to a provider after `failure_threshold` failures in a row.
+
+    Once `reset_timeout` seconds have passed, a single trial request is let
+    through (half open); its success closes the circuit, its failure opens it
+    again for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold or int(
+            os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3")
+        )
+        self.reset_timeout = (
+            reset_timeout
+            if reset_timeout is not None
+            else float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+        )
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def available(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return self._clock() - self._opened_at >= self.reset_timeout
+        return not self._trial_in_flight
+
+    def on_request(self) -> None:
+        if self.state != self.CLOSED and self.available():
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = True
+
+    def on_cancel(self) -> None:
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self._opened_at = self._clock()
+            self.opened += 1
+
+
+class ProviderHealth:
+    """Latency and failures of one provider, shared by every session in the process."""
+
+    def __init__(
+        self, window: int = 200, breaker: Optional[CircuitBreaker] = None
+    ) -> None:
+        self.latency = RollingLatency(window)
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def success(self, seconds: Optional[float]) -> None:
+        if seconds is not None:
+            self.latency.record(seconds)
+        self.breaker.record_success()
+
+    def failure(self) -> bool:
+        """Count a failed request; True if it just opened the circuit."""
+        self.errors += 1
+        was_open = self.breaker.state == CircuitBreaker.OPEN
+        self.breaker.record_failure()
+        return not was_open and self.breaker.state == CircuitBreaker.OPEN
+
+    def summary(self) -> dict:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(HEDGE_QUANTILE)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "circuit": self.breaker.state,
+        }
+
+
+# Process-wide health by "<stage>:<provider>:<model>", so one session's failures spare the others
+HEALTH: dict[str, ProviderHealth] = {}
+
+
+def health_summary() -> dict:
+    return {key: health.summary() for key, health in sorted(HEALTH.items())}
+
+
+class ProviderRoute(Generic[P]):
+    def __init__(self, provider: P, health: ProviderHealth, label: str) -> None:
+        self.provider = provider
+        self.health = health
+        self.label = label
+
+
+class ProviderRouter(Generic[P]):
+    """Sends each request of one pipeline stage to the healthiest provider.
+
+    Providers are tried in the order given. A request whose first result takes
+    longer than the provider's rolling p95 (or `budget` seconds until there are
+    enough samples) is hedged: a second request goes to the next healthy
+    provider, or to the same one if it is the only provider left, and the
+    first to answer wins. A request that fails moves on to the next provider;
+    a provider whose circuit breaker is open is skipped until its reset
+    timeout, unless every provider is open.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        providers: list[P],
+        *,
+        budget: float,
+        hedging: Optional[bool] = None,
+        health: Optional[dict[str, ProviderHealth]] = None,
+        window: int = 200,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+    ) -> None:
+        if not providers:
+            raise ValueError(f"At least one {stage} provider is needed")
+        self.stage = stage
+        self.budget = budget
+        self.hedging = (
+            hedging
+            if hedging is not None
+            else os.getenv("PROVIDER_HEDGING", "1") != "0"
+        )
+        registry = HEALTH if health is None else health
+        self.routes: list[ProviderRoute[P]] = []
+        for provider in providers:
+            label = f"{stage}:{provider.provider}:{provider.model}"
+            if label not in registry:
+                registry[label] = ProviderHealth(
+                    window, CircuitBreaker(failure_threshold, reset_timeout)
+                )
+            self.routes.append(ProviderRoute(provider, registry[label], label))
+
+    def hedge_after(self, route: ProviderRoute[P]) -> float:
+        p95 = route.health.latency.percentile(HEDGE_QUANTILE)
+        return p95 if p95 is not None else self.budget
+
+    def candidates(self) -> list[ProviderRoute[P]]:
+        """Routes in preference order, without those whose circuit is open; all of them if every circuit is."""
+        healthy = [route for route in self.routes if route.health.breaker.available()]
+        if not healthy:
+            logger.error(
+                f"Every {self.stage} provider's circuit is open, trying them all"
+            )
+            return list(self.routes)
+        return healthy
+
+    def failed(self, route: ProviderRoute[P], error: BaseException) -> None:
+        if route.health.failure():
+            logger.error(
+                f"{route.label} failed {route.health.breaker.failures} times in a row, circuit open"
+            )
+        else:
+            logger.warning(f"{route.label} failed: {error!r}")
+
+    async def open(
+        self, attempt: Callable[[ProviderRoute[P]], AsyncGenerator[T, None]]
+    ) -> tuple[ProviderRoute[P], Optional[T], AsyncGenerator[T, None]]:
+        """Start `attempt` on the best route, hedging and failing over until one yields a first result.
+
+        Returns the winning route, its first result (None if it yielded nothing)
+        and the generator with the rest, which the caller must close. Raises
+        APIConnectionError when every provider failed.
+        """
+        candidates = self.candidates()
+        attempts: dict[
+            asyncio.Task, tuple[ProviderRoute[P], AsyncGenerator[T, None], float, bool]
+        ] = {}
+        hedged = False
+        winner = None
+        errors = []
+
+        def launch(route: ProviderRoute[P], hedge: bool = False) -> None:
+            generator = attempt(route)
+            attempts[asyncio.ensure_future(generator.__anext__())] = (
+                route,
+                generator,
+                time.perf_counter(),
+                hedge,
+            )
+            route.health.requests += 1
+            route.health.breaker.on_request()
+
+        launch(candidates.pop(0))
+        try:
+            while attempts:
+                timeout = None
+                if self.hedging and not hedged:
+                    route, _, started, _ = next(iter(attempts.values()))
+                    timeout = max(
+                        0.0, started + self.hedge_after(route) - time.perf_counter()
+                    )
+                done, _ = await asyncio.wait(
+                    attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    slow = next(iter(attempts.values()))[0]
+                    target = candidates.pop(0) if candidates else slow
+                    target.health.hedges += 1
+                    logger.info(
+                        f"{slow.label} slower than {self.hedge_after(slow) * 1000:.0f} ms, hedging with {target.label}"
+                    )
+                    launch(target, hedge=True)
+                    continue
+                for task in done:
+                    route, generator, started, hedge = attempts.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        first = None
+                    except Exception as e:
+                        self.failed(route, e)
+                        errors.append(f"{route.label}: {e!r}")
+                        await generator.aclose()
+                        if not attempts and candidates:
+                            launch(candidates.pop(0))
+                        continue
+                    route.health.success(time.perf_counter() - started)
+                    if hedge:
+                        route.health.hedge_wins += 1
+                    winner = route, first, generator
+                    return winner
+            raise APIConnectionError(
+                f"Every {self.stage} provider failed: {'; '.join(errors)}"
+            )
+        finally:
+            for task, (route, _, started, _) in attempts.items():
+                task.cancel()
+                route.health.breaker.on_cancel()
+                if winner is not None:
+                    # The loser of a hedge is at least this slow; keep it in the window so the p95 stays honest
+                    route.health.latency.record(time.perf_counter() - started)
+            await asyncio.gather(*attempts, return_exceptions=True)
+            for _, generator, _, _ in attempts.values():
+                await generator.aclose()
+
+    def summary(self) -> dict:
+        return {route.label: route.health.summary() for route in self.routes}
+
+
+class RoutedLLM(llm.LLM):
+    """An LLM that routes every request through a ProviderRouter over `providers`."""
+
+    def __init__(
+        self, providers: list[llm.LLM], *, budget: float, **router_options
+    ) -> None:
+        super().__init__()
+        self.router = ProviderRouter("llm", providers, budget=budget, **router_options)
+
+    @property
+    def model(self) -> str:
+        return self.router.routes[0].provider.model
+
+    @property
+    def provider(self) -> str:
+        return self.router.routes[0].provider.provider
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: Optional[list] = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs,
+    ) -> "RoutedLLMStream":
+        return RoutedLLMStream(
+            self,
+            chat_ctx=chat_ctx,
+            tools=tools or [],
+            conn_options=conn_options,
+            kwargs=kwargs,
+        )
+
+    async def aclose(self) -> None:
+        for route in self.router.routes:
+            await route.provider.aclose()
+
+
+class RoutedLLMStream(llm.LLMStream):
+    def __init__(
+        self,
+        routed: RoutedLLM,
+        *,
+        chat_ctx,
+        tools,
+        conn_options: APIConnectOptions,
+        kwargs: dict,
+    ) -> None:
+        super().__init__(
+            routed, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options
+        )
+        self._kwargs = kwargs
+
+    async def _run(self) -> None:
+        router: ProviderRouter[llm.LLM] = self._llm.router  # type: ignore[attr-defined]
+        # Retries happen at this level, so the provider request must not retry on its own
+        inner_options = dataclasses.replace(self._conn_options, max_retry=0)
+
+        async def attempt(
+            route: ProviderRoute[llm.LLM],
+        ) -> AsyncGenerator[llm.ChatChunk, None]:
+            async with route.provider.chat(
+                chat_ctx=self._chat_ctx,
+                tools=self._tools,
+                conn_options=inner_options,
+                **self._kwargs,
+            ) as stream:
+                async for chunk in stream:
+                    yield chunk
+
+        route, first, rest = await router.open(attempt)
+        try:
+            if first is not None:
+                self._event_ch.send_nowait(first)
+                async for chunk in rest:
+                    self._event_ch.send_nowait(chunk)
+        except Exception as e:
+            router.failed(route, e)
+            raise
+        finally:
+            await rest.aclose()
+
+
+class RoutedTTS(tts.TTS):
+    """A TTS that routes every sentence through a ProviderRouter over `providers`.
+
+    It synthesizes whole sentences, so wrap it with `tts.StreamAdapter` (or a
+    CachedTTS) to use it for streamed LLM replies.
+    """
+
+    def __init__(
+        self, providers: list[tts.TTS], *, budget: float, **router_options
+    ) -> None:
+        rates = {
+            (provider.sample_rate, provider.num_channels) for provider in providers
+        }
+        if len(rates) > 1:
+            raise ValueError(
+                f"Routed TTS providers must share one sample rate and channel count, got {rates}"
+            )
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=providers[0].sample_rate,
+            num_channels=providers[0].num_channels,
+        )
+        self.router = ProviderRouter("tts", providers, budget=budget, **router_options)
+
+    @property
+    def model(self) -> str:
+        return self.router.routes[0].provider.model
+
+    @property
+    def provider(self) -> str:
+        return self.router.routes[0].provider.provider
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "RoutedChunkedStream":
+        return RoutedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def prewarm(self) -> None:
+        for route in self.router.routes:
+            route.provider.prewarm()
+
+    async def aclose(self) -> None:
+        for route in self.router.routes:
+            await route.provider.aclose()
+
+
+class RoutedChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        routed: RoutedTTS = self._tts  # type: ignore[assignment]
+        inner_options = APIConnectOptions(
+            max_retry=0, timeout=self._conn_options.timeout
+        )
+
+        async def attempt(route: ProviderRoute[tts.TTS]) -> AsyncGenerator[bytes, None]:
+            async with route.provider.synthesize(
+                self._input_text, conn_options=inner_options
+            ) as stream:
+                async for audio in stream:
+                    yield audio.frame.data.tobytes()
+
+        route, first, rest = await routed.router.open(attempt)
+        # Another provider speaks with another voice; CachedTTS must not keep it under the primary's
+        self.fallback = route is not routed.router.routes[0]
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=routed.sample_rate,
+            num_channels=routed.num_channels,
+            mime_type="audio/pcm",
+        )
+        try:
+            if first is not None:
+                output_emitter.push(first)
+                async for data in rest:
+                    output_emitter.push(data)
+        except Exception as e:
+            routed.router.failed(route, e)
+            raise
+        finally:
+            await rest.aclose()
+        output_emitter.flush()
+
+
+class RoutedSTT(stt.STT):
+    """An STT that routes requests through a ProviderRouter over `providers`.
+
+    Buffered recognition is hedged and fails over like the other stages.
+    Streams fail over but are not hedged, since that would pay for every
+    second of audio twice; see RoutedRecognizeStream.
+    """
+
+    def __init__(
+        self, providers: list[stt.STT], *, budget: float, **router_options
+    ) -> None:
+        super().__init__(
+            capabilities=stt.STTCapabilities(
+                streaming=all(
+                    provider.capabilities.streaming for provider in providers
+                ),
+                interim_results=all(
+                    provider.capabilities.interim_results for provider in providers
+                ),
+            )
+        )
+        self.router = ProviderRouter("stt", providers, budget=budget, **router_options)
+
+    @property
+    def model(self) -> str:
+        return self.router.routes[0].provider.model
+
+    @property
+    def provider(self) -> str:
+        return self.router.routes[0].provider.provider
+
+    async def _recognize_impl(
+        self,
+        buffer: AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        inner_options = dataclasses.replace(conn_options, max_retry=0)
+
+        async def attempt(
+            route: ProviderRoute[stt.STT],
+        ) -> AsyncGenerator[stt.SpeechEvent, None]:
+            yield await route.provider.recognize(
+                buffer, language=language, conn_options=inner_options
+            )
+
+        _, event, rest = await self.router.open(attempt)
+        await rest.aclose()
+        return event
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "RoutedRecognizeStream":
+        return RoutedRecognizeStream(
+            stt=self, language=language, conn_options=conn_options
+        )
+
+    async def aclose(self) -> None:
+        for route in self.router.routes:
+            await route.provider.aclose()
+
+
+class RoutedRecognizeStream(stt.RecognizeStream):
+    """Streams audio to one provider at a time, moving to the next when it fails.
+
+    The audio since the last final transcript (up to REPLAY_FRAMES frames) is
+    replayed into the next provider's stream, so the words being spoken when
+    a provider drops are not lost.
+    """
+
+    def __init__(
+        self,
+        *,
+        stt: RoutedSTT,
+        language: NotGivenOr[str],
+        conn_options: APIConnectOptions,
+    ) -> None:
+        super().__init__(stt=stt, conn_options=conn_options, sample_rate=NOT_GIVEN)
+        self._language = language
+
+    async def _run(self) -> None:
+        router: ProviderRouter[stt.STT] = self._stt.router  # type: ignore[attr-defined]
+        inner_options = dataclasses.replace(self._conn_options, max_retry=0)
+        replay: deque[rtc.AudioFrame] = deque(maxlen=REPLAY_FRAMES)
+        current: Optional[stt.RecognizeStream] = None
+        input_ended = False
+
+        async def forward_input() -> None:
+            nonlocal input_ended
+            async for data in self._input_ch:
+                if isinstance(data, rtc.AudioFrame):
+                    replay.append(data)
+                # A stream that just failed refuses input until the next one replaces it
+                with contextlib.suppress(RuntimeError):
+                    if isinstance(data, rtc.AudioFrame) and current is not None:
+                        current.push_frame(data)
+                    elif current is not None:
+                        current.flush()
+            input_ended = True
+            if current is not None:
+                with contextlib.suppress(RuntimeError):
+                    current.end_input()
+
+        forward_task = asyncio.create_task(forward_input())
+        errors = []
+        try:
+            for route in router.candidates():
+                # Nothing awaits between opening the stream and publishing it, so no frame is missed or doubled
+                current = route.provider.stream(
+                    language=self._language, conn_options=inner_options
+                )
+                for frame in replay:
+                    current.push_frame(frame)
+                if input_ended:
+                    current.end_input()
+                route.health.requests += 1
+                route.health.breaker.on_request()
+                resolved = False
+                try:
+                    async with current:
+                        async for event in current:
+                            if event.type == stt.SpeechEventType.FINAL_TRANSCRIPT:
+                                replay.clear()
+                                route.health.success(None)
+                                resolved = True
+                            self._event_ch.send_nowait(event)
+                    return
+                except Exception as e:
+                    router.failed(route, e)
+                    resolved = True
+                    errors.append(f"{route.label}: {e!r}")
+                    current = None
+                finally:
+                    # A stream that ends or is cancelled before its first final transcript
+                    # must not leave a half-open trial in flight for good
+                    if not resolved:
+                        route.health.breaker.on_cancel()
+            raise APIConnectionError(f"Every stt provider failed: {'; '.join(errors)}")
+        finally:
+            await aio.cancel_and_wait(forward_task)
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+import psutil
+from livekit import rtc
+from livekit.agents import tokenize
+from livekit.plugins import noise_cancellation, silero
+from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+from load_control import job_load
+from menu import MenuCatalog, get_catalog
+from tts_cache import TTSCache
+from tts_chunker import AdaptiveSentenceTokenizer
+
+logger = logging.getLogger("agent.models")
+
+
+class _TimedMultilingualModel(MultilingualModel):
+    """MultilingualModel that reports how long each prediction took to the job's load report."""
+
+    async def predict_end_of_turn(
+        self, chat_ctx, *, timeout: Optional[float] = 3
+    ) -> float:
+        # Queueing in the shared inference process or the batching service shows up here first under load
+        start = time.perf_counter()
+        try:
+            return await super().predict_end_of_turn(chat_ctx, timeout=timeout)
+        finally:
+            job_load.observe_inference("turn_detector", time.perf_counter() - start)
+
+
+class SharedModels:
+    """Models and lookup tables loaded once per worker process and reused by every job.
+
+    With PREWARM_MODE=eager (the default) everything is loaded in `prewarm`,
+    before the process accepts a job, so the first call does not pay for it.
+    With PREWARM_MODE=lazy each model is loaded on first use instead, which
+    makes worker startup faster at the cost of the first call's latency.
+    """
+
+    def __init__(self, eager: Optional[bool] = None) -> None:
+        if eager is None:
+            eager = os.getenv("PREWARM_MODE", "eager").lower() != "lazy"
+        self.eager = eager
+        self.load_seconds: dict[str, float] = {}
+        self._models: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, load: Callable[[], object]):
+        with self._lock:
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = load()
+                self.load_seconds[name] = time.perf_counter() - start
+            return self._models[name]
+
+    @property
+    def vad(self) -> silero.VAD:
+        return self._get("vad", silero.VAD.load)
+
+    def turn_detector(self) -> MultilingualModel:
+        """A turn detector for the current job; it needs the job's inference executor.
+
+        The ONNX model runs in the worker's shared inference process, which
+        loads it once per worker from the files `download-files` fetched.
+        With LIVEKIT_REMOTE_EOT_URL set (EOU_BATCH_PORT sets it) predictions go to that service instead.
+        """
+        return _TimedMultilingualModel()
+
+    @property
+    def noise_cancellation(self) -> rtc.NoiseCancellationOptions:
+        return self._get("noise_cancellation", noise_cancellation.BVC)
+
+    @property
+    def sentence_tokenizer(self) -> tokenize.SentenceTokenizer:
+        """Splits replies for the TTS, releasing the first clause of each before its sentence is done."""
+        return self._get("sentence_tokenizer", AdaptiveSentenceTokenizer)
+
+    @property
+    def tts_cache(self) -> Optional[TTSCache]:
+        """Process-wide cache of synthesized sentences, or None unless TTS_CACHE_BYTES is set.
+
+        Off by default: the cache sends each sentence to Murf on its own instead of
+        streaming the reply over Murf's websocket, which delays the first audio of
+        every reply it misses. With TTS_CACHE_DIR set, entries are also kept on disk
+        there, so the warm-up phrases are synthesized once, not per process.
+        """
+
+        def load() -> Optional[TTSCache]:
+            if int(os.getenv("TTS_CACHE_BYTES") or 0) <= 0:
+                return None
+            return TTSCache(directory=os.getenv("TTS_CACHE_DIR") or None)
+
+        return self._get("tts_cache", load)
+
+    @property
+    def menu(self) -> MenuCatalog:
+        return self._get("menu", get_catalog)
+
+    def prewarm(self) -> dict:
+        """Load everything now if eager, and report how long it took and the process's RSS."""
+        start = time.perf_counter()
+        if self.eager:
+            for name in (
+                "vad",
+                "noise_cancellation",
+                "sentence_tokenizer",
+                "menu",
+                "tts_cache",
+            ):
+                try:
+                    getattr(self, name)
+                except Exception as e:
+                    logger.warning(f"Could not prewarm {name}: {e}")
+        report = {
+            "mode": "eager" if self.eager else "lazy",
+            "seconds": round(time.perf_counter() - start, 3),
+            "rss_mb": round(psutil.Process().memory_info().rss / 2**20, 1),
+            "models": {
+                name: round(seconds, 3) for name, seconds in self.load_seconds.items()
+            },
+        }
+        logger.info(f"Prewarm: {report}")
+        return report
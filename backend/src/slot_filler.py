@@ -0,0 +1,317 @@
+import logging
+import re
+import time
+from typing import Optional
+
+from cart import Cart, CoffeeOrder
+from menu import MenuCatalog, get_catalog
+
+logger = logging.getLogger("agent.slot_filler")
+
+QUANTITIES = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}  # fmt: skip
+
+# Clause boundaries: slots in a clause without a drink belong to the drink before it
+_BOUNDARIES = {"and", "plus", "also", "then", ","}
+# Utterances the fast path must leave to the LLM
+_QUESTION = re.compile(
+    r"\?|\b(?:do you|does|what|which|how|is there|are there|could you tell)\b"
+)
+_NEGATION = {
+    "not",
+    "don't",
+    "dont",
+    "no",
+    "instead",
+    "remove",
+    "cancel",
+    "without",
+    "change",
+    "switch",
+}
+# Corrections of something said earlier, in this utterance or a previous one
+_CORRECTION = re.compile(
+    r"\b(?:actually|make it|make that|instead of|rather than|i meant|i mean)\b"
+)
+# A drink like the one being discussed that is meant as an extra drink, not a confirmation of it
+_ANOTHER = re.compile(r"\b(?:another|one more|a second)\b")
+_NAME = re.compile(
+    r"\b(?:my name is|my name's|name is|it's for|it is for|this is for|under the name)\s+([A-Za-z][A-Za-z'-]+)",
+    re.I,
+)
+_TOKEN = re.compile(r"[a-z0-9']+|,")
+
+
+class ItemSlots:
+    """Slot values found for one drink mention (or for no drink at all)."""
+
+    def __init__(self) -> None:
+        self.drink_type: Optional[str] = None
+        self.size: Optional[str] = None
+        self.milk: Optional[str] = None
+        self.extras: list[str] = []
+        self.quantity: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return not (self.drink_type or self.size or self.milk or self.extras)
+
+    def field_count(self) -> int:
+        return sum(1 for v in (self.drink_type, self.size, self.milk) if v) + len(
+            self.extras
+        )
+
+
+class SlotFill:
+    """Everything the extractor understood from one utterance."""
+
+    def __init__(
+        self,
+        items: list[ItemSlots],
+        modifiers: ItemSlots,
+        name: Optional[str],
+        another: bool = False,
+    ) -> None:
+        self.items = items
+        self.modifiers = modifiers
+        self.name = name
+        self.another = another
+        # Set by SlotFiller.apply: whether the cart differs from before, e.g. not for a confirmation
+        self.changed = False
+
+    def field_count(self) -> int:
+        count = (
+            sum(item.field_count() for item in self.items)
+            + self.modifiers.field_count()
+        )
+        return count + (1 if self.name else 0)
+
+
+class SlotFillStats:
+    """Hit rate and estimated time saved by the fast path."""
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.hits = 0
+        self.fields_filled = 0
+        self.extraction_seconds = 0.0
+        self._llm_ttft_total = 0.0
+        self._llm_ttft_count = 0
+
+    def observe_llm_ttft(self, ttft: float) -> None:
+        """Feed LLM time-to-first-token samples from the metrics_collected event."""
+        if ttft > 0:
+            self._llm_ttft_total += ttft
+            self._llm_ttft_count += 1
+
+    def summary(self) -> dict:
+        # Every hit spares the LLM a tool-call round trip, i.e. roughly one
+        # extra LLM request before the first audio of the reply.
+        avg_ttft = (
+            self._llm_ttft_total / self._llm_ttft_count if self._llm_ttft_count else 0.0
+        )
+        return {
+            "turns": self.turns,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.turns, 3) if self.turns else 0.0,
+            "fields_filled": self.fields_filled,
+            "avg_extraction_ms": round(self.extraction_seconds / self.turns * 1000, 3)
+            if self.turns
+            else 0.0,
+            "est_ttfa_saved_ms_per_hit": round(avg_ttft * 1000, 1),
+            "est_ttfa_saved_ms_total": round(avg_ttft * self.hits * 1000, 1),
+        }
+
+
+class SlotFiller:
+    """Lexicon-based order extractor for unambiguous utterances.
+
+    `extract` returns None whenever the utterance is a question, contains a
+    negation or correction, or names conflicting values for the same drink, so
+    anything that needs judgement is left to the LLM. `apply` treats a drink
+    that repeats the one being discussed as a confirmation of it.
+    """
+
+    def __init__(self, catalog: Optional[MenuCatalog] = None) -> None:
+        catalog = catalog or get_catalog()
+        self._phrases: dict[tuple[str, ...], tuple[str, str]] = {}
+        for kind, category in (
+            ("size", "sizes"),
+            ("milk", "milks"),
+            ("extra", "extras"),
+            ("drink", "drinks"),
+        ):
+            for canonical, forms in catalog.aliases(category).items():
+                for form in forms:
+                    if kind == "drink":
+                        # Group orders use plurals: "three lattes", "two espressos"
+                        self._phrases[tuple(f"{form}s".split())] = (kind, canonical)
+                        self._phrases[tuple(f"{form}es".split())] = (kind, canonical)
+                    self._phrases[tuple(form.split())] = (kind, canonical)
+        self._max_phrase = max(len(p) for p in self._phrases)
+        self.stats = SlotFillStats()
+
+    def _tag(self, tokens: list[str]) -> Optional[list[tuple[str, object]]]:
+        tagged: list[tuple[str, object]] = []
+        i = 0
+        while i < len(tokens):
+            for n in range(min(self._max_phrase, len(tokens) - i), 0, -1):
+                match = self._phrases.get(tuple(tokens[i : i + n]))
+                if match:
+                    tagged.append(match)
+                    i += n
+                    break
+            else:
+                token = tokens[i]
+                if token in _NEGATION:
+                    return None
+                if token in _BOUNDARIES:
+                    tagged.append(("boundary", token))
+                elif token in QUANTITIES or token.isdigit():
+                    tagged.append(("quantity", QUANTITIES.get(token) or int(token)))
+                i += 1
+        return tagged
+
+    def extract(self, transcript: str) -> Optional[SlotFill]:
+        """Pull order slots out of a final transcript, or None if it should go to the LLM."""
+        lowered = transcript.lower()
+        if _QUESTION.search(lowered) or _CORRECTION.search(lowered):
+            return None
+        name_match = _NAME.search(transcript)
+        name = name_match.group(1).capitalize() if name_match else None
+        text = transcript[: name_match.start()] if name_match else transcript
+
+        tagged = self._tag(_TOKEN.findall(text.lower().replace(",", " , ")))
+        if tagged is None:
+            return None
+
+        # Split into clauses, then give each drink the slots of its clause
+        clauses: list[list[tuple[str, object]]] = [[]]
+        for kind, value in tagged:
+            if kind == "boundary":
+                clauses.append([])
+            else:
+                clauses[-1].append((kind, value))
+
+        items: list[ItemSlots] = []
+        modifiers = ItemSlots()
+        for clause in clauses:
+            pending = ItemSlots()
+            drinks_in_clause = []
+            for kind, value in clause:
+                if kind == "drink":
+                    pending.drink_type = value
+                    drinks_in_clause.append(pending)
+                    pending = ItemSlots()
+                elif not self._assign(pending, kind, value):
+                    return None
+            if drinks_in_clause:
+                # Trailing slots ("a latte with oat milk") belong to the clause's last drink
+                if not self._merge(drinks_in_clause[-1], pending):
+                    return None
+                items.extend(drinks_in_clause)
+            elif items:
+                if not self._merge(items[-1], pending):
+                    return None
+            elif not self._merge(modifiers, pending):
+                return None
+
+        fill = SlotFill(items, modifiers, name, another=bool(_ANOTHER.search(lowered)))
+        return fill if fill.field_count() else None
+
+    @staticmethod
+    def _assign(slots: ItemSlots, kind: str, value) -> bool:
+        if kind == "extra":
+            if value not in slots.extras:
+                slots.extras.append(value)
+            return True
+        attr = "drink_type" if kind == "drink" else kind
+        current = getattr(slots, attr)
+        if current is not None and current != value:
+            return False
+        setattr(slots, attr, value)
+        return True
+
+    @classmethod
+    def _merge(cls, target: ItemSlots, source: ItemSlots) -> bool:
+        for attr in ("size", "milk", "quantity"):
+            value = getattr(source, attr)
+            if value is not None and not cls._assign(target, attr, value):
+                return False
+        for extra in source.extras:
+            cls._assign(target, "extra", extra)
+        return True
+
+    def apply(self, transcript: str, cart: Cart) -> Optional[SlotFill]:
+        """Extract slots from `transcript` and write them into `cart`."""
+        start = time.perf_counter()
+        fill = self.extract(transcript)
+        self.stats.turns += 1
+        self.stats.extraction_seconds += time.perf_counter() - start
+        if fill is None:
+            return None
+
+        before = cart.to_dict()
+        items = fill.items
+        latest = cart.items[-1] if cart.items else None
+        if (
+            items
+            and latest is not None
+            and latest.drink_type == items[0].drink_type
+            and not fill.another
+        ):
+            # "yes, a large oat latte" after "a large oat latte please" confirms the drink, it is not a second one
+            if not self._repeats(latest, items[0]):
+                # "a small latte" after "a large latte" is either a correction or another drink
+                return None
+            self._merge_into(latest, items[0])
+            items = items[1:]
+
+        if not fill.modifiers.is_empty():
+            if not cart.items or not cart.current.drink_type:
+                # "large please" with no drink on the table is for the LLM to clarify
+                if not fill.items:
+                    return None
+            else:
+                current = cart.current
+                current.size = fill.modifiers.size or current.size
+                current.milk = fill.modifiers.milk or current.milk
+                for extra in fill.modifiers.extras:
+                    current.add_extra(extra)
+        for slots in items:
+            cart.add_item(
+                CoffeeOrder(
+                    drink_type=slots.drink_type,
+                    size=slots.size,
+                    milk=slots.milk,
+                    extras=slots.extras,
+                    quantity=slots.quantity or 1,
+                )
+            )
+        if fill.name:
+            cart.name = fill.name
+
+        fill.changed = cart.to_dict() != before
+        self.stats.hits += 1
+        self.stats.fields_filled += fill.field_count()
+        return fill
+
+    @staticmethod
+    def _repeats(item: CoffeeOrder, slots: ItemSlots) -> bool:
+        """Whether `slots` describe `item` again, adding details at most."""
+        for attr in ("size", "milk"):
+            value, current = getattr(slots, attr), getattr(item, attr)
+            if value is not None and current is not None and value != current:
+                return False
+        return slots.quantity is None or slots.quantity == item.quantity
+
+    @staticmethod
+    def _merge_into(item: CoffeeOrder, slots: ItemSlots) -> None:
+        # Only fill what is missing, so a plain confirmation sends the frontend no patches
+        if item.size is None and slots.size is not None:
+            item.size = slots.size
+        if item.milk is None and slots.milk is not None:
+            item.milk = slots.milk
+        for extra in slots.extras:
+            item.add_extra(extra)
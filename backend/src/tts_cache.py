@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import aiohttp
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    APIConnectOptions,
+    tokenize,
+    tts,
+    utils,
+)
+
+logger = logging.getLogger("agent.tts_cache")
+
+DEFAULT_PHRASES_PATH = Path(__file__).with_name("tts_phrases.txt")
+# Longer sentences almost never repeat word for word; don't spend the budget on them
+MAX_CACHED_TEXT_CHARS = 200
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case, which do not change how a sentence is spoken."""
+    return " ".join(text.split()).casefold()
+
+
+class TTSCache:
+    """Synthesized PCM keyed on voice settings and normalized text.
+
+    Entries live in an LRU bounded by `max_bytes` and, when `directory` is set,
+    are also written to disk as raw 16-bit PCM so other worker processes and
+    restarts can reuse them.
+    """
+
+    def __init__(
+        self, max_bytes: Optional[int] = None, directory: Union[str, Path, None] = None
+    ) -> None:
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(os.getenv("TTS_CACHE_BYTES", str(32 * 2**20)))
+        )
+        directory = directory or os.getenv("TTS_CACHE_DIR")
+        self.directory = Path(directory) if directory else None
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(voice: tuple, text: str) -> str:
+        return hashlib.sha1(
+            json.dumps([list(voice), normalize_text(text)]).encode()
+        ).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or bool(
+            self.directory and (self.directory / f"{key}.pcm").exists()
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        pcm = self._entries.get(key)
+        if pcm is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pcm
+        if self.directory:
+            path = self.directory / f"{key}.pcm"
+            try:
+                pcm = await asyncio.to_thread(path.read_bytes)
+            except FileNotFoundError:
+                pass
+            else:
+                self._remember(key, pcm)
+                self.hits += 1
+                self.disk_hits += 1
+                return pcm
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, pcm: bytes) -> None:
+        if not pcm or len(pcm) > self.max_bytes:
+            return
+        self._remember(key, pcm)
+        if self.directory:
+            await asyncio.to_thread(self._write, key, pcm)
+
+    def _remember(self, key: str, pcm: bytes) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= len(previous)
+        self._entries[key] = pcm
+        self.bytes += len(pcm)
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def _write(self, key: str, pcm: bytes) -> None:
+        path = self.directory / f"{key}.pcm"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(pcm)
+        os.replace(tmp, path)
+
+    def reset_stats(self) -> None:
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def summary(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+        }
+
+
+class CachedTTS(tts.TTS):
+    """Serves repeated sentences from a TTSCache and synthesizes the rest with `inner`.
+
+    It synthesizes whole sentences, so wrap it with `tts.StreamAdapter` (see
+    `cached_stream_tts`) to use it for streamed LLM replies. `voice` holds the
+    settings `inner` was built with that change the audio for the same text,
+    such as the voice and style; entries are keyed on them.
+    """
+
+    def __init__(self, inner: tts.TTS, cache: TTSCache, *, voice: tuple = ()) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=inner.sample_rate,
+            num_channels=inner.num_channels,
+        )
+        self._inner = inner
+        self.cache = cache
+        self._voice = voice
+
+    @property
+    def model(self) -> str:
+        return self._inner.model
+
+    @property
+    def provider(self) -> str:
+        return self._inner.provider
+
+    def voice(self) -> tuple:
+        """Everything about the inner TTS that changes the audio for the same text."""
+        return (
+            self._inner.provider,
+            self._inner.model,
+            self.sample_rate,
+            self.num_channels,
+            *self._voice,
+        )
+
+    def cache_key(self, text: str) -> Optional[str]:
+        if len(text) > MAX_CACHED_TEXT_CHARS:
+            return None
+        return self.cache.key(self.voice(), text)
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "CachedChunkedStream":
+        return CachedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def prewarm(self) -> None:
+        self._inner.prewarm()
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class CachedChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        cached_tts: CachedTTS = self._tts  # type: ignore[assignment]
+        key = cached_tts.cache_key(self._input_text)
+        pcm = await cached_tts.cache.get(key) if key else None
+
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=cached_tts.sample_rate,
+            num_channels=cached_tts.num_channels,
+            mime_type="audio/pcm",
+        )
+        if pcm is not None:
+            output_emitter.push(pcm)
+            output_emitter.flush()
+            return
+
+        # Retries happen at this level, so the inner request must not retry on its own
+        inner_options = APIConnectOptions(
+            max_retry=0, timeout=self._conn_options.timeout
+        )
+        chunks = []
+        async with cached_tts._inner.synthesize(
+            self._input_text, conn_options=inner_options
+        ) as stream:
+            async for audio in stream:
+                data = audio.frame.data.tobytes()
+                chunks.append(data)
+                output_emitter.push(data)
+            # Set by a RoutedTTS stream that a fallback provider answered
+            fallback = getattr(stream, "fallback", False)
+        output_emitter.flush()
+        if key and not fallback:
+            await cached_tts.cache.put(key, b"".join(chunks))
+
+
+def cached_stream_tts(
+    inner: tts.TTS,
+    cache: TTSCache,
+    tokenizer: tokenize.SentenceTokenizer,
+    *,
+    voice: tuple = (),
+    text_pacing: bool = False,
+) -> tts.StreamAdapter:
+    """Wrap `inner` so every sentence of a streamed reply goes through the cache."""
+    return tts.StreamAdapter(
+        tts=CachedTTS(inner, cache, voice=voice),
+        sentence_tokenizer=tokenizer,
+        text_pacing=text_pacing,
+    )
+
+
+def load_phrases(path: Union[str, Path, None] = None) -> list[str]:
+    """Warm-up phrases, one per line; blank lines and # comments are skipped."""
+    path = Path(path or os.getenv("TTS_WARMUP_FILE", str(DEFAULT_PHRASES_PATH)))
+    with open(path, encoding="utf-8") as f:
+        return [
+            line.strip()
+            for line in f
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+
+async def warm_up(
+    cached: CachedTTS, phrases: list[str], tokenizer: tokenize.SentenceTokenizer
+) -> int:
+    """Synthesize every sentence of `phrases` that is not cached yet; returns how many were."""
+    synthesized = 0
+    for phrase in phrases:
+        for sentence in tokenizer.tokenize(phrase):
+            key = cached.cache_key(sentence)
+            if key is None or key in cached.cache:
+                continue
+            async with cached.synthesize(sentence) as stream:
+                await stream.collect()
+            synthesized += 1
+    return synthesized
+
+
+def warm_up_cache(
+    cache: TTSCache,
+    make_tts: Callable[[aiohttp.ClientSession], tts.TTS],
+    tokenizer: tokenize.SentenceTokenizer,
+    phrases: Optional[list[str]] = None,
+    timeout: Optional[float] = None,
+    voice: tuple = (),
+) -> None:
+    """Pre-synthesize the warm-up phrases from `prewarm`, which runs outside any job.
+
+    `prewarm` has to finish within the worker's initialize_process_timeout, so
+    the warm-up stops after `timeout` seconds (TTS_WARMUP_TIMEOUT, 4 by default);
+    sentences synthesized by then stay cached, and with a disk store the next
+    process starts from them. Failures are logged and never stop the worker
+    from starting.
+    """
+    if timeout is None:
+        timeout = float(os.getenv("TTS_WARMUP_TIMEOUT", "4"))
+
+    async def run() -> int:
+        async with aiohttp.ClientSession() as session:
+            cached = CachedTTS(make_tts(session), cache, voice=voice)
+            try:
+                return await warm_up(
+                    cached,
+                    phrases if phrases is not None else load_phrases(),
+                    tokenizer,
+                )
+            finally:
+                await cached.aclose()
+
+    try:
+        synthesized = asyncio.run(asyncio.wait_for(run(), timeout))
+    except asyncio.TimeoutError:
+        logger.warning(
+            f"TTS cache warm-up stopped after {timeout:g}s: {cache.summary()}"
+        )
+        cache.reset_stats()
+        return
+    except Exception as e:
+        logger.warning(f"TTS cache warm-up failed: {e}")
+        return
+    logger.info(
+        f"TTS cache warm-up synthesized {synthesized} sentences: {cache.summary()}"
+    )
+    # Hit rate should describe live calls only
+    cache.reset_stats()
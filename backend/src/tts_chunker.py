@@ -0,0 +1,155 @@
+import functools
+import os
+import re
+import time
+from typing import Optional
+
+from livekit.agents import tokenize
+from livekit.agents.tokenize import SentenceStream, _basic_sent, token_stream
+from livekit.agents.tokenize.tokenizer import TokenData
+
+from instrumentation import recorder as latency
+
+# A clause or sentence ends at punctuation followed by whitespace, which leaves "3.50" and "e.g." alone;
+# \u2013 is the en dash, spelled out so it is not mistaken for a hyphen
+_CLAUSE_END = re.compile(r"[,;:.!?—\u2013](?=\s)|\s[—\u2013-](?=\s)")
+# A complete word: anything with a letter or digit in it, once the whitespace after it has arrived
+_WORD = re.compile(r"\S*\w\S*(?=\s)")
+
+
+def first_chunk_end(text: str, min_words: int, max_words: int) -> Optional[int]:
+    """Where to cut the first chunk of a reply: after the first clause of at least
+    `min_words` words, or after `max_words` words. None while neither has arrived."""
+    boundaries = sorted(
+        [(m.end(), False) for m in _WORD.finditer(text)]
+        + [(m.end(), True) for m in _CLAUSE_END.finditer(text)]
+    )
+    words = 0
+    for end, is_clause in boundaries:
+        if is_clause:
+            if words >= min_words:
+                return end
+        else:
+            words += 1
+            if words >= max_words:
+                return end
+    return None
+
+
+class AdaptiveSentenceStream(token_stream.BufferedSentenceStream):
+    """Sentences, except that the first chunk of each segment goes out as soon as it can."""
+
+    def __init__(
+        self,
+        *,
+        min_words: int,
+        max_words: int,
+        min_sentence_len: int,
+        stream_context_len: int,
+    ) -> None:
+        super().__init__(
+            tokenizer=functools.partial(
+                _basic_sent.split_sentences, min_sentence_len=min_sentence_len
+            ),
+            min_token_len=min_sentence_len,
+            min_ctx_len=stream_context_len,
+        )
+        self._min_words = min_words
+        self._max_words = max_words
+        self._first_pending = True
+        self._first_buf = ""
+        self._first_text_at: Optional[float] = None
+
+    def push_text(self, text: str) -> None:
+        if not self._first_pending:
+            super().push_text(text)
+            return
+        self._check_not_closed()
+        if self._first_text_at is None:
+            self._first_text_at = time.perf_counter()
+        self._first_buf += text
+        buf = self._first_buf.lstrip()
+        end = first_chunk_end(buf, self._min_words, self._max_words)
+        if end is None:
+            return
+        self._first_pending = False
+        self._first_buf = ""
+        self._event_ch.send_nowait(
+            TokenData(token=buf[:end].strip(), segment_id=self._current_segment_id)
+        )
+        latency.record("tts_first_chunk", time.perf_counter() - self._first_text_at)
+        if buf[end:].strip():
+            super().push_text(buf[end:].lstrip())
+
+    def flush(self) -> None:
+        if self._first_pending and self._first_buf.strip():
+            # The whole segment was shorter than a first chunk
+            super().push_text(self._first_buf)
+            latency.record("tts_first_chunk", time.perf_counter() - self._first_text_at)
+        super().flush()
+        self._first_pending = True
+        self._first_buf = ""
+        self._first_text_at = None
+
+
+class AdaptiveSentenceTokenizer(tokenize.SentenceTokenizer):
+    """Sentence tokenizer for streamed TTS that does not hold the first audio back for a full sentence.
+
+    The basic tokenizer only releases a sentence once the next one has begun,
+    so the TTS waits for the LLM to write a whole sentence and then some. Here
+    the first chunk of each reply is released at the first clause boundary
+    with at least `min_words` words, or after `max_words` words, whichever comes
+    first; the rest of the reply goes out in full sentences so the prosody
+    stays natural. `max_words=0` turns the early chunk off.
+
+    `tokenize` cuts a whole text the same way a stream would, so the TTS cache
+    warm-up stores the chunks that replies are actually synthesized in.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_words: Optional[int] = None,
+        max_words: Optional[int] = None,
+        min_sentence_len: int = 2,
+        stream_context_len: int = 10,
+    ) -> None:
+        self.min_words = (
+            min_words
+            if min_words is not None
+            else int(os.getenv("TTS_FIRST_CHUNK_MIN_WORDS", "2"))
+        )
+        self.max_words = (
+            max_words
+            if max_words is not None
+            else int(os.getenv("TTS_FIRST_CHUNK_MAX_WORDS", "6"))
+        )
+        self._sentences = tokenize.basic.SentenceTokenizer(
+            min_sentence_len=min_sentence_len, stream_context_len=stream_context_len
+        )
+        self._min_sentence_len = min_sentence_len
+        self._stream_context_len = stream_context_len
+
+    def tokenize(self, text: str, *, language: Optional[str] = None) -> list[str]:
+        text = text.strip()
+        end = (
+            first_chunk_end(text + " ", self.min_words, self.max_words)
+            if self.max_words
+            else None
+        )
+        if end is None or end >= len(text):
+            return self._sentences.tokenize(text, language=language)
+        return [
+            text[:end].strip(),
+            *self._sentences.tokenize(text[end:].lstrip(), language=language),
+        ]
+
+    def stream(self, *, language: Optional[str] = None) -> SentenceStream:
+        if not self.max_words:
+            return self._sentences.stream(language=language)
+        return AdaptiveSentenceStream(
+            min_words=self.min_words,
+            max_words=self.max_words,
+            min_sentence_len=self._min_sentence_len,
+            stream_context_len=self._stream_context_len,
+        )
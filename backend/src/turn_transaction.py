@@ -0,0 +1,84 @@
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("agent.transactions")
+
+
+class _Transaction:
+    def __init__(self, speech_id: str, snapshot: Any) -> None:
+        self.speech_id = speech_id
+        self.snapshot = snapshot
+        self.call_ids: set[str] = set()
+
+
+class TurnTransactions:
+    """Per-reply transactions around the order state that tools mutate.
+
+    The first tool call of a reply snapshots the order. The changes are
+    committed once livekit reports the reply's tool calls as executed (their
+    outputs are then part of the chat history), and rolled back if the reply's
+    speech handle finishes without that, e.g. because the customer interrupted
+    it and the tool results were thrown away. Tools called without a speech
+    handle apply their changes immediately.
+    """
+
+    def __init__(
+        self, snapshot: Callable[[], Any], restore: Callable[[Any], None]
+    ) -> None:
+        self._snapshot = snapshot
+        self._restore = restore
+        self._open: dict[str, _Transaction] = {}
+
+        self.committed = 0
+        self.rolled_back = 0
+
+    def begin(self, context) -> None:
+        """Join (or open) the transaction of the reply this tool call belongs to."""
+        speech_handle = getattr(context, "speech_handle", None)
+        if speech_handle is None:
+            return
+        txn = self._open.get(speech_handle.id)
+        if txn is None:
+            if self._open:
+                logger.warning(
+                    f"Opening a transaction for {speech_handle.id} while {list(self._open)} are open"
+                )
+            txn = self._open[speech_handle.id] = _Transaction(
+                speech_handle.id, self._snapshot()
+            )
+            speech_handle.add_done_callback(lambda handle: self.rollback(handle.id))
+        function_call = getattr(context, "function_call", None)
+        if function_call is not None:
+            txn.call_ids.add(function_call.call_id)
+
+    def commit(self, speech_id: str) -> None:
+        if self._open.pop(speech_id, None) is not None:
+            self.committed += 1
+
+    def commit_now(self, context) -> None:
+        """Commit the current reply's changes ahead of an irreversible step such as saving the order."""
+        speech_handle = getattr(context, "speech_handle", None)
+        if speech_handle is not None:
+            self.commit(speech_handle.id)
+
+    def commit_calls(self, call_ids: list[str]) -> None:
+        """Commit every transaction whose tool calls were all executed and recorded."""
+        executed = set(call_ids)
+        for txn in list(self._open.values()):
+            if txn.call_ids and txn.call_ids <= executed:
+                self.commit(txn.speech_id)
+
+    def rollback(self, speech_id: str) -> None:
+        txn: Optional[_Transaction] = self._open.pop(speech_id, None)
+        if txn is None:
+            return
+        self._restore(txn.snapshot)
+        self.rolled_back += 1
+        logger.info(f"Rolled back order changes from discarded reply {speech_id}")
+
+    def summary(self) -> dict:
+        return {
+            "committed": self.committed,
+            "rolled_back": self.rolled_back,
+            "open": len(self._open),
+        }
@@ -1,7 +1,12 @@
+from types import SimpleNamespace
+
 import pytest
 from livekit.agents import AgentSession, inference, llm
 
-from agent import Assistant
+from agent import Assistant, DrinkRequest
+from order_ids import FileLockSequence
+from order_store import JsonlOrderStore
+from profiles import ProfileIndex
 
 
 def _llm() -> llm.LLM:
@@ -108,3 +113,99 @@ async def test_refuses_harmful_request() -> None:
 
         # Ensures there are no function calls or other unexpected events
         result.expect.no_more_events()
+
+
+async def test_set_items_fills_a_group_order_in_one_call(tmp_path) -> None:
+    """A group order is captured by one batch tool call and the cart resets after saving."""
+    store = JsonlOrderStore(tmp_path)
+    assistant = Assistant(
+        order_store=store,
+        order_ids=FileLockSequence(tmp_path / "order_id.seq"),
+        profiles=ProfileIndex(tmp_path / "profiles.db"),
+    )
+    context = SimpleNamespace(speech_handle=None)
+
+    result = await assistant.set_items(
+        context,
+        items=[
+            DrinkRequest(drink_type="Latte", size="large", milk="oat milk", quantity=3),
+            DrinkRequest(drink_type="mocha"),
+        ],
+        customer_name="Jo",
+    )
+    assert "size for drink 2" in result
+
+    await assistant.set_size(context, "small", item_number=2)
+    await assistant.set_milk(context, "whole milk", item_number=2)
+    await assistant.save_order(context)
+    await assistant.receipts.aclose()
+    await store.aclose()
+
+    [saved] = store.read_orders()
+    assert saved["name"] == "Jo"
+    assert saved["order_id"] == 1
+    assert [(i["drinkType"], i["quantity"]) for i in saved["items"]] == [
+        ("latte", 3),
+        ("mocha", 1),
+    ]
+    assert assistant.cart.items == [] and assistant.cart.name is None
+
+
+async def test_set_items_reports_sizes_and_milks_that_are_not_on_the_menu(
+    tmp_path,
+) -> None:
+    assistant = Assistant(
+        order_store=JsonlOrderStore(tmp_path),
+        profiles=ProfileIndex(tmp_path / "profiles.db"),
+    )
+    context = SimpleNamespace(speech_handle=None)
+
+    result = await assistant.set_items(
+        context,
+        items=[DrinkRequest(drink_type="latte", size="venti", milk="camel milk")],
+    )
+
+    assert "venti is not on our menu" in result
+    assert "camel milk is not on our menu" in result
+    assert "size" in result and "milk type" in result
+    assert assistant.cart.items[0].drink_type == "latte"
+
+
+async def test_failed_save_keeps_the_order_for_a_retry(tmp_path) -> None:
+    class FailingStore(JsonlOrderStore):
+        failures = 1
+
+        def _write_batch(self, orders):
+            if self.failures:
+                self.failures -= 1
+                raise OSError("disk full")
+            return super()._write_batch(orders)
+
+    store = FailingStore(tmp_path)
+    assistant = Assistant(
+        order_store=store,
+        order_ids=FileLockSequence(tmp_path / "order_id.seq"),
+        profiles=ProfileIndex(tmp_path / "profiles.db"),
+    )
+    # A retry in the same reply, as the LLM makes after a tool error
+    speech_handle = SimpleNamespace(
+        id="speech-1", add_done_callback=lambda callback: None, done=lambda: True
+    )
+    context = SimpleNamespace(speech_handle=speech_handle)
+    await assistant.set_items(
+        context,
+        items=[DrinkRequest(drink_type="latte", size="large", milk="oat milk")],
+        customer_name="Jo",
+    )
+
+    with pytest.raises(OSError):
+        await assistant.save_order(context)
+    assert assistant.cart.is_complete() and assistant.cart.name == "Jo"
+
+    result = await assistant.save_order(context)
+    await assistant.receipts.aclose()
+    await store.aclose()
+
+    assert "saved successfully" in result
+    [saved] = store.read_orders()
+    assert saved["name"] == "Jo" and saved["items"][0]["drinkType"] == "latte"
@@ -0,0 +1,116 @@
+import datetime
+import json
+import os
+
+import pytest
+
+from analytics import OrderAnalytics
+from order_store import SQLiteOrderStore
+
+LATTE = {
+    "drinkType": "latte",
+    "size": "large",
+    "milk": "oat milk",
+    "extras": ["extra shot"],
+    "quantity": 2,
+}
+EVENING = int(datetime.datetime(2025, 1, 6, 20, 30).timestamp()) * 10**9
+MOCHA = {
+    "drinkType": "mocha",
+    "size": "small",
+    "milk": "whole milk",
+    "extras": [],
+    "quantity": 1,
+}
+
+
+def _write(directory, name: str, order: dict, mtime: int) -> None:
+    path = directory / name
+    path.write_text(json.dumps(order))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_json_ingest_reads_only_new_files(tmp_path) -> None:
+    orders = tmp_path / "orders"
+    orders.mkdir()
+    _write(
+        orders,
+        "a.json",
+        {"name": "A", "items": [LATTE, MOCHA], "placed_at": "2025-01-06T08:15:00"},
+        EVENING,
+    )
+    # Saved before carts existed, and before orders carried a timestamp: the file time is used
+    _write(
+        orders,
+        "b.json",
+        {
+            "name": "B",
+            "drinkType": "mocha",
+            "size": "large",
+            "milk": "oat milk",
+            "extras": [],
+        },
+        EVENING,
+    )
+
+    analytics = OrderAnalytics(tmp_path / "analytics")
+    assert analytics.ingest("json", orders) == 2
+    assert analytics.ingest("json", orders) == 0
+
+    _write(
+        orders,
+        "c.json",
+        {
+            "name": "C",
+            "items": [{**MOCHA, "quantity": 2}],
+            "placed_at": "2025-01-06T08:45:00",
+        },
+        EVENING + 1,
+    )
+    assert OrderAnalytics(tmp_path / "analytics").ingest("json", orders) == 1
+
+    columns = OrderAnalytics(tmp_path / "analytics").load()
+    assert columns.orders == 3
+    assert columns.popular_drink_by_hour() == {8: ("mocha", 3), 20: ("mocha", 1)}
+    assert columns.count_by("drink") == {("latte",): 2, ("mocha",): 4}
+    assert columns.share("milk", "oat milk") == pytest.approx(3 / 6)
+    assert columns.average_extras_per_order() == pytest.approx(2 / 3)
+
+
+def test_jsonl_ingest_skips_a_partly_written_line(tmp_path) -> None:
+    segment = tmp_path / "orders-000000.jsonl"
+    line = json.dumps(
+        {"name": "A", "items": [LATTE], "placed_at": "2025-01-06T14:00:00"}
+    )
+    segment.write_text(line + "\n" + line[:10])
+
+    analytics = OrderAnalytics(tmp_path / "analytics")
+    assert analytics.ingest("jsonl", tmp_path) == 1
+    with open(segment, "a") as f:
+        f.write(line[10:] + "\n")
+    assert analytics.ingest("jsonl", tmp_path) == 1
+
+    columns = analytics.load()
+    assert columns.popular_drink_by_hour() == {14: ("latte", 4)}
+    assert columns.count_by("hour", "size") == {(14, "large"): 4}
+
+
+async def test_sqlite_ingest_uses_row_ids(tmp_path) -> None:
+    store = SQLiteOrderStore(tmp_path / "orders.db")
+    await store.save({"name": "A", "items": [MOCHA]})
+    await store.save({"name": "B", "items": [LATTE]})
+    await store.aclose()
+
+    analytics = OrderAnalytics(tmp_path / "analytics")
+    assert analytics.ingest("sqlite", tmp_path / "orders.db") == 2
+    assert analytics.ingest("sqlite", tmp_path / "orders.db") == 0
+    assert analytics.load().report()["drinks"] == 3
+
+    with pytest.raises(ValueError):
+        analytics.ingest("json", tmp_path)
+
+
+def test_empty_store_reports_zeroes(tmp_path) -> None:
+    report = OrderAnalytics(tmp_path).load().report()
+    assert report["orders"] == 0
+    assert report["popular_drink_by_hour"] == {}
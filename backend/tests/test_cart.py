@@ -0,0 +1,125 @@
+import pytest
+
+from cart import Cart, CoffeeOrder
+
+
+def test_current_item_is_created_on_demand() -> None:
+    cart = Cart()
+
+    cart.current.drink_type = "latte"
+
+    assert len(cart.items) == 1
+    assert cart.missing_fields() == ["size", "milk type", "customer name"]
+
+
+def test_add_item_reuses_an_untouched_current_item() -> None:
+    cart = Cart()
+    _ = cart.current  # created by an earlier lookup, nothing set yet
+
+    cart.add_item(CoffeeOrder(drink_type="latte", quantity=3))
+    cart.add_item(CoffeeOrder(drink_type="mocha"))
+
+    assert [item.drink_type for item in cart.items] == ["latte", "mocha"]
+    assert cart.total_drinks == 4
+
+
+def test_missing_fields_name_each_drink() -> None:
+    cart = Cart()
+    cart.add_item(CoffeeOrder(drink_type="latte", size="large", milk="oat milk"))
+    cart.add_item(CoffeeOrder(drink_type="mocha"))
+    cart.name = "Jo"
+
+    assert cart.missing_fields() == ["size for drink 2", "milk type for drink 2"]
+    assert not cart.is_complete()
+
+
+def test_item_lookup_is_one_based() -> None:
+    cart = Cart()
+    cart.add_item(CoffeeOrder(drink_type="latte"))
+
+    assert cart.item(1).drink_type == "latte"
+    try:
+        cart.item(2)
+    except IndexError as e:
+        assert "drink number 2" in str(e)
+    else:
+        raise AssertionError("expected IndexError")
+
+
+def test_from_dict_reads_legacy_single_drink_orders() -> None:
+    legacy = {
+        "drinkType": "latte",
+        "size": "small",
+        "milk": "soy milk",
+        "extras": [],
+        "name": "Ana",
+    }
+
+    cart = Cart.from_dict(legacy)
+
+    assert cart.name == "Ana"
+    assert cart.to_dict()["items"] == [
+        {
+            "drinkType": "latte",
+            "size": "small",
+            "milk": "soy milk",
+            "extras": [],
+            "quantity": 1,
+        }
+    ]
+    assert Cart.from_dict(cart.to_dict()).to_dict() == cart.to_dict()
+
+
+def test_changes_are_reported_as_json_patches() -> None:
+    cart = Cart()
+    ops = []
+    cart.on_patch = ops.append
+
+    cart.current.drink_type = "latte"
+    cart.add_item(CoffeeOrder(drink_type="mocha"))
+    cart.item(2).add_extra("caramel syrup")
+    cart.item(2).add_extra("caramel syrup")
+    cart.name = "Sam"
+    removed = cart.remove_item(1)
+    removed.size = "large"  # no longer in the cart
+
+    assert ops == [
+        {"op": "add", "path": "/items/-", "value": CoffeeOrder().to_dict()},
+        {"op": "replace", "path": "/items/0/drinkType", "value": "latte"},
+        {
+            "op": "add",
+            "path": "/items/-",
+            "value": CoffeeOrder(drink_type="mocha").to_dict(),
+        },
+        {"op": "add", "path": "/items/1/extras/-", "value": "caramel syrup"},
+        {"op": "replace", "path": "/name", "value": "Sam"},
+        {"op": "remove", "path": "/items/0"},
+    ]
+
+
+def test_snapshots_are_frozen_copies() -> None:
+    cart = Cart()
+    cart.add_item(
+        CoffeeOrder(
+            drink_type="latte", extras=["extra shot", "vanilla syrup", "extra shot"]
+        )
+    )
+    cart.name = "Sam"
+
+    snapshot = cart.snapshot()
+    cart.current.add_extra("caramel syrup")
+    cart.name = "Jo"
+
+    assert snapshot.items[0].extras == ("extra shot", "vanilla syrup")
+    restored = Cart.from_snapshot(snapshot)
+    assert restored.to_dict() == {
+        "name": "Sam",
+        "items": [
+            CoffeeOrder(
+                drink_type="latte", extras=["extra shot", "vanilla syrup"]
+            ).to_dict()
+        ],
+    }
+    assert restored.snapshot() == snapshot and hash(snapshot)
+    with pytest.raises(AttributeError):
+        restored.items[0].notes = "no foam"
@@ -0,0 +1,86 @@
+from livekit.agents import ChatContext
+from livekit.agents.llm import FunctionCall, FunctionCallOutput
+
+from context_manager import SUMMARY_ID, ContextCompactor, compact_prompt
+
+
+def _order_turn(ctx: ChatContext, call_id: str) -> None:
+    ctx.add_message(role="user", content="A large latte with oat milk please")
+    ctx.items.append(
+        FunctionCall(
+            call_id=call_id,
+            name="set_items",
+            arguments='{"items": [{"drink_type": "latte"}]}',
+        )
+    )
+    ctx.items.append(
+        FunctionCallOutput(
+            call_id=call_id,
+            name="set_items",
+            output="Great choice! A latte it is.",
+            is_error=False,
+        )
+    )
+    ctx.add_message(role="assistant", content="Great choice! Anything else?")
+
+
+def _session() -> ChatContext:
+    ctx = ChatContext()
+    ctx.add_message(role="system", content="You are a barista.")
+    _order_turn(ctx, "call_1")
+    return ctx
+
+
+def test_nothing_to_do_under_budget() -> None:
+    compactor = ContextCompactor(token_budget=10_000)
+    assert compactor.compact(_session()) is None
+
+
+def test_saved_order_replaces_tool_history() -> None:
+    compactor = ContextCompactor(token_budget=10_000)
+    compactor.note_order_saved("1 large latte with oat milk for Sam")
+
+    compacted = compactor.compact(_session())
+
+    types = [item.type for item in compacted.items]
+    assert "function_call" not in types and "function_call_output" not in types
+    assert compacted.items[0].text_content == "You are a barista."
+    assert compacted.items[1].id == SUMMARY_ID
+    assert "for Sam" in compacted.items[1].text_content
+    # The next turn keeps one summary instead of stacking another
+    ctx = compacted.copy()
+    _order_turn(ctx, "call_2")
+    compactor.note_order_saved("1 mocha for Alex")
+    again = compactor.compact(ctx)
+    summaries = [item for item in again.items if item.id == SUMMARY_ID]
+    assert len(summaries) == 1
+    assert (
+        "for Sam" in summaries[0].text_content
+        and "for Alex" in summaries[0].text_content
+    )
+
+
+def test_trims_oldest_turns_keeping_call_pairs() -> None:
+    ctx = _session()
+    for i in range(2, 20):
+        _order_turn(ctx, f"call_{i}")
+    compactor = ContextCompactor(token_budget=200, keep_recent=4)
+
+    compacted = compactor.compact(ctx)
+
+    assert compacted.items[0].role == "system"
+    assert len(compacted.items) < len(ctx.items)
+    assert compacted.items[-1].id == ctx.items[-1].id
+    calls = {item.call_id for item in compacted.items if item.type == "function_call"}
+    outputs = {
+        item.call_id for item in compacted.items if item.type == "function_call_output"
+    }
+    assert calls == outputs
+    assert compactor.summary()["items_removed"] == len(ctx.items) - len(compacted.items)
+
+
+def test_compact_prompt_strips_indentation() -> None:
+    assert (
+        compact_prompt("Hello\n            - one\n\n            - two\n")
+        == "Hello\n- one\n- two"
+    )
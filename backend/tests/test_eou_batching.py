@@ -0,0 +1,163 @@
+import asyncio
+import socket
+import threading
+from typing import Optional
+
+import aiohttp
+import pytest
+from aiohttp import web
+from livekit.agents import llm
+
+from eou_batching import EOT_PATH, EOUBatcher, OnnxEOUModel, create_app, serve_eou
+
+
+class _StubModel:
+    """Scores a conversation by the length of its last message; holds each call until `release` is set."""
+
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[str]] = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = fail
+
+    def predict_batch(self, chat_ctxs: list[list[dict]]) -> list[float]:
+        self.release.wait(timeout=5)
+        self.batches.append([ctx[-1]["content"] for ctx in chat_ctxs])
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [len(ctx[-1]["content"]) / 100 for ctx in chat_ctxs]
+
+    def threshold(self, language: str) -> Optional[float]:
+        return 0.2 if language.startswith("en") else None
+
+
+async def _started(batcher: EOUBatcher) -> asyncio.Task:
+    task = asyncio.create_task(batcher.run())
+    await asyncio.sleep(0)
+    return task
+
+
+async def _stop(task: asyncio.Task) -> None:
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def _ctx(text: str) -> list[dict]:
+    return [{"role": "user", "content": text}]
+
+
+async def test_concurrent_sessions_share_a_batch() -> None:
+    model = _StubModel()
+    batcher = EOUBatcher(model, window=0.05, max_batch=8)
+    task = await _started(batcher)
+    try:
+        results = await asyncio.gather(
+            *(batcher.predict(_ctx("x" * n)) for n in (10, 20, 30))
+        )
+    finally:
+        await _stop(task)
+
+    assert results == [0.1, 0.2, 0.3]
+    assert model.batches == [["x" * 10, "x" * 20, "x" * 30]]
+    summary = batcher.summary()
+    assert summary["requests"] == 3 and summary["batch_sizes"] == {3: 1}
+    assert summary["latency_p95"] >= summary["queue_wait_p95"] > 0
+
+
+async def test_requests_queued_behind_a_running_batch_form_the_next() -> None:
+    model = _StubModel()
+    model.release.clear()
+    batcher = EOUBatcher(model, window=0, max_batch=2)
+    task = await _started(batcher)
+    try:
+        first = asyncio.create_task(batcher.predict(_ctx("a")))
+        await asyncio.sleep(0.05)
+        rest = [
+            asyncio.create_task(batcher.predict(_ctx(text)))
+            for text in ("bb", "ccc", "dddd")
+        ]
+        await asyncio.sleep(0.05)
+        model.release.set()
+        await asyncio.gather(first, *rest)
+    finally:
+        await _stop(task)
+
+    assert model.batches == [["a"], ["bb", "ccc"], ["dddd"]]
+    assert batcher.summary()["mean_batch_size"] == 1.33
+
+
+async def test_a_failed_batch_fails_every_request_in_it() -> None:
+    batcher = EOUBatcher(_StubModel(fail=True), window=0.05)
+    task = await _started(batcher)
+    try:
+        results = await asyncio.gather(
+            *(batcher.predict(_ctx(text)) for text in ("a", "b")),
+            return_exceptions=True,
+        )
+    finally:
+        await _stop(task)
+
+    assert [str(result) for result in results] == ["model crashed", "model crashed"]
+    assert batcher.summary()["failed_batches"] == 1
+
+
+async def test_serves_the_remote_turn_detector_api() -> None:
+    batcher = EOUBatcher(_StubModel(), window=0)
+    task = await _started(batcher)
+    runner = web.AppRunner(create_app(batcher))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{EOT_PATH}"
+
+    chat_ctx = llm.ChatContext.empty()
+    chat_ctx.add_message(role="system", content="You are a barista.")
+    chat_ctx.add_message(role="assistant", content="What can I get you?")
+    chat_ctx.add_message(role="user", content=["A large latte,", "please"])
+    # What MultilingualModel posts when LIVEKIT_REMOTE_EOT_URL is set
+    request = chat_ctx.to_dict(
+        exclude_image=True, exclude_audio=True, exclude_timestamp=True
+    )
+    try:
+        async with aiohttp.ClientSession() as http:
+            async with http.post(url, json={"language": "en-US"}) as resp:
+                assert await resp.json() == {"threshold": 0.2}
+            async with http.post(
+                url, json={**request, "jobId": "job", "workerId": "worker"}
+            ) as resp:
+                assert await resp.json() == {"probability": pytest.approx(0.21)}
+            async with http.post(url, json={"items": []}) as resp:
+                assert resp.status == 400
+    finally:
+        await runner.cleanup()
+        await _stop(task)
+
+    assert batcher.model.batches == [["A large latte,\nplease"]]
+
+
+def test_serve_eou_raises_when_the_port_is_taken() -> None:
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        with pytest.raises(RuntimeError, match="Could not serve"):
+            serve_eou(taken.getsockname()[1], model=_StubModel())
+
+
+def test_onnx_model_runs_conversations_alone_when_padding_changes_them() -> None:
+    class LeakyPadding(OnnxEOUModel):
+        def __init__(self) -> None:
+            self.runs: list[int] = []
+            self.batched = self._padding_is_safe()
+
+        def _run(self, chat_ctxs: list[list[dict]]) -> list[float]:
+            # Scores drift with the batch's longest conversation, as if padding were attended to
+            self.runs.append(len(chat_ctxs))
+            width = max(len(ctx[-1]["content"]) for ctx in chat_ctxs)
+            return [len(ctx[-1]["content"]) / 100 + width / 1000 for ctx in chat_ctxs]
+
+    model = LeakyPadding()
+    assert not model.batched
+
+    model.runs.clear()
+    assert model.predict_batch([_ctx("x" * 10), _ctx("x" * 20)]) == [0.11, 0.22]
+    assert model.runs == [1, 1]
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import urllib.request
+
+from livekit.agents import function_tool, metrics
+from livekit.agents.llm.tool_context import find_function_tools, get_function_info
+
+import instrumentation
+from instrumentation import (
+    Histogram,
+    LatencyRecorder,
+    load_dumps,
+    render_openmetrics,
+    serve_metrics,
+    timed_tools,
+)
+
+
+def test_percentiles_within_bucket_precision() -> None:
+    histogram = Histogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+
+    assert histogram.count == 1000
+    for quantile, expected in ((0.5, 0.5), (0.95, 0.95), (0.99, 0.99)):
+        assert abs(histogram.percentile(quantile) - expected) / expected < 0.01
+    assert histogram.percentile(1.0) <= histogram.max == 1.0
+
+
+def test_merge_matches_recording_everything_in_one() -> None:
+    a, b, combined = Histogram(), Histogram(), Histogram()
+    for i in range(500):
+        a.record(i / 1000)
+        b.record(i / 100)
+        combined.record(i / 1000)
+        combined.record(i / 100)
+
+    a.merge(Histogram.from_dict(json.loads(json.dumps(b.to_dict()))))
+
+    assert a.counts == combined.counts
+    assert a.percentile(0.99) == combined.percentile(0.99)
+
+
+def test_observe_records_pipeline_stages() -> None:
+    latency = LatencyRecorder()
+    latency.observe(
+        metrics.EOUMetrics(
+            timestamp=0,
+            end_of_utterance_delay=0.4,
+            transcription_delay=0.2,
+            on_user_turn_completed_delay=0.01,
+        )
+    )
+    latency.observe(
+        metrics.LLMMetrics(
+            label="llm", request_id="r", timestamp=0, duration=1.2, ttft=0.6, cancelled=False,
+            completion_tokens=10, prompt_tokens=100, prompt_cached_tokens=0, total_tokens=110,
+            tokens_per_second=8,
+        )
+    )  # fmt: skip
+
+    assert set(latency.stages) == {
+        "end_of_utterance", "stt_transcription", "on_user_turn_completed", "llm_ttft", "llm_duration",
+    }  # fmt: skip
+    text = render_openmetrics(latency.snapshot())
+    assert 'agent_stage_latency_seconds{stage="llm_ttft",quantile="0.5"}' in text
+    assert text.endswith("# EOF\n")
+
+
+async def test_timed_tools_keeps_tool_schema(monkeypatch) -> None:
+    latency = LatencyRecorder()
+    monkeypatch.setattr(instrumentation, "recorder", latency)
+
+    @timed_tools
+    class Tools:
+        @function_tool
+        async def set_size(self, size: str, item_number: int = 1):
+            """Set the size.
+
+            Args:
+                size: The size
+                item_number: Which drink
+            """
+            return f"size {size}"
+
+    tools = Tools()
+    assert [get_function_info(t).name for t in find_function_tools(tools)] == [
+        "set_size"
+    ]
+    assert await tools.set_size("large") == "size large"
+    assert latency.stages["tool.set_size"].count == 1
+
+
+def test_endpoint_serves_merged_dumps(tmp_path, monkeypatch) -> None:
+    for process, seconds in enumerate((0.1, 0.3)):
+        # Simulate two job processes dumping to the same directory
+        monkeypatch.setattr(instrumentation, "_PROCESS_STARTED", process)
+        latency = LatencyRecorder()
+        latency.record("tts_ttfb", seconds)
+        instrumentation.dump(tmp_path, latency)
+
+    assert load_dumps(tmp_path)["tts_ttfb"]["count"] == 2
+
+    server = serve_metrics(0, tmp_path)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        body = urllib.request.urlopen(f"{url}/metrics").read().decode()
+        assert 'agent_stage_latency_seconds_count{stage="tts_ttfb"} 2' in body
+        stages = json.loads(urllib.request.urlopen(f"{url}/latency.json").read())
+        assert stages["tts_ttfb"]["max"] == 0.3
+    finally:
+        server.shutdown()
+
+
+def test_dumps_of_exited_processes_age_out(tmp_path, monkeypatch) -> None:
+    paths = []
+    for process in range(2):
+        monkeypatch.setattr(instrumentation, "_PROCESS_STARTED", process)
+        latency = LatencyRecorder()
+        latency.record("tts_ttfb", 0.2)
+        paths.append(instrumentation.dump(tmp_path, latency))
+    # The first process last dumped two hours ago
+    stale = json.loads(paths[0].read_text())
+    stale["updated_at"] -= 7200
+    paths[0].write_text(json.dumps(stale))
+
+    assert load_dumps(tmp_path, retention=3600)["tts_ttfb"]["count"] == 1
+    assert list(tmp_path.iterdir()) == [paths[1]]
+
+
+async def test_periodic_dump_writes_a_last_dump_when_cancelled(tmp_path) -> None:
+    task = asyncio.create_task(
+        instrumentation.dump_periodically(tmp_path, interval=3600)
+    )
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert [path.name for path in tmp_path.iterdir()] == [
+        f"latency-{os.getpid()}-{instrumentation._PROCESS_STARTED}.json"
+    ]
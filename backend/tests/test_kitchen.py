@@ -0,0 +1,176 @@
+import asyncio
+import datetime
+import json
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+import kitchen
+from kitchen import STATUS_TOPIC, KitchenClient, KitchenQueue, create_app
+
+ORDER = {
+    "order_id": 1,
+    "name": "Sam",
+    "items": [{"drinkType": "latte", "size": "large", "milk": "oat milk"}],
+}
+
+
+def test_status_only_moves_forward() -> None:
+    queue = KitchenQueue()
+    queue.submit(ORDER)
+    queue.set_status(1, "making")
+
+    with pytest.raises(ValueError):
+        queue.set_status(1, "queued")
+    with pytest.raises(ValueError):
+        queue.set_status(1, "burnt")
+    with pytest.raises(KeyError):
+        queue.set_status(2, "ready")
+    assert queue.submit(ORDER)["status"] == "making"
+
+
+async def test_bursts_are_batched_and_slow_displays_dropped() -> None:
+    queue = KitchenQueue(subscriber_buffer=4)
+    display = queue.subscribe()
+    queue.submit(ORDER)
+    queue.set_status(1, "making")
+    queue.submit({**ORDER, "order_id": 2})
+
+    batch = await display.next_batch(window=0)
+    assert [(entry["order_id"], entry["status"]) for entry in batch] == [
+        (1, "making"),
+        (2, "queued"),
+    ]
+
+    for order_id in range(3, 8):
+        queue.submit({**ORDER, "order_id": order_id})
+    assert display.overflowed
+    assert queue.summary()["dropped_subscribers"] == 1
+
+
+async def test_client_relays_status_changes_to_the_room() -> None:
+    queue = KitchenQueue()
+    runner = web.AppRunner(create_app(queue), handler_cancellation=True)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    published = []
+
+    async def publish(topic: str, payload: bytes) -> None:
+        published.append((topic, json.loads(payload)["status"]))
+
+    client = KitchenClient(url, session_id="s1", publish=publish)
+    client.enqueue(ORDER)
+    try:
+        for _ in range(100):
+            if published:
+                break
+            await asyncio.sleep(0.02)
+        assert queue.snapshot("s1")[0]["session_id"] == "s1"
+
+        async with aiohttp.ClientSession() as http:
+            for status in ("making", "ready"):
+                async with http.post(
+                    f"{url}/orders/1/status", json={"status": status}
+                ) as resp:
+                    assert resp.status == 200
+                await asyncio.sleep(0.1)
+
+        for _ in range(100):
+            if len(published) == 3:
+                break
+            await asyncio.sleep(0.02)
+        assert published == [
+            (STATUS_TOPIC, "queued"),
+            (STATUS_TOPIC, "making"),
+            (STATUS_TOPIC, "ready"),
+        ]
+    finally:
+        await client.aclose()
+        await runner.cleanup()
+
+
+async def test_updates_are_not_lost_to_the_heartbeat(monkeypatch) -> None:
+    # Heartbeats fall inside next_batch's batching window
+    monkeypatch.setattr(kitchen, "HEARTBEAT_INTERVAL", 0.01)
+    queue = KitchenQueue()
+    runner = web.AppRunner(create_app(queue), handler_cancellation=True)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    try:
+        async with aiohttp.ClientSession() as http, http.get(f"{url}/events") as resp:
+            await resp.content.readuntil(b"\n\n")  # snapshot
+            queue.submit(ORDER)
+            events = b""
+            while b"event: orders" not in events:
+                events += await asyncio.wait_for(resp.content.readuntil(b"\n\n"), 1)
+        assert b": keep-alive" in events
+    finally:
+        await runner.cleanup()
+
+
+async def test_rejected_orders_are_dropped_not_retried() -> None:
+    posts = []
+
+    async def reject(request: web.Request) -> web.Response:
+        posts.append(await request.json())
+        raise web.HTTPBadRequest(text="every order needs an order_id")
+
+    app = web.Application()
+    app.router.add_post("/orders", reject)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def publish(topic: str, payload: bytes) -> None:
+        pass
+
+    client = KitchenClient(url, session_id="s1", publish=publish)
+    client.enqueue(ORDER)
+    try:
+        for _ in range(100):
+            if client.dropped:
+                break
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.6)
+    finally:
+        await client.aclose()
+        await runner.cleanup()
+
+    assert len(posts) == 1
+    assert client.summary()["sent"] == 0 and client.summary()["dropped"] == 1
+
+
+def test_restore_resumes_the_journal_and_backfills_missed_orders(tmp_path) -> None:
+    journal = tmp_path / "kitchen-status.jsonl"
+    placed_at = datetime.datetime.now().isoformat(timespec="seconds")
+    queue = KitchenQueue()
+    queue.restore(journal)
+    queue.submit({**ORDER, "session_id": "s1"})
+    queue.set_status(1, "making")
+
+    restarted = KitchenQueue()
+    saved = [
+        {**ORDER, "placed_at": placed_at},
+        {**ORDER, "order_id": 2, "placed_at": placed_at},
+        {**ORDER, "order_id": 3, "placed_at": "2020-01-01T08:00:00"},
+    ]
+    assert restarted.restore(journal, saved, since=time.time() - 3600) == 1
+    assert [(entry["order_id"], entry["status"]) for entry in restarted.snapshot()] == [
+        (1, "making"),
+        (2, "queued"),
+    ]
+    assert restarted.snapshot("s1")[0]["order_id"] == 1
+    restarted.submit({**ORDER, "order_id": 2, "session_id": "s2"})
+
+    again = KitchenQueue()
+    again.restore(journal)
+    assert again.snapshot("s2")[0]["order_id"] == 2
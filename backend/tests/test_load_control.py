@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+
+from livekit.agents import metrics
+
+from load_control import (
+    DEGRADED,
+    NORMAL,
+    SHEDDING,
+    JobLoadReporter,
+    WorkerLoad,
+    read_degradation,
+)
+
+
+def _worker_load(tmp_path, cpu: float = 0.0) -> WorkerLoad:
+    load = WorkerLoad(
+        directory=tmp_path,
+        max_sessions=10,
+        lag_budget=0.1,
+        degrade_at=0.6,
+        shed_at=0.7,
+        samples=1,
+    )
+    load.cpu = lambda: cpu
+    return load
+
+
+def test_load_is_the_most_saturated_signal(tmp_path) -> None:
+    load = _worker_load(tmp_path, cpu=0.2)
+    (tmp_path / "jobload-1.json").write_text(
+        json.dumps(
+            {
+                "updated_at": time.time(),
+                "loop_lag_p95": 0.05,
+                "inference_p95": {"turn_detector": 0.15},
+            }
+        )
+    )
+    # A job that stopped reporting no longer counts
+    (tmp_path / "jobload-2.json").write_text(
+        json.dumps({"updated_at": time.time() - 60, "loop_lag_p95": 1.0})
+    )
+
+    assert load.update(active_sessions=3) == 0.5
+    assert load.summary() == {
+        "load": 0.5,
+        "level": "normal",
+        "cpu": 0.2,
+        "loop_lag": 0.5,
+        "inference": 0.5,
+        "sessions": 0.3,
+    }
+
+
+def test_new_sessions_degrade_before_the_worker_is_full(tmp_path) -> None:
+    load = _worker_load(tmp_path)
+    assert read_degradation(tmp_path).level == NORMAL
+
+    load.update(active_sessions=6)
+    degradation = read_degradation(tmp_path)
+    assert degradation.level == DEGRADED
+    assert not degradation.noise_cancellation and degradation.turn_detector
+
+    load.update(active_sessions=8)
+    assert read_degradation(tmp_path).name == "shedding"
+    assert not read_degradation(tmp_path).turn_detector
+
+    # Hysteresis: just under the threshold is not enough to recover
+    load.update(active_sessions=6)
+    assert load.level == SHEDDING
+    load.update(active_sessions=5)
+    assert load.level == DEGRADED
+    load.update(active_sessions=4)
+    assert load.level == NORMAL
+
+
+async def test_job_reporter_writes_lag_and_inference(tmp_path) -> None:
+    reporter = JobLoadReporter()
+    reporter.observe(
+        metrics.VADMetrics(
+            label="vad",
+            timestamp=0,
+            idle_time=0,
+            inference_duration_total=0.02,
+            inference_count=10,
+        )
+    )
+    reporter.observe_inference("turn_detector", 0.12)
+
+    task = asyncio.create_task(reporter.run(tmp_path))
+    await asyncio.sleep(0.2)
+    path = reporter.write(tmp_path)
+    report = json.loads(path.read_text())
+    assert report["inference_p95"] == {"vad": 0.002, "turn_detector": 0.12}
+    assert report["loop_lag_p95"] is not None
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert not path.exists()
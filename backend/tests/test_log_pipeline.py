@@ -0,0 +1,115 @@
+import json
+import logging
+import threading
+
+from livekit.agents import metrics
+
+from log_pipeline import LogPipeline, MetricsLogSampler
+
+
+class _Capture(logging.Handler):
+    """Keeps each formatted message with the thread that formatted it; waits for `gate` first."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages: list[tuple[str, str]] = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.gate.wait(timeout=5)
+        self.messages.append((self.format(record), threading.current_thread().name))
+
+
+def _logger() -> logging.Logger:
+    log = logging.getLogger("agent.test_log_pipeline")
+    log.setLevel(logging.INFO)
+    return log
+
+
+def test_records_are_formatted_off_the_logging_thread(tmp_path) -> None:
+    capture = _Capture()
+    root = logging.getLogger()
+    root.addHandler(capture)
+    pipeline = LogPipeline()
+    try:
+        pipeline.start(tmp_path / "job.jsonl")
+        assert capture not in root.handlers
+        _logger().info(
+            "Set size to: %s",
+            "large",
+            extra={"room": "coffee-1", "session_id": "job-1"},
+        )
+        pipeline.stop()
+        assert capture in root.handlers
+    finally:
+        pipeline.stop()
+        root.removeHandler(capture)
+
+    assert capture.messages == [("Set size to: large", capture.messages[0][1])]
+    assert capture.messages[0][1] != threading.current_thread().name
+    entry = json.loads((tmp_path / "job.jsonl").read_text())
+    assert entry["message"] == "Set size to: large"
+    assert (entry["level"], entry["logger"]) == ("INFO", "agent.test_log_pipeline")
+    assert (entry["room"], entry["session_id"]) == ("coffee-1", "job-1")
+    assert pipeline.summary() == {"queued": 1, "dropped": 0, "backlog": 0}
+
+
+def test_records_beyond_the_queue_are_dropped_not_waited_for() -> None:
+    capture = _Capture()
+    capture.gate.clear()
+    root = logging.getLogger()
+    root.addHandler(capture)
+    pipeline = LogPipeline(max_queue=2)
+    try:
+        pipeline.start()
+        for i in range(10):
+            _logger().info("Added extra: %s", i)
+        capture.gate.set()
+        pipeline.stop()
+    finally:
+        pipeline.stop()
+        root.removeHandler(capture)
+
+    # The listener may already hold one record while the queue fills up behind it
+    assert pipeline.dropped in (7, 8)
+    assert pipeline.queued + pipeline.dropped == 10
+    messages = [message for message, _ in capture.messages]
+    assert len(messages) == pipeline.queued + 1
+    assert (
+        messages[-1]
+        == f"Dropped {pipeline.dropped} log records while the log queue was full"
+    )
+
+
+def test_high_rate_metrics_are_sampled() -> None:
+    sampler = MetricsLogSampler(every=3)
+    tts = metrics.TTSMetrics(
+        label="tts",
+        request_id="r",
+        timestamp=0,
+        ttfb=0.2,
+        duration=1,
+        audio_duration=1,
+        cancelled=False,
+        characters_count=10,
+        streamed=False,
+    )
+    eou = metrics.EOUMetrics(
+        timestamp=0,
+        end_of_utterance_delay=0.5,
+        transcription_delay=0.1,
+        on_user_turn_completed_delay=0,
+    )
+
+    assert [sampler.should_log(tts) for _ in range(7)] == [
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+        True,
+    ]
+    assert all(sampler.should_log(eou) for _ in range(3))
+    assert sampler.summary() == {"seen": {"TTSMetrics": 7}, "skipped": 4}
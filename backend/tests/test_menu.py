@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from menu import MenuCatalog, get_catalog, normalize, soundex
+
+
+@pytest.fixture
+def catalog() -> MenuCatalog:
+    return get_catalog()
+
+
+@pytest.mark.parametrize(
+    ("category", "heard", "expected", "method"),
+    [
+        ("drinks", "Latte", "latte", "exact"),
+        ("drinks", "a caffe latte please", "latte", "exact"),
+        ("drinks", "flat wide", "flat white", "phonetic"),
+        ("milks", "oak milk", "oat milk", "trigram"),
+        ("milks", "oat", "oat milk", "exact"),
+        ("extras", "whiped cream", "whipped cream", "phonetic"),
+        ("sizes", "big", "large", "exact"),
+    ],
+)
+def test_canonicalizes_noisy_input(catalog, category, heard, expected, method) -> None:
+    match = catalog.match(category, heard)
+
+    assert match is not None
+    assert (match.value, match.method) == (expected, method)
+    assert 0 < match.confidence <= 1
+
+
+@pytest.mark.parametrize(
+    ("category", "heard"), [("drinks", "green tea"), ("sizes", "venti"), ("milks", "")]
+)
+def test_rejects_items_not_on_the_menu(catalog, category, heard) -> None:
+    assert catalog.match(category, heard) is None
+
+
+def test_drives_prompt_and_rendering(catalog) -> None:
+    assert "flat white" in catalog.prompt_section()
+    assert catalog.drink_color("espresso") == "#3e2723"
+    assert catalog.cup("large") == {"width": "150px", "height": "260px"}
+    assert catalog.cup(None) == catalog.cup("medium")
+
+
+def test_loads_custom_menu(tmp_path) -> None:
+    path = tmp_path / "menu.json"
+    path.write_text(
+        json.dumps({"drinks": [{"name": "cortado", "aliases": ["gibraltar"]}]})
+    )
+
+    catalog = MenuCatalog.load(path)
+
+    assert catalog.names("drinks") == ["cortado"]
+    assert catalog.match("drinks", "gibraltar").value == "cortado"
+
+
+def test_helpers() -> None:
+    assert normalize("  A Flat-White, please! ") == "flat white"
+    assert soundex("robert") == soundex("rupert") == "R163"
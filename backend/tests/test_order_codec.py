@@ -0,0 +1,104 @@
+import pytest
+
+import order_codec
+from order_codec import (
+    ORDER_CODECS,
+    SCHEMA_VERSION,
+    OrderSchemaError,
+    check_round_trip,
+    create_codec,
+    upgrade_order,
+    validate_order,
+)
+from order_store import JsonlOrderStore
+
+ORDER = {
+    "schema": SCHEMA_VERSION,
+    "order_id": 42,
+    "name": "Zoë",
+    "items": [
+        {
+            "drinkType": "latte",
+            "size": "large",
+            "milk": "oat milk",
+            "extras": ["extra shot", "vanilla syrup"],
+            "quantity": 2,
+        },
+        {
+            "drinkType": "mocha",
+            "size": "small",
+            "milk": "whole milk",
+            "extras": [],
+            "quantity": 1,
+        },
+    ],
+    "placed_at": "2025-11-03T08:15:00",
+}
+
+INSTALLED = [
+    kind
+    for kind in ORDER_CODECS
+    if kind == "json" or getattr(order_codec, kind) is not None
+]
+
+
+@pytest.mark.parametrize("kind", INSTALLED)
+@pytest.mark.parametrize("pretty", [False, True])
+def test_installed_codecs_round_trip_orders(kind: str, pretty: bool) -> None:
+    codec = create_codec(kind)
+
+    data = check_round_trip(ORDER, codec, pretty=pretty)
+
+    assert isinstance(data, bytes)
+    assert (b"\n  " in data) == pretty
+
+
+def test_unknown_codecs_and_invalid_orders_are_rejected() -> None:
+    with pytest.raises(ValueError, match="expected one of orjson, msgspec, json"):
+        create_codec("pickle")
+    for broken in (
+        {**ORDER, "items": None},
+        {**ORDER, "items": [{**ORDER["items"][0], "extras": "extra shot"}]},
+        {**ORDER, "items": [{**ORDER["items"][0], "quantity": 0}]},
+        {**ORDER, "schema": 3},
+    ):
+        with pytest.raises(OrderSchemaError):
+            validate_order(broken)
+
+
+def test_single_drink_orders_are_upgraded() -> None:
+    legacy = {
+        "drinkType": "latte",
+        "size": "small",
+        "milk": "oat milk",
+        "extras": ["caramel syrup"],
+        "name": "Sam",
+    }
+
+    upgraded = upgrade_order(legacy)
+
+    assert upgraded == {
+        "name": "Sam",
+        "schema": SCHEMA_VERSION,
+        "items": [
+            {
+                "drinkType": "latte",
+                "size": "small",
+                "milk": "oat milk",
+                "extras": ["caramel syrup"],
+                "quantity": 1,
+            }
+        ],
+    }
+    validate_order(upgraded)
+    assert upgrade_order(ORDER) is ORDER
+
+
+def test_stores_write_with_the_given_codec(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, codec=create_codec("json"))
+    store._write_batch([ORDER])
+    store._close_writer()
+
+    line = next(tmp_path.glob("orders-*.jsonl")).read_bytes()
+    assert line.endswith(b"\n") and b'"name":"Zo\\u00eb"' in line
+    assert store.read_orders() == [ORDER]
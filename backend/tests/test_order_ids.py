@@ -0,0 +1,73 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from livekit.agents.voice import SpeechHandle
+
+from agent import Assistant
+from order_ids import FileLockSequence, SQLiteSequence, create_order_id_sequence
+from order_store import JsonlOrderStore
+from profiles import ProfileIndex
+
+SEQUENCES = {"file": FileLockSequence, "sqlite": SQLiteSequence}
+
+
+def _allocate(kind: str, path: str, count: int) -> list[int]:
+    sequence = SEQUENCES[kind](path)
+    return [sequence.next_id() for _ in range(count)]
+
+
+@pytest.mark.parametrize("kind", SEQUENCES)
+def test_ids_are_unique_across_processes(tmp_path, kind) -> None:
+    path = str(tmp_path / "sequence")
+    workers, per_worker = 16, 25
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        results = list(
+            pool.map(
+                _allocate, [kind] * workers, [path] * workers, [per_worker] * workers
+            )
+        )
+
+    ids = [order_id for worker_ids in results for order_id in worker_ids]
+    assert sorted(ids) == list(range(1, workers * per_worker + 1))
+    # Each worker sees its own IDs in increasing order
+    assert all(worker_ids == sorted(worker_ids) for worker_ids in results)
+
+
+async def test_allocate_counts_per_worker(tmp_path) -> None:
+    sequence = create_order_id_sequence("sqlite", path=tmp_path / "ids.db")
+    assert [await sequence.allocate() for _ in range(3)] == [1, 2, 3]
+    assert sequence.summary()["allocated"] == 3
+    assert sequence.summary()["last_id"] == 3
+
+
+def test_unknown_sequence() -> None:
+    with pytest.raises(ValueError):
+        create_order_id_sequence("redis")
+
+
+async def test_repeated_save_order_in_one_turn_saves_once(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path)
+    assistant = Assistant(
+        order_store=store,
+        order_ids=FileLockSequence(tmp_path / "order_id.seq"),
+        profiles=ProfileIndex(tmp_path / "profiles.db"),
+    )
+    context = SimpleNamespace(
+        speech_handle=SpeechHandle.create(), function_call=SimpleNamespace(call_id="c1")
+    )
+
+    await assistant.set_drink_type(context, "latte", item_number=None)
+    await assistant.set_size(context, "medium", item_number=None)
+    await assistant.set_milk(context, "whole milk", item_number=None)
+    await assistant.set_customer_name(context, "Sam")
+    first = await assistant.save_order(context)
+    second = await assistant.save_order(context)
+    await assistant.receipts.aclose()
+    await store.aclose()
+
+    assert second == first
+    assert [order["order_id"] for order in store.read_orders()] == [1]
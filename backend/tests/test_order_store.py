@@ -0,0 +1,202 @@
+import asyncio
+import json
+import sqlite3
+import threading
+
+import pytest
+
+from order_codec import SCHEMA_VERSION, OrderSchemaError, get_codec
+from order_store import (
+    JsonFileOrderStore,
+    JsonlOrderStore,
+    SQLiteOrderStore,
+    create_order_store,
+)
+
+ORDER = {
+    "schema": SCHEMA_VERSION,
+    "name": "Priya",
+    "items": [
+        {
+            "drinkType": "latte",
+            "size": "large",
+            "milk": "oat milk",
+            "extras": ["extra shot"],
+            "quantity": 1,
+        }
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "make_store",
+    [
+        lambda tmp: JsonFileOrderStore(tmp),
+        lambda tmp: JsonlOrderStore(tmp),
+        lambda tmp: SQLiteOrderStore(tmp / "orders.db"),
+    ],
+    ids=["json", "jsonl", "sqlite"],
+)
+async def test_round_trip(tmp_path, make_store) -> None:
+    store = make_store(tmp_path)
+    location = await store.save(ORDER)
+    await store.aclose()
+
+    assert location
+    assert store.read_orders() == [ORDER]
+
+
+async def test_concurrent_saves_are_batched_and_ordered(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, max_batch=8)
+    orders = [{**ORDER, "name": f"customer-{i}"} for i in range(50)]
+
+    await asyncio.gather(*(store.save(order) for order in orders))
+    await store.aclose()
+
+    assert [o["name"] for o in store.read_orders()] == [o["name"] for o in orders]
+
+
+async def test_jsonl_rolls_over_segments(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path, segment_bytes=200)
+    for _ in range(5):
+        await store.save(ORDER)
+    await store.aclose()
+
+    assert len(list(tmp_path.glob("orders-*.jsonl"))) > 1
+    assert len(store.read_orders()) == 5
+
+
+async def test_sqlite_uses_wal(tmp_path) -> None:
+    store = SQLiteOrderStore(tmp_path / "orders.db")
+    await store.save(ORDER)
+    await store.aclose()
+
+    conn = sqlite3.connect(tmp_path / "orders.db")
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+async def test_json_files_are_never_overwritten(tmp_path) -> None:
+    store = JsonFileOrderStore(tmp_path)
+    await asyncio.gather(
+        store.save(ORDER), store.save(ORDER), store.save({**ORDER, "order_id": 7})
+    )
+    await store.aclose()
+
+    assert len(store.read_orders()) == 3
+    assert (tmp_path / "Priya_7.json").exists()
+
+
+async def test_cancelled_save_does_not_stop_the_writer(tmp_path) -> None:
+    writing = threading.Event()
+    release = threading.Event()
+
+    class SlowStore(JsonlOrderStore):
+        def _write_batch(self, orders):
+            writing.set()
+            release.wait(timeout=5)
+            return super()._write_batch(orders)
+
+    store = SlowStore(tmp_path)
+    first = asyncio.create_task(store.save(ORDER))
+    await asyncio.to_thread(writing.wait, 5)
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    release.set()
+
+    assert await asyncio.wait_for(store.save({**ORDER, "name": "Sam"}), timeout=5)
+    await store.aclose()
+    assert [o["name"] for o in store.read_orders()] == ["Priya", "Sam"]
+
+
+async def test_a_failed_order_does_not_fail_the_rest_of_its_batch(tmp_path) -> None:
+    codec = get_codec()
+
+    class FailsForSam:
+        def dumps(self, order, **kwargs):
+            if order["name"] == "Sam":
+                raise OSError("disk full")
+            return codec.dumps(order, **kwargs)
+
+        def loads(self, data):
+            return codec.loads(data)
+
+    store = JsonFileOrderStore(tmp_path, codec=FailsForSam())
+    results = await asyncio.gather(
+        *(store.save({**ORDER, "name": name}) for name in ("Priya", "Sam", "Jo")),
+        return_exceptions=True,
+    )
+    await store.aclose()
+
+    assert isinstance(results[1], OSError)
+    assert sorted(o["name"] for o in store.read_orders()) == ["Jo", "Priya"]
+
+
+async def test_jsonl_writers_in_separate_processes_do_not_interleave(tmp_path) -> None:
+    # Each store has its own descriptors, as each worker process would
+    stores = [
+        JsonlOrderStore(tmp_path, segment_bytes=2000, max_batch=4) for _ in range(3)
+    ]
+    saves = [
+        (store, {**ORDER, "name": f"{n}-{i}"})
+        for i in range(20)
+        for n, store in enumerate(stores)
+    ]
+
+    locations = await asyncio.gather(*(store.save(order) for store, order in saves))
+    for store in stores:
+        await store.aclose()
+
+    assert sorted(o["name"] for o in stores[0].read_orders()) == sorted(
+        order["name"] for _, order in saves
+    )
+    for location, (_, order) in zip(locations, saves):
+        path, offset = location.rsplit(":", 1)
+        with open(path, "rb") as f:
+            f.seek(int(offset))
+            assert json.loads(f.readline())["name"] == order["name"]
+
+
+async def test_malformed_orders_are_rejected_before_writing(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path)
+    with pytest.raises(OrderSchemaError):
+        await store.save({**ORDER, "items": [{**ORDER["items"][0], "quantity": 0}]})
+    await store.aclose()
+
+    assert store.read_orders() == []
+
+
+def test_orders_saved_before_carts_are_read_upgraded(tmp_path) -> None:
+    legacy = {
+        "drinkType": "mocha",
+        "size": "small",
+        "milk": "whole milk",
+        "extras": [],
+        "name": "Sam",
+    }
+    (tmp_path / "Sam_1.json").write_text(json.dumps(legacy))
+
+    [order] = JsonFileOrderStore(tmp_path).read_orders()
+    assert order["schema"] == SCHEMA_VERSION
+    assert order["items"] == [
+        {
+            "drinkType": "mocha",
+            "size": "small",
+            "milk": "whole milk",
+            "extras": [],
+            "quantity": 1,
+        }
+    ]
+
+
+async def test_save_after_close_raises(tmp_path) -> None:
+    store = JsonFileOrderStore(tmp_path)
+    await store.aclose()
+
+    with pytest.raises(RuntimeError):
+        await store.save(ORDER)
+
+
+def test_unknown_backend() -> None:
+    with pytest.raises(ValueError):
+        create_order_store("csv")
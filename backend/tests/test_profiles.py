@@ -0,0 +1,131 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from agent import Assistant
+from order_ids import FileLockSequence
+from order_store import JsonlOrderStore
+from profiles import CustomerProfile, ProfileIndex, UsualOrderStats
+
+DAY = 86400
+OAT_LATTE = [
+    {
+        "drinkType": "latte",
+        "size": "large",
+        "milk": "oat milk",
+        "extras": ["extra shot"],
+        "quantity": 1,
+    }
+]
+MOCHA = [
+    {
+        "drinkType": "mocha",
+        "size": "small",
+        "milk": "whole milk",
+        "extras": [],
+        "quantity": 1,
+    }
+]
+
+
+def test_recent_orders_outweigh_old_habits() -> None:
+    profile = CustomerProfile("Sam", half_life=30 * DAY)
+    now = time.time()
+    for _ in range(5):
+        profile.record(MOCHA, now - 60 * DAY)
+    for _ in range(2):
+        profile.record(OAT_LATTE, now - DAY)
+
+    assert profile.usual(now) == OAT_LATTE
+    assert profile.usual(now - 59 * DAY) == MOCHA
+
+
+async def test_index_is_built_from_saved_orders_and_kept_up_to_date(tmp_path) -> None:
+    index = ProfileIndex(tmp_path / "profiles.db", capacity=1)
+    await index.ensure_built(
+        lambda: [{"name": "Sam", "items": MOCHA}, {"name": "Ana", "items": OAT_LATTE}]
+    )
+
+    assert (await index.lookup("sam.")).usual() == MOCHA
+    assert (await index.lookup("Sam")).order_count == 1
+    assert await index.lookup("Nobody") is None
+    assert index.summary()["hits"] == 1
+
+    await index.record({"name": "Sam", "items": OAT_LATTE})
+    await index.record({"name": "Sam", "items": OAT_LATTE})
+    # Another worker sees the update, and does not rebuild from the orders
+    other = ProfileIndex(tmp_path / "profiles.db")
+    await other.ensure_built(lambda: [])
+    assert (await other.lookup("SAM")).usual() == OAT_LATTE
+    assert (await other.lookup("Ana")).usual() == OAT_LATTE
+
+
+async def test_returning_customer_gets_the_usual_in_one_step(tmp_path) -> None:
+    store = JsonlOrderStore(tmp_path)
+    await store.save(
+        {"name": "Sam", "items": OAT_LATTE, "placed_at": "2025-01-06T08:00:00"}
+    )
+    assistant = Assistant(
+        order_store=store,
+        order_ids=FileLockSequence(tmp_path / "order_id.seq"),
+        profiles=ProfileIndex(tmp_path / "profiles.db"),
+    )
+    context = SimpleNamespace(speech_handle=None)
+    # No offer until the profiles are built
+    assert "order_usual" not in await assistant.set_customer_name(context, "Sam")
+    await assistant.profiles.ensure_built(store.read_orders)
+
+    reply = await assistant.set_customer_name(context, "Sam")
+    assert "large latte with oat milk, extras: extra shot" in reply
+    assert "order_usual" in reply
+
+    assert "The order is complete" in await assistant.order_usual(context)
+    await assistant.save_order(context)
+    await assistant.receipts.aclose()
+    await store.aclose()
+
+    assert len(store.read_orders()) == 2
+    stats = assistant.usual_stats.summary()
+    assert stats["offered"] == 1 and stats["accepted"] == 1
+    assert stats["turns_saved"] == 3
+    assert (await assistant.profiles.lookup("Sam")).order_count == 2
+
+
+async def test_orders_recorded_while_the_build_scans_are_not_lost(tmp_path) -> None:
+    index = ProfileIndex(tmp_path / "profiles.db")
+    other_worker = ProfileIndex(tmp_path / "profiles.db")
+    saved = {
+        "name": "Sam",
+        "items": MOCHA,
+        "order_id": 1,
+        "placed_at": "2025-01-06T08:00:00",
+    }
+    late = {
+        "name": "Sam",
+        "items": OAT_LATTE,
+        "order_id": 2,
+        "placed_at": "2025-01-07T08:00:00",
+    }
+
+    def read_orders() -> list[dict]:
+        # Both orders are recorded by another worker while the scan runs; only the first was read
+        asyncio.run(other_worker.record(saved))
+        asyncio.run(other_worker.record(late))
+        return [saved]
+
+    await index.ensure_built(read_orders)
+
+    profile = await index.lookup("Sam")
+    assert profile.order_count == 2
+    assert profile.usual() == OAT_LATTE
+
+
+def test_seconds_saved_use_the_measured_turn_length() -> None:
+    stats = UsualOrderStats()
+    for at in (0.0, 4.0, 10.0):
+        stats.observe_user_turn(at)
+    stats.observe_accepted(slots=5)
+
+    summary = stats.summary()
+    assert summary["est_seconds_per_turn"] == 5.0
+    assert summary["est_seconds_saved"] == 20.0
@@ -0,0 +1,110 @@
+import datetime
+import json
+
+import pytest
+
+from receipt_renderer import (
+    COMPACT_TOPIC,
+    HTML_TOPIC,
+    TEMPLATE_VERSION,
+    build_receipt_payload,
+    render_html,
+)
+
+ORDER = {
+    "name": "Sam <Admin>",
+    "items": [
+        {
+            "drinkType": "flat white",
+            "size": "large",
+            "milk": "oat milk",
+            "extras": ["whipped cream", "vanilla syrup"],
+            "quantity": 1,
+        }
+    ],
+}
+PLACED_AT = datetime.datetime(2025, 11, 23, 9, 30)
+
+
+def test_html_contains_order_fields() -> None:
+    html = render_html(ORDER, order_number="123456", placed_at=PLACED_AT)
+
+    assert "Flat White" in html
+    assert "Oat Milk" in html
+    assert "Vanilla Syrup" in html
+    assert "Order #123456" in html
+    assert "November 23, 2025 at 09:30 AM" in html
+    assert "#d4a574" in html
+    assert "Sam &lt;Admin&gt;" in html
+    assert "Drink 1" not in html
+
+
+def test_html_lists_every_line_item() -> None:
+    order = {
+        "name": "Team",
+        "items": [
+            {
+                "drinkType": "latte",
+                "size": "large",
+                "milk": "oat milk",
+                "extras": [],
+                "quantity": 3,
+            },
+            {
+                "drinkType": "mocha",
+                "size": "small",
+                "milk": "whole milk",
+                "extras": [],
+                "quantity": 1,
+            },
+        ],
+    }
+
+    html = render_html(order, order_number="1", placed_at=PLACED_AT)
+
+    assert "Drink 1 \u00d7 3" in html
+    assert "Drink 2</h4>" in html
+    assert "Mocha" in html
+
+
+def test_auto_mode_prefers_html() -> None:
+    topic, data = build_receipt_payload(
+        ORDER, order_number="1", placed_at=PLACED_AT, mode="auto"
+    )
+
+    assert topic == HTML_TOPIC
+    assert data.startswith(b"<!DOCTYPE html>")
+
+
+def test_auto_mode_falls_back_to_compact() -> None:
+    topic, data = build_receipt_payload(
+        ORDER, order_number="1", placed_at=PLACED_AT, mode="auto", max_bytes=1000
+    )
+    payload = json.loads(data)
+
+    assert topic == COMPACT_TOPIC
+    assert payload["v"] == TEMPLATE_VERSION
+    assert payload["order"] == ORDER
+    assert "truncated" not in payload
+
+
+def test_compact_payload_is_size_bounded() -> None:
+    item = {**ORDER["items"][0], "extras": [f"topping number {i}" for i in range(20)]}
+    order = {**ORDER, "items": [item] * 10}
+
+    topic, data = build_receipt_payload(
+        order, order_number="1", placed_at=PLACED_AT, mode="compact", max_bytes=1000
+    )
+    payload = json.loads(data)
+
+    assert topic == COMPACT_TOPIC
+    assert len(data) <= 1000
+    assert payload["truncated"] is True
+    assert payload["order"]["items"][0]["drinkType"] == "flat white"
+
+
+def test_payload_that_cannot_fit_raises() -> None:
+    with pytest.raises(ValueError):
+        build_receipt_payload(
+            ORDER, order_number="1", placed_at=PLACED_AT, mode="compact", max_bytes=10
+        )
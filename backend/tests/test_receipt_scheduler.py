@@ -0,0 +1,73 @@
+import asyncio
+
+from livekit.agents.voice import SpeechHandle
+
+from receipt_scheduler import ReceiptScheduler
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.payloads: list[bytes] = []
+
+    async def __call__(self, topic: str, payload: bytes) -> None:
+        assert topic == "order-visualization"
+        self.payloads.append(payload)
+
+
+async def test_publishes_when_speech_ends() -> None:
+    publish = _Recorder()
+    scheduler = ReceiptScheduler(publish, timeout=5)
+    handle = SpeechHandle.create()
+
+    task = scheduler.schedule("order-visualization", b"receipt", handle)
+    await asyncio.sleep(0.05)
+    assert publish.payloads == []
+
+    handle._mark_done()
+    await task
+
+    assert publish.payloads == [b"receipt"]
+    assert scheduler.published == 1
+    assert scheduler.latencies[0] < 0.05
+
+
+async def test_publishes_immediately_without_speech() -> None:
+    publish = _Recorder()
+    scheduler = ReceiptScheduler(publish, timeout=5)
+
+    await scheduler.schedule("order-visualization", b"receipt")
+
+    assert publish.payloads == [b"receipt"]
+
+
+async def test_timeout_caps_the_wait() -> None:
+    publish = _Recorder()
+    scheduler = ReceiptScheduler(publish, timeout=0.01)
+
+    await scheduler.schedule("order-visualization", b"receipt", SpeechHandle.create())
+
+    assert publish.payloads == [b"receipt"]
+    assert scheduler.timed_out == 1
+
+
+async def test_aclose_cancels_pending_receipts() -> None:
+    publish = _Recorder()
+    scheduler = ReceiptScheduler(publish, timeout=5)
+    task = scheduler.schedule("order-visualization", b"receipt", SpeechHandle.create())
+
+    await scheduler.aclose()
+
+    assert task.cancelled()
+    assert publish.payloads == []
+    assert scheduler.summary()["pending"] == 0
+
+
+async def test_publish_failures_are_counted() -> None:
+    async def failing(topic: str, payload: bytes) -> None:
+        raise ConnectionError("room closed")
+
+    scheduler = ReceiptScheduler(failing, timeout=5)
+    await scheduler.schedule("order-visualization", b"receipt")
+
+    assert scheduler.failed == 1
+    assert scheduler.published == 0
@@ -0,0 +1,134 @@
+import json
+
+from recorder import RECORD_VERSION, SessionRecorder, read_recording, replay
+
+ORDER_ARGS = {
+    "items": [
+        {"drink_type": "latte", "size": "large", "milk": "oat milk", "quantity": 1}
+    ],
+    "customer_name": "Sam",
+}
+
+
+def _recording(path) -> None:
+    """What a call placing one order looks like on disk."""
+    records = [
+        {"kind": "session", "version": RECORD_VERSION, "session_id": "AJ_test"},
+        {"kind": "message", "role": "user", "text": "Hi there"},
+        {"kind": "llm_request", "request": 1, "user": "Hi there", "items": []},
+        {
+            "kind": "llm_response",
+            "request": 1,
+            "text": "Hi! What can I get you?",
+            "tool_calls": [],
+            "ttft": 0.01,
+        },
+        {"kind": "message", "role": "user", "text": "The same as always please"},
+        {
+            "kind": "llm_request",
+            "request": 2,
+            "user": "The same as always please",
+            "items": [],
+        },
+        {
+            "kind": "llm_response",
+            "request": 2,
+            "text": "",
+            "tool_calls": [
+                {
+                    "name": "set_items",
+                    "arguments": json.dumps(ORDER_ARGS),
+                    "call_id": "call_1",
+                }
+            ],
+        },
+        {
+            "kind": "tool",
+            "name": "set_items",
+            "call_id": "call_1",
+            "output": "recorded by an older build",
+        },
+        {
+            "kind": "llm_request",
+            "request": 3,
+            "user": "The same as always please",
+            "items": [],
+        },
+        {
+            "kind": "llm_response",
+            "request": 3,
+            "text": "A large oat latte for Sam. Anything else?",
+            "tool_calls": [],
+        },
+        {"kind": "message", "role": "user", "text": "No that's it"},
+        {"kind": "llm_request", "request": 4, "user": "No that's it", "items": []},
+        {
+            "kind": "llm_response",
+            "request": 4,
+            "text": "",
+            "tool_calls": [
+                {"name": "save_order", "arguments": "{}", "call_id": "call_2"}
+            ],
+        },
+        {"kind": "llm_request", "request": 5, "user": "No that's it", "items": []},
+        {
+            "kind": "llm_response",
+            "request": 5,
+            "text": "Your order is in!",
+            "tool_calls": [],
+        },
+    ]
+    path.write_text(
+        "".join(json.dumps({"t": i * 0.1, **r}) + "\n" for i, r in enumerate(records))
+    )
+
+
+async def test_recorder_writes_records_in_order_and_drops_unencodable_ones(
+    tmp_path,
+) -> None:
+    recorder = SessionRecorder(tmp_path / "session.jsonl", session_id="AJ_test")
+    for n in range(500):
+        recorder.record("stt", text=f"utterance {n}")
+    recorder.record("metrics", value=object())
+    await recorder.aclose()
+    recorder.record("stt", text="after close")
+
+    records = read_recording(tmp_path / "session.jsonl")
+    assert records[0]["kind"] == "session" and records[0]["version"] == RECORD_VERSION
+    assert [r["text"] for r in records[1:]] == [f"utterance {n}" for n in range(500)]
+    assert recorder.summary()["dropped"] == 1
+
+
+async def test_replay_reruns_the_tools_and_its_own_recording_replays_identically(
+    tmp_path,
+) -> None:
+    _recording(tmp_path / "original.jsonl")
+
+    result = await replay(
+        tmp_path / "original.jsonl", record_to=tmp_path / "replayed.jsonl"
+    )
+
+    assert result["turns"] == 3 and result["llm_requests"] == 5
+    assert result["llm_mismatches"] == 0 and result["llm_exhausted"] == 0
+    assert result["orders_saved"] == 1
+    assert result["tool_calls"] == {"recorded": 1, "replayed": 2}
+    assert [d["recorded"][1] for d in result["tool_divergences"]] == [
+        "recorded by an older build"
+    ]
+
+    replayed = read_recording(tmp_path / "replayed.jsonl")
+    kinds = {r["kind"] for r in replayed}
+    assert {
+        "session",
+        "llm_request",
+        "llm_response",
+        "tool",
+        "message",
+        "agent_state",
+    } <= kinds
+    again = await replay(tmp_path / "replayed.jsonl")
+    assert again["tool_divergences"] == [] and again["llm_mismatches"] == 0
+    assert (
+        again["tool_calls"] == {"recorded": 2, "replayed": 2}
+        and again["orders_saved"] == 1
+    )
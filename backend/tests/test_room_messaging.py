@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from room_messaging import (
+    CHUNK_TOPIC,
+    ORDER_STATE_TOPIC,
+    ChunkAssembler,
+    RoomMessenger,
+    coalesce_patch,
+)
+
+
+class _FlakyParticipant:
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.packets: list[tuple[str, bytes]] = []
+
+    async def publish_data(
+        self, payload: bytes, *, reliable: bool = True, topic: str = ""
+    ) -> None:
+        await asyncio.sleep(0)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("data channel not ready")
+        self.packets.append((topic, payload))
+
+
+class _Room:
+    def __init__(self, failures: int = 0) -> None:
+        self.local_participant = _FlakyParticipant(failures)
+        self.listeners = {}
+
+    def on(self, event: str, callback) -> None:
+        self.listeners[event] = callback
+
+
+async def test_large_payloads_are_compressed_chunked_and_reassembled() -> None:
+    room = _Room()
+    messenger = RoomMessenger(room, max_packet=1000)
+    payload = ("<div>receipt</div>" * 2000).encode() + os.urandom(3000)
+
+    await messenger.publish("order-visualization", payload)
+
+    packets = room.local_participant.packets
+    assert len(packets) > 1 and all(
+        topic == CHUNK_TOPIC and len(p) <= 1000 for topic, p in packets
+    )
+    assert sum(len(p) for _, p in packets) < len(payload)
+    assembler = ChunkAssembler()
+    results = [assembler.add(p) for _, p in reversed(packets)]
+    assert results[:-1] == [None] * (len(packets) - 1)
+    assert results[-1] == ("order-visualization", payload)
+
+
+async def test_small_payloads_keep_their_topic_and_failures_are_retried() -> None:
+    room = _Room(failures=2)
+    messenger = RoomMessenger(room, backoff=0)
+
+    await messenger.publish("order-receipt", b"{}")
+
+    assert room.local_participant.packets == [("order-receipt", b"{}")]
+    assert messenger.summary()["retries"] == 2
+
+    room.local_participant.failures = 10
+    with pytest.raises(ConnectionError):
+        await messenger.publish("order-receipt", b"{}")
+    assert messenger.summary()["failed"] == 1
+
+
+def test_coalesce_patch_drops_superseded_replaces() -> None:
+    ops: list[dict] = []
+    for op in (
+        {"op": "replace", "path": "/items/0/size", "value": "small"},
+        {"op": "replace", "path": "/name", "value": "Sam"},
+        {"op": "replace", "path": "/items/0/size", "value": "large"},
+        {"op": "remove", "path": "/items/0"},
+        {"op": "replace", "path": "/items/0/size", "value": "medium"},
+    ):
+        coalesce_patch(ops, op)
+
+    assert [(op["path"], op.get("value")) for op in ops] == [
+        ("/name", "Sam"),
+        ("/items/0/size", "large"),
+        ("/items/0", None),
+        ("/items/0/size", "medium"),
+    ]
+    coalesce_patch(
+        ops, {"op": "replace", "path": "", "value": {"name": None, "items": []}}
+    )
+    assert [op["path"] for op in ops] == [""]
+
+
+async def test_patches_are_batched_into_versioned_messages() -> None:
+    room = _Room()
+    messenger = RoomMessenger(room, patch_window=0)
+    messenger.publish_patch({"op": "replace", "path": "/name", "value": "Sam"})
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)  # the first batch is now being sent
+    for size in ("medium", "large"):
+        messenger.publish_patch(
+            {"op": "replace", "path": "/items/0/size", "value": size}
+        )
+    messenger.publish_patch(
+        {"op": "add", "path": "/items/0/extras/-", "value": "extra shot"}
+    )
+    await messenger.aclose()
+
+    messages = [
+        json.loads(p)
+        for topic, p in room.local_participant.packets
+        if topic == ORDER_STATE_TOPIC
+    ]
+    assert [m["v"] for m in messages] == [1, 2]
+    assert [(op["path"], op["value"]) for op in messages[1]["ops"]] == [
+        ("/items/0/size", "large"),
+        ("/items/0/extras/-", "extra shot"),
+    ]
+    assert messenger.summary()["patch_ops_coalesced"] == 1
+
+    messenger.publish_snapshot({"name": None, "items": []})
+    await messenger.aclose()
+    assert json.loads(room.local_participant.packets[-1][1]) == {
+        "v": 3,
+        "ops": [{"op": "replace", "path": "", "value": {"name": None, "items": []}}],
+    }
+
+
+def test_inbound_packets_reach_their_handlers() -> None:
+    room = _Room()
+    messenger = RoomMessenger(room)
+    received = []
+    messenger.on(
+        "visualization-closed",
+        lambda payload, sender: received.append((payload, sender)),
+    )
+
+    packet = SimpleNamespace(
+        data=b"receipt-closed",
+        topic="visualization-closed",
+        participant=SimpleNamespace(identity="user"),
+    )
+    room.listeners["data_received"](packet)
+    room.listeners["data_received"](
+        SimpleNamespace(data=b"", topic="other", participant=None)
+    )
+
+    assert received == [(b"receipt-closed", "user")]
@@ -0,0 +1,291 @@
+import asyncio
+from typing import Optional
+
+import pytest
+from livekit import rtc
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    APIConnectionError,
+    APIConnectOptions,
+    llm,
+    stt,
+    tts,
+    utils,
+)
+
+from routing import (
+    MIN_SAMPLES,
+    CircuitBreaker,
+    RollingLatency,
+    RoutedLLM,
+    RoutedSTT,
+    RoutedTTS,
+)
+
+SAMPLE_RATE = 16000
+
+
+class _StubLLM(llm.LLM):
+    """Replies with its own name after the next of `delays`, or fails if `fail` is set."""
+
+    def __init__(
+        self, name: str, delays: Optional[list[float]] = None, fail: bool = False
+    ) -> None:
+        super().__init__()
+        self.name = name
+        self.delays = list(delays or [])
+        self.fail = fail
+        self.requests = 0
+
+    @property
+    def model(self) -> str:
+        return self.name
+
+    @property
+    def provider(self) -> str:
+        return "stub"
+
+    def chat(
+        self,
+        *,
+        chat_ctx,
+        tools=None,
+        conn_options=DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs,
+    ):
+        self.requests += 1
+        delay = self.delays.pop(0) if self.delays else 0.0
+        return _StubLLMStream(
+            self,
+            chat_ctx=chat_ctx,
+            tools=tools or [],
+            conn_options=conn_options,
+            delay=delay,
+        )
+
+
+class _StubLLMStream(llm.LLMStream):
+    def __init__(self, stub: _StubLLM, *, delay: float, **kwargs) -> None:
+        super().__init__(stub, **kwargs)
+        self._delay = delay
+
+    async def _run(self) -> None:
+        await asyncio.sleep(self._delay)
+        if self._llm.fail:  # type: ignore[attr-defined]
+            raise APIConnectionError("stub outage", retryable=False)
+        for word in ("from", self._llm.model):
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    id="stub",
+                    delta=llm.ChoiceDelta(role="assistant", content=f"{word} "),
+                )
+            )
+
+
+class _StubTTS(tts.TTS):
+    """Synthesizes 10 ms of silence after the next of `delays`."""
+
+    def __init__(self, delays: list[float]) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+        )
+        self.delays = list(delays)
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ):
+        return _StubChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _StubChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        await asyncio.sleep(self._tts.delays.pop(0))  # type: ignore[attr-defined]
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        output_emitter.push(bytes(SAMPLE_RATE // 100 * 2))
+        output_emitter.flush()
+
+
+class _StubSTT(stt.STT):
+    """Streams that fail after `fail_after` frames, or transcribe how many frames they heard."""
+
+    def __init__(self, name: str, fail_after: Optional[int] = None) -> None:
+        super().__init__(
+            capabilities=stt.STTCapabilities(streaming=True, interim_results=False)
+        )
+        self.name = name
+        self.fail_after = fail_after
+
+    @property
+    def model(self) -> str:
+        return self.name
+
+    async def _recognize_impl(
+        self, buffer, *, language=None, conn_options: APIConnectOptions
+    ) -> stt.SpeechEvent:
+        if self.fail_after is not None:
+            raise APIConnectionError("stub outage", retryable=False)
+        return _final(self.name)
+
+    def stream(
+        self,
+        *,
+        language=None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ):
+        return _StubRecognizeStream(
+            stt=self, conn_options=conn_options, sample_rate=None
+        )
+
+
+class _StubRecognizeStream(stt.RecognizeStream):
+    async def _run(self) -> None:
+        frames = 0
+        async for data in self._input_ch:
+            if isinstance(data, rtc.AudioFrame):
+                frames += 1
+                if frames == self._stt.fail_after:  # type: ignore[attr-defined]
+                    raise APIConnectionError("stub outage", retryable=False)
+        self._event_ch.send_nowait(_final(f"{self._stt.model} heard {frames} frames"))
+
+
+def _final(text: str) -> stt.SpeechEvent:
+    return stt.SpeechEvent(
+        type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+        alternatives=[stt.SpeechData(language="en", text=text)],
+    )
+
+
+async def _reply(routed: RoutedLLM) -> str:
+    async with routed.chat(
+        chat_ctx=llm.ChatContext.empty(), conn_options=APIConnectOptions(max_retry=0)
+    ) as stream:
+        return "".join(
+            [chunk.delta.content async for chunk in stream if chunk.delta]
+        ).strip()
+
+
+def test_rolling_latency_needs_samples_and_forgets_old_ones() -> None:
+    latency = RollingLatency(window=MIN_SAMPLES)
+    for _ in range(MIN_SAMPLES - 1):
+        latency.record(5.0)
+    assert latency.percentile(0.95) is None
+
+    for i in range(MIN_SAMPLES):
+        latency.record((i + 1) / 100)
+    assert latency.percentile(0.95) == pytest.approx(0.19)
+    assert latency.percentile(0.5) == pytest.approx(0.10)
+
+
+def test_circuit_breaker_opens_then_lets_one_trial_through() -> None:
+    now = [0.0]
+    breaker = CircuitBreaker(
+        failure_threshold=2, reset_timeout=10, clock=lambda: now[0]
+    )
+
+    breaker.record_failure()
+    assert breaker.available()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.available()
+
+    now[0] = 10
+    assert breaker.available()
+    breaker.on_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.available()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened == 2
+
+    now[0] = 20
+    breaker.on_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.available()
+
+
+async def test_slow_llm_is_hedged_with_the_next_provider() -> None:
+    slow, fast = _StubLLM("slow", delays=[1.0]), _StubLLM("fast")
+    routed = RoutedLLM([slow, fast], budget=0.05, hedging=True, health={})
+
+    assert await _reply(routed) == "from fast"
+
+    summary = routed.router.summary()
+    assert summary["llm:stub:slow"]["hedges"] == 0
+    assert summary["llm:stub:fast"]["hedges"] == 1
+    assert summary["llm:stub:fast"]["hedge_wins"] == 1
+    assert fast.requests == 1
+
+
+async def test_failing_llm_fails_over_and_its_circuit_opens() -> None:
+    broken, backup = _StubLLM("broken", fail=True), _StubLLM("backup")
+    routed = RoutedLLM(
+        [broken, backup], budget=1.0, health={}, failure_threshold=2, reset_timeout=60
+    )
+
+    for _ in range(3):
+        assert await _reply(routed) == "from backup"
+
+    # The third request skipped the broken provider
+    assert broken.requests == 2
+    assert routed.router.summary()["llm:stub:broken"]["circuit"] == CircuitBreaker.OPEN
+
+    backup.fail = True
+    with pytest.raises(APIConnectionError):
+        await _reply(routed)
+
+
+async def test_single_tts_hedges_with_itself() -> None:
+    provider = _StubTTS(delays=[1.0, 0.0])
+    routed = RoutedTTS([provider], budget=0.05, hedging=True, health={})
+
+    async with routed.synthesize("One latte, coming up.") as stream:
+        frame = await asyncio.wait_for(stream.collect(), timeout=0.5)
+
+    assert frame.duration > 0
+    assert routed.router.summary()["tts:unknown:unknown"]["hedge_wins"] == 1
+
+
+async def test_stt_fails_over_and_replays_audio() -> None:
+    routed = RoutedSTT(
+        [_StubSTT("primary", fail_after=3), _StubSTT("backup")], budget=1.0, health={}
+    )
+
+    event = await routed.recognize(rtc.AudioFrame.create(SAMPLE_RATE, 1, 160))
+    assert event.alternatives[0].text == "backup"
+
+    stream = routed.stream()
+    for _ in range(5):
+        stream.push_frame(rtc.AudioFrame.create(SAMPLE_RATE, 1, 160))
+        await asyncio.sleep(0)
+    stream.end_input()
+    events = [event async for event in stream]
+
+    assert [event.alternatives[0].text for event in events] == ["backup heard 5 frames"]
+
+
+async def test_stt_stream_closed_before_a_transcript_ends_the_half_open_trial() -> None:
+    routed = RoutedSTT(
+        [_StubSTT("primary")],
+        budget=1.0,
+        health={},
+        failure_threshold=1,
+        reset_timeout=0,
+    )
+    breaker = routed.router.routes[0].health.breaker
+    breaker.record_failure()
+
+    stream = routed.stream()
+    stream.push_frame(rtc.AudioFrame.create(SAMPLE_RATE, 1, 160))
+    await asyncio.sleep(0.05)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # The session closes during silence, before any final transcript
+    await stream.aclose()
+
+    assert breaker.available()
@@ -0,0 +1,42 @@
+from shared_models import SharedModels
+
+
+def test_lazy_mode_loads_on_first_use_only() -> None:
+    models = SharedModels(eager=False)
+
+    report = models.prewarm()
+    assert report["mode"] == "lazy"
+    assert report["models"] == {}
+
+    tokenizer = models.sentence_tokenizer
+    assert models.sentence_tokenizer is tokenizer
+    assert list(models.load_seconds) == ["sentence_tokenizer"]
+
+
+def test_eager_mode_loads_everything_in_prewarm(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("TTS_CACHE_BYTES", str(2**20))
+    monkeypatch.setenv("TTS_CACHE_DIR", str(tmp_path))
+    models = SharedModels(eager=True)
+
+    report = models.prewarm()
+
+    assert report["mode"] == "eager"
+    assert report["rss_mb"] > 0
+    assert {"vad", "noise_cancellation", "sentence_tokenizer", "menu"} <= set(
+        report["models"]
+    )
+    vad = models.vad
+    assert models.vad is vad
+    assert models.tts_cache.directory == tmp_path
+
+
+def test_mode_from_env(monkeypatch) -> None:
+    monkeypatch.setenv("PREWARM_MODE", "lazy")
+    assert SharedModels().eager is False
+    monkeypatch.delenv("PREWARM_MODE")
+    assert SharedModels().eager is True
+
+
+def test_tts_cache_is_opt_in(monkeypatch) -> None:
+    monkeypatch.delenv("TTS_CACHE_BYTES", raising=False)
+    assert SharedModels(eager=False).tts_cache is None
@@ -0,0 +1,108 @@
+import pytest
+
+from cart import Cart, CoffeeOrder
+from slot_filler import SlotFiller
+
+
+@pytest.fixture
+def filler() -> SlotFiller:
+    return SlotFiller()
+
+
+def test_single_drink(filler: SlotFiller) -> None:
+    cart = Cart()
+
+    filler.apply("Can I get a large oat latte with vanilla", cart)
+
+    assert cart.to_dict()["items"] == [
+        {
+            "drinkType": "latte",
+            "size": "large",
+            "milk": "oat milk",
+            "extras": ["vanilla syrup"],
+            "quantity": 1,
+        }
+    ]
+
+
+def test_group_order_splits_clauses(filler: SlotFiller) -> None:
+    cart = Cart()
+
+    filler.apply(
+        "three large lattes with oat milk and a small mocha, my name is priya", cart
+    )
+
+    assert [(i.drink_type, i.size, i.milk, i.quantity) for i in cart.items] == [
+        ("latte", "large", "oat milk", 3),
+        ("mocha", "small", None, 1),
+    ]
+    assert cart.name == "Priya"
+
+
+def test_trailing_clause_without_drink_extends_previous(filler: SlotFiller) -> None:
+    cart = Cart()
+
+    filler.apply("a flat white with almond milk and whipped cream", cart)
+
+    assert cart.items[0].drink_type == "flat white"
+    assert cart.items[0].extras == ["whipped cream"]
+
+
+def test_modifier_only_updates_current_drink(filler: SlotFiller) -> None:
+    cart = Cart()
+    cart.add_item(CoffeeOrder(drink_type="americano"))
+
+    filler.apply("medium please, no milk", cart)
+
+    assert (cart.current.size, cart.current.milk) == ("medium", "no milk")
+
+
+@pytest.mark.parametrize(
+    "utterance",
+    [
+        "do you have oat milk?",
+        "actually not a latte",
+        "a large small latte",
+        "hello there",
+        "large please",  # nothing to attach it to yet
+        "a latte please, actually make it a mocha",
+        "a mocha instead of the latte",
+    ],
+)
+def test_leaves_ambiguous_utterances_to_the_llm(
+    filler: SlotFiller, utterance: str
+) -> None:
+    cart = Cart()
+
+    assert filler.apply(utterance, cart) is None
+    assert cart.items == [] and cart.name is None
+
+
+def test_repeating_the_current_drink_confirms_it(filler: SlotFiller) -> None:
+    cart = Cart()
+    filler.apply("a large oat latte please", cart)
+
+    fill = filler.apply("yes, a large oat latte", cart)
+    assert fill is not None and not fill.changed
+    assert len(cart.items) == 1
+
+    assert filler.apply("a latte with vanilla", cart).changed
+    assert [(i.drink_type, i.size, i.extras) for i in cart.items] == [
+        ("latte", "large", ["vanilla syrup"])
+    ]
+
+    # A different size could be a correction or a second drink
+    assert filler.apply("a small latte", cart) is None
+    filler.apply("and another large oat latte", cart)
+    assert len(cart.items) == 2
+
+
+def test_stats_track_hit_rate(filler: SlotFiller) -> None:
+    filler.apply("a latte", Cart())
+    filler.apply("what's good here", Cart())
+    filler.stats.observe_llm_ttft(0.4)
+
+    summary = filler.stats.summary()
+    assert summary["turns"] == 2
+    assert summary["hit_rate"] == 0.5
+    assert summary["est_ttfa_saved_ms_total"] == 400.0
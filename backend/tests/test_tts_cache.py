@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+from livekit.agents import (
+    DEFAULT_API_CONNECT_OPTIONS,
+    APIConnectOptions,
+    tokenize,
+    tts,
+    utils,
+)
+
+from routing import RoutedTTS
+from tts_cache import CachedTTS, TTSCache, warm_up, warm_up_cache
+
+SAMPLE_RATE = 16000
+
+
+class _CountingTTS(tts.TTS):
+    """Returns 100ms of a tone-free buffer per word and counts requests."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+        )
+        self.requests: list[str] = []
+        self.delay = 0.01
+
+    def synthesize(
+        self,
+        text: str,
+        *,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ):
+        self.requests.append(text)
+        return _CountingStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _CountingStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        await asyncio.sleep(self._tts.delay)
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        output_emitter.push(
+            b"\x01\x00" * (SAMPLE_RATE // 10) * len(self._input_text.split())
+        )
+        output_emitter.flush()
+
+
+async def _synthesize(cached: CachedTTS, text: str) -> bytes:
+    async with cached.synthesize(text) as stream:
+        frame = await stream.collect()
+    return frame.data.tobytes()
+
+
+async def test_repeated_sentence_is_served_from_cache() -> None:
+    inner = _CountingTTS()
+    cached = CachedTTS(inner, TTSCache(max_bytes=10 * 2**20))
+
+    first = await _synthesize(cached, "Great choice!")
+    second = await _synthesize(cached, "  great   CHOICE! ")
+
+    assert second == first
+    assert inner.requests == ["Great choice!"]
+    assert cached.cache.summary()["hits"] == 1
+    assert cached.cache.summary()["misses"] == 1
+
+
+async def test_byte_budget_evicts_least_recently_used() -> None:
+    inner = _CountingTTS()
+    cached = CachedTTS(inner, TTSCache())
+
+    await _synthesize(cached, "one")
+    cached.cache.max_bytes = 2 * cached.cache.bytes  # room for two one-word entries
+    await _synthesize(cached, "two")
+    await _synthesize(cached, "one")  # refresh, so "two" is the oldest
+    await _synthesize(cached, "three")
+
+    assert cached.cache.evictions == 1
+    await _synthesize(cached, "one")
+    await _synthesize(cached, "two")
+    assert inner.requests == ["one", "two", "three", "two"]
+
+
+async def test_disk_store_is_shared_between_caches(tmp_path) -> None:
+    inner = _CountingTTS()
+    await _synthesize(CachedTTS(inner, TTSCache(directory=tmp_path)), "Anything else?")
+
+    fresh = CachedTTS(inner, TTSCache(directory=tmp_path))
+    await _synthesize(fresh, "Anything else?")
+
+    assert inner.requests == ["Anything else?"]
+    assert fresh.cache.disk_hits == 1
+
+
+async def test_warm_up_synthesizes_each_sentence_once() -> None:
+    inner = _CountingTTS()
+    cached = CachedTTS(inner, TTSCache())
+    tokenizer = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+
+    phrases = ["Hi! Welcome to Murf Coffee Shop.", "Anything else?", "Anything else?"]
+    assert await warm_up(cached, phrases, tokenizer) == 3
+    assert await warm_up(cached, phrases, tokenizer) == 0
+    assert len(inner.requests) == 3
+
+
+def test_warm_up_stops_at_its_timeout() -> None:
+    inner = _CountingTTS()
+    inner.delay = 0.1
+    cache = TTSCache()
+    tokenizer = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    phrases = [f"Phrase number {n}." for n in range(20)]
+
+    start = time.perf_counter()
+    warm_up_cache(cache, lambda session: inner, tokenizer, phrases, timeout=0.35)
+
+    assert time.perf_counter() - start < 1
+    assert 1 <= cache.summary()["entries"] < 20
+    assert cache.summary()["hits"] == cache.summary()["misses"] == 0
+
+
+async def test_sentences_from_a_fallback_provider_are_not_cached() -> None:
+    primary, backup = _CountingTTS(), _CountingTTS()
+    primary.delay = 1.0
+    routed = RoutedTTS([primary, backup], budget=0.05, hedging=True, health={})
+    cached = CachedTTS(routed, TTSCache())
+
+    await _synthesize(cached, "Anything else?")
+
+    assert backup.requests == ["Anything else?"]
+    assert cached.cache.summary()["entries"] == 0
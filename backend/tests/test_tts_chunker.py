@@ -0,0 +1,57 @@
+import pytest
+
+from tts_chunker import AdaptiveSentenceTokenizer, first_chunk_end
+
+REPLY = (
+    "Sure thing, one large latte with oat milk coming up. Anything else for you today?"
+)
+
+
+async def _stream(
+    tokenizer: AdaptiveSentenceTokenizer, text: str, step: int
+) -> list[str]:
+    stream = tokenizer.stream()
+    for i in range(0, len(text), step):
+        stream.push_text(text[i : i + step])
+    stream.end_input()
+    return [event.token async for event in stream]
+
+
+def test_first_chunk_ends_at_clause_or_word_limit() -> None:
+    assert first_chunk_end("Hi Sam, what can I get you? ", 2, 8) == len("Hi Sam,")
+    # Too short a clause is not a chunk of its own
+    assert first_chunk_end(
+        "Sure, one large latte with oat milk coming up. ", 3, 6
+    ) == len("Sure, one large latte with oat")
+    # Decimals and a word still being written are not boundaries
+    assert first_chunk_end("That's $3.50 total", 2, 8) is None
+    assert first_chunk_end("That's $3.50 total, ", 2, 8) == len("That's $3.50 total,")
+
+
+@pytest.mark.parametrize("step", [1, 3, 7, len(REPLY)])
+async def test_stream_sends_first_clause_early_then_sentences(step: int) -> None:
+    tokenizer = AdaptiveSentenceTokenizer(min_words=2, max_words=8)
+
+    chunks = await _stream(tokenizer, REPLY, step)
+
+    assert chunks == [
+        "Sure thing,",
+        "one large latte with oat milk coming up.",
+        "Anything else for you today?",
+    ]
+    assert tokenizer.tokenize(REPLY) == chunks
+
+
+async def test_short_reply_and_disabled_chunker_keep_whole_sentences() -> None:
+    assert await _stream(
+        AdaptiveSentenceTokenizer(min_words=3, max_words=8), "Thanks, Sam!", 2
+    ) == ["Thanks, Sam!"]
+    assert AdaptiveSentenceTokenizer(min_words=3, max_words=8).tokenize(
+        "Thanks, Sam!"
+    ) == ["Thanks, Sam!"]
+
+    disabled = AdaptiveSentenceTokenizer(min_words=2, max_words=0)
+    assert await _stream(disabled, REPLY, 5) == [
+        "Sure thing, one large latte with oat milk coming up.",
+        "Anything else for you today?",
+    ]
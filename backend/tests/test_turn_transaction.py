@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+from livekit.agents.voice import SpeechHandle
+
+from agent import Assistant
+from order_store import JsonlOrderStore
+from turn_transaction import TurnTransactions
+
+
+def _context(handle: SpeechHandle, call_id: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        speech_handle=handle, function_call=SimpleNamespace(call_id=call_id)
+    )
+
+
+class _State:
+    def __init__(self) -> None:
+        self.value = {"size": None}
+
+    def restore(self, snapshot: dict) -> None:
+        self.value = snapshot
+
+
+async def test_discarded_reply_is_rolled_back() -> None:
+    state = _State()
+    txns = TurnTransactions(lambda: dict(state.value), state.restore)
+    handle = SpeechHandle.create()
+
+    txns.begin(_context(handle, "call_1"))
+    state.value["size"] = "large"
+    handle._mark_done()
+    await asyncio.sleep(0)  # done callbacks run on the next loop iteration
+
+    assert state.value == {"size": None}
+    assert txns.summary() == {"committed": 0, "rolled_back": 1, "open": 0}
+
+
+async def test_executed_calls_commit() -> None:
+    state = _State()
+    txns = TurnTransactions(lambda: dict(state.value), state.restore)
+    handle = SpeechHandle.create()
+
+    txns.begin(_context(handle, "call_1"))
+    txns.begin(_context(handle, "call_2"))
+    state.value["size"] = "large"
+    txns.commit_calls(["call_1"])
+    assert txns.summary()["open"] == 1  # call_2 has not been recorded yet
+    txns.commit_calls(["call_1", "call_2"])
+    handle._mark_done()
+    await asyncio.sleep(0)
+
+    assert state.value == {"size": "large"}
+    assert txns.summary() == {"committed": 1, "rolled_back": 0, "open": 0}
+
+
+async def test_interrupted_tools_leave_the_cart_untouched(tmp_path) -> None:
+    assistant = Assistant(order_store=JsonlOrderStore(tmp_path))
+    handle = SpeechHandle.create()
+
+    await assistant.set_drink_type(
+        _context(handle, "call_1"), drink_type="latte", item_number=None
+    )
+    await assistant.set_size(_context(handle, "call_2"), size="large", item_number=None)
+    assert assistant.cart.describe() == "large latte"
+    handle._mark_done()
+    await asyncio.sleep(0)
+
+    assert assistant.cart.describe() == "nothing yet"
+    await assistant.order_store.aclose()
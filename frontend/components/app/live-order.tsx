@@ -0,0 +1,119 @@
+'use client';
+
+import React, { useCallback, useEffect, useRef, useState } from 'react';
+import { useRoomContext } from '@livekit/components-react';
+import { AnimatePresence, motion } from 'motion/react';
+import type { ReceiptItem, ReceiptOrder } from '@/components/app/receipt-card';
+import { useRoomMessages } from '@/hooks/useRoomMessages';
+
+/** Must match ORDER_STATE_TOPIC and RESYNC_TOPIC in backend/src/room_messaging.py */
+const STATE_TOPIC = 'order-state';
+const RESYNC_TOPIC = 'order-state-resync';
+const STATE_TOPICS = [STATE_TOPIC];
+
+/** A JSON Patch (RFC 6902) operation against the order, as sent by backend/src/cart.py */
+interface PatchOp {
+  op: 'add' | 'remove' | 'replace';
+  path: string;
+  value?: unknown;
+}
+
+interface OrderPatch {
+  v: number;
+  ops: PatchOp[];
+}
+
+const EMPTY_ORDER: ReceiptOrder = { name: null, items: [] };
+
+function applyPatch(order: ReceiptOrder, ops: PatchOp[]): ReceiptOrder {
+  let root: any = structuredClone(order);
+  for (const { op, path, value } of ops) {
+    if (path === '') {
+      root = structuredClone(value);
+      continue;
+    }
+    const keys = path
+      .slice(1)
+      .split('/')
+      .map((key) => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+    const last = keys.pop()!;
+    const parent = keys.reduce((node, key) => node[key], root);
+    if (Array.isArray(parent)) {
+      const index = last === '-' ? parent.length : Number(last);
+      if (op === 'add') parent.splice(index, 0, value);
+      else if (op === 'remove') parent.splice(index, 1);
+      else parent[index] = value;
+    } else if (op === 'remove') {
+      delete parent[last];
+    } else {
+      parent[last] = value;
+    }
+  }
+  return root as ReceiptOrder;
+}
+
+function describe(item: ReceiptItem) {
+  const quantity = item.quantity > 1 ? `${item.quantity} × ` : '';
+  const extras = item.extras.length ? `, ${item.extras.join(', ')}` : '';
+  const milk = item.milk ? ` with ${item.milk}` : '';
+  return `${quantity}${item.size ?? ''} ${item.drinkType ?? 'drink'}${milk}${extras}`.trim();
+}
+
+/** The order as the barista records it, kept current by the backend's order patches. */
+export function LiveOrder() {
+  const room = useRoomContext();
+  const [order, setOrder] = useState<ReceiptOrder>(EMPTY_ORDER);
+  const versionRef = useRef(0);
+
+  const requestResync = useCallback(() => {
+    if (!room) return;
+    room.localParticipant
+      .publishData(new TextEncoder().encode('resync'), { topic: RESYNC_TOPIC })
+      .catch((error) => console.warn('Failed to request the order state:', error));
+  }, [room]);
+
+  // The agent may have recorded part of the order before this component mounted
+  useEffect(() => {
+    requestResync();
+  }, [requestResync]);
+
+  useRoomMessages(STATE_TOPICS, (_, payload) => {
+    let patch: OrderPatch;
+    try {
+      patch = JSON.parse(new TextDecoder().decode(payload)) as OrderPatch;
+    } catch (error) {
+      console.warn('Invalid order patch:', error);
+      return;
+    }
+    const isSnapshot = patch.ops[0]?.op === 'replace' && patch.ops[0]?.path === '';
+    if (!isSnapshot && patch.v !== versionRef.current + 1) {
+      // A patch went missing; ask for the whole order again
+      requestResync();
+      return;
+    }
+    versionRef.current = patch.v;
+    setOrder((current) => applyPatch(current, patch.ops));
+  });
+
+  const items = order.items.filter((item) => item.drinkType);
+  return (
+    <AnimatePresence>
+      {items.length > 0 && (
+        <motion.div
+          key="live-order"
+          initial={{ opacity: 0, x: 20 }}
+          animate={{ opacity: 1, x: 0 }}
+          exit={{ opacity: 0, x: 20 }}
+          className="fixed top-16 right-4 z-[80] w-64 rounded-xl bg-[#2c1810]/90 p-4 text-sm text-white shadow-lg"
+        >
+          <div className="mb-2 font-semibold">Your order{order.name ? ` for ${order.name}` : ''}</div>
+          <ul className="space-y-1">
+            {items.map((item, index) => (
+              <li key={index}>{describe(item)}</li>
+            ))}
+          </ul>
+        </motion.div>
+      )}
+    </AnimatePresence>
+  );
+}
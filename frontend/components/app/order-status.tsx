@@ -0,0 +1,64 @@
+'use client';
+
+import React, { useEffect, useRef, useState } from 'react';
+import { AnimatePresence, motion } from 'motion/react';
+import { useRoomMessages } from '@/hooks/useRoomMessages';
+
+/** Must match STATUSES in backend/src/kitchen.py */
+type KitchenStatus = 'queued' | 'making' | 'ready';
+
+interface OrderStatusUpdate {
+  orderId: number;
+  orderNumber: string;
+  status: KitchenStatus;
+}
+
+const STATUS_LABELS: Record<KitchenStatus, string> = {
+  queued: 'is in the queue',
+  making: 'is being made',
+  ready: 'is ready for pickup!',
+};
+
+const STATUS_TOPICS = ['order-status'];
+// How long a ready order stays on screen
+const READY_DISPLAY_MS = 15000;
+
+export function OrderStatus() {
+  const [update, setUpdate] = useState<OrderStatusUpdate | null>(null);
+  const hideRef = useRef<NodeJS.Timeout | undefined>();
+
+  useRoomMessages(STATUS_TOPICS, (_, payload) => {
+    try {
+      const next = JSON.parse(new TextDecoder().decode(payload)) as OrderStatusUpdate;
+      setUpdate(next);
+      if (hideRef.current) clearTimeout(hideRef.current);
+      if (next.status === 'ready') {
+        hideRef.current = setTimeout(() => setUpdate(null), READY_DISPLAY_MS);
+      }
+    } catch (error) {
+      console.warn('Invalid order status payload:', error);
+    }
+  });
+
+  useEffect(() => {
+    return () => {
+      if (hideRef.current) clearTimeout(hideRef.current);
+    };
+  }, []);
+
+  return (
+    <AnimatePresence>
+      {update && (
+        <motion.div
+          key="order-status"
+          initial={{ opacity: 0, y: -10 }}
+          animate={{ opacity: 1, y: 0 }}
+          exit={{ opacity: 0, y: -10 }}
+          className="fixed top-4 left-1/2 z-[90] -translate-x-1/2 rounded-full bg-[#2c1810] px-5 py-2 text-sm text-white shadow-lg"
+        >
+          Order #{update.orderNumber} {STATUS_LABELS[update.status] ?? update.status}
+        </motion.div>
+      )}
+    </AnimatePresence>
+  );
+}
@@ -3,10 +3,16 @@
 import React, { useCallback, useEffect, useRef, useState } from 'react';
 import { useRoomContext } from '@livekit/components-react';
 import { motion, AnimatePresence } from 'motion/react';
+import { type CompactReceipt, ReceiptCard, parseCompactReceipt } from '@/components/app/receipt-card';
+import { useRoomMessages } from '@/hooks/useRoomMessages';
+
+const RECEIPT_TOPICS = ['order-visualization', 'order-receipt'];
+
+type ReceiptContent = { kind: 'html'; html: string } | { kind: 'compact'; receipt: CompactReceipt };
 
 export function OrderVisualization() {
   const room = useRoomContext();
-  const [htmlContent, setHtmlContent] = useState<string>('');
+  const [content, setContent] = useState<ReceiptContent | null>(null);
   const [isVisible, setIsVisible] = useState(false);
   const timeoutRef = useRef<NodeJS.Timeout | undefined>();
   const isShowingRef = useRef(false);
@@ -45,19 +51,19 @@ export function OrderVisualization() {
       timeoutRef.current = undefined;
     }
     setIsVisible(false);
-    setHtmlContent('');
+    setContent(null);
     isShowingRef.current = false;
     muteRemoteAudio(false);
     notifyBackendClosed();
   }, [muteRemoteAudio, notifyBackendClosed]);
 
   const showVisualization = useCallback(
-    (html: string) => {
+    (receipt: ReceiptContent) => {
       // Prevent multiple rapid shows
       if (isShowingRef.current) return;
       
       isShowingRef.current = true;
-      setHtmlContent(html);
+      setContent(receipt);
       setIsVisible(true);
       muteRemoteAudio(true);
 
@@ -75,32 +81,20 @@ export function OrderVisualization() {
     closeVisualization();
   }, [closeVisualization]);
 
-  // Listen for visualization payloads from the backend
-  useEffect(() => {
-    if (!room) return;
+  // Listen for visualization payloads from the backend; large HTML receipts arrive in chunks
+  useRoomMessages(RECEIPT_TOPICS, (topic, payload) => {
+    // Ignore if already showing to prevent flicker
+    if (isShowingRef.current) return;
 
-    const handleData = (
-      payload: Uint8Array,
-      participant?: any,
-      kind?: any,
-      topic?: string,
-    ) => {
-      if (topic === 'order-visualization') {
-        // Ignore if already showing to prevent flicker
-        if (isShowingRef.current) return;
-        
-        const decoder = new TextDecoder();
-        const html = decoder.decode(payload);
-        showVisualization(html);
-      }
-    };
-
-    room.on('dataReceived', handleData);
-
-    return () => {
-      room.off('dataReceived', handleData);
-    };
-  }, [room, showVisualization]);
+    const text = new TextDecoder().decode(payload);
+    if (topic === 'order-visualization') {
+      showVisualization({ kind: 'html', html: text });
+      return;
+    }
+    // Compact receipts carry only the order fields and are hydrated locally
+    const receipt = parseCompactReceipt(text);
+    if (receipt) showVisualization({ kind: 'compact', receipt });
+  });
 
   // Cleanup on unmount
   useEffect(() => {
@@ -113,7 +107,7 @@ export function OrderVisualization() {
 
   return (
     <AnimatePresence mode="wait">
-      {isVisible && htmlContent && (
+      {isVisible && content && (
         <motion.div
           key="order-viz-stable"
           initial={{ opacity: 0, scale: 0.9 }}
@@ -139,7 +133,11 @@ export function OrderVisualization() {
             >
               ✕
             </button>
-            <div dangerouslySetInnerHTML={{ __html: htmlContent }} />
+            {content.kind === 'html' ? (
+              <div dangerouslySetInnerHTML={{ __html: content.html }} />
+            ) : (
+              <ReceiptCard receipt={content.receipt} />
+            )}
           </motion.div>
         </motion.div>
       )}
@@ -0,0 +1,282 @@
+'use client';
+
+import React from 'react';
+
+/** Must match TEMPLATE_VERSION in backend/src/receipt_renderer.py */
+export const RECEIPT_TEMPLATE_VERSION = 2;
+
+export interface ReceiptItem {
+  drinkType: string | null;
+  size: string | null;
+  milk: string | null;
+  extras: string[];
+  quantity: number;
+}
+
+export interface ReceiptOrder {
+  name: string | null;
+  items: ReceiptItem[];
+}
+
+export interface CompactReceipt {
+  v: number;
+  orderNumber: string;
+  placedAt: string;
+  order: ReceiptOrder;
+  truncated?: boolean;
+}
+
+const CUP_HEIGHTS: Record<string, number> = { small: 180, medium: 220, large: 260 };
+const CUP_WIDTHS: Record<string, number> = { small: 110, medium: 130, large: 150 };
+const DRINK_COLORS: Record<string, string> = {
+  latte: '#c49a6c',
+  cappuccino: '#b88a5e',
+  espresso: '#3e2723',
+  americano: '#5d4037',
+  mocha: '#6d4c41',
+  'flat white': '#d4a574',
+};
+
+export function parseCompactReceipt(json: string): CompactReceipt | null {
+  try {
+    const receipt = JSON.parse(json) as CompactReceipt;
+    if (receipt.v !== RECEIPT_TEMPLATE_VERSION) {
+      console.warn(`Unsupported receipt template version ${receipt.v}`);
+      return null;
+    }
+    return receipt;
+  } catch (error) {
+    console.warn('Invalid receipt payload:', error);
+    return null;
+  }
+}
+
+function titleCase(value: string | null) {
+  return (value ?? 'N/A').replace(/\w\S*/g, (w) => w[0].toUpperCase() + w.slice(1).toLowerCase());
+}
+
+function DetailRow({
+  label,
+  value,
+  background,
+  accent,
+}: {
+  label: string;
+  value: string;
+  background: string;
+  accent: string;
+}) {
+  return (
+    <div
+      style={{
+        display: 'flex',
+        justifyContent: 'space-between',
+        alignItems: 'center',
+        margin: '15px 0',
+        padding: 12,
+        background: `linear-gradient(135deg, ${background})`,
+        borderRadius: 10,
+        borderLeft: `4px solid ${accent}`,
+      }}
+    >
+      <strong style={{ color: '#555', fontSize: 16 }}>{label}:</strong>
+      <span style={{ color: '#222', fontWeight: 600, fontSize: 16 }}>{value}</span>
+    </div>
+  );
+}
+
+/** Renders a compact receipt payload with the same look as the backend's HTML receipt. */
+export function ReceiptCard({ receipt }: { receipt: CompactReceipt }) {
+  const { order } = receipt;
+  const first = order.items[0] ?? { drinkType: null, size: null, milk: null, extras: [], quantity: 1 };
+  const size = first.size ?? 'medium';
+  const width = CUP_WIDTHS[size] ?? 130;
+  const height = CUP_HEIGHTS[size] ?? 220;
+  const color = DRINK_COLORS[first.drinkType ?? 'latte'] ?? '#c49a6c';
+  const hasWhippedCream = first.extras.some((e) => e.includes('whipped') || e.includes('cream'));
+  const showHeaders = order.items.length > 1 || first.quantity > 1;
+  const placedAt = new Date(receipt.placedAt).toLocaleString(undefined, {
+    dateStyle: 'long',
+    timeStyle: 'short',
+  });
+
+  return (
+    <div
+      style={{
+        display: 'flex',
+        flexDirection: 'column',
+        alignItems: 'center',
+        padding: 30,
+        background: 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
+        borderRadius: 20,
+        fontFamily: "'Segoe UI', Tahoma, Geneva, Verdana, sans-serif",
+      }}
+    >
+      <h2
+        style={{
+          color: 'white',
+          marginBottom: 25,
+          textShadow: '2px 2px 8px rgba(0,0,0,0.4)',
+          fontSize: 28,
+          letterSpacing: 1,
+        }}
+      >
+        ☕ Your Perfect Coffee
+      </h2>
+
+      <div style={{ position: 'relative', marginBottom: 35 }}>
+        <div
+          style={{
+            position: 'relative',
+            width,
+            height,
+            background: `linear-gradient(165deg, ${color} 0%, ${color}dd 100%)`,
+            borderRadius: '8px 8px 35px 35px',
+            boxShadow:
+              '0 25px 50px rgba(0,0,0,0.35), inset -8px 0 15px rgba(0,0,0,0.2), inset 8px 0 15px rgba(255,255,255,0.1)',
+            border: '3px solid rgba(139,111,71,0.8)',
+          }}
+        >
+          <div
+            style={{
+              position: 'absolute',
+              top: 0,
+              left: 0,
+              right: 0,
+              height: '22%',
+              background:
+                'linear-gradient(180deg, rgba(255,248,240,0.95) 0%, rgba(245,235,220,0.85) 40%, rgba(240,230,215,0.6) 70%, transparent 100%)',
+              borderRadius: '8px 8px 50% 50% / 8px 8px 35% 35%',
+            }}
+          />
+          {hasWhippedCream && (
+            <div
+              style={{
+                position: 'absolute',
+                top: -22,
+                left: '50%',
+                transform: 'translateX(-50%)',
+                width: width - 10,
+                height: 35,
+                background: 'linear-gradient(180deg, #ffffff 0%, #fffbf5 50%, #f5f0e8 100%)',
+                borderRadius: '50%',
+                boxShadow: '0 -2px 8px rgba(255,255,255,0.8), 0 4px 12px rgba(0,0,0,0.2)',
+                zIndex: 5,
+              }}
+            />
+          )}
+          <div
+            style={{
+              position: 'absolute',
+              right: -38,
+              top: '30%',
+              width: 45,
+              height: '42%',
+              border: '4px solid rgba(139,111,71,0.9)',
+              borderLeft: 'none',
+              borderRadius: '0 45% 45% 0',
+            }}
+          />
+        </div>
+        <div
+          style={{
+            width: width + 50,
+            height: 16,
+            marginLeft: -25,
+            marginTop: 6,
+            background: 'linear-gradient(180deg, #9d826d 0%, #8b6f47 100%)',
+            borderRadius: '50%',
+            border: '2px solid #6d5638',
+          }}
+        />
+      </div>
+
+      <div
+        style={{
+          background: 'white',
+          padding: 25,
+          borderRadius: 18,
+          width: '100%',
+          maxWidth: 450,
+          boxShadow: '0 10px 40px rgba(0,0,0,0.3)',
+        }}
+      >
+        <h3
+          style={{
+            marginTop: 0,
+            color: '#4a2c2a',
+            borderBottom: '3px solid #667eea',
+            paddingBottom: 12,
+            fontSize: 24,
+          }}
+        >
+          📋 Order Summary
+        </h3>
+        <DetailRow
+          label="👤 Customer"
+          value={order.name ?? 'N/A'}
+          background="#f8f9ff 0%, #f0f2ff 100%"
+          accent="#667eea"
+        />
+        {order.items.map((item, index) => (
+          <React.Fragment key={index}>
+            {showHeaders && (
+              <h4 style={{ margin: '22px 0 0', color: '#4a2c2a', fontSize: 18 }}>
+                Drink {index + 1}
+                {item.quantity > 1 ? ` × ${item.quantity}` : ''}
+              </h4>
+            )}
+            <DetailRow
+              label="☕ Drink"
+              value={titleCase(item.drinkType)}
+              background="#fff8f0 0%, #fff0e6 100%"
+              accent="#d4a574"
+            />
+            <DetailRow
+              label="📏 Size"
+              value={titleCase(item.size)}
+              background="#f0fff4 0%, #e6f9f0 100%"
+              accent="#52c41a"
+            />
+            <DetailRow
+              label="🥛 Milk"
+              value={titleCase(item.milk)}
+              background="#fffbf0 0%, #fff5e6 100%"
+              accent="#faad14"
+            />
+            <DetailRow
+              label="✨ Extras"
+              value={item.extras.length ? item.extras.map(titleCase).join(', ') : 'None'}
+              background="#fff0f6 0%, #ffe6f0 100%"
+              accent="#eb2f96"
+            />
+          </React.Fragment>
+        ))}
+        {receipt.truncated && (
+          <p style={{ color: '#999', fontStyle: 'italic', textAlign: 'center' }}>
+            Some items were left off this receipt.
+          </p>
+        )}
+        <div
+          style={{
+            marginTop: 25,
+            paddingTop: 20,
+            borderTop: '2px dashed #ddd',
+            textAlign: 'center',
+          }}
+        >
+          <p style={{ color: '#667eea', fontWeight: 'bold', fontSize: 22, margin: '8px 0' }}>
+            Order #{receipt.orderNumber}
+          </p>
+          <p style={{ color: '#999', fontSize: 14, margin: '5px 0', fontWeight: 500 }}>
+            {placedAt}
+          </p>
+        </div>
+      </div>
+
+      <p style={{ color: 'white', marginTop: 25, fontSize: 16, textAlign: 'center' }}>
+        ✨ Thank you for ordering from Murf Coffee Shop! ✨
+      </p>
+    </div>
+  );
+}
@@ -6,6 +6,8 @@ import type { AppConfig } from '@/app-config';
 import { ChatTranscript } from '@/components/app/chat-transcript';
 import { PreConnectMessage } from '@/components/app/preconnect-message';
 import { TileLayout } from '@/components/app/tile-layout';
+import { LiveOrder } from '@/components/app/live-order';
+import { OrderStatus } from '@/components/app/order-status';
 import { OrderVisualization } from '@/components/app/order-visualization';
 import {
   AgentControlBar,
@@ -95,6 +97,8 @@ export const SessionView = ({
     <section className="bg-background relative z-10 h-full w-full overflow-hidden" {...props}>
       {/* Order Visualization Overlay */}
       <OrderVisualization />
+      <OrderStatus />
+      <LiveOrder />
       
       {/* Chat Transcript */}
       <div
@@ -0,0 +1,86 @@
+import { useEffect, useRef } from 'react';
+import { RoomEvent } from 'livekit-client';
+import { useRoomContext } from '@livekit/components-react';
+
+/** Must match CHUNK_TOPIC in backend/src/room_messaging.py */
+const CHUNK_TOPIC = 'room-chunk';
+// Incomplete messages kept at once; the oldest is dropped beyond this
+const MAX_PENDING = 16;
+
+interface ChunkHeader {
+  id: string;
+  topic: string;
+  seq: number;
+  count: number;
+  enc: 'identity' | 'deflate';
+}
+
+interface PendingMessage {
+  header: ChunkHeader;
+  parts: Map<number, Uint8Array>;
+}
+
+async function inflate(data: Uint8Array): Promise<Uint8Array> {
+  const stream = new Blob([data]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+function concat(parts: Uint8Array[]): Uint8Array {
+  const out = new Uint8Array(parts.reduce((total, part) => total + part.length, 0));
+  let offset = 0;
+  for (const part of parts) {
+    out.set(part, offset);
+    offset += part.length;
+  }
+  return out;
+}
+
+/**
+ * Calls `handler(topic, payload)` for data messages on `topics`, reassembling and
+ * decompressing the chunked messages the backend's RoomMessenger sends for large payloads.
+ */
+export function useRoomMessages(topics: string[], handler: (topic: string, payload: Uint8Array) => void) {
+  const room = useRoomContext();
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+  const topicKey = topics.join('\n');
+
+  useEffect(() => {
+    if (!room) return;
+    const wanted = new Set(topicKey.split('\n'));
+    const pending = new Map<string, PendingMessage>();
+
+    const onChunk = async (packet: Uint8Array) => {
+      const newline = packet.indexOf(10);
+      const header = JSON.parse(new TextDecoder().decode(packet.subarray(0, newline))) as ChunkHeader;
+      if (!wanted.has(header.topic)) return;
+
+      let message = pending.get(header.id);
+      if (!message) {
+        message = { header, parts: new Map() };
+        pending.set(header.id, message);
+        if (pending.size > MAX_PENDING) pending.delete(pending.keys().next().value as string);
+      }
+      message.parts.set(header.seq, packet.slice(newline + 1));
+      if (message.parts.size < header.count) return;
+
+      pending.delete(header.id);
+      const parts = Array.from({ length: header.count }, (_, seq) => message.parts.get(seq) as Uint8Array);
+      const body = concat(parts);
+      handlerRef.current(header.topic, header.enc === 'deflate' ? await inflate(body) : body);
+    };
+
+    const onData = (payload: Uint8Array, participant?: unknown, kind?: unknown, topic?: string) => {
+      if (topic === CHUNK_TOPIC) {
+        onChunk(payload).catch((error) => console.warn('Invalid chunked message:', error));
+      } else if (topic && wanted.has(topic)) {
+        handlerRef.current(topic, payload);
+      }
+    };
+
+    room.on(RoomEvent.DataReceived, onData);
+    return () => {
+      room.off(RoomEvent.DataReceived, onData);
+    };
+  }, [room, topicKey]);
+}